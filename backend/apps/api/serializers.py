@@ -3,7 +3,8 @@ from apps.organizations.models import Organization
 from apps.users.models import User
 from apps.bookings.models import (
     Traveller, Booking, AirBooking, AirSegment,
-    AccommodationBooking, CarHireBooking, Invoice, ServiceFee
+    AccommodationBooking, CarHireBooking, Invoice, ServiceFee, DuplicateBookingCandidate, Trip,
+    BookingConflict, BookingTransaction
 )
 from apps.budgets.models import FiscalYear, Budget, BudgetAlert
 from apps.compliance.models import (
@@ -12,6 +13,7 @@ from apps.compliance.models import (
 )
 from apps.reference_data.models import Airport, Airline, CurrencyExchangeRate, Country
 from apps.commissions.models import Commission
+from apps.imports.models import ImportBatch, ImportBatchError
 
 
 # ============================================================================
@@ -110,7 +112,8 @@ class AirBookingSerializer(serializers.ModelSerializer):
             'primary_airline_iata_code', 'primary_airline_name',
             'origin_airport_iata_code', 'destination_airport_iata_code',
             'lowest_fare_available', 'lowest_fare_currency', 'potential_savings',
-            'segments', 'total_carbon_kg', 'base_fare', 'taxes', 'fees', 'gst_amount', 'total_fare', 'currency'
+            'segments', 'total_carbon_kg', 'base_fare', 'taxes', 'fees', 'gst_amount', 'total_fare', 'currency',
+            'transaction_total', 'transaction_total_base'
         ]
 
     def get_total_carbon_kg(self, obj):
@@ -126,10 +129,11 @@ class AccommodationBookingSerializer(serializers.ModelSerializer):
     class Meta:
         model = AccommodationBooking
         fields = [
-            'id', 'hotel_name', 'hotel_chain', 'city', 'country',
+            'id', 'hotel_name', 'hotel_chain', 'hotel_chain_ref', 'city', 'country',
             'address', 'check_in_date', 'check_out_date',
             'number_of_nights', 'room_type', 'nightly_rate',
-            'currency', 'nightly_rate_base', 'gst_amount', 'total_amount_base'
+            'currency', 'nightly_rate_base', 'gst_amount', 'total_amount_base',
+            'transaction_total', 'transaction_total_base'
         ]
 
 
@@ -137,11 +141,12 @@ class CarHireBookingSerializer(serializers.ModelSerializer):
     class Meta:
         model = CarHireBooking
         fields = [
-            'id', 'rental_company', 'vehicle_type', 'vehicle_category', 'vehicle_make_model',  # ✅ Fixed
+            'id', 'rental_company', 'rental_company_ref', 'vehicle_type', 'vehicle_category', 'vehicle_make_model',  # ✅ Fixed
             'pickup_location', 'pickup_city', 'pickup_date', 'pickup_time',
             'dropoff_location', 'dropoff_city', 'dropoff_date', 'dropoff_time',
             'country', 'number_of_days', 'daily_rate', 'currency',
-            'daily_rate_base', 'gst_amount', 'total_amount_base'
+            'daily_rate_base', 'gst_amount', 'total_amount_base',
+            'transaction_total', 'transaction_total_base'
         ]
 
 
@@ -381,6 +386,142 @@ class ServiceFeeSerializer(serializers.ModelSerializer):
             return obj.booking.agent_booking_reference
         return None
 
+# ============================================================================
+# IMPORT SERIALIZERS
+# ============================================================================
+
+class ImportBatchSerializer(serializers.ModelSerializer):
+    """Import batch with counters, error summary and the error sample"""
+    organization_name = serializers.CharField(source='organization.name', read_only=True)
+    
+    class Meta:
+        model = ImportBatch
+        fields = [
+            'id', 'organization', 'organization_name', 'import_date', 'import_type',
+            'file_name', 'status', 'records_processed', 'records_created',
+            'records_updated', 'records_unchanged', 'records_failed', 'chunks_processed',
+            'error_summary', 'error_log', 'started_at', 'completed_at', 'created_at',
+        ]
+
+
+class ImportBatchErrorSerializer(serializers.ModelSerializer):
+    """A single import error row"""
+    
+    class Meta:
+        model = ImportBatchError
+        fields = ['id', 'line', 'reference', 'error_class', 'message', 'created_at']
+
+
+# ============================================================================
+# DUPLICATE BOOKING SERIALIZERS
+# ============================================================================
+
+class DuplicateBookingCandidateSerializer(serializers.ModelSerializer):
+    """A probable duplicate pair with both booking references"""
+    booking_reference = serializers.CharField(source='booking.agent_booking_reference', read_only=True)
+    duplicate_of_reference = serializers.CharField(
+        source='duplicate_of.agent_booking_reference', read_only=True
+    )
+    traveller_name = serializers.SerializerMethodField()
+    travel_date = serializers.DateField(source='booking.travel_date', read_only=True)
+    
+    class Meta:
+        model = DuplicateBookingCandidate
+        fields = [
+            'id', 'organization', 'booking', 'booking_reference', 'duplicate_of',
+            'duplicate_of_reference', 'traveller_name', 'travel_date', 'confidence',
+            'reasons', 'status', 'import_batch', 'detected_at', 'updated_at',
+        ]
+    
+    def get_traveller_name(self, obj):
+        traveller = obj.booking.traveller
+        return f"{traveller.first_name} {traveller.last_name}"
+
+
+# ============================================================================
+# TRIP SERIALIZERS
+# ============================================================================
+
+class TripSerializer(serializers.ModelSerializer):
+    """A reconstructed trip with its booking ids"""
+    traveller_name = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Trip
+        fields = [
+            'id', 'organization', 'traveller', 'traveller_name', 'bookings',
+            'start_date', 'end_date', 'duration_days', 'origin_city', 'destination_city',
+            'destination_country', 'flight_count', 'nights', 'rental_days', 'air_spend',
+            'hotel_spend', 'car_spend', 'total_spend', 'total_carbon_kg', 'built_at',
+        ]
+    
+    def get_traveller_name(self, obj):
+        return f"{obj.traveller.first_name} {obj.traveller.last_name}"
+
+
+# ============================================================================
+# BOOKING CONFLICT SERIALIZERS
+# ============================================================================
+
+class BookingConflictSerializer(serializers.ModelSerializer):
+    """An overlap between two items of a traveller's timeline"""
+    conflict_type_display = serializers.CharField(source='get_conflict_type_display', read_only=True)
+    booking_reference = serializers.CharField(source='booking.agent_booking_reference', read_only=True)
+    conflicting_booking_reference = serializers.CharField(
+        source='conflicting_booking.agent_booking_reference', read_only=True
+    )
+    traveller_name = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = BookingConflict
+        fields = [
+            'id', 'organization', 'traveller', 'traveller_name', 'conflict_type',
+            'conflict_type_display', 'booking', 'booking_reference', 'component_id',
+            'conflicting_booking', 'conflicting_booking_reference', 'conflicting_component_id',
+            'overlap_start_date', 'overlap_hours', 'wasted_amount', 'description', 'status',
+            'import_batch', 'detected_at', 'updated_at',
+        ]
+    
+    def get_traveller_name(self, obj):
+        return f"{obj.traveller.first_name} {obj.traveller.last_name}"
+
+
+# ============================================================================
+# BOOKING TRANSACTION SERIALIZERS
+# ============================================================================
+
+class BookingTransactionSerializer(serializers.ModelSerializer):
+    """A transaction against a booking component"""
+    transaction_type_display = serializers.CharField(source='get_transaction_type_display', read_only=True)
+    component_type = serializers.CharField(source='content_type.model', read_only=True)
+    
+    class Meta:
+        model = BookingTransaction
+        fields = [
+            'id', 'component_type', 'object_id', 'transaction_type', 'transaction_type_display',
+            'transaction_date', 'transaction_reference', 'status', 'currency', 'base_amount',
+            'taxes', 'fees', 'total_amount', 'base_amount_base', 'taxes_base', 'fees_base',
+            'total_amount_base', 'exchange_rate', 'reason', 'notes', 'created_by', 'created_at',
+        ]
+
+
+class BookingTransactionIngestSerializer(serializers.Serializer):
+    """One row of a bulk transaction upload"""
+    component_type = serializers.ChoiceField(choices=['AIR', 'HOTEL', 'CAR', 'FEE'])
+    component_id = serializers.UUIDField()
+    transaction_type = serializers.ChoiceField(choices=BookingTransaction.TRANSACTION_TYPE_CHOICES)
+    transaction_date = serializers.DateField()
+    transaction_reference = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    status = serializers.ChoiceField(choices=BookingTransaction.STATUS_CHOICES, required=False)
+    currency = serializers.CharField(max_length=3, required=False)
+    base_amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    taxes = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    fees = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    total_amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    reason = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    notes = serializers.CharField(required=False, allow_blank=True)
+
+
 # ============================================================================
 # COUNTRY SERIALIZERS
 # ============================================================================
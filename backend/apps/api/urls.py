@@ -12,6 +12,10 @@ router.register(r'organizations', views.OrganizationViewSet, basename='organizat
 router.register(r'users', views.UserViewSet, basename='user')
 router.register(r'travellers', views.TravellerViewSet, basename='traveller')
 router.register(r'bookings', views.BookingViewSet, basename='booking')
+router.register(r'duplicate-bookings', views.DuplicateBookingCandidateViewSet, basename='duplicate-booking')
+router.register(r'trips', views.TripViewSet, basename='trip')
+router.register(r'booking-conflicts', views.BookingConflictViewSet, basename='booking-conflict')
+router.register(r'booking-transactions', views.BookingTransactionViewSet, basename='booking-transaction')
 
 # Budget endpoints
 router.register(r'budgets', views.BudgetViewSet, basename='budget')
@@ -27,6 +31,9 @@ router.register(r'commissions', views.CommissionViewSet, basename='commission')
 # Service Fee endpoint
 router.register(r'service-fees', views.ServiceFeeViewSet, basename='service-fee')
 
+# Import endpoints
+router.register(r'import-batches', views.ImportBatchViewSet, basename='import-batch')
+
 urlpatterns = [
     # JWT Authentication endpoints
     path('auth/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
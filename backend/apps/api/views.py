@@ -1,21 +1,32 @@
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Count, Sum, Avg, Q
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from datetime import datetime, timedelta
+import json
 
 from apps.organizations.models import Organization
 from apps.users.models import User
 from apps.bookings.models import (
     Traveller, Booking, AirBooking, AirSegment,
-    AccommodationBooking, CarHireBooking, Invoice, ServiceFee
+    AccommodationBooking, CarHireBooking, Invoice, ServiceFee,
+    DailySpendFact, DuplicateBookingCandidate, Trip, TravellerLocation, BookingConflict,
+    BookingTransaction
 )
 from apps.budgets.models import FiscalYear, Budget, BudgetAlert
 from apps.compliance.models import ComplianceViolation, TravelRiskAlert
-from apps.reference_data.models import Airport, Airline, CurrencyExchangeRate, Country
+from apps.reference_data.models import (
+    Airport, Airline, CarRentalCompany, CurrencyExchangeRate, Country, HotelChain
+)
 from apps.commissions.models import Commission
+from apps.imports.models import ImportBatch
+from apps.bookings import analytics, audit_archive, identity, locations, transactions, valuation
 
 from .serializers import (
     OrganizationSerializer, UserSerializer,
@@ -25,7 +36,10 @@ from .serializers import (
     FiscalYearSerializer, BudgetSerializer, BudgetAlertSerializer,
     ComplianceViolationSerializer, TravelRiskAlertSerializer,
     AirportSerializer, AirlineSerializer, CurrencyExchangeRateSerializer,
-    CommissionSerializer, ServiceFeeSerializer, CountrySerializer
+    CommissionSerializer, ServiceFeeSerializer, CountrySerializer,
+    ImportBatchSerializer, ImportBatchErrorSerializer, DuplicateBookingCandidateSerializer,
+    TripSerializer, BookingConflictSerializer,
+    BookingTransactionSerializer, BookingTransactionIngestSerializer
 )
 
 
@@ -169,6 +183,154 @@ class TravellerViewSet(viewsets.ModelViewSet):
         bookings = Booking.objects.filter(traveller=traveller).order_by('-travel_date')
         serializer = BookingListSerializer(bookings, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def merge_suggestions(self, request):
+        """
+        Pairs of travellers in the same organization that are probably the
+        same person (e.g. "Jon Smith" / "Jonathan Smith"). Admins only.
+        
+        Query params:
+        - organization: Limit to one organization (plus the usual traveller filters)
+        - min_score: Minimum match score 0-1 (default 0.85)
+        - limit: Maximum pairs (default 100, max 1000)
+        """
+        if request.user.user_type not in ['ADMIN', 'AGENT_ADMIN', 'CUSTOMER_ADMIN']:
+            return Response(
+                {'error': 'Only administrators can review merge suggestions'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        try:
+            min_score = float(request.query_params.get('min_score', identity.SUGGESTION_THRESHOLD))
+            limit = min(int(request.query_params.get('limit', 100)), 1000)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        travellers = self.filter_queryset(self.get_queryset()).filter(is_active=True)
+        pairs = identity.merge_suggestions(travellers, min_score=min_score, limit=limit)
+        
+        ids = {traveller.pk for pair in pairs for traveller in pair[:2]}
+        booking_counts = dict(
+            Booking.objects.filter(traveller_id__in=ids)
+            .values('traveller_id')
+            .annotate(count=Count('id'))
+            .values_list('traveller_id', 'count')
+        )
+        
+        def describe(traveller):
+            return {
+                'id': str(traveller.pk),
+                'first_name': traveller.first_name,
+                'last_name': traveller.last_name,
+                'email': traveller.email,
+                'employee_id': traveller.employee_id,
+                'cost_center': traveller.cost_center,
+                'bookings': booking_counts.get(traveller.pk, 0),
+            }
+        
+        return Response({
+            'min_score': min_score,
+            'count': len(pairs),
+            'results': [
+                {
+                    'organization': str(a.organization_id),
+                    'score': score,
+                    'travellers': [describe(a), describe(b)],
+                }
+                for a, b, score in pairs
+            ],
+        })
+    
+    @action(detail=False, methods=['get'])
+    def locations(self, request):
+        """
+        Duty of care: every traveller in a city or country at some point
+        between two moments, read from the materialized location timeline.
+        
+        Query params:
+        - city or country: Where (case-insensitive, one is required)
+        - start, end: ISO dates or datetimes in local time at that place
+          (default: now). A bare end date covers the whole day; without
+          end, the moment (or day) given as start.
+        - organization: Limit to one organization
+        """
+        city = request.query_params.get('city', '').strip()
+        country = request.query_params.get('country', '').strip()
+        if not city and not country:
+            return Response(
+                {'error': 'city or country is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        now = timezone.localtime().replace(tzinfo=None).isoformat()
+        try:
+            start = locations.parse_moment(request.query_params.get('start', now))
+            end = locations.parse_moment(request.query_params.get('end', request.query_params.get('start', now)), end=True)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if end < start:
+            return Response({'error': 'end must not be before start'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        user = request.user
+        rows = TravellerLocation.objects.filter(date__gte=start.date(), date__lte=end.date())
+        if user.user_type in ['AGENT_ADMIN', 'AGENT_USER']:
+            rows = rows.filter(
+                Q(organization=user.organization) |
+                Q(organization__travel_agent=user.organization)
+            )
+        elif user.user_type != 'ADMIN':
+            rows = rows.filter(organization=user.organization)
+        if request.query_params.get('organization'):
+            rows = rows.filter(organization_id=request.query_params['organization'])
+        if city:
+            rows = rows.filter(city_key=city.upper())
+        if country:
+            rows = rows.filter(country_key=country.upper())
+        # Left before start on the first day / arrives after end on the last day
+        rows = (
+            rows.exclude(date=start.date(), last_seen__lt=start.time())
+            .exclude(date=end.date(), first_seen__gt=end.time())
+            .order_by('traveller__last_name', 'traveller__first_name', 'traveller_id', 'date', 'first_seen')
+            .values_list(
+                'traveller_id', 'traveller__first_name', 'traveller__last_name', 'traveller__email',
+                'traveller__employee_id', 'organization_id', 'organization__name',
+                'date', 'city', 'country', 'first_seen', 'last_seen', 'booking_id',
+            )
+        )
+        
+        travellers = {}
+        for (traveller_id, first_name, last_name, email, employee_id, organization_id, organization_name,
+             date, row_city, row_country, first_seen, last_seen, booking_id) in rows:
+            traveller = travellers.get(traveller_id)
+            if traveller is None:
+                traveller = travellers[traveller_id] = {
+                    'id': str(traveller_id),
+                    'first_name': first_name,
+                    'last_name': last_name,
+                    'email': email,
+                    'employee_id': employee_id,
+                    'organization': str(organization_id),
+                    'organization_name': organization_name,
+                    'presence': [],
+                }
+            traveller['presence'].append({
+                'date': date,
+                'city': row_city,
+                'country': row_country,
+                'first_seen': first_seen,
+                'last_seen': last_seen,
+                'booking': str(booking_id) if booking_id else None,
+            })
+        
+        return Response({
+            'city': city or None,
+            'country': country or None,
+            'start': start,
+            'end': end,
+            'count': len(travellers),
+            'results': list(travellers.values()),
+        })
 
 
 # ============================================================================
@@ -190,10 +352,15 @@ class BookingViewSet(viewsets.ModelViewSet):
     - Supplier filter
 
     Response includes summary statistics:
-    - total_spend: Sum of all booking amounts
+    - total_spend: Sum of all booking amounts (as it stood on ?as_of=YYYY-MM-DD
+      when given, from the transaction ledger)
     - total_emissions: Sum of carbon emissions (kg CO2)
     - compliance_rate: Percentage of compliant bookings
     - booking_count: Total number of bookings
+
+    ?as_of=YYYY-MM-DD is only accepted by list (which values the summary
+    total_spend as of it; rows keep their current amounts) and analytics.
+    The other actions report current amounts and answer it with 400.
     """
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -209,6 +376,14 @@ class BookingViewSet(viewsets.ModelViewSet):
     ordering_fields = ['booking_date', 'travel_date', 'total_amount', 'created_at']
     ordering = ['-travel_date']
 
+    # Actions that value spend as of ?as_of=
+    AS_OF_ACTIONS = {'list', 'analytics'}
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if 'as_of' in request.query_params and self.action not in self.AS_OF_ACTIONS:
+            raise ValidationError({'error': f'as_of not supported by {self.action}'})
+
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return BookingDetailSerializer
@@ -255,6 +430,16 @@ class BookingViewSet(viewsets.ModelViewSet):
         travel_consultant = self.request.query_params.get('travel_consultant', '')
         travel_consultants = self.request.query_params.get('travel_consultants', '')
         supplier = self.request.query_params.get('supplier', '')
+        as_of = self.request.query_params.get('as_of', '')
+        
+        # ========================================================================
+        # AS-OF DATE - only bookings that existed by then
+        # ========================================================================
+        if as_of:
+            try:
+                queryset = queryset.filter(booking_date__lte=valuation.parse_as_of(as_of))
+            except ValueError as e:
+                raise ValidationError({'error': str(e)})
         
         # ========================================================================
         # TRAVELLERS FILTER (Multi-select)
@@ -525,11 +710,25 @@ class BookingViewSet(viewsets.ModelViewSet):
             supplier_q = Q()
             
             supplier_q |= Q(air_bookings__primary_airline_name__icontains=supplier_search)
+            # Chains and rental companies match on their canonical name or
+            # alternative names, then filter on the indexed supplier key
+            chains = HotelChain.objects.filter(
+                Q(name__icontains=supplier_search) | Q(alternative_names__icontains=supplier_search)
+            )
+            companies = CarRentalCompany.objects.filter(
+                Q(name__icontains=supplier_search) | Q(alternative_names__icontains=supplier_search)
+            )
             supplier_q |= Q(
                 Q(accommodation_bookings__hotel_name__icontains=supplier_search) |
-                Q(accommodation_bookings__hotel_chain__icontains=supplier_search)
+                Q(accommodation_bookings__hotel_chain_ref__in=chains) |
+                Q(accommodation_bookings__hotel_chain_ref__isnull=True,
+                  accommodation_bookings__hotel_chain__icontains=supplier_search)
+            )
+            supplier_q |= Q(
+                Q(car_hire_bookings__rental_company_ref__in=companies) |
+                Q(car_hire_bookings__rental_company_ref__isnull=True,
+                  car_hire_bookings__rental_company__icontains=supplier_search)
             )
-            supplier_q |= Q(car_hire_bookings__rental_company__icontains=supplier_search)
             
             queryset = queryset.filter(supplier_q).distinct()
         
@@ -553,26 +752,41 @@ class BookingViewSet(viewsets.ModelViewSet):
             }
         }
         """
+        try:
+            as_of = self._as_of()
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         # Get the filtered queryset
         queryset = self.filter_queryset(self.get_queryset())
 
         # Calculate summary statistics on the filtered queryset
         from decimal import Decimal
 
-        total_spend = queryset.aggregate(
-            total=Sum('total_amount')
-        )['total'] or Decimal('0')
-
-        # Calculate total emissions from air bookings
-        # NOTE: We calculate from segments (same logic as serializer) because
-        # the air_booking.total_carbon_kg field may not be populated
-        total_emissions = 0
-        for booking in queryset.prefetch_related('air_bookings__segments'):
-            for air_booking in booking.air_bookings.all():
-                # Sum carbon from all segments in this air booking
-                for segment in air_booking.segments.all():
-                    if segment.carbon_emissions_kg:
-                        total_emissions += float(segment.carbon_emissions_kg)
+        if as_of is not None:
+            total_spend = analytics.spend_as_of(queryset, as_of)
+            total_emissions = float(AirSegment.objects.filter(
+                air_booking__booking__in=queryset.values('pk')
+            ).aggregate(total=Sum('carbon_emissions_kg'))['total'] or 0)
+        elif self._spend_facts_cover_filters():
+            # Only day-level filters in play - answer from the rollup, less the
+            # service fees without a booking (the rollup has them, bookings don't)
+            totals = self._get_spend_facts().aggregate(
+                spend=Sum('spend'),
+                emissions=Sum('emissions_kg')
+            )
+            total_spend = (totals['spend'] or Decimal('0')) - self._standalone_fee_spend()
+            total_emissions = float(totals['emissions'] or 0)
+        else:
+            total_spend = queryset.aggregate(
+                total=Sum('total_amount')
+            )['total'] or Decimal('0')
+
+            # Calculate total emissions from air segments (same logic as
+            # serializer) because air_booking.total_carbon_kg may not be populated
+            total_emissions = float(AirSegment.objects.filter(
+                air_booking__booking__in=queryset.values('pk')
+            ).aggregate(total=Sum('carbon_emissions_kg'))['total'] or 0)
 
         # Calculate compliance rate
         booking_count = queryset.count()
@@ -607,6 +821,484 @@ class BookingViewSet(viewsets.ModelViewSet):
             'summary': summary
         })
 
+    def _as_of(self):
+        """The ?as_of date, or None. Raises ValueError if malformed."""
+        value = self.request.query_params.get('as_of')
+        return valuation.parse_as_of(value) if value else None
+
+    # ========================================================================
+    # DAILY SPEND ROLLUP (DailySpendFact)
+    # ========================================================================
+
+    # List filters the rollup can answer without touching raw bookings
+    SPEND_FACT_LIST_PARAMS = {
+        'organization', 'status', 'travel_date__gte', 'travel_date__lte',
+        'page', 'page_size', 'ordering',
+    }
+
+    def _spend_facts_cover_filters(self):
+        return set(self.request.query_params.keys()) <= self.SPEND_FACT_LIST_PARAMS
+
+    def _get_spend_facts(self):
+        """DailySpendFact rows visible to the user, filtered by query params"""
+        user = self.request.user
+
+        if user.user_type == 'ADMIN':
+            queryset = DailySpendFact.objects.all()
+        elif user.user_type in ['AGENT_ADMIN', 'AGENT_USER']:
+            queryset = DailySpendFact.objects.filter(
+                Q(organization=user.organization) |
+                Q(organization__travel_agent=user.organization)
+            )
+        else:
+            queryset = DailySpendFact.objects.filter(organization=user.organization)
+
+        params = self.request.query_params
+        if params.get('organization'):
+            queryset = queryset.filter(organization_id=params['organization'])
+        if params.get('status'):
+            queryset = queryset.filter(status=params['status'])
+        if params.get('cost_center'):
+            queryset = queryset.filter(cost_center=params['cost_center'])
+        if params.get('product_type'):
+            queryset = queryset.filter(product_type=params['product_type'])
+
+        start_date = params.get('travel_date__gte') or params.get('start_date')
+        end_date = params.get('travel_date__lte') or params.get('end_date')
+        if start_date:
+            queryset = queryset.filter(date__gte=start_date)
+        if end_date:
+            queryset = queryset.filter(date__lte=end_date)
+
+        return queryset
+
+    def _standalone_fee_spend(self):
+        """
+        Spend of service fees without a parent booking that _get_spend_facts()
+        includes for the list filters (FEE facts of those fees are dated by
+        fee_date and counted as CONFIRMED).
+        """
+        from decimal import Decimal
+
+        user = self.request.user
+        fees = ServiceFee.objects.filter(booking__isnull=True)
+        if user.user_type in ['AGENT_ADMIN', 'AGENT_USER']:
+            fees = fees.filter(
+                Q(organization=user.organization) |
+                Q(organization__travel_agent=user.organization)
+            )
+        elif user.user_type != 'ADMIN':
+            fees = fees.filter(organization=user.organization)
+
+        params = self.request.query_params
+        if params.get('status') and params['status'] != 'CONFIRMED':
+            return Decimal('0')
+        if params.get('organization'):
+            fees = fees.filter(organization_id=params['organization'])
+        start_date = params.get('travel_date__gte') or params.get('start_date')
+        end_date = params.get('travel_date__lte') or params.get('end_date')
+        if start_date:
+            fees = fees.filter(fee_date__gte=start_date)
+        if end_date:
+            fees = fees.filter(fee_date__lte=end_date)
+
+        return fees.aggregate(total=Sum('fee_amount'))['total'] or Decimal('0')
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        Dashboard totals from the daily spend rollup.
+
+        Query params: organization, start_date/end_date (or travel_date__gte/lte),
+        cost_center, status, product_type
+
+        Returns:
+        {
+            "total_spend": 125000.50,
+            "total_emissions": 45000,
+            "item_count": 320,
+            "hotel_nights": 210,
+            "car_hire_days": 45,
+            "potential_savings": 3200.00,
+            "by_product": {"AIR": {...}, "HOTEL": {...}, "CAR": {...}, "FEE": {...}}
+        }
+        """
+        facts = self._get_spend_facts()
+
+        measures = dict(
+            spend=Sum('spend'),
+            items=Sum('item_count'),
+            nights=Sum('nights'),
+            days=Sum('days'),
+            emissions=Sum('emissions_kg'),
+            savings=Sum('savings'),
+        )
+        totals = facts.aggregate(**measures)
+
+        by_product = {}
+        for row in facts.values('product_type').annotate(**measures).order_by('product_type'):
+            by_product[row['product_type']] = {
+                'spend': float(row['spend'] or 0),
+                'item_count': row['items'] or 0,
+                'nights': row['nights'] or 0,
+                'days': row['days'] or 0,
+                'emissions': round(float(row['emissions'] or 0)),
+            }
+
+        return Response({
+            'total_spend': float(totals['spend'] or 0),
+            'total_emissions': round(float(totals['emissions'] or 0)),
+            'item_count': totals['items'] or 0,
+            'hotel_nights': totals['nights'] or 0,
+            'car_hire_days': totals['days'] or 0,
+            'potential_savings': float(totals['savings'] or 0),
+            'by_product': by_product,
+        })
+
+    @action(detail=False, methods=['get'])
+    def spend_trend(self, request):
+        """
+        Spend trend from the daily spend rollup.
+
+        Query params: same as summary, plus
+        - granularity: day | week | month (default month)
+
+        Returns:
+            [
+                {"period": "2025-07-01", "product_type": "AIR", "spend": 1200.0, ...},
+                ...
+            ]
+        """
+        truncators = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+        granularity = request.query_params.get('granularity', 'month')
+        if granularity not in truncators:
+            return Response(
+                {'error': f"granularity must be one of: {', '.join(truncators)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rows = (
+            self._get_spend_facts()
+            .annotate(period=truncators[granularity]('date'))
+            .values('period', 'product_type')
+            .annotate(
+                spend=Sum('spend'),
+                items=Sum('item_count'),
+                nights=Sum('nights'),
+                days=Sum('days'),
+                emissions=Sum('emissions_kg'),
+            )
+            .order_by('period', 'product_type')
+        )
+
+        return Response([
+            {
+                'period': row['period'],
+                'product_type': row['product_type'],
+                'spend': float(row['spend'] or 0),
+                'item_count': row['items'] or 0,
+                'nights': row['nights'] or 0,
+                'days': row['days'] or 0,
+                'emissions': round(float(row['emissions'] or 0)),
+            }
+            for row in rows
+        ])
+
+    @action(detail=False, methods=['get'])
+    def analytics(self, request):
+        """
+        Group-by analytics across air, hotel, car and fee components.
+
+        Query params (plus the usual booking filters):
+        - dimensions: comma separated, e.g. "cost_center,month"
+          (product, organization, cost_center, traveller, airline, route,
+          hotel_chain, city, month, fiscal_period, travel_class)
+        - measures: comma separated (spend, count, nights, days, emissions, savings)
+        - products: optional comma separated subset of AIR, HOTEL, CAR, FEE
+        - rollup: "true" for subtotal and grand total rows (PostgreSQL)
+        - limit: maximum rows returned (default 500, max 5000)
+        - as_of: value spend as it stood on this date (YYYY-MM-DD), from the
+          transaction ledger; only bookings made by then are included
+
+        Returns:
+            {
+                "dimensions": ["cost_center", "month"],
+                "measures": ["spend", "count"],
+                "rows": [{"cost_center": "CC100", "month": "2025-07-01", "spend": 1200.0, "count": 3}],
+                "totals": {"spend": 1200.0, "count": 3},
+                "truncated": false,
+                ...
+            }
+        """
+        params = request.query_params
+
+        def split(name):
+            return [v.strip() for v in params.get(name, '').split(',') if v.strip()]
+
+        try:
+            as_of = self._as_of()
+            result = analytics.cached('group_by', request.user.pk, params, lambda: analytics.group_by(
+                self.filter_queryset(self.get_queryset()),
+                dimensions=split('dimensions'),
+                measures=split('measures'),
+                products=[p.upper() for p in split('products')],
+                rollup=params.get('rollup', '').lower() == 'true',
+                limit=int(params.get('limit') or analytics.DEFAULT_ROW_LIMIT),
+                as_of=as_of,
+            ))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(result)
+
+    @action(detail=False, methods=['get'])
+    def airlines(self, request):
+        """
+        Airline spend analytics (ticketing airline for spend, operating
+        airline for segments, distance and emissions).
+
+        Query params: the usual booking filters.
+
+        Returns:
+            [
+                {
+                    "airline_code": "QF", "airline_name": "Qantas", "alliance": "oneworld",
+                    "spend": 1050.0, "tickets": 3, "segments": 3, "distance_km": 2130,
+                    "emissions": 668, "average_fare": 350.0
+                },
+                ...
+            ]
+        """
+        return Response(analytics.cached(
+            'airlines', request.user.pk, request.query_params,
+            lambda: analytics.airline_summary(self.filter_queryset(self.get_queryset()))
+        ))
+
+    @action(detail=False, methods=['get'])
+    def accommodation(self, request):
+        """
+        Hotel analytics per city and hotel chain, including nightly rate
+        percentiles in base currency for setting city rate caps. Chains are
+        the canonical HotelChain (hotel_chain_id is null for stays whose
+        chain name matched no HotelChain).
+
+        Query params: the usual booking filters.
+
+        Returns:
+            [
+                {
+                    "city": "Melbourne", "hotel_chain": "Hilton",
+                    "hotel_chain_id": "5d0c...", "nights": 4,
+                    "spend": 820.0, "average_rate": 205.0,
+                    "median": 205.0, "p90": 209.0, "p95": 209.5
+                },
+                ...
+            ]
+        """
+        return Response(analytics.cached(
+            'accommodation', request.user.pk, request.query_params,
+            lambda: analytics.accommodation_summary(self.filter_queryset(self.get_queryset()))
+        ))
+
+    @action(detail=False, methods=['get'])
+    def car_hire(self, request):
+        """
+        Car hire analytics per rental company, vehicle category and pickup city.
+
+        Query params: the usual booking filters.
+
+        Returns:
+            [
+                {
+                    "rental_company": "Hertz", "rental_company_id": "9a41...",
+                    "vehicle_category": "Economy",
+                    "pickup_city": "Melbourne", "is_preferred": true, "tier": "PREFERRED",
+                    "rentals": 3, "days": 9, "spend": 450.0, "average_daily_rate": 50.0,
+                    "one_way_rentals": 1, "one_way_share": 0.3333
+                },
+                ...
+            ]
+        """
+        return Response(analytics.cached(
+            'car_hire', request.user.pk, request.query_params,
+            lambda: analytics.car_hire_summary(self.filter_queryset(self.get_queryset()))
+        ))
+
+    @action(detail=False, methods=['get'])
+    def routes(self, request):
+        """
+        Top routes by segment count, directional (SYD-MEL and MEL-SYD apart)
+        and non-directional (folded into one city pair).
+
+        Query params (plus the usual booking filters):
+        - limit: routes per list (default 20, max 100)
+
+        Returns:
+            {
+                "directional": [
+                    {
+                        "origin": "SYD", "destination": "MEL",
+                        "origin_city": "Sydney", "destination_city": "Melbourne",
+                        "segments": 4, "spend": 700.0, "emissions": 446,
+                        "average_advance_days": 12.5, "airline_share": {"QF": 0.75, "VA": 0.25}
+                    },
+                    ...
+                ],
+                "non_directional": [...]
+            }
+        """
+        params = request.query_params
+        try:
+            limit = int(params.get('limit') or analytics.DEFAULT_ROUTE_LIMIT)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(analytics.cached(
+            'routes', request.user.pk, params,
+            lambda: analytics.route_summary(self.filter_queryset(self.get_queryset()), limit=limit)
+        ))
+
+    @action(detail=False, methods=['get'])
+    def lost_savings(self, request):
+        """
+        Lost savings report: potential_savings on air tickets grouped by
+        traveller, cost centre, consultant or route.
+
+        Query params (plus the usual booking filters):
+        - group_by: traveller | cost_center | consultant | route (default traveller)
+        - limit: maximum groups (default 50, max 500)
+
+        Returns:
+            {
+                "group_by": "traveller",
+                "totals": {"tickets": 3, "tickets_with_savings": 1, "total_fare": 1050.0,
+                           "potential_savings": 120.0, "savings_rate": 11.43},
+                "rows": [{"traveller": "...", "traveller_name": "Jonathan Smith", ...}],
+                "truncated": false
+            }
+        """
+        params = request.query_params
+        try:
+            result = analytics.cached('lost_savings', request.user.pk, params, lambda: analytics.lost_savings_summary(
+                self.filter_queryset(self.get_queryset()),
+                params.get('group_by', 'traveller'),
+                limit=int(params.get('limit') or analytics.DEFAULT_LOST_SAVINGS_LIMIT),
+            ))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(result)
+
+    @action(detail=False, methods=['get'], url_path='transactions')
+    def transaction_analytics(self, request):
+        """
+        Cost of change, refund recovery, void rates and time to refund from
+        the booking transactions (base currency).
+
+        Query params (plus the usual booking filters):
+        - group_by: comma separated supplier, product, month (default product)
+        - start_date / end_date: transaction_date range (YYYY-MM-DD)
+        - products: optional comma separated subset of AIR, HOTEL, CAR, FEE
+
+        Returns:
+            {
+                "dimensions": ["supplier", "month"],
+                "totals": {"transactions": 40, "changes": 6, "cost_of_change": 1290.0,
+                           "change_fees": 300.0, "void_rate": 0.05, "refund_recovery_rate": 0.82,
+                           "average_days_to_refund": 12.5, ...},
+                "rows": [{"supplier": "Qantas", "month": "2025-07-01", ...}, ...]
+            }
+        """
+        params = request.query_params
+
+        def split(name):
+            return [v.strip() for v in params.get(name, '').split(',') if v.strip()]
+
+        try:
+            result = analytics.cached('transactions', request.user.pk, params, lambda: analytics.transaction_summary(
+                self.filter_queryset(self.get_queryset()),
+                split('group_by'),
+                start_date=params.get('start_date'),
+                end_date=params.get('end_date'),
+                products=[p.upper() for p in split('products')],
+            ))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(result)
+
+    @action(detail=False, methods=['get'])
+    def preferred_suppliers(self, request):
+        """
+        Preferred-supplier compliance for hotels and car hire per
+        organization, city and travel month, with estimated corporate
+        discount captured and missed (base currency).
+
+        Units are nights for HOTEL rows and rental days for CAR rows.
+
+        Query params: the usual booking filters.
+
+        Returns:
+            {
+                "totals": {
+                    "HOTEL": {"units": 8, "preferred_units": 4, "spend": 1560.0,
+                              "preferred_spend": 820.0, "unit_share": 0.5,
+                              "spend_share": 0.5256, "discount_captured": 111.82,
+                              "discount_missed": 88.8, "benchmark_discount_percentage": 12.0},
+                    "CAR": {...}
+                },
+                "rows": [
+                    {"organization": "...", "organization_name": "Acme", "city": "Melbourne",
+                     "month": "2025-03-01", "product": "HOTEL", "units": 6, ...},
+                    ...
+                ]
+            }
+        """
+        return Response(analytics.cached(
+            'preferred_suppliers', request.user.pk, request.query_params,
+            lambda: analytics.preferred_supplier_summary(self.filter_queryset(self.get_queryset()))
+        ))
+
+    @action(detail=True, methods=['get'], url_path='audit-log')
+    def audit_log(self, request, pk=None):
+        """
+        The booking's audit trail, newest first, including months already
+        moved to the audit archive (those entries have "archived": true).
+
+        Query params:
+        - start, end: ISO dates or datetimes bounding the timestamp
+          (a bare end date includes that day)
+        - action: Only this action (e.g. TRANSACTION_CREATED)
+        - limit: newest entries returned (default 500, max 5000)
+        """
+        booking = self.get_object()
+        try:
+            start, end = (
+                audit_archive.parse_moment(request.query_params.get(name), end=name == 'end')
+                for name in ('start', 'end')
+            )
+            limit = int(request.query_params.get('limit') or audit_archive.DEFAULT_TRAIL_LIMIT)
+            limit = max(1, min(limit, audit_archive.MAX_TRAIL_LIMIT))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Nothing is logged before the booking exists: skip the older archive files
+        created = audit_archive.booking_start(booking)
+        if start is None or start < created:
+            start = created
+
+        # One extra entry tells whether the trail was cut off
+        entries = audit_archive.audit_trail(
+            booking_id=booking.pk, start=start, end=end, action=request.query_params.get('action'),
+            limit=limit + 1,
+        )
+        return Response({
+            'booking': str(booking.pk),
+            'count': min(len(entries), limit),
+            'truncated': len(entries) > limit,
+            'results': entries[:limit],
+        })
+
     @action(detail=False, methods=['get'])
     def available_countries(self, request):
         """
@@ -802,6 +1494,386 @@ class ServiceFeeViewSet(viewsets.ReadOnlyModelViewSet):
         
         return ServiceFee.objects.none()
 
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        Service fee analytics with online adoption and fee per booking.
+
+        Query params (plus the usual fee filters):
+        - group_by: comma separated fee_type, booking_channel, month, traveller
+        - start_date / end_date: fee_date range (YYYY-MM-DD)
+
+        Returns:
+            {
+                "dimensions": ["fee_type"],
+                "totals": {"fees": 12, "amount": 420.0, "bookings": 10, "fee_per_booking": 42.0,
+                           "online_bookings": 8, "offline_bookings": 2, "online_adoption_rate": 80.0},
+                "rows": [{"fee_type": "BOOKING_ONLINE_DOM", ...}, ...]
+            }
+        """
+        params = request.query_params
+
+        def compute():
+            fees = self.filter_queryset(self.get_queryset())
+            if params.get('start_date'):
+                fees = fees.filter(fee_date__gte=params['start_date'])
+            if params.get('end_date'):
+                fees = fees.filter(fee_date__lte=params['end_date'])
+            dimensions = [v.strip() for v in params.get('group_by', '').split(',') if v.strip()]
+            return analytics.service_fee_summary(fees, dimensions)
+
+        try:
+            result = analytics.cached('service_fees', request.user.pk, params, compute)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(result)
+
+# ============================================================================
+# IMPORT BATCH VIEWSET
+# ============================================================================
+
+class ImportBatchViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint for import batches - read-only.
+    Only accessible by travel agents (and admins).
+    
+    Endpoints:
+    - GET /api/v1/import-batches/ - List batches with counters and error summary
+    - GET /api/v1/import-batches/{id}/errors/ - Paginated errors (?error_class=VALIDATION)
+    - GET /api/v1/import-batches/{id}/errors_export/ - All errors streamed as NDJSON
+    """
+    serializer_class = ImportBatchSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['organization', 'status', 'import_type', 'import_date']
+    ordering_fields = ['import_date', 'created_at', 'records_failed']
+    ordering = ['-import_date', '-created_at']
+    
+    def get_queryset(self):
+        user = self.request.user
+        
+        if user.user_type == 'ADMIN':
+            queryset = ImportBatch.objects.all()
+        elif user.user_type in ['AGENT_ADMIN', 'AGENT_USER']:
+            queryset = ImportBatch.objects.filter(
+                Q(organization=user.organization) |
+                Q(organization__travel_agent=user.organization)
+            )
+        else:
+            return ImportBatch.objects.none()
+        
+        return queryset.select_related('organization')
+    
+    def _batch_errors(self, request):
+        errors = self.get_object().errors.order_by('line', 'created_at')
+        error_class = request.query_params.get('error_class')
+        if error_class:
+            errors = errors.filter(error_class=error_class.upper())
+        return errors
+    
+    @action(detail=True, methods=['get'])
+    def errors(self, request, pk=None):
+        """
+        Errors for one batch, a page at a time.
+        
+        Query params:
+        - error_class: Only this class (see error_summary for the classes present)
+        - page: Page number
+        """
+        page = self.paginate_queryset(self._batch_errors(request))
+        serializer = ImportBatchErrorSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def errors_export(self, request, pk=None):
+        """
+        Every error for one batch as newline-delimited JSON, streamed so
+        large batches are never held in memory.
+        """
+        errors = self._batch_errors(request).values('line', 'reference', 'error_class', 'message')
+        
+        def lines():
+            for error in errors.iterator(chunk_size=2000):
+                yield json.dumps(error) + '\n'
+        
+        response = StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="import-{pk}-errors.ndjson"'
+        return response
+
+
+# ============================================================================
+# DUPLICATE BOOKING VIEWSET
+# ============================================================================
+
+class DuplicateBookingCandidateViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint for probable duplicate bookings found by duplicate detection.
+    
+    Endpoints:
+    - GET /api/v1/duplicate-bookings/ - List pairs (?status=OPEN, ?import_batch=..., ?min_confidence=0.9)
+    - POST /api/v1/duplicate-bookings/{id}/confirm/ - Mark as a confirmed duplicate
+    - POST /api/v1/duplicate-bookings/{id}/dismiss/ - Mark as not a duplicate
+    """
+    serializer_class = DuplicateBookingCandidateSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['organization', 'status', 'import_batch']
+    ordering_fields = ['confidence', 'detected_at']
+    ordering = ['-confidence', '-detected_at']
+    
+    def get_queryset(self):
+        user = self.request.user
+        
+        if user.user_type == 'ADMIN':
+            queryset = DuplicateBookingCandidate.objects.all()
+        elif user.user_type in ['AGENT_ADMIN', 'AGENT_USER']:
+            queryset = DuplicateBookingCandidate.objects.filter(
+                Q(organization=user.organization) |
+                Q(organization__travel_agent=user.organization)
+            )
+        else:
+            queryset = DuplicateBookingCandidate.objects.filter(organization=user.organization)
+        
+        min_confidence = self.request.query_params.get('min_confidence')
+        if min_confidence:
+            try:
+                queryset = queryset.filter(confidence__gte=float(min_confidence))
+            except ValueError:
+                pass
+        
+        return queryset.select_related('booking__traveller', 'duplicate_of')
+    
+    def _review(self, request, new_status):
+        if request.user.user_type not in ['ADMIN', 'AGENT_ADMIN', 'AGENT_USER', 'CUSTOMER_ADMIN']:
+            return Response(
+                {'error': 'You do not have permission to review duplicate bookings'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        candidate = self.get_object()
+        candidate.status = new_status
+        candidate.save(update_fields=['status', 'updated_at'])
+        return Response(self.get_serializer(candidate).data)
+    
+    @action(detail=True, methods=['post'])
+    def confirm(self, request, pk=None):
+        """Mark the pair as the same trip booked twice."""
+        return self._review(request, 'CONFIRMED')
+    
+    @action(detail=True, methods=['post'])
+    def dismiss(self, request, pk=None):
+        """Mark the pair as two genuine bookings."""
+        return self._review(request, 'DISMISSED')
+
+
+# ============================================================================
+# TRIP VIEWSET
+# ============================================================================
+
+class TripViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint for trips reconstructed from bookings - read-only.
+    
+    Endpoints:
+    - GET /api/v1/trips/ - List trips
+      (?traveller=..., ?destination_city=..., ?start_date__gte=2025-01-01,
+       ?ordering=-total_spend | -duration_days | -total_carbon_kg)
+    - GET /api/v1/trips/{id}/ - Get a specific trip
+    """
+    serializer_class = TripSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = {
+        'organization': ['exact'],
+        'traveller': ['exact'],
+        'destination_city': ['exact'],
+        'destination_country': ['exact'],
+        'start_date': ['gte', 'lte'],
+        'end_date': ['gte', 'lte'],
+        'total_spend': ['gte', 'lte'],
+        'duration_days': ['gte', 'lte'],
+    }
+    ordering_fields = ['start_date', 'total_spend', 'duration_days', 'total_carbon_kg']
+    ordering = ['-start_date']
+    
+    def get_queryset(self):
+        user = self.request.user
+        
+        if user.user_type == 'ADMIN':
+            queryset = Trip.objects.all()
+        elif user.user_type in ['AGENT_ADMIN', 'AGENT_USER']:
+            queryset = Trip.objects.filter(
+                Q(organization=user.organization) |
+                Q(organization__travel_agent=user.organization)
+            )
+        else:
+            queryset = Trip.objects.filter(organization=user.organization)
+        
+        return queryset.select_related('traveller').prefetch_related('bookings')
+
+
+# ============================================================================
+# BOOKING CONFLICT VIEWSET
+# ============================================================================
+
+class BookingConflictViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint for overlapping stays, rentals and flights found by conflict
+    detection.
+    
+    Endpoints:
+    - GET /api/v1/booking-conflicts/ - List conflicts
+      (?status=OPEN, ?conflict_type=OVERLAPPING_STAYS, ?traveller=...,
+       ?overlap_start_date__gte=2025-01-01, ?ordering=-wasted_amount)
+    - POST /api/v1/booking-conflicts/{id}/confirm/ - Mark as a real conflict
+    - POST /api/v1/booking-conflicts/{id}/dismiss/ - Mark as intended
+    """
+    serializer_class = BookingConflictSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = {
+        'organization': ['exact'],
+        'traveller': ['exact'],
+        'booking': ['exact'],
+        'conflict_type': ['exact'],
+        'status': ['exact'],
+        'import_batch': ['exact'],
+        'overlap_start_date': ['gte', 'lte'],
+    }
+    ordering_fields = ['overlap_start_date', 'wasted_amount', 'overlap_hours', 'detected_at']
+    ordering = ['-overlap_start_date']
+    
+    def get_queryset(self):
+        user = self.request.user
+        
+        if user.user_type == 'ADMIN':
+            queryset = BookingConflict.objects.all()
+        elif user.user_type in ['AGENT_ADMIN', 'AGENT_USER']:
+            queryset = BookingConflict.objects.filter(
+                Q(organization=user.organization) |
+                Q(organization__travel_agent=user.organization)
+            )
+        else:
+            queryset = BookingConflict.objects.filter(organization=user.organization)
+        
+        return queryset.select_related('traveller', 'booking', 'conflicting_booking')
+    
+    def _review(self, request, new_status):
+        if request.user.user_type not in ['ADMIN', 'AGENT_ADMIN', 'AGENT_USER', 'CUSTOMER_ADMIN']:
+            return Response(
+                {'error': 'You do not have permission to review booking conflicts'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        conflict = self.get_object()
+        conflict.status = new_status
+        conflict.save(update_fields=['status', 'updated_at'])
+        return Response(self.get_serializer(conflict).data)
+    
+    @action(detail=True, methods=['post'])
+    def confirm(self, request, pk=None):
+        """Mark the overlap as wasted spend to be followed up."""
+        return self._review(request, 'CONFIRMED')
+    
+    @action(detail=True, methods=['post'])
+    def dismiss(self, request, pk=None):
+        """Mark the overlap as intended (e.g. a deliberate backup booking)."""
+        return self._review(request, 'DISMISSED')
+
+
+# ============================================================================
+# BOOKING TRANSACTION VIEWSET
+# ============================================================================
+
+class BookingTransactionViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint for exchanges, refunds, voids and other transactions on
+    booking components.
+    
+    Endpoints:
+    - GET /api/v1/booking-transactions/ - List transactions
+      (?transaction_type=REFUND, ?status=CONFIRMED, ?object_id=<component id>,
+       ?transaction_date__gte=2025-01-01, ?ordering=-total_amount)
+    - POST /api/v1/booking-transactions/bulk/ - Ingest a list of transactions
+      and update their components' transaction totals
+    """
+    serializer_class = BookingTransactionSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = {
+        'transaction_type': ['exact'],
+        'status': ['exact'],
+        'currency': ['exact'],
+        'object_id': ['exact'],
+        'transaction_date': ['gte', 'lte'],
+    }
+    ordering_fields = ['transaction_date', 'total_amount', 'total_amount_base', 'created_at']
+    ordering = ['-transaction_date']
+    
+    # Users allowed to upload transactions
+    INGEST_USER_TYPES = ['ADMIN', 'AGENT_ADMIN', 'AGENT_USER']
+    
+    def _organizations(self):
+        """Organizations whose transactions the user can see, None for all."""
+        user = self.request.user
+        if user.user_type == 'ADMIN':
+            return None
+        if user.user_type in ['AGENT_ADMIN', 'AGENT_USER']:
+            return Organization.objects.filter(
+                Q(id=user.organization_id) | Q(travel_agent=user.organization_id)
+            )
+        return Organization.objects.filter(id=user.organization_id)
+    
+    def get_queryset(self):
+        queryset = BookingTransaction.objects.select_related('content_type')
+        organizations = self._organizations()
+        if organizations is None:
+            return queryset
+        return queryset.filter(
+            Q(air_booking__booking__organization__in=organizations) |
+            Q(accommodation_booking__booking__organization__in=organizations) |
+            Q(car_hire_booking__booking__organization__in=organizations) |
+            Q(service_fee__organization__in=organizations)
+        )
+    
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Ingest transactions in one request.
+        
+        Body: a list of rows, or {"transactions": [...]}, each row with
+        component_type (AIR, HOTEL, CAR, FEE), component_id,
+        transaction_type, transaction_date and amounts. Transactions are
+        inserted together and each affected component's totals are updated
+        with one statement.
+        
+        Returns:
+            {"created": 2500, "components": 830}
+        """
+        if request.user.user_type not in self.INGEST_USER_TYPES:
+            return Response(
+                {'error': 'You do not have permission to upload transactions'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        rows = request.data.get('transactions') if isinstance(request.data, dict) else request.data
+        serializer = BookingTransactionIngestSerializer(data=rows, many=True)
+        if not serializer.is_valid():
+            return Response({'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            created = transactions.ingest(
+                serializer.validated_data, user=request.user, organizations=self._organizations()
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        components = {(t.content_type_id, t.object_id) for t in created}
+        return Response(
+            {'created': len(created), 'components': len(components)},
+            status=status.HTTP_201_CREATED
+        )
+
+
 # ============================================================================
 # COUNTRY VIEWSET
 # ============================================================================
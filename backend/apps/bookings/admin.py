@@ -4,15 +4,19 @@
 from django.contrib import admin
 from django.contrib.contenttypes.admin import GenericTabularInline
 from django.utils.html import format_html
-from django.urls import reverse
+from django.urls import path, reverse
+from django.contrib import messages
 from django.utils.safestring import mark_safe
 import json
 from django.core.serializers.json import DjangoJSONEncoder
-from django.http import HttpResponse
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, StreamingHttpResponse
 from decimal import Decimal
+from . import audit_archive
 from .models import (
     Traveller, Booking, AirBooking, AirSegment, 
-    AccommodationBooking, CarHireBooking, Invoice, ServiceFee, BookingTransaction, BookingAuditLog
+    AccommodationBooking, CarHireBooking, Invoice, ServiceFee, BookingTransaction, BookingAuditLog,
+    DuplicateBookingCandidate, Trip, TravellerLocation, BookingConflict, TransactionBalance
 )
 
 
@@ -611,6 +615,70 @@ class BookingAuditLogAdmin(admin.ModelAdmin):
         # Only superusers can delete audit logs (for data cleanup)
         return request.user.is_superuser
     
+    # =============================================================================
+    # ARCHIVED MONTHS
+    # =============================================================================
+    
+    def get_urls(self):
+        return [
+            path(
+                'archive/',
+                self.admin_site.admin_view(self.archive_view),
+                name='bookings_bookingauditlog_archive',
+            ),
+        ] + super().get_urls()
+    
+    def changelist_view(self, request, extra_context=None):
+        """Point to the archive when older months have been moved out of the table"""
+        archives = audit_archive.load_index()['archives']
+        if archives:
+            messages.info(request, format_html(
+                'Entries from {} to {} are archived. '
+                '<a href="{}">Download archived entries</a> '
+                '(give ?booking= or ?start=; ?end= and ?action= filter further).',
+                archives[0]['month'],
+                archives[-1]['month'],
+                reverse('admin:bookings_bookingauditlog_archive'),
+            ))
+        return super().changelist_view(request, extra_context)
+    
+    def archive_view(self, request):
+        """
+        Audit entries from the database and the archive as streamed NDJSON,
+        newest first and at most audit_archive.MAX_TRAIL_LIMIT of them.
+        Needs ?booking= or ?start= so the whole archive is never read.
+        """
+        params = request.GET
+        try:
+            start, end = (
+                audit_archive.parse_moment(params.get(name), end=name == 'end')
+                for name in ('start', 'end')
+            )
+            booking = Booking.objects.filter(pk=params['booking']).first() if params.get('booking') else None
+        except (ValueError, ValidationError) as e:
+            return HttpResponse(str(e), status=400)
+        if params.get('booking') and booking is None:
+            return HttpResponse('Unknown booking', status=400)
+        if booking is not None:
+            created = audit_archive.booking_start(booking)
+            if start is None or start < created:
+                start = created
+        if start is None:
+            return HttpResponse('Give ?booking= or ?start= to bound the archive read', status=400)
+
+        entries = audit_archive.audit_trail(
+            booking_id=booking.pk if booking else None, start=start, end=end, action=params.get('action'),
+            limit=audit_archive.MAX_TRAIL_LIMIT,
+        )
+
+        def lines():
+            for entry in entries:
+                yield json.dumps(entry, cls=DjangoJSONEncoder) + '\n'
+
+        response = StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="booking_audit_logs_archive.ndjson"'
+        return response
+    
     # =============================================================================
     # CUSTOM DISPLAY METHODS
     # =============================================================================
@@ -1073,7 +1141,12 @@ class AirBookingAdmin(admin.ModelAdmin):
         ('Compliance', {
             'fields': ('lowest_fare_available', 'lowest_fare_currency', 'potential_savings')
         }),
+        ('Transactions', {
+            'fields': ('transaction_total', 'transaction_total_base')
+        }),
     )
+    # Maintained from the transactions below
+    readonly_fields = ['transaction_total', 'transaction_total_base']
 
 
 @admin.register(AirSegment)
@@ -1113,7 +1186,7 @@ class AirSegmentAdmin(admin.ModelAdmin):
 class AccommodationBookingAdmin(admin.ModelAdmin):
     list_display = ['booking', 'hotel_name', 'city', 'country', 
                     'check_in_date', 'number_of_nights', 'nightly_rate', 'currency']
-    list_filter = ['country', 'city', 'hotel_chain']
+    list_filter = ['country', 'city', 'hotel_chain_ref']
     search_fields = ['booking__agent_booking_reference', 'hotel_name', 'city']
     
     inlines = [BookingTransactionInline]
@@ -1123,7 +1196,7 @@ class AccommodationBookingAdmin(admin.ModelAdmin):
             'fields': ('booking',)
         }),
         ('Hotel', {
-            'fields': ('hotel_name', 'hotel_chain')
+            'fields': ('hotel_name', 'hotel_chain', 'hotel_chain_ref')
         }),
         ('Location', {
             'fields': ('city', 'country', 'address')
@@ -1134,14 +1207,19 @@ class AccommodationBookingAdmin(admin.ModelAdmin):
         ('Rate', {
             'fields': ('nightly_rate', 'currency', 'nightly_rate_base', 'total_amount_base')
         }),
+        ('Transactions', {
+            'fields': ('transaction_total', 'transaction_total_base')
+        }),
     )
+    # Maintained from the transactions below
+    readonly_fields = ['transaction_total', 'transaction_total_base']
 
 
 @admin.register(CarHireBooking)
 class CarHireBookingAdmin(admin.ModelAdmin):
     list_display = ['booking', 'rental_company', 'vehicle_type', 
                     'pickup_city', 'country', 'pickup_date', 'number_of_days', 'daily_rate']
-    list_filter = ['country', 'rental_company', 'vehicle_type']
+    list_filter = ['country', 'rental_company_ref', 'vehicle_type']
     search_fields = ['booking__agent_booking_reference', 'rental_company', 'pickup_city']
     
     inlines = [BookingTransactionInline]
@@ -1151,7 +1229,8 @@ class CarHireBookingAdmin(admin.ModelAdmin):
             'fields': ('booking',)
         }),
         ('Rental Company & Vehicle', {
-            'fields': ('rental_company', 'vehicle_type', 'vehicle_category', 'vehicle_make_model')
+            'fields': ('rental_company', 'rental_company_ref', 'vehicle_type', 'vehicle_category',
+                       'vehicle_make_model')
         }),
         ('Pickup', {
             'fields': ('pickup_location', 'pickup_city', 'pickup_date', 'pickup_time')
@@ -1165,7 +1244,12 @@ class CarHireBookingAdmin(admin.ModelAdmin):
         ('Rate', {
             'fields': ('number_of_days', 'daily_rate', 'currency', 'daily_rate_base', 'total_amount_base')
         }),
+        ('Transactions', {
+            'fields': ('transaction_total', 'transaction_total_base')
+        }),
     )
+    # Maintained from the transactions below
+    readonly_fields = ['transaction_total', 'transaction_total_base']
 
 
 @admin.register(Invoice)
@@ -1228,4 +1312,92 @@ class ServiceFeeAdmin(admin.ModelAdmin):
         form = super().get_form(request, obj, **kwargs)
         if 'import_batch' in form.base_fields:
             form.base_fields['import_batch'].required = False
-        return form
\ No newline at end of file
+        return form
+
+
+@admin.register(DuplicateBookingCandidate)
+class DuplicateBookingCandidateAdmin(admin.ModelAdmin):
+    list_display = ['booking', 'duplicate_of', 'organization', 'confidence', 'status', 'detected_at']
+    list_filter = ['status', 'organization']
+    list_editable = ['status']
+    search_fields = ['booking__agent_booking_reference', 'duplicate_of__agent_booking_reference']
+    list_select_related = ['booking__traveller', 'duplicate_of__traveller', 'organization']
+    raw_id_fields = ['booking', 'duplicate_of', 'import_batch']
+    readonly_fields = ['confidence', 'reasons', 'detected_at', 'updated_at']
+    actions = ['mark_confirmed', 'mark_dismissed']
+
+    @admin.action(description='Mark selected as confirmed duplicates')
+    def mark_confirmed(self, request, queryset):
+        queryset.update(status='CONFIRMED')
+
+    @admin.action(description='Mark selected as not duplicates')
+    def mark_dismissed(self, request, queryset):
+        queryset.update(status='DISMISSED')
+
+
+@admin.register(Trip)
+class TripAdmin(admin.ModelAdmin):
+    list_display = ['traveller', 'organization', 'origin_city', 'destination_city', 'start_date',
+                    'end_date', 'duration_days', 'total_spend', 'total_carbon_kg']
+    list_filter = ['organization', 'destination_country']
+    search_fields = ['traveller__first_name', 'traveller__last_name', 'destination_city']
+    date_hierarchy = 'start_date'
+    list_select_related = ['traveller', 'organization']
+    raw_id_fields = ['traveller', 'bookings']
+
+    # Trips are rebuilt from bookings (see apps.bookings.trips)
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TravellerLocation)
+class TravellerLocationAdmin(admin.ModelAdmin):
+    list_display = ['traveller', 'organization', 'date', 'city', 'country', 'first_seen', 'last_seen']
+    list_filter = ['organization', 'country']
+    search_fields = ['traveller__first_name', 'traveller__last_name', 'city']
+    date_hierarchy = 'date'
+    list_select_related = ['traveller', 'organization']
+    raw_id_fields = ['traveller', 'booking']
+
+    # Locations are rebuilt with trips (see apps.bookings.locations)
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TransactionBalance)
+class TransactionBalanceAdmin(admin.ModelAdmin):
+    list_display = ['product_type', 'object_id', 'booking', 'organization', 'balance_date', 'valid_until',
+                    'running_total', 'running_total_base', 'transaction_count']
+    list_filter = ['product_type', 'organization']
+    search_fields = ['booking__agent_booking_reference', 'object_id']
+    date_hierarchy = 'balance_date'
+    list_select_related = ['booking', 'organization']
+    raw_id_fields = ['booking']
+
+    # Balances are derived from the transactions (see apps.bookings.valuation)
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(BookingConflict)
+class BookingConflictAdmin(admin.ModelAdmin):
+    list_display = ['traveller', 'conflict_type', 'booking', 'conflicting_booking', 'overlap_start_date',
+                    'overlap_hours', 'wasted_amount', 'status']
+    list_filter = ['conflict_type', 'status', 'organization']
+    list_editable = ['status']
+    search_fields = ['traveller__first_name', 'traveller__last_name', 'booking__agent_booking_reference',
+                     'conflicting_booking__agent_booking_reference']
+    date_hierarchy = 'overlap_start_date'
+    list_select_related = ['traveller', 'booking', 'conflicting_booking']
+    raw_id_fields = ['traveller', 'booking', 'conflicting_booking', 'import_batch']
+    readonly_fields = ['conflict_type', 'component_id', 'conflicting_component_id', 'overlap_start_date',
+                       'overlap_hours', 'wasted_amount', 'description', 'detected_at', 'updated_at']
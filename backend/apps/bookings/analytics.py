@@ -0,0 +1,1321 @@
+# apps/bookings/analytics.py
+"""
+Server-side analytics over booking components.
+
+The API layer passes in an already tenant-scoped Booking queryset; everything
+here aggregates in the database so the frontend no longer has to download
+booking pages and sum them in the browser.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import (
+    Aggregate, Avg, Case, CharField, Count, DecimalField, DurationField, Exists,
+    ExpressionWrapper, F, FloatField, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+)
+from django.db.models.functions import Cast, Coalesce, Concat, Greatest, Least, NullIf, TruncMonth
+from decimal import Decimal
+from urllib.parse import urlencode
+from itertools import groupby
+import hashlib
+import logging
+import uuid
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from apps.budgets.models import FiscalYear
+from apps.reference_data.models import Airline, Airport, CarRentalCompany, CurrencyExchangeRate, HotelChain
+from .models import (
+    AirBooking, AirSegment, AccommodationBooking, BookingTransaction, CarHireBooking, ServiceFee, Traveller
+)
+from . import valuation
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# RESULT CACHING
+# =============================================================================
+
+CACHE_VERSION_KEY = 'analytics:version'
+
+
+def cached(name, scope, params, compute):
+    """
+    Return compute() cached per analytics name, user scope and filter set.
+
+    Cache keys embed a version number that invalidate_cache() bumps whenever
+    booking data changes, so results never outlive the data they describe.
+    The version lives in settings.CACHES, so with a shared backend a bump
+    from an import or management command reaches every web process.
+    """
+    version = cache.get_or_set(CACHE_VERSION_KEY, 1, None)
+    digest = hashlib.md5(
+        f"{scope}|{urlencode(sorted(params.items()))}".encode()
+    ).hexdigest()
+    key = f'analytics:{version}:{name}:{digest}'
+
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.set(key, result, settings.ANALYTICS_CACHE_TIMEOUT)
+    return result
+
+
+def invalidate_cache():
+    """Invalidate every cached analytics result."""
+    try:
+        cache.incr(CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(CACHE_VERSION_KEY, 1, None)
+
+
+def _union_sql(parts):
+    """Compile querysets into a single UNION ALL statement."""
+    combined = parts[0].union(*parts[1:], all=True) if len(parts) > 1 else parts[0]
+    return combined.query.sql_with_params()
+
+
+# =============================================================================
+# GROUP-BY (OLAP) ANALYTICS
+# =============================================================================
+
+MAX_DIMENSIONS = 3
+DEFAULT_ROW_LIMIT = 500
+MAX_ROW_LIMIT = 5000
+
+PRODUCT_MODELS = {
+    'AIR': AirBooking,
+    'HOTEL': AccommodationBooking,
+    'CAR': CarHireBooking,
+    'FEE': ServiceFee,
+}
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _fiscal_period():
+    return Subquery(
+        FiscalYear.objects.filter(
+            organization_id=OuterRef('booking__organization_id'),
+            start_date__lte=OuterRef('booking__travel_date'),
+            end_date__gte=OuterRef('booking__travel_date'),
+        ).values('year_label')[:1],
+        output_field=CharField()
+    )
+
+
+def _airport_city(field):
+    return Subquery(
+        Airport.objects.filter(iata_code=OuterRef(field)).values('city')[:1],
+        output_field=CharField()
+    )
+
+
+def _segment_emissions():
+    return Subquery(
+        AirSegment.objects.filter(air_booking=OuterRef('pk'))
+        .order_by()
+        .values('air_booking')
+        .annotate(total=Sum('carbon_emissions_kg'))
+        .values('total'),
+        output_field=MONEY
+    )
+
+
+# Dimension name -> {product: expression factory}. A product that has no
+# expression for a requested dimension is left out of the result.
+DIMENSIONS = {
+    'product': {
+        product: (lambda product=product: Value(product, output_field=CharField()))
+        for product in PRODUCT_MODELS
+    },
+    'organization': {
+        product: (lambda: F('booking__organization__code')) for product in PRODUCT_MODELS
+    },
+    'cost_center': {
+        product: (lambda: F('booking__traveller__cost_center')) for product in PRODUCT_MODELS
+    },
+    'traveller': {
+        product: (lambda: F('booking__traveller_id')) for product in PRODUCT_MODELS
+    },
+    'month': {
+        product: (lambda: TruncMonth('booking__travel_date')) for product in PRODUCT_MODELS
+    },
+    'fiscal_period': {
+        product: _fiscal_period for product in PRODUCT_MODELS
+    },
+    'airline': {
+        'AIR': lambda: F('primary_airline_iata_code'),
+    },
+    'route': {
+        'AIR': lambda: Concat(
+            'origin_airport_iata_code', Value('-'), 'destination_airport_iata_code',
+            output_field=CharField()
+        ),
+    },
+    'travel_class': {
+        'AIR': lambda: F('travel_class'),
+    },
+    'hotel_chain': {
+        'HOTEL': lambda: Coalesce(F('hotel_chain_ref__name'), F('hotel_chain')),
+    },
+    'city': {
+        'AIR': lambda: _airport_city('destination_airport_iata_code'),
+        'HOTEL': lambda: F('city'),
+        'CAR': lambda: F('pickup_city'),
+    },
+}
+
+ZERO_MONEY = lambda: Value(Decimal('0.00'), output_field=MONEY)  # noqa: E731
+ZERO_INT = lambda: Value(0, output_field=IntegerField())  # noqa: E731
+
+# Measure name -> {product: expression factory}. Every product contributes
+# to every measure (zero where it does not apply) so the union lines up.
+MEASURES = {
+    'spend': {
+        'AIR': lambda: Coalesce('total_fare', ZERO_MONEY(), output_field=MONEY),
+        'HOTEL': lambda: Coalesce('total_amount_base', ZERO_MONEY(), output_field=MONEY),
+        'CAR': lambda: Coalesce('total_amount_base', ZERO_MONEY(), output_field=MONEY),
+        'FEE': lambda: Coalesce('fee_amount', ZERO_MONEY(), output_field=MONEY),
+    },
+    'count': {
+        product: (lambda: Value(1, output_field=IntegerField())) for product in PRODUCT_MODELS
+    },
+    'nights': {
+        'AIR': ZERO_INT,
+        'HOTEL': lambda: Coalesce('number_of_nights', ZERO_INT(), output_field=IntegerField()),
+        'CAR': ZERO_INT,
+        'FEE': ZERO_INT,
+    },
+    'days': {
+        'AIR': ZERO_INT,
+        'HOTEL': ZERO_INT,
+        'CAR': lambda: Coalesce('number_of_days', ZERO_INT(), output_field=IntegerField()),
+        'FEE': ZERO_INT,
+    },
+    'emissions': {
+        'AIR': lambda: Coalesce(_segment_emissions(), ZERO_MONEY(), output_field=MONEY),
+        'HOTEL': ZERO_MONEY,
+        'CAR': ZERO_MONEY,
+        'FEE': ZERO_MONEY,
+    },
+    'savings': {
+        'AIR': lambda: Coalesce('potential_savings', ZERO_MONEY(), output_field=MONEY),
+        'HOTEL': ZERO_MONEY,
+        'CAR': ZERO_MONEY,
+        'FEE': ZERO_MONEY,
+    },
+}
+
+
+# Date a component's recorded amount applies from, for as-of valuation
+RECORDED_ON = {
+    'AIR': 'booking__booking_date',
+    'HOTEL': 'booking__booking_date',
+    'CAR': 'booking__booking_date',
+    'FEE': 'fee_date',
+}
+
+
+def _spend_as_of(product, as_of):
+    """A component's spend as it stood on a date (see valuation.py)."""
+    return valuation.value_as_of(
+        PRODUCT_MODELS[product], as_of, MEASURES['spend'][product](), RECORDED_ON[product]
+    )
+
+
+def spend_as_of(bookings, as_of):
+    """Total spend of the bookings' components as it stood on a date."""
+    booking_ids = bookings.order_by().values('pk')
+    total = Decimal('0.00')
+    for product, model in PRODUCT_MODELS.items():
+        total += model.objects.filter(booking__in=booking_ids).aggregate(
+            total=Sum(_spend_as_of(product, as_of))
+        )['total'] or Decimal('0.00')
+    return total
+
+
+def _to_number(value):
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return value
+    return float(value)
+
+
+def _rounded(value, places=2):
+    return round(float(value), places) if value is not None else None
+
+
+def _to_label(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()[:10]
+    return value
+
+
+def group_by(bookings, dimensions, measures, products=None, rollup=False,
+             limit=DEFAULT_ROW_LIMIT, as_of=None):
+    """
+    Aggregate booking components by the requested dimensions.
+
+    Args:
+        bookings: Tenant-scoped Booking queryset (already filtered)
+        dimensions: List of DIMENSIONS keys (max MAX_DIMENSIONS)
+        measures: List of MEASURES keys
+        products: Optional subset of PRODUCT_MODELS keys
+        rollup: Add subtotal/grand total rows (PostgreSQL GROUP BY ROLLUP)
+        limit: Maximum number of rows returned (capped at MAX_ROW_LIMIT)
+        as_of: Optional date to value spend at, from the transaction ledger
+
+    Returns:
+        dict with rows, totals, truncated and rollup flags
+
+    Raises:
+        ValueError: Unknown or incompatible dimension/measure
+    """
+    dimensions = list(dict.fromkeys(dimensions))
+    measures = list(dict.fromkeys(measures)) or ['spend', 'count']
+
+    if not dimensions:
+        raise ValueError('At least one dimension is required')
+    if len(dimensions) > MAX_DIMENSIONS:
+        raise ValueError(f'At most {MAX_DIMENSIONS} dimensions can be combined')
+    unknown = [d for d in dimensions if d not in DIMENSIONS]
+    unknown += [m for m in measures if m not in MEASURES]
+    if unknown:
+        raise ValueError(f"Unknown dimension or measure: {', '.join(unknown)}")
+
+    products = [p for p in (products or PRODUCT_MODELS) if p in PRODUCT_MODELS]
+    # Only products that can express every requested dimension take part
+    products = [p for p in products if all(p in DIMENSIONS[d] for d in dimensions)]
+    if not products:
+        raise ValueError('No booking product supports that combination of dimensions')
+
+    limit = max(1, min(int(limit or DEFAULT_ROW_LIMIT), MAX_ROW_LIMIT))
+    rollup = bool(rollup) and connection.vendor == 'postgresql'
+
+    dim_aliases = [f'd_{i}' for i in range(len(dimensions))]
+    measure_aliases = [f'm_{name}' for name in measures]
+    booking_ids = bookings.order_by().values('pk')
+
+    # One component-level SELECT per product, UNION ALL'd together
+    parts = []
+    for product in products:
+        annotations = {}
+        for alias, dimension in zip(dim_aliases, dimensions):
+            annotations[alias] = DIMENSIONS[dimension][product]()
+        for alias, measure in zip(measure_aliases, measures):
+            if measure == 'spend' and as_of is not None:
+                annotations[alias] = _spend_as_of(product, as_of)
+            else:
+                annotations[alias] = MEASURES[measure][product]()
+
+        parts.append(
+            PRODUCT_MODELS[product].objects
+            .filter(booking__in=booking_ids)
+            .annotate(**annotations)
+            .values(*dim_aliases, *measure_aliases)
+            .order_by()
+        )
+
+    inner_sql, params = _union_sql(parts)
+
+    qn = connection.ops.quote_name
+    dim_cols = ', '.join(qn(a) for a in dim_aliases)
+    select = [qn(a) for a in dim_aliases]
+    select += [f'SUM({qn(a)}) AS {qn(a)}' for a in measure_aliases]
+
+    if rollup:
+        select.append(f'GROUPING({dim_cols}) AS grouping_level')
+        group_clause = f'GROUP BY ROLLUP ({dim_cols})'
+        order_clause = f'ORDER BY grouping_level DESC, {qn(measure_aliases[0])} DESC'
+    else:
+        group_clause = f'GROUP BY {dim_cols}'
+        order_clause = f'ORDER BY {qn(measure_aliases[0])} DESC'
+
+    sql = (
+        f"SELECT {', '.join(select)} FROM ({inner_sql}) AS components "
+        f"{group_clause} {order_clause} LIMIT %s"
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (*params, limit + 1))
+        fetched = cursor.fetchall()
+
+    truncated = len(fetched) > limit
+    fetched = fetched[:limit]
+
+    rows = []
+    totals = None
+    all_dims_mask = (1 << len(dimensions)) - 1
+    for record in fetched:
+        row = {name: _to_label(record[i]) for i, name in enumerate(dimensions)}
+        offset = len(dimensions)
+        for i, name in enumerate(measures):
+            row[name] = _to_number(record[offset + i])
+
+        if rollup:
+            level = record[-1]
+            if level == all_dims_mask:
+                totals = {name: row[name] for name in measures}
+                continue
+            row['subtotal'] = level != 0
+        rows.append(row)
+
+    if totals is None and not truncated:
+        totals = {name: sum(row[name] for row in rows if not row.get('subtotal')) for name in measures}
+
+    # Traveller dimension is grouped on the id; resolve display names in one query
+    if 'traveller' in dimensions:
+        for row in rows:
+            if row['traveller']:
+                row['traveller'] = str(uuid.UUID(str(row['traveller'])))
+        names = {
+            str(t['id']): f"{t['first_name']} {t['last_name']}"
+            for t in Traveller.objects.filter(
+                id__in={row['traveller'] for row in rows if row['traveller']}
+            ).values('id', 'first_name', 'last_name')
+        }
+        for row in rows:
+            row['traveller_name'] = names.get(row['traveller'])
+
+    return {
+        'dimensions': dimensions,
+        'measures': measures,
+        'products': products,
+        'rows': rows,
+        'totals': totals,
+        'truncated': truncated,
+        'rollup': rollup,
+        'as_of': as_of,
+    }
+
+
+# =============================================================================
+# AIRLINE ANALYTICS
+# =============================================================================
+
+def airline_summary(bookings):
+    """
+    Spend, segments, distance and emissions per airline.
+
+    Spend and fares are attributed to the ticketing (primary) airline of each
+    AirBooking; segments, distance and emissions to the operating airline of
+    each AirSegment. Both sides are unioned and grouped in one statement and
+    joined to the airline reference table for name and alliance.
+
+    Args:
+        bookings: Tenant-scoped Booking queryset (already filtered)
+
+    Returns:
+        List of dicts ordered by spend descending
+    """
+    booking_ids = bookings.order_by().values('pk')
+
+    tickets = (
+        AirBooking.objects
+        .filter(booking__in=booking_ids)
+        .annotate(
+            airline=F('primary_airline_iata_code'),
+            m_spend=Coalesce('total_fare', ZERO_MONEY(), output_field=MONEY),
+            m_tickets=Value(1, output_field=IntegerField()),
+            m_segments=ZERO_INT(),
+            m_distance=ZERO_INT(),
+            m_emissions=ZERO_MONEY(),
+        )
+    )
+    segments = (
+        AirSegment.objects
+        .filter(air_booking__booking__in=booking_ids)
+        .annotate(
+            airline=F('airline_iata_code'),
+            m_spend=ZERO_MONEY(),
+            m_tickets=ZERO_INT(),
+            m_segments=Value(1, output_field=IntegerField()),
+            m_distance=Coalesce('distance_km', ZERO_INT(), output_field=IntegerField()),
+            m_emissions=Coalesce('carbon_emissions_kg', ZERO_MONEY(), output_field=MONEY),
+        )
+    )
+    columns = ('airline', 'm_spend', 'm_tickets', 'm_segments', 'm_distance', 'm_emissions')
+    inner_sql, params = _union_sql([
+        qs.values(*columns).order_by() for qs in (tickets, segments)
+    ])
+
+    qn = connection.ops.quote_name
+    airlines = qn(Airline._meta.db_table)
+    sql = (
+        f"SELECT c.airline, a.{qn('name')}, a.{qn('alliance')}, "
+        f"SUM(c.m_spend), SUM(c.m_tickets), SUM(c.m_segments), "
+        f"SUM(c.m_distance), SUM(c.m_emissions) "
+        f"FROM ({inner_sql}) AS c "
+        f"LEFT JOIN {airlines} a ON a.{qn('iata_code')} = c.airline "
+        f"GROUP BY c.airline, a.{qn('name')}, a.{qn('alliance')} "
+        f"ORDER BY 4 DESC"
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        fetched = cursor.fetchall()
+
+    results = []
+    for code, name, alliance, spend, tickets, segment_count, distance, emissions in fetched:
+        spend = _to_number(spend)
+        tickets = _to_number(tickets)
+        results.append({
+            'airline_code': code,
+            'airline_name': name or code,
+            'alliance': alliance or None,
+            'spend': spend,
+            'tickets': tickets,
+            'segments': _to_number(segment_count),
+            'distance_km': _to_number(distance),
+            'emissions': round(_to_number(emissions)),
+            'average_fare': round(spend / tickets, 2) if tickets else 0,
+        })
+    return results
+
+
+# =============================================================================
+# ACCOMMODATION ANALYTICS
+# =============================================================================
+
+RATE_PERCENTILES = {'median': 0.5, 'p90': 0.9, 'p95': 0.95}
+
+
+class PercentileCont(Aggregate):
+    """PostgreSQL percentile_cont ordered-set aggregate."""
+    function = 'PERCENTILE_CONT'
+    template = '%(function)s(%(percentile)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+
+    def __init__(self, expression, percentile, **extra):
+        super().__init__(
+            expression, percentile=float(percentile), output_field=FloatField(), **extra
+        )
+
+
+def percentile(values, fraction):
+    """
+    Linear-interpolated percentile of a sorted sequence.
+
+    Matches PostgreSQL percentile_cont (and NumPy's default method) so both
+    code paths report the same figures.
+    """
+    if not values:
+        return None
+    if np is not None:
+        return float(np.percentile(np.asarray(values, dtype=float), fraction * 100))
+
+    position = fraction * (len(values) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    weight = position - lower
+    return float(values[lower]) * (1 - weight) + float(values[upper]) * weight
+
+
+def accommodation_summary(bookings):
+    """
+    Nights, spend and nightly rate distribution per city and hotel chain.
+
+    Chains are the canonical HotelChain a stay was matched to (see
+    reference_data.suppliers), so "Hilton Garden Inn" and "HILTON HOTELS"
+    roll up together; unmatched stays keep their free-text chain name.
+    Rates are nightly_rate_base (organization base currency); stays without
+    a converted rate are left out of the rate statistics but still count
+    towards nights and spend. On PostgreSQL the percentiles are computed in
+    the grouped query; other backends stream the rate column ordered by
+    group and compute them in Python.
+
+    Args:
+        bookings: Tenant-scoped Booking queryset (already filtered)
+
+    Returns:
+        List of dicts ordered by spend descending
+    """
+    stays = AccommodationBooking.objects.filter(
+        booking__in=bookings.order_by().values('pk')
+    ).order_by()
+    has_rate = Q(nightly_rate_base__gt=0)
+
+    aggregates = {
+        'nights': Sum('number_of_nights'),
+        'spend': Sum('total_amount_base'),
+        'average_rate': Avg('nightly_rate_base', filter=has_rate),
+    }
+    use_database_percentiles = connection.vendor == 'postgresql'
+    if use_database_percentiles:
+        for name, fraction in RATE_PERCENTILES.items():
+            aggregates[name] = PercentileCont('nightly_rate_base', fraction, filter=has_rate)
+
+    # Matched stays group on the indexed chain key; the free text only
+    # separates stays no HotelChain matched
+    unmatched_chain = Case(
+        When(hotel_chain_ref__isnull=True, then=F('hotel_chain')),
+        default=Value(''), output_field=CharField()
+    )
+    stays = stays.annotate(unmatched_chain=unmatched_chain)
+    groups = (
+        stays.values('city', 'hotel_chain_ref', 'unmatched_chain')
+        .annotate(**aggregates)
+        .order_by('-spend')
+    )
+    chain_names = dict(
+        HotelChain.objects.filter(
+            pk__in={row['hotel_chain_ref'] for row in groups if row['hotel_chain_ref']}
+        ).values_list('pk', 'name')
+    )
+
+    results = []
+    by_group = {}
+    for row in groups:
+        chain = chain_names.get(row['hotel_chain_ref']) or row['unmatched_chain']
+        result = {
+            'city': row['city'],
+            'hotel_chain': chain or None,
+            'hotel_chain_id': str(row['hotel_chain_ref']) if row['hotel_chain_ref'] else None,
+            'nights': row['nights'] or 0,
+            'spend': _to_number(row['spend']),
+            'average_rate': _rounded(row['average_rate']),
+        }
+        for name in RATE_PERCENTILES:
+            result[name] = _rounded(row.get(name))
+        results.append(result)
+        by_group[(row['city'], row['hotel_chain_ref'], row['unmatched_chain'])] = result
+
+    if not use_database_percentiles and results:
+        rates = (
+            stays.filter(has_rate)
+            .values_list('city', 'hotel_chain_ref', 'unmatched_chain', 'nightly_rate_base')
+            .order_by('city', 'hotel_chain_ref', 'unmatched_chain', 'nightly_rate_base')
+            .iterator(chunk_size=2000)
+        )
+        for key, group in groupby(rates, key=lambda r: r[:3]):
+            values = [row[3] for row in group]
+            target = by_group.get(key)
+            if target is None:
+                continue
+            for name, fraction in RATE_PERCENTILES.items():
+                target[name] = _rounded(percentile(values, fraction))
+
+    return results
+
+
+# =============================================================================
+# CAR HIRE ANALYTICS
+# =============================================================================
+
+def car_hire_summary(bookings):
+    """
+    Rental days, spend, average daily rate and one-way share per rental
+    company, vehicle category and pickup city.
+
+    Rentals are grouped on the canonical CarRentalCompany they were matched
+    to (see reference_data.suppliers), which also supplies the
+    preferred-supplier status and tier; unmatched rentals keep their
+    free-text company name and are never preferred.
+
+    Args:
+        bookings: Tenant-scoped Booking queryset (already filtered)
+
+    Returns:
+        List of dicts ordered by spend descending
+    """
+    groups = (
+        CarHireBooking.objects
+        .filter(booking__in=bookings.order_by().values('pk'))
+        .annotate(
+            unmatched_company=Case(
+                When(rental_company_ref__isnull=True, then=F('rental_company')),
+                default=Value(''), output_field=CharField()
+            ),
+        )
+        .values(
+            'rental_company_ref', 'unmatched_company', 'vehicle_category', 'pickup_city',
+            # Functionally dependent on rental_company_ref, so they don't split groups
+            'rental_company_ref__name', 'rental_company_ref__is_preferred',
+            'rental_company_ref__tier', 'rental_company_ref__is_active',
+        )
+        .annotate(
+            rentals=Count('id'),
+            days=Sum('number_of_days'),
+            spend=Sum('total_amount_base'),
+            average_daily_rate=Avg('daily_rate_base', filter=Q(daily_rate_base__gt=0)),
+            one_way=Count('id', filter=~Q(dropoff_city=F('pickup_city'))),
+        )
+        .order_by('-spend')
+    )
+
+    return [
+        {
+            'rental_company': row['rental_company_ref__name'] or row['unmatched_company'],
+            'rental_company_id': str(row['rental_company_ref']) if row['rental_company_ref'] else None,
+            'vehicle_category': row['vehicle_category'] or None,
+            'pickup_city': row['pickup_city'],
+            'is_preferred': bool(row['rental_company_ref__is_active'] and row['rental_company_ref__is_preferred']),
+            'tier': row['rental_company_ref__tier'] if row['rental_company_ref__is_active'] else None,
+            'rentals': row['rentals'],
+            'days': row['days'] or 0,
+            'spend': _to_number(row['spend']),
+            'average_daily_rate': _rounded(row['average_daily_rate']),
+            'one_way_rentals': row['one_way'],
+            'one_way_share': round(row['one_way'] / row['rentals'], 4) if row['rentals'] else 0,
+        }
+        for row in groups
+    ]
+
+
+# =============================================================================
+# SERVICE FEE ANALYTICS
+# =============================================================================
+
+FEE_DIMENSIONS = {
+    'fee_type': F('fee_type'),
+    'booking_channel': F('booking_channel'),
+    'month': TruncMonth('fee_date'),
+    'traveller': Coalesce('traveller_id', 'booking__traveller_id'),
+}
+
+
+def _fee_measures(row):
+    online, offline = row['online'], row['offline']
+    bookings = row['bookings']
+    amount = _to_number(row['amount'])
+    return {
+        'fees': row['fees'],
+        'amount': amount,
+        'bookings': bookings,
+        'fee_per_booking': round(amount / bookings, 2) if bookings else None,
+        'online_bookings': online,
+        'offline_bookings': offline,
+        'online_adoption_rate': round(online * 100 / (online + offline), 2) if online + offline else None,
+    }
+
+
+def service_fee_summary(fees, dimensions):
+    """
+    Fee totals, fee per booking and online adoption by the requested
+    dimensions (fee_type, booking_channel, month, traveller).
+
+    Online adoption is online booking fees as a share of all online and
+    offline booking fees (ServiceFee.ONLINE_FEE_TYPES/OFFLINE_FEE_TYPES).
+
+    Args:
+        fees: Tenant-scoped ServiceFee queryset (already filtered)
+        dimensions: List of FEE_DIMENSIONS keys (may be empty)
+
+    Returns:
+        dict with totals and grouped rows
+
+    Raises:
+        ValueError: Unknown dimension
+    """
+    dimensions = list(dict.fromkeys(dimensions))
+    unknown = [d for d in dimensions if d not in FEE_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown dimension: {', '.join(unknown)}")
+
+    measures = {
+        'fees': Count('id'),
+        'amount': Sum('fee_amount'),
+        'bookings': Count('booking', distinct=True),
+        'online': Count('id', filter=Q(fee_type__in=ServiceFee.ONLINE_FEE_TYPES)),
+        'offline': Count('id', filter=Q(fee_type__in=ServiceFee.OFFLINE_FEE_TYPES)),
+    }
+    fees = fees.order_by()
+    totals = _fee_measures(fees.aggregate(**measures))
+
+    rows = []
+    if dimensions:
+        aliases = {f'g_{name}': FEE_DIMENSIONS[name] for name in dimensions}
+        groups = (
+            fees.annotate(**aliases)
+            .values(*aliases)
+            .annotate(**measures)
+            .order_by('-amount')
+        )
+        for group in groups:
+            row = {name: _to_label(group[f'g_{name}']) for name in dimensions}
+            if 'traveller' in row and row['traveller']:
+                row['traveller'] = str(row['traveller'])
+            row.update(_fee_measures(group))
+            rows.append(row)
+
+    return {'dimensions': dimensions, 'totals': totals, 'rows': rows}
+
+
+# =============================================================================
+# ROUTE ANALYTICS
+# =============================================================================
+
+DEFAULT_ROUTE_LIMIT = 20
+MAX_ROUTE_LIMIT = 100
+
+
+def _allocated_segment_spend():
+    """
+    Share of the ticket's total_fare carried by a segment: by distance where
+    the ticket has distances, otherwise split evenly across its segments.
+    """
+    siblings = AirSegment.objects.filter(air_booking=OuterRef('air_booking')).order_by().values('air_booking')
+    ticket_distance = Subquery(
+        siblings.annotate(total=Sum('distance_km')).values('total'), output_field=IntegerField()
+    )
+    ticket_segments = Subquery(
+        siblings.annotate(total=Count('id')).values('total'), output_field=IntegerField()
+    )
+    fare = Coalesce('air_booking__total_fare', ZERO_MONEY(), output_field=MONEY)
+
+    return Case(
+        When(
+            Q(distance_km__gt=0) & Q(_ticket_distance__gt=0),
+            then=ExpressionWrapper(fare * F('distance_km') / F('_ticket_distance'), output_field=MONEY),
+        ),
+        default=ExpressionWrapper(fare / ticket_segments, output_field=MONEY),
+        output_field=MONEY,
+    ), ticket_distance
+
+
+def route_summary(bookings, limit=DEFAULT_ROUTE_LIMIT):
+    """
+    Top city pairs by segment count, directional and non-directional.
+
+    Segments are grouped on the (origin, destination) airport codes so the
+    air_segments route index does the work; the non-directional view folds
+    each pair with LEAST/GREATEST. The database sorts and cuts each list to
+    the top N, and airline shares are then fetched for those routes only.
+
+    Args:
+        bookings: Tenant-scoped Booking queryset (already filtered)
+        limit: Number of routes per list (capped at MAX_ROUTE_LIMIT)
+
+    Returns:
+        dict with "directional" and "non_directional" route lists
+    """
+    limit = max(1, min(limit or DEFAULT_ROUTE_LIMIT, MAX_ROUTE_LIMIT))
+    spend, ticket_distance = _allocated_segment_spend()
+
+    segments = (
+        AirSegment.objects
+        .filter(air_booking__booking__in=bookings.order_by().values('pk'))
+        .annotate(_ticket_distance=ticket_distance)
+        .annotate(
+            allocated_spend=spend,
+            lead_time=ExpressionWrapper(
+                F('departure_date') - F('air_booking__booking__booking_date'),
+                output_field=DurationField()
+            ),
+        )
+        .order_by()
+    )
+    measures = {
+        'segment_count': Count('id'),
+        'spend': Sum('allocated_spend'),
+        'emissions': Sum('carbon_emissions_kg'),
+        'advance_days': Avg('lead_time'),
+    }
+
+    layouts = {
+        'directional': segments.annotate(
+            route_from=F('origin_airport_iata_code'),
+            route_to=F('destination_airport_iata_code'),
+        ),
+        'non_directional': segments.annotate(
+            route_from=Least('origin_airport_iata_code', 'destination_airport_iata_code'),
+            route_to=Greatest('origin_airport_iata_code', 'destination_airport_iata_code'),
+        ),
+    }
+
+    results = {}
+    codes = set()
+    for name, routed in layouts.items():
+        top = list(
+            routed.values('route_from', 'route_to')
+            .annotate(**measures)
+            .order_by('-segment_count', '-spend')[:limit]
+        )
+        shares = {}
+        if top:
+            pairs = Q()
+            for row in top:
+                pairs |= Q(route_from=row['route_from'], route_to=row['route_to'])
+            for row in (
+                routed.filter(pairs)
+                .values('route_from', 'route_to', 'airline_iata_code')
+                .annotate(segment_count=Count('id'))
+            ):
+                shares.setdefault((row['route_from'], row['route_to']), {})[
+                    row['airline_iata_code']
+                ] = row['segment_count']
+
+        results[name] = []
+        for row in top:
+            key = (row['route_from'], row['route_to'])
+            codes.update(key)
+            advance = row['advance_days']
+            results[name].append({
+                'origin': row['route_from'],
+                'destination': row['route_to'],
+                'segments': row['segment_count'],
+                'spend': round(_to_number(row['spend']), 2),
+                'emissions': round(_to_number(row['emissions'])),
+                'average_advance_days': round(advance.total_seconds() / 86400, 1) if advance is not None else None,
+                'airline_share': {
+                    airline: round(count / row['segment_count'], 4)
+                    for airline, count in sorted(shares.get(key, {}).items(), key=lambda i: -i[1])
+                },
+            })
+
+    cities = dict(Airport.objects.filter(iata_code__in=codes).values_list('iata_code', 'city'))
+    for routes in results.values():
+        for route in routes:
+            route['origin_city'] = cities.get(route['origin'])
+            route['destination_city'] = cities.get(route['destination'])
+
+    return results
+
+
+# =============================================================================
+# LOST SAVINGS ANALYTICS
+# =============================================================================
+
+LOST_SAVINGS_DIMENSIONS = {
+    'traveller': ['booking__traveller_id'],
+    'cost_center': ['booking__traveller__cost_center'],
+    'consultant': ['booking__travel_consultant_id', 'booking__travel_consultant_text'],
+    'route': ['origin_airport_iata_code', 'destination_airport_iata_code'],
+}
+DEFAULT_LOST_SAVINGS_LIMIT = 50
+MAX_LOST_SAVINGS_LIMIT = 500
+
+
+def _savings_measures(row):
+    fare = _to_number(row['fare'])
+    savings = _to_number(row['savings'])
+    return {
+        'tickets': row['tickets'],
+        'tickets_with_savings': row['missed'],
+        'total_fare': fare,
+        'potential_savings': savings,
+        'savings_rate': round(savings * 100 / fare, 2) if fare else None,
+    }
+
+
+def lost_savings_summary(bookings, dimension, limit=DEFAULT_LOST_SAVINGS_LIMIT):
+    """
+    AirBooking.potential_savings (fare paid above the lowest fare available)
+    grouped by traveller, cost centre, consultant or route.
+
+    Args:
+        bookings: Tenant-scoped Booking queryset (already filtered)
+        dimension: One of LOST_SAVINGS_DIMENSIONS
+        limit: Maximum groups returned, largest savings first
+
+    Returns:
+        dict with totals and grouped rows
+
+    Raises:
+        ValueError: Unknown dimension
+    """
+    if dimension not in LOST_SAVINGS_DIMENSIONS:
+        raise ValueError(
+            f"group_by must be one of: {', '.join(LOST_SAVINGS_DIMENSIONS)}"
+        )
+    limit = max(1, min(int(limit or DEFAULT_LOST_SAVINGS_LIMIT), MAX_LOST_SAVINGS_LIMIT))
+    fields = LOST_SAVINGS_DIMENSIONS[dimension]
+
+    tickets = AirBooking.objects.filter(booking__in=bookings.order_by().values('pk')).order_by()
+    measures = {
+        'tickets': Count('id'),
+        'missed': Count('id', filter=Q(potential_savings__gt=0)),
+        'fare': Sum('total_fare'),
+        'savings': Sum('potential_savings'),
+    }
+    totals = _savings_measures(tickets.aggregate(**measures))
+    groups = list(
+        tickets.values(*fields).annotate(**measures).order_by('-savings')[:limit + 1]
+    )
+    truncated = len(groups) > limit
+    groups = groups[:limit]
+
+    labels = {}
+    if dimension == 'traveller':
+        labels = {
+            t['id']: f"{t['first_name']} {t['last_name']}"
+            for t in Traveller.objects.filter(
+                id__in=[g['booking__traveller_id'] for g in groups]
+            ).values('id', 'first_name', 'last_name')
+        }
+    elif dimension == 'consultant':
+        from apps.users.models import User
+        labels = {
+            u.pk: u.get_full_name() or u.username
+            for u in User.objects.filter(
+                pk__in=[g['booking__travel_consultant_id'] for g in groups if g['booking__travel_consultant_id']]
+            )
+        }
+
+    rows = []
+    for group in groups:
+        if dimension == 'traveller':
+            key = group['booking__traveller_id']
+            row = {'traveller': str(key), 'traveller_name': labels.get(key)}
+        elif dimension == 'cost_center':
+            row = {'cost_center': group['booking__traveller__cost_center'] or None}
+        elif dimension == 'consultant':
+            key = group['booking__travel_consultant_id']
+            row = {
+                'consultant': key,
+                'consultant_name': labels.get(key) or group['booking__travel_consultant_text'] or None,
+            }
+        else:
+            row = {
+                'origin': group['origin_airport_iata_code'],
+                'destination': group['destination_airport_iata_code'],
+            }
+        row.update(_savings_measures(group))
+        rows.append(row)
+
+    return {'group_by': dimension, 'totals': totals, 'rows': rows, 'truncated': truncated}
+
+
+# =============================================================================
+# PREFERRED SUPPLIER ANALYTICS
+# =============================================================================
+
+# Product -> (component model, supplier reference, supplier model, city, units)
+PREFERRED_SUPPLIER_PRODUCTS = {
+    'HOTEL': (AccommodationBooking, 'hotel_chain_ref', HotelChain, 'city', 'number_of_nights'),
+    'CAR': (CarHireBooking, 'rental_company_ref', CarRentalCompany, 'pickup_city', 'number_of_days'),
+}
+
+
+def _benchmark_discount(supplier_model):
+    """Average corporate discount (%) of the active preferred suppliers, or None."""
+    average = supplier_model.objects.filter(
+        is_preferred=True, is_active=True, corporate_discount_percentage__isnull=False
+    ).aggregate(average=Avg('corporate_discount_percentage'))['average']
+    return Decimal(str(average)).quantize(Decimal('0.01')) if average is not None else None
+
+
+def _preferred_measures(row, benchmark):
+    units = row['units'] or 0
+    spend = _to_number(row['spend'])
+    preferred_spend = _to_number(row['preferred_spend'])
+    missed_spend = spend - preferred_spend
+    return {
+        'units': units,
+        'preferred_units': row['preferred_units'] or 0,
+        'spend': spend,
+        'preferred_spend': preferred_spend,
+        'unit_share': round((row['preferred_units'] or 0) / units, 4) if units else None,
+        'spend_share': round(preferred_spend / spend, 4) if spend else None,
+        'discount_captured': _rounded(row['captured'] or 0),
+        'discount_missed': round(missed_spend * float(benchmark) / 100, 2) if benchmark else None,
+    }
+
+
+def preferred_supplier_summary(bookings):
+    """
+    Preferred-supplier compliance for hotels and car hire per organization,
+    pickup / stay city and travel month.
+
+    Units are nights (hotels) or rental days (cars). A stay or rental counts
+    as preferred when its canonical supplier (hotel_chain_ref /
+    rental_company_ref) is an active preferred supplier.
+
+    Discounts are estimates in base currency:
+    - captured: preferred spend x d / (100 - d), where d is the supplier's
+      corporate_discount_percentage off the best available rate
+    - missed: non-preferred spend x the average discount of the product's
+      active preferred suppliers (the benchmark), i.e. what the same spend
+      would have saved at a preferred supplier
+
+    Args:
+        bookings: Tenant-scoped Booking queryset (already filtered)
+
+    Returns:
+        dict with per-product totals (including the benchmark discount)
+        and rows ordered by organization, month, city and product
+    """
+    booking_ids = bookings.order_by().values('pk')
+    totals = {}
+    rows = []
+
+    for product, (model, ref, supplier_model, city, units) in PREFERRED_SUPPLIER_PRODUCTS.items():
+        # As float so SQLite doesn't fall back to integer division on whole amounts
+        discount = Cast(f'{ref}__corporate_discount_percentage', FloatField())
+        preferred = Q(**{f'{ref}__is_preferred': True, f'{ref}__is_active': True})
+        measures = {
+            'units': Sum(units),
+            'preferred_units': Sum(units, filter=preferred),
+            'spend': Sum('total_amount_base'),
+            'preferred_spend': Sum('total_amount_base', filter=preferred),
+            'captured': Sum(
+                ExpressionWrapper(
+                    F('total_amount_base') * discount / (Value(100.0) - discount), output_field=FloatField()
+                ),
+                filter=preferred & Q(**{f'{ref}__corporate_discount_percentage__gt': 0,
+                                        f'{ref}__corporate_discount_percentage__lt': 100}),
+            ),
+        }
+        components = model.objects.filter(booking__in=booking_ids).order_by()
+        benchmark = _benchmark_discount(supplier_model)
+
+        product_totals = _preferred_measures(components.aggregate(**measures), benchmark)
+        product_totals['benchmark_discount_percentage'] = _to_number(benchmark) if benchmark else None
+        totals[product] = product_totals
+
+        groups = (
+            components
+            .annotate(month=TruncMonth('booking__travel_date'))
+            .values('booking__organization_id', 'booking__organization__name', city, 'month')
+            .annotate(**measures)
+        )
+        for group in groups:
+            row = {
+                'organization': str(group['booking__organization_id']),
+                'organization_name': group['booking__organization__name'],
+                'city': group[city] or None,
+                'month': _to_label(group['month']),
+                'product': product,
+            }
+            row.update(_preferred_measures(group, benchmark))
+            rows.append(row)
+
+    rows.sort(key=lambda r: (r['organization_name'] or '', r['month'] or '', r['city'] or '', r['product']))
+    return {'totals': totals, 'rows': rows}
+
+
+# =============================================================================
+# TRANSACTION ANALYTICS
+# =============================================================================
+
+def _in_base_currency(rel, amount, organization, on):
+    """
+    Expression for a component amount kept only in its own currency,
+    converted to the organization's base currency at the latest rate on or
+    before a date (1:1 without one, like convert_to_base_currency).
+    """
+    base_currency = F(f'{rel}__{organization}__base_currency')
+    rate = CurrencyExchangeRate.objects.filter(
+        from_currency=OuterRef(f'{rel}__currency'),
+        to_currency=OuterRef(f'{rel}__{organization}__base_currency'),
+        rate_date__lte=OuterRef(on),
+    ).order_by('-rate_date').values('exchange_rate')[:1]
+    return Case(
+        When(**{f'{rel}__currency': base_currency}, then=F(f'{rel}__{amount}')),
+        default=ExpressionWrapper(
+            F(f'{rel}__{amount}') * Coalesce(Subquery(rate), Value(Decimal('1'))), output_field=MONEY
+        ),
+        output_field=MONEY,
+    )
+
+
+# Component reached from BookingTransaction through its GenericRelation, and
+# the component's own (canonical where matched) supplier, original date and
+# recorded amount in base currency
+TRANSACTION_PRODUCTS = {
+    'AIR': {
+        'relation': 'air_booking',
+        'supplier': lambda rel: Coalesce(
+            NullIf(f'{rel}__primary_airline_name', Value('')), f'{rel}__primary_airline_iata_code'
+        ),
+        'booked_on': 'booking__booking_date',
+        'recorded': lambda rel: _in_base_currency(
+            rel, 'total_fare', 'booking__organization', f'{rel}__booking__booking_date'
+        ),
+    },
+    'HOTEL': {
+        'relation': 'accommodation_booking',
+        'supplier': lambda rel: Coalesce(
+            f'{rel}__hotel_chain_ref__name', NullIf(f'{rel}__hotel_chain', Value('')), f'{rel}__hotel_name'
+        ),
+        'booked_on': 'booking__booking_date',
+        'recorded': lambda rel: F(f'{rel}__total_amount_base'),
+    },
+    'CAR': {
+        'relation': 'car_hire_booking',
+        'supplier': lambda rel: Coalesce(f'{rel}__rental_company_ref__name', f'{rel}__rental_company'),
+        'booked_on': 'booking__booking_date',
+        'recorded': lambda rel: F(f'{rel}__total_amount_base'),
+    },
+    'FEE': {
+        'relation': 'service_fee',
+        'supplier': lambda rel: Value('Service fees', output_field=CharField()),
+        'booked_on': 'fee_date',
+        'recorded': lambda rel: _in_base_currency(rel, 'fee_amount', 'organization', f'{rel}__fee_date'),
+    },
+}
+
+TRANSACTION_DIMENSIONS = ['supplier', 'product', 'month']
+
+CHANGE_TYPES = ['EXCHANGE', 'REISSUE', 'DATE_CHANGE']
+REFUND_TYPES = ['REFUND', 'PARTIAL_REFUND']
+
+# Measures summed across products when merging their groups
+TRANSACTION_SUMS = [
+    'transactions', 'originals', 'changes', 'cost_of_change', 'change_fees', 'voids', 'refunds',
+    'refunded_components', 'refunded_amount', 'refundable_amount', 'refund_time',
+]
+
+
+def _ratio(numerator, denominator, places=4):
+    return round(float(numerator) / float(denominator), places) if denominator else None
+
+
+def _transaction_measures(row):
+    """Rates and averages from the summed measures of a group."""
+    refunded = -(row['refunded_amount'] or 0)
+    refund_time = row['refund_time']
+    return {
+        'transactions': row['transactions'] or 0,
+        'originals': row['originals'] or 0,
+        'changes': row['changes'] or 0,
+        'cost_of_change': round(_to_number(row['cost_of_change']), 2),
+        'change_fees': round(_to_number(row['change_fees']), 2),
+        'change_rate': _ratio(row['changes'] or 0, row['originals']),
+        'voids': row['voids'] or 0,
+        'void_rate': _ratio(row['voids'] or 0, row['originals']),
+        'refunds': row['refunds'] or 0,
+        'refunded_amount': round(_to_number(refunded), 2),
+        'refundable_amount': round(_to_number(row['refundable_amount']), 2),
+        'refund_recovery_rate': _ratio(refunded, row['refundable_amount']),
+        'average_days_to_refund': (
+            round(refund_time.total_seconds() / 86400 / row['refunded_components'], 1)
+            if refund_time is not None and row['refunded_components'] else None
+        ),
+    }
+
+
+def transaction_summary(bookings, dimensions, start_date=None, end_date=None, products=None):
+    """
+    Cost of change, refund recovery and void rates from BookingTransactions.
+
+    Each product is one grouped query over its transactions joined once to
+    the component (and its booking) through the generic relation; the
+    products' groups are merged afterwards. Cancelled transactions are
+    left out.
+
+    - cost_of_change: net of EXCHANGE, REISSUE and DATE_CHANGE transactions
+      (base currency), change_fees the fee part of them
+    - void_rate / change_rate: voids / changes per ORIGINAL transaction
+    - refund_recovery_rate: refunded amount over the original value of the
+      refunded components (their ORIGINAL transaction, else the recorded
+      amount converted to base currency)
+    - average_days_to_refund: from the ORIGINAL transaction (else the
+      booking date) to the component's first refund
+
+    Args:
+        bookings: Tenant-scoped Booking queryset (already filtered)
+        dimensions: Subset of TRANSACTION_DIMENSIONS
+        start_date, end_date: Optional transaction_date range
+        products: Optional subset of TRANSACTION_PRODUCTS keys
+
+    Returns:
+        dict with totals and rows ordered by cost of change
+
+    Raises:
+        ValueError: Unknown dimension
+    """
+    dimensions = list(dict.fromkeys(dimensions)) or ['product']
+    unknown = [d for d in dimensions if d not in TRANSACTION_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown dimension: {', '.join(unknown)}")
+    products = [p for p in (products or TRANSACTION_PRODUCTS) if p in TRANSACTION_PRODUCTS]
+
+    booking_ids = bookings.order_by().values('pk')
+    counted = BookingTransaction.objects.exclude(status__in=BookingTransaction.UNCOUNTED_STATUSES)
+    if start_date:
+        counted = counted.filter(transaction_date__gte=start_date)
+    if end_date:
+        counted = counted.filter(transaction_date__lte=end_date)
+
+    # Other transactions of the same component, via the (content_type, object_id) index
+    same_component = BookingTransaction.objects.filter(
+        content_type=OuterRef('content_type'), object_id=OuterRef('object_id')
+    ).exclude(status__in=BookingTransaction.UNCOUNTED_STATUSES)
+    original = same_component.filter(transaction_type='ORIGINAL').order_by('transaction_date', 'created_at')
+    earlier_refund = same_component.filter(transaction_type__in=REFUND_TYPES).filter(
+        Q(transaction_date__lt=OuterRef('transaction_date')) |
+        Q(transaction_date=OuterRef('transaction_date'), created_at__lt=OuterRef('created_at'))
+    )
+
+    change = Q(transaction_type__in=CHANGE_TYPES)
+    first_refund = Q(transaction_type__in=REFUND_TYPES, first_refund=True)
+    measures = {
+        'transactions': Count('id'),
+        'originals': Count('id', filter=Q(transaction_type='ORIGINAL')),
+        'changes': Count('id', filter=change),
+        'cost_of_change': Sum('total_amount_base', filter=change),
+        'change_fees': Sum('fees_base', filter=change),
+        'voids': Count('id', filter=Q(transaction_type='VOID')),
+        'refunds': Count('id', filter=Q(transaction_type__in=REFUND_TYPES)),
+        'refunded_components': Count('id', filter=first_refund),
+        'refunded_amount': Sum('total_amount_base', filter=Q(transaction_type__in=REFUND_TYPES)),
+        'refundable_amount': Sum('original_amount', filter=first_refund),
+        'refund_time': Sum('days_to_refund', filter=first_refund),
+    }
+
+    groups = {}
+    for product in products:
+        config = TRANSACTION_PRODUCTS[product]
+        rel = config['relation']
+        dims = {
+            'supplier': config['supplier'](rel),
+            'product': Value(product, output_field=CharField()),
+            'month': TruncMonth('transaction_date'),
+        }
+        rows = (
+            counted
+            .filter(**{f'{rel}__booking__in': booking_ids})
+            .annotate(
+                first_refund=~Exists(earlier_refund),
+                original_amount=Coalesce(
+                    Subquery(original.values('total_amount_base')[:1]),
+                    config['recorded'](rel),
+                    ZERO_MONEY(),
+                    output_field=MONEY,
+                ),
+                days_to_refund=ExpressionWrapper(
+                    F('transaction_date') - Coalesce(
+                        Subquery(original.values('transaction_date')[:1]),
+                        f"{rel}__{config['booked_on']}",
+                    ),
+                    output_field=DurationField(),
+                ),
+                **{f'd_{name}': dims[name] for name in dimensions},
+            )
+            .values(*[f'd_{name}' for name in dimensions])
+            .annotate(**measures)
+            .order_by()
+        )
+        for row in rows:
+            key = tuple(_to_label(row[f'd_{name}']) for name in dimensions)
+            merged = groups.get(key)
+            if merged is None:
+                groups[key] = {name: row[name] for name in TRANSACTION_SUMS}
+                continue
+            for name in TRANSACTION_SUMS:
+                if row[name] is not None:
+                    merged[name] = row[name] if merged[name] is None else merged[name] + row[name]
+
+    totals = {name: None for name in TRANSACTION_SUMS}
+    results = []
+    for key, merged in groups.items():
+        for name in TRANSACTION_SUMS:
+            if merged[name] is not None:
+                totals[name] = merged[name] if totals[name] is None else totals[name] + merged[name]
+        row = dict(zip(dimensions, key))
+        row.update(_transaction_measures(merged))
+        results.append(row)
+
+    results.sort(key=lambda r: (-r['cost_of_change'], -r['transactions']))
+    return {
+        'dimensions': dimensions,
+        'totals': _transaction_measures(totals),
+        'rows': results,
+    }
@@ -0,0 +1,278 @@
+# apps/bookings/audit.py
+"""
+Batched BookingAuditLog writer.
+
+Signals used to INSERT one audit row per save, and BookingAuditLog.save()
+fetched the related object and user again to store their str(). Instead,
+record() builds the row in memory - string representations computed from
+the objects the caller already holds - and buffers it until the database
+transaction it belongs to commits. All rows of a transaction are then
+written with one bulk_create.
+
+Rollback semantics follow transaction.on_commit(): rows recorded inside an
+atomic block (or savepoint) that rolls back are discarded with it, and
+rows of committed work are always handed to the writer. Outside any
+transaction the change has already committed, so the row is written
+straight away.
+
+With AUDIT_ASYNC on, committed rows go to a bounded queue drained by a
+background thread instead of being written by the committing thread. When
+the queue is full, record()'s commit hook blocks until there is room, so a
+burst slows its producers down rather than growing memory or dropping
+rows. drain() waits for the queue to empty; it also runs at interpreter
+exit.
+
+A batch that still fails after WRITE_ATTEMPTS is never dropped: the
+synchronous path raises, and the background writer (which has no caller
+to raise to) spools the rows to a file under AUDIT_SPOOL_DIR that
+replay_spool() - run by archive_audit_logs - writes back to the table.
+"""
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from pathlib import Path
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+from .models import BookingAuditLog
+
+logger = logging.getLogger(__name__)
+
+# Attempts at writing a batch before it is raised or spooled
+WRITE_ATTEMPTS = 3
+
+# BookingAuditLog columns kept in spool files
+SPOOL_FIELDS = [field.attname for field in BookingAuditLog._meta.concrete_fields]
+
+_state = threading.local()
+
+
+class _Bucket:
+    """
+    Rows recorded in one transaction / savepoint, written when it commits.
+
+    Django has no public way to ask whether an on_commit hook is still
+    registered, so this reads the connection's run_on_commit list of
+    (savepoint ids, func, robust) tuples - the Django 4.2 layout pinned in
+    requirements.txt. The audit tests in tests.py cover it; re-run them when
+    upgrading Django.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.hooks = connection.run_on_commit
+
+    def is_pending(self):
+        # Rollbacks replace the connection's hook list, so an unchanged list
+        # means the hook is still there without scanning it
+        hooks = connection.run_on_commit
+        if hooks is self.hooks:
+            return True
+        if any(func is self.commit for _, func, _ in hooks):
+            self.hooks = hooks
+            return True
+        return False
+
+    def commit(self):
+        buckets = getattr(_state, 'buckets', {})
+        for key, bucket in list(buckets.items()):
+            if bucket is self:
+                del buckets[key]
+        entries, self.entries = self.entries, []
+        submit(entries)
+
+
+def _current_bucket():
+    """
+    The bucket for the current transaction and savepoint, registering its
+    on_commit hook the first time. A bucket whose hook was dropped by a
+    rollback is replaced, so its rows are never written.
+    """
+    buckets = getattr(_state, 'buckets', None)
+    if buckets is None:
+        buckets = _state.buckets = {}
+
+    key = tuple(connection.savepoint_ids)
+    bucket = buckets.get(key)
+    if bucket is None or not bucket.is_pending():
+        for stale_key in [k for k, b in buckets.items() if not b.is_pending()]:
+            del buckets[stale_key]
+        bucket = buckets[key] = _Bucket()
+        transaction.on_commit(bucket.commit)
+    return bucket
+
+
+def record(booking_id, action, description, component=None, user=None, field_name='',
+           old_value=None, new_value=None, notes=''):
+    """
+    Buffer an audit row for the current transaction.
+
+    Args:
+        booking_id: Booking the entry belongs to
+        action: One of BookingAuditLog.ACTION_CHOICES
+        description: Human-readable description
+        component: Optional related object (component, transaction, ...);
+            its type, id and str() are stored
+        user: Optional user who made the change
+    """
+    if not booking_id:
+        # A component deleted along with its booking has no booking left
+        # to hang the entry on (the booking's own rows cascade with it)
+        logger.warning(f"Audit entry without a booking not recorded: {action} {description}")
+        return
+    entry = BookingAuditLog(
+        booking_id=booking_id,
+        action=action,
+        timestamp=timezone.now(),
+        field_name=field_name,
+        old_value=old_value,
+        new_value=new_value,
+        description=description,
+        notes=notes,
+        user=user,
+        user_repr=str(user) if user is not None else '',
+    )
+    if component is not None:
+        entry.content_type = ContentType.objects.get_for_model(component)
+        entry.object_id = component.pk
+        entry.related_object_repr = str(component)[:255]
+
+    if connection.in_atomic_block:
+        _current_bucket().entries.append(entry)
+    else:
+        submit([entry])
+
+
+def write(entries):
+    """Insert rows now, retrying transient failures; the last failure is raised."""
+    for attempt in range(1, WRITE_ATTEMPTS + 1):
+        try:
+            BookingAuditLog.objects.bulk_create(entries, batch_size=settings.AUDIT_BATCH_SIZE)
+            return
+        except Exception:
+            if attempt == WRITE_ATTEMPTS:
+                raise
+            close_old_connections()
+            time.sleep(0.1 * attempt)
+
+
+# =============================================================================
+# SPOOL
+# =============================================================================
+
+def spool_dir():
+    return Path(settings.AUDIT_SPOOL_DIR)
+
+
+def spool(entries, directory=None):
+    """
+    Durably write rows that could not be inserted to a new NDJSON file.
+
+    Returns:
+        Path of the spool file
+    """
+    directory = directory or spool_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{timezone.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex}.ndjson"
+    temporary = path.with_suffix('.tmp')
+    with open(temporary, 'w') as f:
+        for entry in entries:
+            row = {name: getattr(entry, name) for name in SPOOL_FIELDS}
+            f.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    return path
+
+
+def replay_spool(directory=None):
+    """
+    Insert the rows of every spool file and remove the file. Rows are
+    inserted with their original ids, so replaying a file twice is harmless.
+
+    Returns:
+        Number of rows replayed
+    """
+    directory = directory or spool_dir()
+    if not directory.exists():
+        return 0
+    replayed = 0
+    for path in sorted(directory.glob('*.ndjson')):
+        with open(path) as f:
+            entries = [BookingAuditLog(**json.loads(line)) for line in f if line.strip()]
+        BookingAuditLog.objects.bulk_create(
+            entries, batch_size=settings.AUDIT_BATCH_SIZE, ignore_conflicts=True
+        )
+        path.unlink()
+        replayed += len(entries)
+    return replayed
+
+
+def submit(entries):
+    """Write committed rows, or queue them for the background writer."""
+    if not entries:
+        return
+    if not settings.AUDIT_ASYNC:
+        write(entries)
+        return
+    writer = _writer()
+    for entry in entries:
+        # Blocks while the queue is full
+        writer.queue.put(entry)
+
+
+class _Writer(threading.Thread):
+    """Background thread draining the queue in batches."""
+
+    def __init__(self):
+        super().__init__(name='booking-audit-writer', daemon=True)
+        self.queue = queue.Queue(maxsize=settings.AUDIT_QUEUE_SIZE)
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < settings.AUDIT_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                write(batch)
+            except Exception as e:
+                path = spool(batch)
+                logger.error(f"Error writing {len(batch)} audit log entries: {e}; spooled to {path}")
+            finally:
+                close_old_connections()
+                for _ in batch:
+                    self.queue.task_done()
+
+
+_writer_lock = threading.Lock()
+_writer_thread = None
+
+
+def _writer():
+    global _writer_thread
+    if _writer_thread is None:
+        with _writer_lock:
+            if _writer_thread is None:
+                thread = _Writer()
+                thread.start()
+                atexit.register(drain)
+                _writer_thread = thread
+    return _writer_thread
+
+
+def drain():
+    """Block until every queued row has been written (no-op when synchronous)."""
+    if _writer_thread is not None:
+        _writer_thread.queue.join()
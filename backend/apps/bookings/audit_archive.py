@@ -0,0 +1,415 @@
+# apps/bookings/audit_archive.py
+"""
+Monthly storage and archival of booking audit logs.
+
+On PostgreSQL booking_audit_logs is a table partitioned by month of
+timestamp (see migration 0027): booking_audit_logs_pYYYYMM per month plus
+booking_audit_logs_default catching anything without a partition yet.
+ensure_partitions() creates the coming months' partitions ahead of time and
+moves rows that landed in the default partition into their own. On other
+databases the table stays a single table and a "partition" is the
+month's timestamp range of it.
+
+Months older than AUDIT_RETENTION_MONTHS are archived: their rows are
+written to a gzip-compressed NDJSON file in AUDIT_ARCHIVE_DIR, recorded in
+the directory's index.json (month, file, row count, first/last timestamp,
+size, SHA-256), and the partition is dropped (or the range deleted).
+
+audit_trail() reads the live table and the archive files covering a time
+range as one stream, so callers don't need to know where the rows live.
+Months follow settings.TIME_ZONE.
+"""
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from datetime import date, datetime, timedelta
+from itertools import chain
+from pathlib import Path
+import gzip
+import hashlib
+import heapq
+import json
+import logging
+import os
+
+from .models import BookingAuditLog
+
+logger = logging.getLogger(__name__)
+
+TABLE = BookingAuditLog._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+INDEX_FILE = 'index.json'
+
+# Records an audit trail request returns by default, and at most
+DEFAULT_TRAIL_LIMIT = 500
+MAX_TRAIL_LIMIT = 5000
+
+FIELDS = [
+    'id', 'booking_id', 'booking__agent_booking_reference', 'action', 'timestamp',
+    'content_type__app_label', 'content_type__model', 'object_id', 'related_object_repr',
+    'field_name', 'old_value', 'new_value', 'description', 'notes', 'user_id', 'user_repr',
+    'ip_address',
+]
+
+
+# =============================================================================
+# MONTHS
+# =============================================================================
+
+def add_months(month, count):
+    """First day of the month `count` months after (or before) `month`."""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_range(month):
+    """(start, end) aware datetimes of a month in the current time zone."""
+    return (
+        timezone.make_aware(datetime.combine(month, datetime.min.time())),
+        timezone.make_aware(datetime.combine(add_months(month, 1), datetime.min.time())),
+    )
+
+
+def current_month():
+    today = timezone.localdate()
+    return date(today.year, today.month, 1)
+
+
+# =============================================================================
+# PARTITIONS
+# =============================================================================
+
+def is_partitioned():
+    """Whether booking_audit_logs is a partitioned PostgreSQL table."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s",
+            [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def partitions():
+    """Names of the existing monthly partitions."""
+    if not is_partitioned():
+        return set()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits i "
+            "JOIN pg_class parent ON parent.oid = i.inhparent "
+            "JOIN pg_class child ON child.oid = i.inhrelid "
+            "WHERE parent.relname = %s",
+            [TABLE]
+        )
+        return {name for name, in cursor.fetchall()}
+
+
+def create_partition(month):
+    """
+    Create the partition of a month. Rows of that month sitting in the
+    default partition are moved into it, so creating a partition late is
+    safe.
+    """
+    name = partition_name(month)
+    start, end = month_range(month)
+    bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s '
+            f'RETURNING *) INSERT INTO {name} SELECT * FROM moved',
+            [start, end]
+        )
+        cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES {bounds}')
+    logger.info(f"Created audit log partition {name}")
+
+
+def ensure_partitions(months_ahead=None):
+    """
+    Create partitions from the current month to `months_ahead` months out,
+    plus any month with rows in the default partition.
+
+    Returns:
+        Names of the partitions created
+    """
+    if not is_partitioned():
+        return []
+    if months_ahead is None:
+        months_ahead = settings.AUDIT_PARTITION_MONTHS_AHEAD
+
+    this_month = current_month()
+    months = {add_months(this_month, offset) for offset in range(months_ahead + 1)}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', \"timestamp\" AT TIME ZONE %s) FROM {DEFAULT_PARTITION}",
+            [settings.TIME_ZONE]
+        )
+        months.update(row[0].date() for row in cursor.fetchall())
+
+    existing = partitions()
+    created = []
+    for month in sorted(months):
+        if partition_name(month) not in existing:
+            create_partition(month)
+            created.append(partition_name(month))
+    return created
+
+
+def _drop_month(month):
+    """Remove a month's rows: drop its partition, or delete the range."""
+    start, end = month_range(month)
+    name = partition_name(month)
+    with transaction.atomic():
+        if name in partitions():
+            with connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+                cursor.execute(f'DROP TABLE {name}')
+        # Rows outside a partition (default partition, or no partitioning)
+        BookingAuditLog.objects.filter(timestamp__gte=start, timestamp__lt=end).delete()
+
+
+# =============================================================================
+# ARCHIVE FILES
+# =============================================================================
+
+def archive_dir():
+    return Path(settings.AUDIT_ARCHIVE_DIR)
+
+
+def load_index(directory=None):
+    """The archive index: {'archives': [{'month', 'file', 'rows', 'first', 'last', ...}]}."""
+    path = (directory or archive_dir()) / INDEX_FILE
+    if not path.exists():
+        return {'archives': []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_index(index, directory):
+    path = directory / INDEX_FILE
+    temporary = path.with_suffix('.tmp')
+    with open(temporary, 'w') as f:
+        json.dump(index, f, indent=2, cls=DjangoJSONEncoder)
+    os.replace(temporary, path)
+
+
+def _serialize(row):
+    """A values() row of FIELDS as an archive record."""
+    return {
+        'id': str(row['id']),
+        'booking': str(row['booking_id']),
+        'booking_reference': row['booking__agent_booking_reference'],
+        'action': row['action'],
+        'timestamp': row['timestamp'].isoformat(),
+        'content_type': (
+            f"{row['content_type__app_label']}.{row['content_type__model']}"
+            if row['content_type__model'] else None
+        ),
+        'object_id': str(row['object_id']) if row['object_id'] else None,
+        'related_object_repr': row['related_object_repr'],
+        'field_name': row['field_name'],
+        'old_value': row['old_value'],
+        'new_value': row['new_value'],
+        'description': row['description'],
+        'notes': row['notes'],
+        'user': row['user_id'],
+        'user_repr': row['user_repr'],
+        'ip_address': row['ip_address'],
+    }
+
+
+def archive_month(month, directory=None):
+    """
+    Write a month's rows to a compressed NDJSON file, record it in the
+    index and remove the rows from the database.
+
+    Returns:
+        Number of rows archived
+    """
+    directory = directory or archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    start, end = month_range(month)
+    rows = (
+        BookingAuditLog.objects
+        .filter(timestamp__gte=start, timestamp__lt=end)
+        .order_by('timestamp', 'id')
+        .values(*FIELDS)
+    )
+
+    index = load_index(directory)
+    parts = sum(1 for archive in index['archives'] if archive['month'] == f'{month:%Y-%m}')
+    filename = f'{TABLE}_{month:%Y_%m}' + (f'.{parts + 1}' if parts else '') + '.ndjson.gz'
+    path = directory / filename
+    temporary = path.with_name(path.name + '.tmp')
+
+    count, first, last = 0, None, None
+    with gzip.open(temporary, 'wt', encoding='utf-8') as f:
+        for row in rows.iterator(chunk_size=5000):
+            record = _serialize(row)
+            f.write(json.dumps(record, cls=DjangoJSONEncoder) + '\n')
+            first = first or record['timestamp']
+            last = record['timestamp']
+            count += 1
+    if not count:
+        temporary.unlink()
+        return 0
+
+    digest = hashlib.sha256()
+    with open(temporary, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    os.replace(temporary, path)
+
+    index['archives'].append({
+        'month': f'{month:%Y-%m}',
+        'file': filename,
+        'rows': count,
+        'first': first,
+        'last': last,
+        'bytes': path.stat().st_size,
+        'sha256': digest.hexdigest(),
+        'archived_at': timezone.now().isoformat(),
+    })
+    index['archives'].sort(key=lambda archive: (archive['month'], archive['archived_at']))
+    _save_index(index, directory)
+
+    # Only once the file and index are safely on disk
+    _drop_month(month)
+    logger.info(f"Archived {count} audit log entries for {month:%Y-%m} to {path}")
+    return count
+
+
+def months_to_archive(retention_months=None):
+    """Months with rows older than the retention period, oldest first."""
+    if retention_months is None:
+        retention_months = settings.AUDIT_RETENTION_MONTHS
+    cutoff, _ = month_range(add_months(current_month(), -retention_months))
+    months = (
+        BookingAuditLog.objects.filter(timestamp__lt=cutoff)
+        .annotate(month=TruncMonth('timestamp'))
+        .values_list('month', flat=True)
+        .distinct()
+    )
+    return sorted({timezone.localtime(month).date().replace(day=1) for month in months})
+
+
+def archive(retention_months=None, directory=None):
+    """
+    Archive every month older than the retention period.
+
+    Returns:
+        [(month, rows archived), ...]
+    """
+    return [(month, archive_month(month, directory)) for month in months_to_archive(retention_months)]
+
+
+# =============================================================================
+# READING
+# =============================================================================
+
+def parse_moment(value, end=False):
+    """
+    Aware datetime from an ISO date or datetime (naive values are in
+    settings.TIME_ZONE). A bare date used as an exclusive end means the
+    start of the next day, so that day is included.
+
+    Raises:
+        ValueError: Not an ISO date or datetime
+    """
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        moment += timedelta(days=1)
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+
+def booking_start(booking):
+    """
+    Earliest timestamp a booking's entries can have: the start of the day
+    it was created, so archive months before it need not be read.
+    """
+    return timezone.localtime(booking.created_at).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _overlaps(archive, start, end):
+    if start is not None and datetime.fromisoformat(archive['last']) < start:
+        return False
+    if end is not None and datetime.fromisoformat(archive['first']) >= end:
+        return False
+    return True
+
+
+def archived_entries(booking_id=None, start=None, end=None, action=None, directory=None):
+    """
+    Yield archived records (timestamp parsed) matching the filters, reading
+    only the files whose time range overlaps [start, end).
+    """
+    directory = directory or archive_dir()
+    booking_id = str(booking_id) if booking_id else None
+    for archive in load_index(directory)['archives']:
+        if not _overlaps(archive, start, end):
+            continue
+        with gzip.open(directory / archive['file'], 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if booking_id and record['booking'] != booking_id:
+                    continue
+                if action and record['action'] != action:
+                    continue
+                record['timestamp'] = datetime.fromisoformat(record['timestamp'])
+                if start is not None and record['timestamp'] < start:
+                    continue
+                if end is not None and record['timestamp'] >= end:
+                    continue
+                record['archived'] = True
+                yield record
+
+
+def audit_trail(booking_id=None, start=None, end=None, action=None, limit=None):
+    """
+    Audit records from the database and the archive, newest first.
+
+    Args:
+        booking_id: Only this booking's entries
+        start, end: Aware datetimes bounding the timestamp (end exclusive);
+            archive files outside them aren't read, so pass a start where
+            one is known (e.g. the booking's creation)
+        action: Only this action
+        limit: Only the newest `limit` records
+    """
+    live = BookingAuditLog.objects.all()
+    if booking_id:
+        live = live.filter(booking_id=booking_id)
+    if start is not None:
+        live = live.filter(timestamp__gte=start)
+    if end is not None:
+        live = live.filter(timestamp__lt=end)
+    if action:
+        live = live.filter(action=action)
+    if limit:
+        live = live.order_by('-timestamp')[:limit]
+
+    records = []
+    for row in live.values(*FIELDS):
+        record = _serialize(row)
+        record['timestamp'] = row['timestamp']
+        record['archived'] = False
+        records.append(record)
+    archived = archived_entries(booking_id, start, end, action)
+    if limit:
+        records = heapq.nlargest(limit, chain(records, archived), key=lambda record: record['timestamp'])
+    else:
+        records.extend(archived)
+        records.sort(key=lambda record: record['timestamp'], reverse=True)
+    return records
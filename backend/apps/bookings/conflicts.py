@@ -0,0 +1,169 @@
+# apps/bookings/conflicts.py
+"""
+Booking conflict detection.
+
+Overlapping hotel stays or car rentals, overlapping flights, and a car
+picked up before the traveller's flight has landed all mean paying for
+something that can't be used. Comparing every item with every other is
+quadratic, so each traveller's timeline (see timeline.py, already sorted by
+start) is swept once, remembering per kind the item that reaches furthest
+so far:
+
+- an item starting before that item of its own kind ends overlaps it
+- a rental starting before the furthest-reaching flight into its pickup
+  city lands starts before arrival
+
+Each item is compared with at most two remembered items, so a traveller
+costs time linear in their items. Items overlapping several earlier ones
+are reported once, against the one reaching furthest.
+
+Conflicts are stored as BookingConflict rows. Rerunning for a traveller
+refreshes their conflicts, keeps the review status of the ones still
+present and removes the ones that no longer are.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+from decimal import Decimal, ROUND_HALF_UP
+import logging
+
+from . import timeline
+from .models import Booking, BookingConflict
+
+logger = logging.getLogger(__name__)
+
+OVERLAP_TYPES = {
+    timeline.FLIGHT: 'OVERLAPPING_FLIGHTS',
+    timeline.STAY: 'OVERLAPPING_STAYS',
+    timeline.RENTAL: 'OVERLAPPING_RENTALS',
+}
+RENTAL_BEFORE_ARRIVAL = 'RENTAL_BEFORE_ARRIVAL'
+
+LABELS = {
+    timeline.FLIGHT: 'flight to',
+    timeline.STAY: 'stay in',
+    timeline.RENTAL: 'car hire in',
+}
+
+# Cancelled and refunded bookings can't conflict
+EXCLUDED_STATUSES = ['CANCELLED', 'REFUNDED']
+
+BATCH_SIZE = 1000
+
+CENT = Decimal('0.01')
+
+
+def sweep(intervals):
+    """
+    Conflicts among one traveller's intervals (sorted by start).
+
+    Yields:
+        (conflict_type, later, earlier)
+    """
+    furthest = {}
+    for interval in intervals:
+        earlier = furthest.get(interval.kind)
+        if earlier is not None and earlier.end > interval.start:
+            # Segments of one ticket are a routing, not a double booking
+            if interval.kind != timeline.FLIGHT or interval.air_booking_id != earlier.air_booking_id:
+                yield OVERLAP_TYPES[interval.kind], interval, earlier
+
+        if interval.kind == timeline.RENTAL:
+            flight = furthest.get(timeline.FLIGHT)
+            # Local times only compare within one city
+            if (flight is not None and flight.end > interval.start
+                    and flight.city.upper() == interval.origin_city.upper()):
+                yield RENTAL_BEFORE_ARRIVAL, interval, flight
+
+        if earlier is None or interval.end > earlier.end:
+            furthest[interval.kind] = interval
+
+
+def wasted_amount(later, overlap):
+    """The later item's cost pro rata to the part of it inside the overlap."""
+    duration = (later.end - later.start).total_seconds()
+    if not duration or not later.spend:
+        return Decimal('0.00')
+    share = Decimal(str(min(overlap.total_seconds() / duration, 1.0)))
+    return (later.spend * share).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def to_conflict(conflict_type, later, earlier, batch=None):
+    """Unsaved BookingConflict for a pair found by sweep()."""
+    overlap = min(later.end, earlier.end) - later.start
+    where = later.origin_city if later.kind == timeline.RENTAL else later.city
+    return BookingConflict(
+        organization_id=later.organization_id,
+        traveller_id=later.traveller_id,
+        conflict_type=conflict_type,
+        booking_id=later.booking_id,
+        component_id=later.component_id,
+        conflicting_booking_id=earlier.booking_id,
+        conflicting_component_id=earlier.component_id,
+        overlap_start_date=later.start.date(),
+        overlap_hours=Decimal(str(round(overlap.total_seconds() / 3600, 2))),
+        wasted_amount=wasted_amount(later, overlap),
+        description=(
+            f"{LABELS[later.kind].capitalize()} {where} from {later.start:%Y-%m-%d %H:%M} "
+            f"overlaps {LABELS[earlier.kind]} {earlier.city} until {earlier.end:%Y-%m-%d %H:%M}"
+        )[:255],
+        import_batch=batch,
+    )
+
+
+def _save(conflicts):
+    """Upsert conflicts; ones already stored keep their review status and import batch."""
+    if conflicts:
+        BookingConflict.objects.bulk_create(
+            conflicts,
+            update_conflicts=True,
+            unique_fields=['conflict_type', 'component_id', 'conflicting_component_id'],
+            update_fields=[
+                'booking', 'conflicting_booking', 'overlap_start_date', 'overlap_hours',
+                'wasted_amount', 'description', 'updated_at',
+            ],
+        )
+    return len(conflicts)
+
+
+def detect_conflicts(traveller_ids=None, organization_id=None, batch=None):
+    """
+    Sweep travellers' timelines and store their conflicts.
+
+    Args:
+        traveller_ids: Only these travellers (e.g. the ones an import touched)
+        organization_id: Only this organization's travellers
+        batch: Optional ImportBatch recorded on newly found conflicts
+
+    Returns:
+        Number of conflicts found
+    """
+    started = timezone.now()
+    bookings = Booking.objects.exclude(status__in=EXCLUDED_STATUSES)
+    stale = BookingConflict.objects.all()
+    if traveller_ids is not None:
+        traveller_ids = list(set(traveller_ids))
+        if not traveller_ids:
+            return 0
+        bookings = bookings.filter(traveller_id__in=traveller_ids)
+        stale = stale.filter(traveller_id__in=traveller_ids)
+    if organization_id is not None:
+        bookings = bookings.filter(organization_id=organization_id)
+        stale = stale.filter(organization_id=organization_id)
+
+    found = 0
+    pending = []
+    with transaction.atomic():
+        for _, intervals in timeline.by_traveller(bookings):
+            for conflict_type, later, earlier in sweep(intervals):
+                pending.append(to_conflict(conflict_type, later, earlier, batch))
+            if len(pending) >= BATCH_SIZE:
+                found += _save(pending)
+                pending = []
+        found += _save(pending)
+
+        # Conflicts that went away with the bookings' changes
+        stale.filter(updated_at__lt=started).delete()
+
+    logger.info(f"Conflict detection: {found} conflicts" + (f" for import batch {batch.pk}" if batch else ""))
+    return found
@@ -0,0 +1,237 @@
+# apps/bookings/duplicates.py
+"""
+Duplicate booking detection.
+
+Agents sometimes send the same trip twice under different
+agent_booking_reference values. Comparing every booking with every other
+is quadratic, so bookings are streamed ordered by (traveller, travel_date)
+- the existing index - and only bookings in the same run are considered.
+Within a run each booking is hashed into a bucket keyed on:
+
+- its itinerary signature: the air route, else the hotel city, else the
+  car pickup city
+- a logarithmic amount band (about AMOUNT_BAND_RATIO wide)
+
+and compared only with the bookings already in its own and the two
+neighbouring amount bands. Memory is bounded by the largest run, so a full
+scan is one ordered pass over the table.
+
+Each compared pair gets a confidence score; pairs at or above
+MIN_CONFIDENCE are stored as DuplicateBookingCandidate rows for review.
+"""
+
+from django.db.models import CharField, Exists, OuterRef, Subquery, Value
+from django.db.models.functions import Concat
+from collections import defaultdict
+from decimal import Decimal
+from itertools import groupby
+import logging
+import math
+
+from .models import AccommodationBooking, AirBooking, Booking, CarHireBooking, DuplicateBookingCandidate
+
+logger = logging.getLogger(__name__)
+
+# Pairs scoring at or above this are stored as candidates
+MIN_CONFIDENCE = 0.75
+
+# Relative width of an amount band (adjacent bands are compared too)
+AMOUNT_BAND_RATIO = 0.05
+
+# Relative amount difference at which the amount score reaches zero
+MAX_AMOUNT_DIFFERENCE = 0.10
+
+# Cancelled and refunded bookings don't double-count spend
+EXCLUDED_STATUSES = ['CANCELLED', 'REFUNDED']
+
+BATCH_SIZE = 1000
+
+
+class BookingRecord:
+    """The fields of a booking the detector buckets and scores on."""
+
+    __slots__ = [
+        'id', 'organization_id', 'traveller_id', 'travel_date', 'return_date', 'booking_date',
+        'reference', 'supplier_reference', 'amount', 'signature', 'band',
+    ]
+
+    def __init__(self, id, organization_id, traveller_id, travel_date, return_date, booking_date,
+                 reference, supplier_reference, amount, route, hotel_city, car_city):
+        self.id = id
+        self.organization_id = organization_id
+        self.traveller_id = traveller_id
+        self.travel_date = travel_date
+        self.return_date = return_date
+        self.booking_date = booking_date
+        self.reference = reference
+        self.supplier_reference = (supplier_reference or '').strip().upper()
+        self.amount = amount or Decimal('0')
+        self.signature = itinerary_signature(route, hotel_city, car_city)
+        self.band = amount_band(self.amount)
+
+
+def itinerary_signature(route, hotel_city, car_city):
+    """'AIR:SYD-MEL', 'HOTEL:MELBOURNE', 'CAR:MELBOURNE' or '' for bookings without components."""
+    if route:
+        return f'AIR:{route.upper()}'
+    if hotel_city:
+        return f'HOTEL:{hotel_city.strip().upper()}'
+    if car_city:
+        return f'CAR:{car_city.strip().upper()}'
+    return ''
+
+
+def amount_band(amount):
+    """Logarithmic band number of an amount; zero and negative amounts share band 0."""
+    if amount <= 0:
+        return 0
+    return int(math.log(float(amount)) / math.log(1 + AMOUNT_BAND_RATIO)) + 1
+
+
+def match_score(a, b):
+    """
+    Likelihood (0-1) that two bookings in the same bucket are the same trip.
+
+    Sharing the bucket (traveller, travel date, itinerary) is worth 0.5;
+    the amount adds up to 0.3 (scaled down to nothing at
+    MAX_AMOUNT_DIFFERENCE), and the same return date, booking date and
+    supplier reference add 0.1, 0.05 and 0.05.
+
+    Returns:
+        (confidence, reasons)
+    """
+    confidence = 0.5
+    reasons = ['traveller', 'travel_date', 'itinerary']
+
+    largest = max(abs(a.amount), abs(b.amount))
+    difference = float(abs(a.amount - b.amount) / largest) if largest else 0.0
+    amount_score = max(0.0, 1 - difference / MAX_AMOUNT_DIFFERENCE)
+    if amount_score:
+        confidence += 0.3 * amount_score
+        reasons.append('amount' if difference == 0 else 'amount_close')
+
+    if a.return_date == b.return_date:
+        confidence += 0.1
+        reasons.append('return_date')
+    if a.booking_date == b.booking_date:
+        confidence += 0.05
+        reasons.append('booking_date')
+    if a.supplier_reference and a.supplier_reference == b.supplier_reference:
+        confidence += 0.05
+        reasons.append('supplier_reference')
+
+    return round(min(confidence, 1.0), 3), reasons
+
+
+def find_pairs(records, new_ids=None, min_confidence=MIN_CONFIDENCE):
+    """
+    Probable duplicates among records ordered by (traveller, travel_date,
+    created_at).
+
+    Args:
+        records: iterable of BookingRecord in that order
+        new_ids: optional set of booking ids; only pairs involving at least
+            one of them are reported
+
+    Yields:
+        (later, earlier, confidence, reasons)
+    """
+    for _, run in groupby(records, key=lambda record: (record.traveller_id, record.travel_date)):
+        buckets = defaultdict(list)
+        for record in run:
+            for band in (record.band - 1, record.band, record.band + 1):
+                for earlier in buckets.get((record.signature, band), ()):
+                    if earlier.reference == record.reference:
+                        continue
+                    if new_ids is not None and record.id not in new_ids and earlier.id not in new_ids:
+                        continue
+                    confidence, reasons = match_score(record, earlier)
+                    if confidence >= min_confidence:
+                        yield record, earlier, confidence, reasons
+            buckets[(record.signature, record.band)].append(record)
+
+
+def _records(bookings):
+    """Stream BookingRecords for the bookings in sweep order (one query)."""
+    first = lambda model: model.objects.filter(booking=OuterRef('pk')).order_by('id')  # noqa: E731
+    rows = (
+        bookings.exclude(status__in=EXCLUDED_STATUSES)
+        .annotate(
+            route=Subquery(
+                first(AirBooking).annotate(
+                    route=Concat(
+                        'origin_airport_iata_code', Value('-'), 'destination_airport_iata_code',
+                        output_field=CharField()
+                    )
+                ).values('route')[:1]
+            ),
+            hotel_city=Subquery(first(AccommodationBooking).values('city')[:1]),
+            car_city=Subquery(first(CarHireBooking).values('pickup_city')[:1]),
+        )
+        .order_by('traveller_id', 'travel_date', 'created_at', 'pk')
+        .values_list(
+            'pk', 'organization_id', 'traveller_id', 'travel_date', 'return_date', 'booking_date',
+            'agent_booking_reference', 'supplier_reference', 'total_amount',
+            'route', 'hotel_city', 'car_city',
+        )
+    )
+    for row in rows.iterator(chunk_size=5000):
+        yield BookingRecord(*row)
+
+
+def _save(candidates):
+    """Insert candidates; pairs already stored keep their review status."""
+    if candidates:
+        DuplicateBookingCandidate.objects.bulk_create(
+            candidates,
+            update_conflicts=True,
+            unique_fields=['booking', 'duplicate_of'],
+            update_fields=['confidence', 'reasons', 'updated_at'],
+        )
+    return len(candidates)
+
+
+def detect_duplicates(bookings=None, batch=None, min_confidence=MIN_CONFIDENCE):
+    """
+    Find probable duplicate bookings and store them as candidates.
+
+    Args:
+        bookings: Booking queryset to scan (default: all bookings)
+        batch: Optional ImportBatch; only that import's bookings are checked,
+            against every booking of the same traveller and travel date
+        min_confidence: Lowest score stored
+
+    Returns:
+        Number of candidate pairs found
+    """
+    if bookings is None:
+        bookings = Booking.objects.all()
+
+    new_ids = None
+    if batch is not None:
+        imported = Booking.objects.filter(import_batch=batch)
+        bookings = bookings.filter(Exists(imported.filter(
+            traveller_id=OuterRef('traveller_id'), travel_date=OuterRef('travel_date')
+        )))
+        new_ids = set(imported.values_list('pk', flat=True))
+        if not new_ids:
+            return 0
+
+    found = 0
+    pending = []
+    for later, earlier, confidence, reasons in find_pairs(_records(bookings), new_ids, min_confidence):
+        pending.append(DuplicateBookingCandidate(
+            organization_id=later.organization_id,
+            booking_id=later.id,
+            duplicate_of_id=earlier.id,
+            confidence=Decimal(str(confidence)),
+            reasons=reasons,
+            import_batch=batch,
+        ))
+        if len(pending) >= BATCH_SIZE:
+            found += _save(pending)
+            pending = []
+    found += _save(pending)
+
+    logger.info(f"Duplicate detection: {found} candidate pairs" + (f" for import batch {batch.pk}" if batch else ""))
+    return found
@@ -0,0 +1,307 @@
+# apps/bookings/identity.py
+"""
+Traveller identity resolution.
+
+Imports identify travellers by employee id, email and name. A
+TravellerIndex holds one organization's travellers in memory under three
+blocking keys:
+
+- normalized employee_id
+- normalized email
+- a phonetic name key (Soundex of the last name + first initial)
+
+Exact keys resolve in O(1). Otherwise only the travellers sharing the
+record's phonetic block are scored, so "Jon Smith" finds "Jonathan Smith"
+without comparing against the whole organization. The same blocks drive
+the merge suggestions offered to admins for duplicates that already exist.
+"""
+
+from collections import defaultdict
+from difflib import SequenceMatcher
+from itertools import combinations
+import re
+import unicodedata
+
+from .models import Traveller
+
+# Fuzzy scores (0-1) at or above this resolve an import row to an existing traveller
+# (only if the first names also agree, see first_names_agree)
+MATCH_THRESHOLD = 0.9
+
+# A fuzzy best match this close to the runner-up is ambiguous and not used
+AMBIGUITY_MARGIN = 0.02
+
+# Pairs of existing travellers at or above this are suggested for merging
+SUGGESTION_THRESHOLD = 0.85
+
+# Penalty when both sides have an email and they differ
+EMAIL_MISMATCH_PENALTY = 0.15
+
+_SOUNDEX_CODES = {
+    letter: digit
+    for digit, letters in {
+        '1': 'BFPV', '2': 'CGJKQSXZ', '3': 'DT', '4': 'L', '5': 'MN', '6': 'R',
+    }.items()
+    for letter in letters
+}
+
+
+# =============================================================================
+# NORMALIZATION & KEYS
+# =============================================================================
+
+def normalize_name(name):
+    """Lowercase ASCII letters and single spaces ('José  O'Brien-Smith' -> 'jose obrien smith')."""
+    text = unicodedata.normalize('NFKD', name or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    text = re.sub(r"['’.]", '', text)
+    text = re.sub(r'[^a-z]+', ' ', text)
+    return text.strip()
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+def normalize_employee_id(employee_id):
+    return (employee_id or '').strip().lower()
+
+
+def soundex(name):
+    """American Soundex code of a name, e.g. 'Smith' and 'Smyth' -> 'S530'."""
+    letters = [char for char in normalize_name(name).upper() if char.isalpha()]
+    if not letters:
+        return ''
+
+    code = letters[0]
+    previous = _SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        digit = _SOUNDEX_CODES.get(letter, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # H and W don't separate letters with the same code
+        if letter not in 'HW':
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def name_key(first_name, last_name):
+    """Phonetic blocking key: Soundex of the last name plus the first initial."""
+    first = normalize_name(first_name)
+    return (soundex(last_name), first[:1])
+
+
+class Identity:
+    """Normalized identifying fields of a traveller or an import record."""
+
+    __slots__ = ['first_name', 'last_name', 'email', 'employee_id', 'key']
+
+    def __init__(self, first_name='', last_name='', email='', employee_id=''):
+        self.first_name = normalize_name(first_name)
+        self.last_name = normalize_name(last_name)
+        self.email = normalize_email(email)
+        self.employee_id = normalize_employee_id(employee_id)
+        self.key = name_key(first_name, last_name)
+
+    @classmethod
+    def of(cls, traveller):
+        return cls(traveller.first_name, traveller.last_name, traveller.email, traveller.employee_id)
+
+    @classmethod
+    def from_values(cls, values):
+        return cls(
+            values.get('first_name'), values.get('last_name'),
+            values.get('email'), values.get('employee_id')
+        )
+
+
+# =============================================================================
+# SCORING
+# =============================================================================
+
+def _first_name_similarity(a, b):
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    shorter, longer = sorted((a, b), key=len)
+    # "jon" / "jonathan", "j" / "jonathan"
+    if longer.startswith(shorter):
+        return 0.9 if len(shorter) > 1 else 0.8
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def first_names_agree(a, b):
+    """
+    Whether two normalized first names can be the same person's: equal,
+    an initial, or a short form ("jon" / "jonathan"). A prefix extended by
+    only one or two letters is usually another name ("daniel" /
+    "danielle", "paul" / "paula") and doesn't agree.
+    """
+    if not a or not b:
+        return False
+    if a == b:
+        return True
+    shorter, longer = sorted((a, b), key=len)
+    return longer.startswith(shorter) and (len(shorter) == 1 or len(longer) - len(shorter) > 2)
+
+
+def match_score(a, b):
+    """
+    Likelihood (0-1) that two identities are the same person.
+
+    Different employee ids never match. A shared employee id or email is
+    a certain match. Otherwise names are compared (last name weighted 0.6,
+    first name 0.4, prefixes and initials count as near matches), less a
+    penalty if the emails differ.
+    """
+    if a.employee_id and b.employee_id:
+        return 1.0 if a.employee_id == b.employee_id else 0.0
+    if a.email and a.email == b.email:
+        return 1.0
+    if not a.last_name or not b.last_name:
+        return 0.0
+
+    score = (
+        0.6 * SequenceMatcher(None, a.last_name, b.last_name).ratio() +
+        0.4 * _first_name_similarity(a.first_name, b.first_name)
+    )
+    if a.email and b.email:
+        score -= EMAIL_MISMATCH_PENALTY
+    return round(max(score, 0.0), 3)
+
+
+# =============================================================================
+# INDEX
+# =============================================================================
+
+class TravellerIndex:
+    """
+    In-memory blocking index over one organization's travellers.
+
+    Usage:
+        index = TravellerIndex.load(organization.id)
+        traveller, score = index.resolve({'first_name': 'Jon', 'last_name': 'Smith'})
+        if traveller is None:
+            traveller = Traveller(organization=organization, ...)
+            index.add(traveller)
+    """
+
+    def __init__(self, travellers=()):
+        self.by_employee_id = {}
+        self.by_email = {}
+        self.blocks = defaultdict(list)
+        self.identities = {}
+        for traveller in travellers:
+            self.add(traveller)
+
+    @classmethod
+    def load(cls, organization_id):
+        """Index every traveller of an organization (one query)."""
+        return cls(Traveller.objects.filter(organization_id=organization_id))
+
+    def __len__(self):
+        return len(self.identities)
+
+    def add(self, traveller):
+        identity = Identity.of(traveller)
+        self.identities[id(traveller)] = (traveller, identity)
+        if identity.employee_id:
+            self.by_employee_id[identity.employee_id] = traveller
+        if identity.email:
+            self.by_email.setdefault(identity.email, traveller)
+        if identity.last_name:
+            self.blocks[identity.key].append(traveller)
+
+    def remove(self, traveller):
+        entry = self.identities.pop(id(traveller), None)
+        if entry is None:
+            return
+        identity = entry[1]
+        if self.by_employee_id.get(identity.employee_id) is traveller:
+            del self.by_employee_id[identity.employee_id]
+        if self.by_email.get(identity.email) is traveller:
+            del self.by_email[identity.email]
+        block = self.blocks.get(identity.key)
+        if block and traveller in block:
+            block.remove(traveller)
+
+    def candidates(self, identity):
+        """Travellers sharing the identity's phonetic block."""
+        return self.blocks.get(identity.key, [])
+
+    def resolve(self, values):
+        """
+        Find the traveller an import record refers to.
+
+        Args:
+            values: dict with any of first_name, last_name, email, employee_id
+
+        A fuzzy match is only considered when the first names agree
+        (first_names_agree): "Daniel" and "Danielle" score high on spelling
+        alone, and attaching one's bookings to the other is worse than a
+        duplicate traveller, which merge_suggestions reports anyway.
+
+        Returns:
+            (traveller, score), or (None, best_score) when nothing scores
+            at least MATCH_THRESHOLD or the best fuzzy match is ambiguous
+        """
+        identity = values if isinstance(values, Identity) else Identity.from_values(values)
+
+        if identity.employee_id:
+            traveller = self.by_employee_id.get(identity.employee_id)
+            if traveller is not None:
+                return traveller, 1.0
+        if identity.email:
+            traveller = self.by_email.get(identity.email)
+            if traveller is not None and match_score(identity, self.identities[id(traveller)][1]):
+                return traveller, 1.0
+
+        best, best_score, runner_up = None, 0.0, 0.0
+        for traveller in self.candidates(identity):
+            candidate = self.identities[id(traveller)][1]
+            if not first_names_agree(identity.first_name, candidate.first_name):
+                continue
+            score = match_score(identity, candidate)
+            if score > best_score:
+                best, best_score, runner_up = traveller, score, best_score
+            elif score > runner_up:
+                runner_up = score
+        # Two "John Smith"s: better to create or reject than to guess
+        if best_score >= MATCH_THRESHOLD and best_score - runner_up >= AMBIGUITY_MARGIN:
+            return best, best_score
+        return None, best_score
+
+    def suggestions(self, min_score=SUGGESTION_THRESHOLD):
+        """Pairs of indexed travellers that are probably the same person, best first."""
+        pairs = []
+        for block in self.blocks.values():
+            for a, b in combinations(block, 2):
+                score = match_score(self.identities[id(a)][1], self.identities[id(b)][1])
+                if score >= min_score:
+                    pairs.append((a, b, score))
+        pairs.sort(key=lambda pair: -pair[2])
+        return pairs
+
+
+def merge_suggestions(travellers, min_score=SUGGESTION_THRESHOLD, limit=100):
+    """
+    Likely duplicate travellers, compared only within each organization.
+
+    Args:
+        travellers: Traveller queryset to look for duplicates in
+
+    Returns:
+        list of (traveller_a, traveller_b, score), best first
+    """
+    by_organization = defaultdict(list)
+    for traveller in travellers.order_by('created_at'):
+        by_organization[traveller.organization_id].append(traveller)
+
+    pairs = []
+    for members in by_organization.values():
+        pairs.extend(TravellerIndex(members).suggestions(min_score))
+    pairs.sort(key=lambda pair: -pair[2])
+    return pairs[:limit]
@@ -0,0 +1,108 @@
+# apps/bookings/locations.py
+"""
+Traveller location timeline for duty of care.
+
+Answering "who is in Melbourne between T1 and T2" by overlapping every
+flight, stay and rental at request time doesn't scale, so the answer is
+materialized: each trip (see trips.py) is walked once and turned into
+presences - the traveller is at a city
+
+- for the length of a stay or rental
+- from a flight's landing until the next item of the trip starts
+- between the end of one item and the start of the next, at the city the
+  earlier one left them in
+
+Presences are cut into TravellerLocation rows, one per traveller, day and
+city, carrying the first and last local time seen there. Time before the
+first flight out and after the flight home is spent at home and not
+recorded.
+"""
+
+from datetime import datetime, time, timedelta
+
+from . import timeline
+from .models import TravellerLocation
+
+DAY_START = time.min
+DAY_END = time(23, 59, 59)
+
+
+def presences(draft):
+    """
+    Yield (city, country, start, end, booking_id) for a TripDraft, start and
+    end being naive local datetimes.
+    """
+    intervals = draft.intervals
+    for position, interval in enumerate(intervals):
+        following = intervals[position + 1] if position + 1 < len(intervals) else None
+
+        if interval.kind == timeline.FLIGHT:
+            if following is None and interval.city == draft.origin_city:
+                # Flown home
+                continue
+        elif interval.kind == timeline.RENTAL and interval.origin_city:
+            # Taken as at the pickup city until the car is dropped off
+            yield interval.origin_city, interval.origin_country, interval.start, interval.end, interval.booking_id
+            yield interval.city, interval.country, interval.end, interval.end, interval.booking_id
+        else:
+            yield interval.city, interval.country, interval.start, interval.end, interval.booking_id
+
+        # On the ground where this item left the traveller until the next one starts
+        until = max(interval.end, following.start) if following is not None else interval.end
+        if interval.kind == timeline.FLIGHT or until > interval.end:
+            yield interval.city, interval.country, interval.end, until, interval.booking_id
+
+
+def to_locations(draft):
+    """Unsaved TravellerLocation rows for a TripDraft, one per (date, city)."""
+    first = draft.intervals[0]
+    days = {}
+    # Airports and rentals don't always carry the country; borrow it from another item in the same city
+    countries = {}
+    for city, country, start, end, booking_id in presences(draft):
+        city = (city or '').strip()
+        if not city:
+            continue
+        if country:
+            countries.setdefault(city.upper(), country)
+        day = start.date()
+        while day <= end.date():
+            first_seen = start.time() if day == start.date() else DAY_START
+            last_seen = end.time() if day == end.date() else DAY_END
+            key = (day, city.upper())
+            row = days.get(key)
+            if row is None:
+                days[key] = TravellerLocation(
+                    organization_id=first.organization_id,
+                    traveller_id=first.traveller_id,
+                    booking_id=booking_id,
+                    date=day,
+                    city=city,
+                    city_key=city.upper(),
+                    first_seen=first_seen,
+                    last_seen=last_seen,
+                )
+            else:
+                row.first_seen = min(row.first_seen, first_seen)
+                row.last_seen = max(row.last_seen, last_seen)
+            day += timedelta(days=1)
+
+    for (_, city_key), row in days.items():
+        row.country = countries.get(city_key, '')
+        row.country_key = row.country.strip().upper()
+    return list(days.values())
+
+
+def parse_moment(value, end=False):
+    """
+    Parse an ISO date or datetime query parameter to a naive local datetime.
+
+    A bare date means the start of that day, or its end when end is True.
+
+    Raises:
+        ValueError: If the value is neither
+    """
+    moment = datetime.fromisoformat(value)
+    if len(value) == 10:
+        moment = datetime.combine(moment.date(), DAY_END if end else DAY_START)
+    return moment.replace(tzinfo=None)
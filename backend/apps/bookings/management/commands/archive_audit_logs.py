@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.bookings import audit, audit_archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Create upcoming monthly audit log partitions, replay spooled entries the '
+        'background writer could not insert, and move months older than the '
+        'retention period to compressed archive files'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.AUDIT_RETENTION_MONTHS,
+                            help=f'Months kept in the database (default {settings.AUDIT_RETENTION_MONTHS})')
+        parser.add_argument('--dry-run', action='store_true', help='List the months that would be archived')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            for month in audit_archive.months_to_archive(options['months']):
+                self.stdout.write(f'Would archive {month:%Y-%m}')
+            return
+
+        for name in audit_archive.ensure_partitions():
+            self.stdout.write(f'Created partition {name}')
+
+        replayed = audit.replay_spool()
+        if replayed:
+            self.stdout.write(f'Replayed {replayed} spooled entries from {audit.spool_dir()}')
+
+        self.stdout.write('Archiving audit logs...')
+        archived = audit_archive.archive(options['months'])
+        for month, rows in archived:
+            self.stdout.write(f'  {month:%Y-%m}: {rows} entries')
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {sum(rows for _, rows in archived)} entries from {len(archived)} months '
+            f'to {audit_archive.archive_dir()}'
+        ))
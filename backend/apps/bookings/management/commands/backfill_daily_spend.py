@@ -0,0 +1,42 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.bookings.models import DailySpendFact
+from apps.organizations.models import Organization
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily_spend_facts rollup from bookings, components and service fees'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', help='Organization code (default: all organizations)')
+        parser.add_argument('--start-date', help='First travel date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end-date', help='Last travel date to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        try:
+            start_date = date.fromisoformat(options['start_date']) if options['start_date'] else None
+            end_date = date.fromisoformat(options['end_date']) if options['end_date'] else None
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+
+        organizations = Organization.objects.all().order_by('code')
+        if options['organization']:
+            organizations = organizations.filter(code=options['organization'])
+            if not organizations.exists():
+                raise CommandError(f"Organization '{options['organization']}' not found")
+
+        self.stdout.write('Rebuilding daily spend facts...')
+
+        total_rows = 0
+        # One organization at a time keeps each transaction (and memory) bounded
+        for organization in organizations:
+            rows = DailySpendFact.rebuild(
+                organization_id=organization.id,
+                start_date=start_date,
+                end_date=end_date
+            )
+            total_rows += rows
+            self.stdout.write(f'  {organization.code}: {rows} fact rows')
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt {total_rows} daily spend fact rows'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from apps.bookings.valuation import build
+
+
+class Command(BaseCommand):
+    help = "Rebuild the components' running transaction balances used for as-of valuation"
+
+    def handle(self, *args, **options):
+        self.stdout.write('Building transaction balances...')
+        written = build()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} balance rows'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.bookings import trips
+from apps.organizations.models import Organization
+
+
+class Command(BaseCommand):
+    help = "Rebuild trips and location timelines from every traveller's flights, stays and rentals"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', help='Organization code (default: all organizations)')
+
+    def handle(self, *args, **options):
+        organization_id = None
+        if options['organization']:
+            organization = Organization.objects.filter(code=options['organization']).first()
+            if organization is None:
+                raise CommandError(f"Organization '{options['organization']}' not found")
+            organization_id = organization.id
+
+        self.stdout.write('Rebuilding trips...')
+        written = trips.rebuild_all(organization_id=organization_id)
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt {written} trips'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.bookings.conflicts import detect_conflicts
+from apps.organizations.models import Organization
+
+
+class Command(BaseCommand):
+    help = 'Flag overlapping hotel stays, car rentals and flights, and car hire starting before the flight lands'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', help='Organization code (default: all organizations)')
+
+    def handle(self, *args, **options):
+        organization_id = None
+        if options['organization']:
+            organization = Organization.objects.filter(code=options['organization']).first()
+            if organization is None:
+                raise CommandError(f"Organization '{options['organization']}' not found")
+            organization_id = organization.pk
+
+        self.stdout.write('Detecting booking conflicts...')
+        found = detect_conflicts(organization_id=organization_id)
+        self.stdout.write(self.style.SUCCESS(f'Found {found} conflicts'))
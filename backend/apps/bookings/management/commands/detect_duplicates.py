@@ -0,0 +1,36 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.bookings.duplicates import MIN_CONFIDENCE, detect_duplicates
+from apps.bookings.models import Booking
+from apps.imports.models import ImportBatch
+from apps.organizations.models import Organization
+
+
+class Command(BaseCommand):
+    help = 'Flag probable duplicate bookings (same trip under different agent booking references)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', help='Organization code (default: all organizations)')
+        parser.add_argument('--batch', help='Only check the bookings of this ImportBatch id')
+        parser.add_argument('--min-confidence', type=float, default=MIN_CONFIDENCE,
+                            help=f'Lowest confidence stored (default {MIN_CONFIDENCE})')
+
+    def handle(self, *args, **options):
+        bookings = Booking.objects.all()
+        if options['organization']:
+            organization = Organization.objects.filter(code=options['organization']).first()
+            if organization is None:
+                raise CommandError(f"Organization '{options['organization']}' not found")
+            bookings = bookings.filter(organization=organization)
+
+        batch = None
+        if options['batch']:
+            try:
+                batch = ImportBatch.objects.get(pk=options['batch'])
+            except (ImportBatch.DoesNotExist, ValidationError):
+                raise CommandError(f"Import batch '{options['batch']}' not found")
+
+        self.stdout.write('Detecting duplicate bookings...')
+        found = detect_duplicates(bookings, batch=batch, min_confidence=options['min_confidence'])
+        self.stdout.write(self.style.SUCCESS(f'Found {found} probable duplicate pairs'))
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.bookings import analytics
+from apps.bookings.models import AccommodationBooking, CarHireBooking
+from apps.reference_data.models import CarRentalCompany, HotelChain
+from apps.reference_data.suppliers import SupplierMatcher
+
+
+class Command(BaseCommand):
+    help = 'Link hotel stays and car rentals to their canonical HotelChain / CarRentalCompany'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Re-match every row, not only rows without a supplier reference '
+                 '(use after changing supplier names or alternative names)'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Report matches without saving')
+
+    def handle(self, *args, **options):
+        targets = [
+            (AccommodationBooking, 'hotel_chain', 'hotel_chain_ref', HotelChain),
+            (CarHireBooking, 'rental_company', 'rental_company_ref', CarRentalCompany),
+        ]
+        self.stdout.write('Normalizing supplier names...')
+        for model, name_field, ref_field, supplier_model in targets:
+            self.normalize(model, name_field, ref_field, supplier_model, options)
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run - no changes saved'))
+        else:
+            # QuerySet.update() sends no signals: drop the cached supplier groupings here
+            analytics.invalidate_cache()
+            self.stdout.write(self.style.SUCCESS('Supplier references updated'))
+
+    def normalize(self, model, name_field, ref_field, supplier_model, options):
+        matcher = SupplierMatcher.load(supplier_model)
+        rows = model.objects.exclude(**{name_field: ''})
+        if not options['all']:
+            rows = rows.filter(**{f'{ref_field}__isnull': True})
+
+        # Each distinct string is matched once and written with one UPDATE
+        names = rows.order_by().values_list(name_field, flat=True).distinct()
+        matches = matcher.match_many(names)
+
+        updated = 0
+        unmatched = 0
+        with transaction.atomic():
+            for name, supplier in matches.items():
+                if supplier is None:
+                    unmatched += 1
+                    if not options['all']:
+                        continue
+                if options['dry_run']:
+                    continue
+                updated += (
+                    rows.filter(**{name_field: name})
+                    .exclude(**{f'{ref_field}_id': supplier.pk if supplier else None})
+                    .update(**{ref_field: supplier})
+                )
+
+        label = model._meta.verbose_name_plural
+        self.stdout.write(
+            f'  {label}: {len(matches)} distinct names, {len(matches) - unmatched} matched, '
+            f'{unmatched} unmatched, {updated} rows updated'
+        )
+        if options['verbosity'] > 1:
+            for name, supplier in sorted(matches.items()):
+                self.stdout.write(f'    {name!r} -> {supplier or "-"}')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from apps.bookings.transactions import rebuild_totals
+
+
+class Command(BaseCommand):
+    help = "Recompute the components' transaction totals from their BookingTransactions"
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding transaction totals...')
+        for model_name, count in rebuild_totals().items():
+            self.stdout.write(f'  {model_name}: {count} rows')
+        self.stdout.write(self.style.SUCCESS('Transaction totals rebuilt'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.bookings.models import AirBooking
+from apps.organizations.models import Organization
+
+
+class Command(BaseCommand):
+    help = 'Recalculate AirBooking.potential_savings in bulk using a preloaded exchange rate table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', help='Organization code (default: all organizations)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk update')
+
+    def handle(self, *args, **options):
+        queryset = AirBooking.objects.all()
+        if options['organization']:
+            organization = Organization.objects.filter(code=options['organization']).first()
+            if organization is None:
+                raise CommandError(f"Organization '{options['organization']}' not found")
+            queryset = queryset.filter(booking__organization=organization)
+
+        self.stdout.write('Recalculating potential savings...')
+
+        result = AirBooking.recalculate_potential_savings(queryset, batch_size=options['batch_size'])
+
+        self.stdout.write(
+            f"  checked {result['checked']}, skipped {result['skipped']} (no lowest fare rate)"
+        )
+        self.stdout.write(self.style.SUCCESS(f"Successfully updated {result['updated']} air bookings"))
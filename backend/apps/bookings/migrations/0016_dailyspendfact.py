@@ -0,0 +1,109 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("organizations", "0003_organization_home_country_and_more"),
+        ("bookings", "0015_alter_booking_total_amount"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySpendFact",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("cost_center", models.CharField(blank=True, max_length=100)),
+                ("department", models.CharField(blank=True, max_length=100)),
+                (
+                    "product_type",
+                    models.CharField(
+                        choices=[
+                            ("AIR", "Air"),
+                            ("HOTEL", "Accommodation"),
+                            ("CAR", "Car Hire"),
+                            ("FEE", "Service Fee"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("currency", models.CharField(max_length=3)),
+                ("status", models.CharField(default="CONFIRMED", max_length=20)),
+                (
+                    "spend",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "item_count",
+                    models.IntegerField(
+                        default=0,
+                        help_text="Number of components (tickets, stays, rentals, fees)",
+                    ),
+                ),
+                ("nights", models.IntegerField(default=0)),
+                ("days", models.IntegerField(default=0)),
+                (
+                    "emissions_kg",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "savings",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        help_text="Potential (lost) savings from air bookings",
+                        max_digits=14,
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "organization",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_spend_facts",
+                        to="organizations.organization",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "daily_spend_facts",
+                "ordering": ["date"],
+                "indexes": [
+                    models.Index(
+                        fields=["organization", "date"],
+                        name="daily_spend_organiz_3f0e02_idx",
+                    ),
+                    models.Index(
+                        fields=["organization", "cost_center", "date"],
+                        name="daily_spend_organiz_ceddd6_idx",
+                    ),
+                    models.Index(
+                        fields=["organization", "product_type", "date"],
+                        name="daily_spend_organiz_18e507_idx",
+                    ),
+                ],
+                "unique_together": {
+                    (
+                        "organization",
+                        "date",
+                        "cost_center",
+                        "department",
+                        "product_type",
+                        "currency",
+                        "status",
+                    )
+                },
+            },
+        ),
+    ]
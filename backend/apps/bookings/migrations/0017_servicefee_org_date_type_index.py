@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bookings", "0016_dailyspendfact"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="servicefee",
+            index=models.Index(
+                fields=["organization", "fee_date", "fee_type"],
+                name="service_fee_organiz_884b0c_idx",
+            ),
+        ),
+    ]
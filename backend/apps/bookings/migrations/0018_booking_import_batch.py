@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("imports", "0002_importbatch_chunks_processed"),
+        ("bookings", "0017_servicefee_org_date_type_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="booking",
+            name="import_batch",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="bookings",
+                to="imports.importbatch",
+            ),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bookings", "0018_booking_import_batch"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="accommodationbooking",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                help_text="Hash of the imported values, used to skip unchanged re-imports",
+                max_length=64,
+            ),
+        ),
+        migrations.AddField(
+            model_name="airbooking",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                help_text="Hash of the imported values, used to skip unchanged re-imports",
+                max_length=64,
+            ),
+        ),
+        migrations.AddField(
+            model_name="booking",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                help_text="Hash of the imported values, used to skip unchanged re-imports",
+                max_length=64,
+            ),
+        ),
+        migrations.AddField(
+            model_name="carhirebooking",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                help_text="Hash of the imported values, used to skip unchanged re-imports",
+                max_length=64,
+            ),
+        ),
+        migrations.AddField(
+            model_name="servicefee",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                help_text="Hash of the imported values, used to skip unchanged re-imports",
+                max_length=64,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["organization", "agent_booking_reference"],
+                name="bookings_organiz_1be516_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bookings", "0019_content_hash"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="traveller",
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name="traveller",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("employee_id", ""), _negated=True),
+                fields=("organization", "employee_id"),
+                name="unique_traveller_employee_id",
+            ),
+        ),
+    ]
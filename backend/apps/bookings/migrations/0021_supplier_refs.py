@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("reference_data", "0004_alter_carrentalcompany_options_and_more"),
+        ("bookings", "0020_traveller_employee_id_constraint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="accommodationbooking",
+            name="hotel_chain_ref",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Canonical chain matched from hotel_chain (see reference_data.suppliers)",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="bookings",
+                to="reference_data.hotelchain",
+                verbose_name="Hotel Chain Reference",
+            ),
+        ),
+        migrations.AddField(
+            model_name="carhirebooking",
+            name="rental_company_ref",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Canonical company matched from rental_company (see reference_data.suppliers)",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="bookings",
+                to="reference_data.carrentalcompany",
+                verbose_name="Rental Company Reference",
+            ),
+        ),
+    ]
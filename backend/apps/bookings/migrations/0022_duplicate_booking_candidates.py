@@ -0,0 +1,114 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("imports", "0003_import_batch_errors"),
+        ("organizations", "0003_organization_home_country_and_more"),
+        ("bookings", "0021_supplier_refs"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DuplicateBookingCandidate",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "confidence",
+                    models.DecimalField(
+                        decimal_places=3,
+                        help_text="Likelihood (0-1) that the bookings are the same trip",
+                        max_digits=4,
+                    ),
+                ),
+                (
+                    "reasons",
+                    models.JSONField(
+                        blank=True, default=list, help_text="Which fields matched"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("OPEN", "Open"),
+                            ("CONFIRMED", "Confirmed Duplicate"),
+                            ("DISMISSED", "Not a Duplicate"),
+                        ],
+                        default="OPEN",
+                        max_length=20,
+                    ),
+                ),
+                ("detected_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "booking",
+                    models.ForeignKey(
+                        help_text="The later booking - the probable duplicate",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="duplicate_candidates",
+                        to="bookings.booking",
+                    ),
+                ),
+                (
+                    "duplicate_of",
+                    models.ForeignKey(
+                        help_text="The earlier booking it appears to duplicate",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="duplicated_by",
+                        to="bookings.booking",
+                    ),
+                ),
+                (
+                    "import_batch",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Import whose rows this pair was found for",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="duplicate_candidates",
+                        to="imports.importbatch",
+                    ),
+                ),
+                (
+                    "organization",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="duplicate_booking_candidates",
+                        to="organizations.organization",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "duplicate_booking_candidates",
+                "ordering": ["-confidence", "-detected_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["organization", "status"],
+                        name="duplicate_b_organiz_556c9b_idx",
+                    ),
+                    models.Index(
+                        fields=["import_batch"], name="duplicate_b_import__1d6e9b_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="duplicatebookingcandidate",
+            constraint=models.UniqueConstraint(
+                fields=("booking", "duplicate_of"), name="unique_duplicate_candidate"
+            ),
+        ),
+    ]
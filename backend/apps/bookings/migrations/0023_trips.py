@@ -0,0 +1,130 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("organizations", "0003_organization_home_country_and_more"),
+        ("bookings", "0022_duplicate_booking_candidates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Trip",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("start_date", models.DateField()),
+                ("end_date", models.DateField()),
+                (
+                    "duration_days",
+                    models.IntegerField(
+                        help_text="Calendar days from start to end, inclusive"
+                    ),
+                ),
+                (
+                    "origin_city",
+                    models.CharField(
+                        blank=True,
+                        help_text="Departure city of the first flight",
+                        max_length=100,
+                    ),
+                ),
+                (
+                    "destination_city",
+                    models.CharField(
+                        blank=True,
+                        help_text="City with the most nights (else the first flight's destination)",
+                        max_length=100,
+                    ),
+                ),
+                ("destination_country", models.CharField(blank=True, max_length=100)),
+                ("flight_count", models.IntegerField(default=0)),
+                ("nights", models.IntegerField(default=0)),
+                ("rental_days", models.IntegerField(default=0)),
+                (
+                    "air_spend",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "hotel_spend",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "car_spend",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "total_spend",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "total_carbon_kg",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                ("built_at", models.DateTimeField(auto_now=True)),
+                (
+                    "bookings",
+                    models.ManyToManyField(
+                        blank=True, related_name="trips", to="bookings.booking"
+                    ),
+                ),
+                (
+                    "organization",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="trips",
+                        to="organizations.organization",
+                    ),
+                ),
+                (
+                    "traveller",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="trips",
+                        to="bookings.traveller",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "trips",
+                "ordering": ["-start_date"],
+                "indexes": [
+                    models.Index(
+                        fields=["organization", "start_date"],
+                        name="trips_organiz_242593_idx",
+                    ),
+                    models.Index(
+                        fields=["traveller", "start_date"],
+                        name="trips_travell_b5734c_idx",
+                    ),
+                    models.Index(
+                        fields=["organization", "total_spend"],
+                        name="trips_organiz_0e7f9a_idx",
+                    ),
+                    models.Index(
+                        fields=["organization", "duration_days"],
+                        name="trips_organiz_4c56d8_idx",
+                    ),
+                    models.Index(
+                        fields=["organization", "total_carbon_kg"],
+                        name="trips_organiz_39aa1e_idx",
+                    ),
+                    models.Index(
+                        fields=["organization", "destination_city"],
+                        name="trips_organiz_f91cc3_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("organizations", "0003_organization_home_country_and_more"),
+        ("bookings", "0023_trips"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TravellerLocation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("city", models.CharField(max_length=100)),
+                ("country", models.CharField(blank=True, max_length=100)),
+                (
+                    "city_key",
+                    models.CharField(
+                        help_text="Upper-cased city for lookups", max_length=100
+                    ),
+                ),
+                (
+                    "country_key",
+                    models.CharField(
+                        blank=True,
+                        help_text="Upper-cased country for lookups",
+                        max_length=100,
+                    ),
+                ),
+                (
+                    "first_seen",
+                    models.TimeField(
+                        help_text="Local time the traveller arrives (00:00 if already there)"
+                    ),
+                ),
+                (
+                    "last_seen",
+                    models.TimeField(
+                        help_text="Local time the traveller leaves (23:59:59 if staying on)"
+                    ),
+                ),
+                (
+                    "booking",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Booking that puts the traveller there",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="traveller_locations",
+                        to="bookings.booking",
+                    ),
+                ),
+                (
+                    "organization",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="traveller_locations",
+                        to="organizations.organization",
+                    ),
+                ),
+                (
+                    "traveller",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="locations",
+                        to="bookings.traveller",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "traveller_locations",
+                "ordering": ["traveller", "date", "first_seen"],
+                "indexes": [
+                    models.Index(
+                        fields=["city_key", "date"],
+                        name="traveller_l_city_ke_31a42d_idx",
+                    ),
+                    models.Index(
+                        fields=["country_key", "date"],
+                        name="traveller_l_country_46d8b5_idx",
+                    ),
+                    models.Index(
+                        fields=["traveller", "date"],
+                        name="traveller_l_travell_62d15e_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,142 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("imports", "0003_import_batch_errors"),
+        ("organizations", "0003_organization_home_country_and_more"),
+        ("bookings", "0024_traveller_locations"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookingConflict",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "conflict_type",
+                    models.CharField(
+                        choices=[
+                            ("OVERLAPPING_STAYS", "Overlapping Hotel Stays"),
+                            ("OVERLAPPING_RENTALS", "Overlapping Car Rentals"),
+                            ("OVERLAPPING_FLIGHTS", "Overlapping Flights"),
+                            (
+                                "RENTAL_BEFORE_ARRIVAL",
+                                "Car Hire Starts Before Flight Lands",
+                            ),
+                        ],
+                        max_length=30,
+                    ),
+                ),
+                ("component_id", models.UUIDField()),
+                ("conflicting_component_id", models.UUIDField()),
+                ("overlap_start_date", models.DateField()),
+                ("overlap_hours", models.DecimalField(decimal_places=2, max_digits=8)),
+                (
+                    "wasted_amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        help_text="Share of the later item's cost falling inside the overlap",
+                        max_digits=12,
+                    ),
+                ),
+                ("description", models.CharField(blank=True, max_length=255)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("OPEN", "Open"),
+                            ("CONFIRMED", "Confirmed"),
+                            ("DISMISSED", "Dismissed"),
+                        ],
+                        default="OPEN",
+                        max_length=20,
+                    ),
+                ),
+                ("detected_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "booking",
+                    models.ForeignKey(
+                        help_text="Booking of the later-starting item",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="conflicts",
+                        to="bookings.booking",
+                    ),
+                ),
+                (
+                    "conflicting_booking",
+                    models.ForeignKey(
+                        help_text="Booking of the earlier item it overlaps",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="conflicted_by",
+                        to="bookings.booking",
+                    ),
+                ),
+                (
+                    "import_batch",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Import during which this conflict was first found",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="booking_conflicts",
+                        to="imports.importbatch",
+                    ),
+                ),
+                (
+                    "organization",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="booking_conflicts",
+                        to="organizations.organization",
+                    ),
+                ),
+                (
+                    "traveller",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="booking_conflicts",
+                        to="bookings.traveller",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "booking_conflicts",
+                "ordering": ["-overlap_start_date", "traveller"],
+                "indexes": [
+                    models.Index(
+                        fields=["organization", "status"],
+                        name="booking_con_organiz_46b820_idx",
+                    ),
+                    models.Index(
+                        fields=["organization", "overlap_start_date"],
+                        name="booking_con_organiz_8bb6ec_idx",
+                    ),
+                    models.Index(
+                        fields=["traveller"], name="booking_con_travell_37b3fa_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="bookingconflict",
+            constraint=models.UniqueConstraint(
+                fields=("conflict_type", "component_id", "conflicting_component_id"),
+                name="unique_booking_conflict",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:22
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bookings", "0025_booking_conflicts"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="bookingauditlog",
+            name="timestamp",
+            field=models.DateTimeField(
+                db_index=True,
+                default=django.utils.timezone.now,
+                help_text="When this action occurred",
+            ),
+        ),
+    ]
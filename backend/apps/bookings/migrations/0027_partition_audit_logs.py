@@ -0,0 +1,96 @@
+# Converts booking_audit_logs to a table partitioned by month on PostgreSQL.
+# Other databases keep the single table (see apps/bookings/audit_archive.py).
+
+from datetime import date, datetime
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+TABLE = "booking_audit_logs"
+
+# Partitions created ahead of the current month
+MONTHS_AHEAD = 3
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def bound(month):
+    return timezone.make_aware(datetime.combine(month, datetime.min.time())).isoformat()
+
+
+def partition(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s",
+            [TABLE],
+        )
+        if cursor.fetchone():
+            return
+
+        # Indexes and foreign keys to recreate on the partitioned table
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+            [TABLE, f"{TABLE}_pkey"],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', \"timestamp\" AT TIME ZONE %s) FROM {TABLE}",
+            [settings.TIME_ZONE],
+        )
+        months = {row[0].date() for row in cursor.fetchall()}
+        today = timezone.localdate()
+        this_month = date(today.year, today.month, 1)
+        months.update(add_months(this_month, offset) for offset in range(MONTHS_AHEAD + 1))
+
+        old = f"{TABLE}_unpartitioned"
+        for name, _ in indexes:
+            cursor.execute(f"DROP INDEX {name}")
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {old}")
+        cursor.execute(f"ALTER TABLE {old} RENAME CONSTRAINT {TABLE}_pkey TO {old}_pkey")
+
+        # The partition key has to be part of the primary key
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f'PARTITION BY RANGE ("timestamp")'
+        )
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, "timestamp")')
+        for _, definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}")
+
+        cursor.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+        for month in sorted(months):
+            cursor.execute(
+                f"CREATE TABLE {TABLE}_p{month:%Y%m} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{bound(month)}') TO ('{bound(add_months(month, 1))}')"
+            )
+
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {old}")
+        cursor.execute(f"DROP TABLE {old}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bookings", "0026_audit_log_timestamp_default"),
+    ]
+
+    operations = [
+        # A partitioned table serves the unpartitioned model state as is
+        migrations.RunPython(partition, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,134 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:29
+
+from django.db import migrations, models
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_totals(apps, schema_editor):
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    BookingTransaction = apps.get_model("bookings", "BookingTransaction")
+    zero = Value(0, output_field=DecimalField(max_digits=12, decimal_places=2))
+
+    for model_name in [
+        "AirBooking",
+        "AccommodationBooking",
+        "CarHireBooking",
+        "ServiceFee",
+    ]:
+        content_type = ContentType.objects.filter(
+            app_label="bookings", model=model_name.lower()
+        ).first()
+        if content_type is None:
+            continue
+        counted = (
+            BookingTransaction.objects.filter(
+                content_type=content_type, object_id=OuterRef("pk")
+            )
+            .exclude(status="CANCELLED")
+            .order_by()
+            .values("object_id")
+        )
+        apps.get_model("bookings", model_name).objects.update(
+            transaction_total=Coalesce(
+                Subquery(counted.annotate(total=Sum("total_amount")).values("total")),
+                zero,
+            ),
+            transaction_total_base=Coalesce(
+                Subquery(
+                    counted.annotate(total=Sum("total_amount_base")).values("total")
+                ),
+                zero,
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bookings", "0027_partition_audit_logs"),
+        ("contenttypes", "0002_remove_content_type_name"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="accommodationbooking",
+            name="transaction_total",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                help_text="Net of the transactions in their own currency",
+                max_digits=12,
+            ),
+        ),
+        migrations.AddField(
+            model_name="accommodationbooking",
+            name="transaction_total_base",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                help_text="Net of the transactions in organization base currency",
+                max_digits=12,
+            ),
+        ),
+        migrations.AddField(
+            model_name="airbooking",
+            name="transaction_total",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                help_text="Net of the transactions in their own currency",
+                max_digits=12,
+            ),
+        ),
+        migrations.AddField(
+            model_name="airbooking",
+            name="transaction_total_base",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                help_text="Net of the transactions in organization base currency",
+                max_digits=12,
+            ),
+        ),
+        migrations.AddField(
+            model_name="carhirebooking",
+            name="transaction_total",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                help_text="Net of the transactions in their own currency",
+                max_digits=12,
+            ),
+        ),
+        migrations.AddField(
+            model_name="carhirebooking",
+            name="transaction_total_base",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                help_text="Net of the transactions in organization base currency",
+                max_digits=12,
+            ),
+        ),
+        migrations.AddField(
+            model_name="servicefee",
+            name="transaction_total",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                help_text="Net of the transactions in their own currency",
+                max_digits=12,
+            ),
+        ),
+        migrations.AddField(
+            model_name="servicefee",
+            name="transaction_total_base",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                help_text="Net of the transactions in organization base currency",
+                max_digits=12,
+            ),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("organizations", "0003_organization_home_country_and_more"),
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("bookings", "0028_component_transaction_totals"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TransactionBalance",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("object_id", models.UUIDField()),
+                (
+                    "product_type",
+                    models.CharField(
+                        choices=[
+                            ("AIR", "Air"),
+                            ("HOTEL", "Accommodation"),
+                            ("CAR", "Car Hire"),
+                            ("FEE", "Service Fee"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("balance_date", models.DateField()),
+                (
+                    "valid_until",
+                    models.DateField(
+                        blank=True,
+                        help_text="Next day with transactions; the balance holds until the day before",
+                        null=True,
+                    ),
+                ),
+                (
+                    "running_total",
+                    models.DecimalField(
+                        decimal_places=2,
+                        help_text="Net of the transactions so far, in their own currency",
+                        max_digits=14,
+                    ),
+                ),
+                (
+                    "running_total_base",
+                    models.DecimalField(
+                        decimal_places=2,
+                        help_text="Net of the transactions so far in organization base currency",
+                        max_digits=14,
+                    ),
+                ),
+                ("transaction_count", models.IntegerField(default=0)),
+                (
+                    "booking",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="transaction_balances",
+                        to="bookings.booking",
+                    ),
+                ),
+                (
+                    "content_type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="contenttypes.contenttype",
+                    ),
+                ),
+                (
+                    "organization",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="transaction_balances",
+                        to="organizations.organization",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "transaction_balances",
+                "ordering": ["balance_date"],
+                "indexes": [
+                    models.Index(
+                        fields=["organization", "balance_date", "valid_until"],
+                        name="transaction_organiz_1269af_idx",
+                    ),
+                    models.Index(
+                        fields=["booking", "balance_date"],
+                        name="transaction_booking_1f0ca2_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="transactionbalance",
+            constraint=models.UniqueConstraint(
+                fields=("content_type", "object_id", "balance_date"),
+                name="unique_transaction_balance",
+            ),
+        ),
+    ]
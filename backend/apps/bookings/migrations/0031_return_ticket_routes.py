@@ -0,0 +1,71 @@
+# Return tickets were imported with the last segment's destination as the
+# route destination (SYD -> SYD). Point them at the turnaround airport, as
+# BookingImporter.route_destination() now does.
+
+from math import atan2, cos, radians, sin, sqrt
+
+from django.db import migrations
+from django.db.models import F
+
+
+def distance_km(a, b):
+    if a is None or b is None or None in (a[0], a[1], b[0], b[1]):
+        return None
+    lat1, lon1, lat2, lon2 = map(lambda value: radians(float(value)), (*a, *b))
+    h = (
+        sin((lat2 - lat1) / 2) ** 2
+        + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    )
+    return 6371 * 2 * atan2(sqrt(h), sqrt(1 - h))
+
+
+def fix_routes(apps, schema_editor):
+    AirBooking = apps.get_model("bookings", "AirBooking")
+    AirSegment = apps.get_model("bookings", "AirSegment")
+    Airport = apps.get_model("reference_data", "Airport")
+
+    tickets = AirBooking.objects.filter(
+        origin_airport_iata_code=F("destination_airport_iata_code")
+    ).values_list("pk", "origin_airport_iata_code")
+    tickets = dict(tickets)
+    if not tickets:
+        return
+
+    coordinates = {
+        code: (latitude, longitude)
+        for code, latitude, longitude in Airport.objects.values_list(
+            "iata_code", "latitude", "longitude"
+        )
+    }
+    arrivals = {}
+    for air_booking_id, arrival in (
+        AirSegment.objects.filter(air_booking_id__in=tickets)
+        .order_by("air_booking_id", "segment_number")
+        .values_list("air_booking_id", "destination_airport_iata_code")
+    ):
+        arrivals.setdefault(air_booking_id, []).append(arrival)
+
+    for pk, origin in tickets.items():
+        turnaround, furthest = None, None
+        for arrival in arrivals.get(pk, [])[:-1]:
+            distance = distance_km(coordinates.get(origin), coordinates.get(arrival))
+            if distance is not None and (furthest is None or distance > furthest):
+                turnaround, furthest = arrival, distance
+        if turnaround is None and arrivals.get(pk):
+            turnaround = arrivals[pk][0]
+        if turnaround is None or turnaround == origin:
+            continue
+        AirBooking.objects.filter(pk=pk).update(
+            destination_airport_iata_code=turnaround
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bookings", "0029_transaction_balances"),
+        ("reference_data", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(fix_routes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:58
+
+from django.db import migrations, models
+from django.db.models.functions import Lower
+import django.db.models.functions.text
+
+
+def release_duplicate_emails(apps, schema_editor):
+    """
+    Blank the email of every traveller without an employee id that shares
+    it (case-insensitively) with an earlier one of the same organization,
+    so the constraint can be added. The travellers are kept and reported
+    for merging.
+    """
+    Traveller = apps.get_model("bookings", "Traveller")
+    travellers = (
+        Traveller.objects.filter(employee_id="")
+        .exclude(email="")
+        .annotate(email_key=Lower("email"))
+        .order_by("organization_id", "email_key", "created_at", "id")
+        .values_list("id", "organization_id", "email_key", "email")
+    )
+    seen = set()
+    released = []
+    for pk, organization_id, email_key, email in travellers.iterator():
+        key = (organization_id, email_key)
+        if key in seen:
+            released.append((pk, email))
+        else:
+            seen.add(key)
+    if not released:
+        return
+    Traveller.objects.filter(pk__in=[pk for pk, _ in released]).update(email="")
+    print(
+        f"\n  Blanked the email of {len(released)} duplicate traveller(s) without an employee id; "
+        f"merge them into the traveller keeping the email:"
+    )
+    for pk, email in released:
+        print(f"    {pk} {email}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bookings", "0031_return_ticket_routes"),
+    ]
+
+    operations = [
+        migrations.RunPython(release_duplicate_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="traveller",
+            constraint=models.UniqueConstraint(
+                models.F("organization"),
+                django.db.models.functions.text.Lower("email"),
+                condition=models.Q(
+                    ("employee_id", ""), models.Q(("email", ""), _negated=True)
+                ),
+                name="unique_traveller_email",
+            ),
+        ),
+    ]
@@ -2,11 +2,15 @@
 # CORRECTED MODEL - Session 26 + Session 34 (Phase 1 enhancements)
 
 from apps.users.models import User
-from django.db import models
-from django.contrib.contenttypes.fields import GenericForeignKey
+from django.db import models, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, Lower
+from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
 from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
+from django.utils import timezone
+from collections import defaultdict
 from decimal import Decimal
 import uuid
 import json
@@ -58,7 +62,20 @@ class Traveller(models.Model):
             models.Index(fields=['organization', 'last_name', 'first_name']),
             models.Index(fields=['organization', 'is_active']),
         ]
-        unique_together = [['organization', 'employee_id']]
+        constraints = [
+            # Employee ids are optional: only non-blank ones must be unique
+            models.UniqueConstraint(
+                fields=['organization', 'employee_id'],
+                condition=~models.Q(employee_id=''),
+                name='unique_traveller_employee_id'
+            ),
+            # Without an employee id the email identifies the traveller (imports resolve by it)
+            models.UniqueConstraint(
+                'organization', Lower('email'),
+                condition=models.Q(employee_id='') & ~models.Q(email=''),
+                name='unique_traveller_email'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -179,6 +196,12 @@ class Booking(models.Model):
     policy_compliant = models.BooleanField(default=True)
     advance_booking_days = models.IntegerField(null=True, blank=True)
     
+    # Import tracking
+    import_batch = models.ForeignKey('imports.ImportBatch', on_delete=models.SET_NULL,
+                                     null=True, blank=True, related_name='bookings')
+    content_hash = models.CharField(max_length=64, blank=True,
+                                    help_text="Hash of the imported values, used to skip unchanged re-imports")
+    
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -190,6 +213,7 @@ class Booking(models.Model):
             models.Index(fields=['organization', 'travel_date']),
             models.Index(fields=['traveller', 'travel_date']),
             models.Index(fields=['agent_booking_reference']),
+            models.Index(fields=['organization', 'agent_booking_reference']),
             models.Index(fields=['status']),
         ]
     
@@ -273,7 +297,8 @@ class AirBooking(models.Model):
     primary_airline_iata_code = models.CharField(max_length=3, blank=True)
     primary_airline_name = models.CharField(max_length=100, blank=True)
     
-    # Route (summary - from first segment origin to last segment destination)
+    # Route (summary - from first segment origin to last segment destination, or the
+    # turnaround point of a return)
     origin_airport_iata_code = models.CharField(max_length=3)
     destination_airport_iata_code = models.CharField(max_length=3)
     
@@ -309,6 +334,18 @@ class AirBooking(models.Model):
         help_text="Amount that could have been saved if lowest fare was used"
     )
     
+    # Import tracking
+    content_hash = models.CharField(max_length=64, blank=True,
+                                    help_text="Hash of the imported values, used to skip unchanged re-imports")
+
+    # Net of the component's BookingTransactions, maintained by deltas (see transactions.py)
+    # (the transactions relation cascades: deleting the component deletes its ledger)
+    transaction_total = models.DecimalField(max_digits=12, decimal_places=2, default=0,
+                                            help_text="Net of the transactions in their own currency")
+    transaction_total_base = models.DecimalField(max_digits=12, decimal_places=2, default=0,
+                                                 help_text="Net of the transactions in organization base currency")
+    transactions = GenericRelation('BookingTransaction', related_query_name='air_booking')
+    
     class Meta:
         db_table = 'air_bookings'
         indexes = [
@@ -340,10 +377,14 @@ class AirBooking(models.Model):
         
         return round(total, 2)
     
-    def calculate_potential_savings(self):
+    def calculate_potential_savings(self, rates=None):
         """
         Calculate potential savings if lowest fare was used instead
         
+        Args:
+            rates: Optional preloaded ExchangeRateTable (batch recalculation);
+                defaults to CurrencyExchangeRate.get_rate lookups
+        
         Returns:
             Decimal: Savings amount in base currency, or None if can't calculate
         """
@@ -354,15 +395,16 @@ class AirBooking(models.Model):
             from apps.reference_data.models import CurrencyExchangeRate
             
             # Convert lowest fare to booking currency if needed
-            if self.lowest_fare_currency != self.booking.currency:
-                rate = CurrencyExchangeRate.get_rate(
-                    from_currency=self.lowest_fare_currency,
+            lowest_fare_currency = self.lowest_fare_currency or self.booking.currency
+            if lowest_fare_currency != self.booking.currency:
+                rate = (rates or CurrencyExchangeRate).get_rate(
+                    from_currency=lowest_fare_currency,
                     to_currency=self.booking.currency,
                     date=self.booking.booking_date
                 )
                 if rate is None:
                     logger.warning(
-                        f"No exchange rate found for {self.lowest_fare_currency} to "
+                        f"No exchange rate found for {lowest_fare_currency} to "
                         f"{self.booking.currency} on {self.booking.booking_date}"
                     )
                     return None
@@ -384,6 +426,86 @@ class AirBooking(models.Model):
         except Exception as e:
             logger.error(f"Error calculating potential savings: {e}")
             return None
+
+    @classmethod
+    def recalculate_potential_savings(cls, queryset=None, batch_size=1000):
+        """
+        Recalculate potential_savings for many air bookings at once.
+        
+        Exchange rates are preloaded into an ExchangeRateTable and changed
+        rows are written with bulk_update, so the cost is a handful of
+        queries per batch instead of several per booking. Daily spend facts
+        for the affected organisations/days are refreshed afterwards.
+        
+        Args:
+            queryset: AirBooking queryset to recalculate (default: all with a
+                lowest fare)
+            batch_size: Rows loaded and written per batch
+        
+        Returns:
+            dict: {'checked': n, 'updated': n, 'skipped': n}
+        """
+        from apps.reference_data.rates import ExchangeRateTable
+        from .analytics import invalidate_cache
+        
+        if queryset is None:
+            queryset = cls.objects.all()
+        
+        checked = updated = skipped = 0
+        changed = []
+        dirty_days = defaultdict(set)
+        
+        # Savings of tickets whose lowest fare was removed no longer apply
+        stale = queryset.exclude(lowest_fare_available__gt=0).exclude(potential_savings=0)
+        for organization_id, travel_date in (
+            stale.values_list('booking__organization_id', 'booking__travel_date').distinct()
+        ):
+            dirty_days[organization_id].add(travel_date)
+        updated += stale.update(potential_savings=Decimal('0.00'))
+        
+        queryset = (
+            queryset.filter(lowest_fare_available__gt=0)
+            .select_related('booking')
+            .only(
+                'id', 'lowest_fare_available', 'lowest_fare_currency', 'potential_savings',
+                'booking__id', 'booking__organization_id', 'booking__agent_booking_reference',
+                'booking__base_fare', 'booking__currency', 'booking__booking_date',
+                'booking__travel_date',
+            )
+            .order_by('pk')
+        )
+        
+        currencies = set(queryset.values_list('lowest_fare_currency', flat=True).distinct())
+        currencies |= set(queryset.values_list('booking__currency', flat=True).distinct())
+        rates = ExchangeRateTable.load(currencies=currencies - {''})
+        
+        def flush():
+            cls.objects.bulk_update(changed, ['potential_savings'], batch_size=batch_size)
+            changed.clear()
+        
+        for air in queryset.iterator(chunk_size=batch_size):
+            checked += 1
+            savings = air.calculate_potential_savings(rates=rates)
+            if savings is None:
+                skipped += 1
+                continue
+            if savings != air.potential_savings:
+                air.potential_savings = savings
+                changed.append(air)
+                dirty_days[air.booking.organization_id].add(air.booking.travel_date)
+                updated += 1
+                if len(changed) >= batch_size:
+                    flush()
+        
+        if changed:
+            flush()
+        
+        for organization_id, dates in dirty_days.items():
+            DailySpendFact.refresh(organization_id, dates)
+        if dirty_days:
+            invalidate_cache()
+        
+        return {'checked': checked, 'updated': updated, 'skipped': skipped}
     
     def save(self, *args, **kwargs):
         """
@@ -434,6 +556,10 @@ class AirBooking(models.Model):
                     logger.info(f"Updated savings for {self.booking.agent_booking_reference}: {calculated_savings}")
             except Exception as e:
                 logger.error(f"Error calculating potential savings: {e}")
+        elif self.potential_savings:
+            # Lowest fare removed - its savings no longer apply
+            self.potential_savings = Decimal('0.00')
+            AirBooking.objects.filter(pk=self.pk).update(potential_savings=self.potential_savings)
         
         # ==================================================================
         # SESSION 45: Update parent Booking total_amount
@@ -518,17 +644,27 @@ class AirSegment(models.Model):
             logger.warning(f"Airport not found: {self.destination_airport_iata_code}")
             return None
     
-    def calculate_distance(self):
+    def calculate_distance(self, airports=None):
         """
         Calculate great circle distance between origin and destination airports.
         Returns distance in kilometers.
+        
+        Args:
+            airports: Optional {iata_code: Airport} map (bulk imports);
+                defaults to looking the airports up
         """
         try:
             from math import radians, sin, cos, sqrt, atan2
             
             # Use ForeignKey relationships directly
-            origin_airport = self.origin_airport
-            dest_airport = self.destination_airport
+            if airports is not None:
+                origin_airport = airports.get(self.origin_airport_iata_code)
+                dest_airport = airports.get(self.destination_airport_iata_code)
+                if origin_airport is None or dest_airport is None:
+                    return None
+            else:
+                origin_airport = self.origin_airport
+                dest_airport = self.destination_airport
             
             if not all([origin_airport.latitude, origin_airport.longitude,
                        dest_airport.latitude, dest_airport.longitude]):
@@ -555,7 +691,7 @@ class AirSegment(models.Model):
             logger.error(f"Error calculating distance: {e}")
             return None
     
-    def calculate_carbon_emissions(self):
+    def calculate_carbon_emissions(self, airports=None):
         """
         Calculate CO2 emissions based on ICAO standards.
         
@@ -569,9 +705,12 @@ class AirSegment(models.Model):
         - Premium Economy: 1.5x
         - Business: 2.0x
         - First: 2.5x
+        
+        Args:
+            airports: Optional {iata_code: Airport} map, see calculate_distance()
         """
         if not self.distance_km:
-            distance = self.calculate_distance()
+            distance = self.calculate_distance(airports)
             if distance:
                 self.distance_km = distance
             else:
@@ -620,6 +759,21 @@ class AirSegment(models.Model):
         super().save(*args, **kwargs)
 
 
+def _match_supplier(instance, text_field, ref_field, supplier_model):
+    """
+    Point a component's canonical supplier ref at the supplier matching its
+    free-text name when the name is new or edited, or the ref is still
+    unset. A ref changed by hand in the same edit is kept.
+    """
+    stored_text, stored_ref = getattr(instance, '_stored_supplier', (None, None))
+    text = getattr(instance, text_field)
+    ref_id = getattr(instance, f'{ref_field}_id')
+    if ref_id != stored_ref or (ref_id and text == stored_text):
+        return
+    from apps.reference_data.suppliers import matcher
+    setattr(instance, ref_field, matcher(supplier_model).match(text) if text else None)
+
+
 # ============================================================================
 # ACCOMMODATION MODELS
 # ============================================================================
@@ -645,6 +799,15 @@ class AccommodationBooking(models.Model):
     # Hotel details
     hotel_name = models.CharField(max_length=200)
     hotel_chain = models.CharField(max_length=100, blank=True)
+    hotel_chain_ref = models.ForeignKey(
+        'reference_data.HotelChain',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='bookings',
+        verbose_name="Hotel Chain Reference",
+        help_text="Canonical chain matched from hotel_chain (see reference_data.suppliers)"
+    )
     
     # Location
     city = models.CharField(max_length=100)
@@ -666,6 +829,18 @@ class AccommodationBooking(models.Model):
     gst_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     total_amount_base = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     
+    # Import tracking
+    content_hash = models.CharField(max_length=64, blank=True,
+                                    help_text="Hash of the imported values, used to skip unchanged re-imports")
+
+    # Net of the component's BookingTransactions, maintained by deltas (see transactions.py)
+    # (the transactions relation cascades: deleting the component deletes its ledger)
+    transaction_total = models.DecimalField(max_digits=12, decimal_places=2, default=0,
+                                            help_text="Net of the transactions in their own currency")
+    transaction_total_base = models.DecimalField(max_digits=12, decimal_places=2, default=0,
+                                                 help_text="Net of the transactions in organization base currency")
+    transactions = GenericRelation('BookingTransaction', related_query_name='accommodation_booking')
+    
     class Meta:
         db_table = 'accommodation_bookings'
         indexes = [
@@ -677,14 +852,25 @@ class AccommodationBooking(models.Model):
     def __str__(self):
         return f"{self.booking.agent_booking_reference} - {self.hotel_name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored supplier text and ref, so save() can tell an edited name
+        instance._stored_supplier = (instance.__dict__.get('hotel_chain'), instance.__dict__.get('hotel_chain_ref_id'))
+        return instance
+
     # ==================================================================
     # SESSION 34 ENHANCEMENTS: Automatic Currency Conversion
     # ==================================================================
 
-    def convert_to_base_currency(self):
+    def convert_to_base_currency(self, rates=None):
         """
         Convert nightly rate and total to organization's base currency
         
+        Args:
+            rates: Optional preloaded ExchangeRateTable (bulk imports);
+                defaults to CurrencyExchangeRate.get_rate lookups
+        
         Updates:
         - nightly_rate_base
         - total_amount_base
@@ -702,7 +888,7 @@ class AccommodationBooking(models.Model):
             # Get exchange rate
             from apps.reference_data.models import CurrencyExchangeRate
             
-            rate = CurrencyExchangeRate.get_rate(
+            rate = (rates or CurrencyExchangeRate).get_rate(
                 from_currency=self.currency,
                 to_currency=base_currency,
                 date=self.check_in_date
@@ -739,9 +925,13 @@ class AccommodationBooking(models.Model):
         """
         # Calculate base currency amounts
         self.convert_to_base_currency()
+
+        from apps.reference_data.models import HotelChain
+        _match_supplier(self, 'hotel_chain', 'hotel_chain_ref', HotelChain)
         
         # Save with converted values
         super().save(*args, **kwargs)
+        self._stored_supplier = (self.hotel_chain, self.hotel_chain_ref_id)
         
         # ==================================================================
         # SESSION 45: Update parent Booking total_amount
@@ -783,6 +973,15 @@ class CarHireBooking(models.Model):
     
     # Rental company
     rental_company = models.CharField(max_length=100)
+    rental_company_ref = models.ForeignKey(
+        'reference_data.CarRentalCompany',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='bookings',
+        verbose_name="Rental Company Reference",
+        help_text="Canonical company matched from rental_company (see reference_data.suppliers)"
+    )
     
     # Vehicle
     vehicle_type = models.CharField(max_length=100, blank=True)  # Compact, SUV, etc.
@@ -814,6 +1013,18 @@ class CarHireBooking(models.Model):
     gst_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     total_amount_base = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     
+    # Import tracking
+    content_hash = models.CharField(max_length=64, blank=True,
+                                    help_text="Hash of the imported values, used to skip unchanged re-imports")
+
+    # Net of the component's BookingTransactions, maintained by deltas (see transactions.py)
+    # (the transactions relation cascades: deleting the component deletes its ledger)
+    transaction_total = models.DecimalField(max_digits=12, decimal_places=2, default=0,
+                                            help_text="Net of the transactions in their own currency")
+    transaction_total_base = models.DecimalField(max_digits=12, decimal_places=2, default=0,
+                                                 help_text="Net of the transactions in organization base currency")
+    transactions = GenericRelation('BookingTransaction', related_query_name='car_hire_booking')
+    
     class Meta:
         db_table = 'car_hire_bookings'
         indexes = [
@@ -825,14 +1036,25 @@ class CarHireBooking(models.Model):
     def __str__(self):
         return f"{self.booking.agent_booking_reference} - {self.rental_company}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored supplier text and ref, so save() can tell an edited name
+        instance._stored_supplier = (instance.__dict__.get('rental_company'), instance.__dict__.get('rental_company_ref_id'))
+        return instance
+
     # ==================================================================
     # SESSION 34 ENHANCEMENTS: Automatic Currency Conversion
     # ==================================================================
 
-    def convert_to_base_currency(self):
+    def convert_to_base_currency(self, rates=None):
         """
         Convert daily rate and total to organization's base currency
         
+        Args:
+            rates: Optional preloaded ExchangeRateTable (bulk imports);
+                defaults to CurrencyExchangeRate.get_rate lookups
+        
         Updates:
         - daily_rate_base
         - total_amount_base
@@ -850,7 +1072,7 @@ class CarHireBooking(models.Model):
             # Get exchange rate
             from apps.reference_data.models import CurrencyExchangeRate
             
-            rate = CurrencyExchangeRate.get_rate(
+            rate = (rates or CurrencyExchangeRate).get_rate(
                 from_currency=self.currency,
                 to_currency=base_currency,
                 date=self.pickup_date
@@ -887,9 +1109,13 @@ class CarHireBooking(models.Model):
         """
         # Calculate base currency amounts
         self.convert_to_base_currency()
+
+        from apps.reference_data.models import CarRentalCompany
+        _match_supplier(self, 'rental_company', 'rental_company_ref', CarRentalCompany)
         
         # Save with converted values
         super().save(*args, **kwargs)
+        self._stored_supplier = (self.rental_company, self.rental_company_ref_id)
         
         # ==================================================================
         # SESSION 45: Update parent Booking total_amount
@@ -966,6 +1192,10 @@ class ServiceFee(models.Model):
         ('CONSULTATION', 'Consultation Fee'),
         ('OTHER', 'Other Fee'),
     ]
+
+    # Booking fee types used to measure online adoption
+    ONLINE_FEE_TYPES = ['BOOKING_ONLINE_DOM', 'BOOKING_ONLINE_INTL']
+    OFFLINE_FEE_TYPES = ['BOOKING_OFFLINE_DOM', 'BOOKING_OFFLINE_INTL']
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     
@@ -989,6 +1219,16 @@ class ServiceFee(models.Model):
     # Import tracking
     import_batch = models.ForeignKey('imports.ImportBatch', on_delete=models.SET_NULL, 
                                      null=True, blank=True, related_name='service_fees')
+    content_hash = models.CharField(max_length=64, blank=True,
+                                    help_text="Hash of the imported values, used to skip unchanged re-imports")
+
+    # Net of the component's BookingTransactions, maintained by deltas (see transactions.py)
+    # (the transactions relation cascades: deleting the component deletes its ledger)
+    transaction_total = models.DecimalField(max_digits=12, decimal_places=2, default=0,
+                                            help_text="Net of the transactions in their own currency")
+    transaction_total_base = models.DecimalField(max_digits=12, decimal_places=2, default=0,
+                                                 help_text="Net of the transactions in organization base currency")
+    transactions = GenericRelation('BookingTransaction', related_query_name='service_fee')
     
     # Metadata
     description = models.TextField(blank=True)
@@ -999,6 +1239,7 @@ class ServiceFee(models.Model):
         db_table = 'service_fees'
         indexes = [
             models.Index(fields=['organization', 'fee_date']),
+            models.Index(fields=['organization', 'fee_date', 'fee_type']),
             models.Index(fields=['booking']),
             models.Index(fields=['fee_type']),
         ]
@@ -1062,6 +1303,12 @@ class BookingTransaction(models.Model):
         ('REFUNDED', 'Refunded'),
     ]
     
+    # Statuses left out of the components' transaction totals
+    UNCOUNTED_STATUSES = ['CANCELLED']
+    
+    # Fields contribution() reads
+    CONTRIBUTION_FIELDS = {'content_type_id', 'object_id', 'status', 'total_amount', 'total_amount_base'}
+    
     # =============================================================================
     # IDENTIFICATION
     # =============================================================================
@@ -1263,25 +1510,68 @@ class BookingTransaction(models.Model):
         
         return f"{self.get_transaction_type_display()} - {amount_display} - {self.transaction_date}"
     
+    def contribution(self):
+        """
+        What this transaction adds to its component's totals:
+        (content_type_id, object_id, total_amount, total_amount_base), or
+        None for uncounted statuses.
+        """
+        if self.status in self.UNCOUNTED_STATUSES or self.total_amount is None:
+            return None
+        return (
+            self.content_type_id,
+            self.object_id,
+            self.total_amount,
+            self.total_amount_base or Decimal('0.00'),
+        )
+    
     def save(self, *args, **kwargs):
         """
-        Auto-calculate total_amount and convert to base currency on save.
-        Uses .update() to avoid infinite recursion.
+        Auto-calculate total_amount and the base currency amounts, then save
+        them in one statement. The component's totals are adjusted in the
+        same transaction (see signals).
         """
         # Calculate total if not already set
         if self.total_amount is None or self.total_amount == 0:
             self.total_amount = self.base_amount + self.taxes + self.fees
         
-        # Save first to get the ID
-        super().save(*args, **kwargs)
-        
-        # Convert to base currency if needed
         self.convert_to_base_currency()
+        
+        with transaction.atomic():
+            self._lock_stored_contribution()
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            self._lock_stored_contribution()
+            return super().delete(*args, **kwargs)
+    
+    def _lock_stored_contribution(self):
+        """
+        Lock the stored row and read what it adds to its component's totals,
+        so the signals apply the difference from the row actually replaced -
+        not from a copy loaded earlier, which a concurrent save may have
+        changed since.
+        """
+        if self._state.adding:
+            self._stored_contribution = None
+            return
+        stored = (
+            BookingTransaction.objects.select_for_update()
+            .filter(pk=self.pk)
+            .only(*self.CONTRIBUTION_FIELDS)
+            .first()
+        )
+        self._stored_contribution = stored.contribution() if stored else None
     
-    def convert_to_base_currency(self):
+    def convert_to_base_currency(self, rates=None):
         """
         Convert transaction amounts to organization's base currency.
-        Gets the base currency from the booking's organization.
+        Gets the base currency from the booking component's organization.
+        
+        Args:
+            rates: Optional preloaded ExchangeRateTable (bulk ingestion);
+                defaults to CurrencyExchangeRate.get_rate lookups
         """
         # Import here to avoid circular imports
         from apps.reference_data.models import CurrencyExchangeRate
@@ -1291,10 +1581,9 @@ class BookingTransaction(models.Model):
         if not booking_component:
             return
         
-        # Get the parent Booking to access organization
         try:
-            parent_booking = booking_component.booking
-            org = parent_booking.organization
+            # Service fees carry their organization, other components reach it through the booking
+            org = getattr(booking_component, 'organization', None) or booking_component.booking.organization
             base_currency = org.base_currency
         except AttributeError:
             # Couldn't find organization, skip conversion
@@ -1302,40 +1591,30 @@ class BookingTransaction(models.Model):
         
         # If already in base currency, just copy values
         if self.currency == base_currency:
-            BookingTransaction.objects.filter(pk=self.pk).update(
-                base_amount_base=self.base_amount,
-                taxes_base=self.taxes,
-                fees_base=self.fees,
-                total_amount_base=self.total_amount,
-                exchange_rate=Decimal('1.000000')
+            rate = Decimal('1.000000')
+        else:
+            rate = (rates or CurrencyExchangeRate).get_rate(
+                from_currency=self.currency,
+                to_currency=base_currency,
+                date=self.transaction_date
             )
-            return
-        
-        # Get exchange rate
-        rate = CurrencyExchangeRate.get_rate(
-            from_currency=self.currency,
-            to_currency=base_currency,
-            date=self.transaction_date
-        )
         
         if rate is None:
             # No rate found, log warning and use 1:1 fallback
-            import logging
-            logger = logging.getLogger(__name__)
             logger.warning(
                 f"No exchange rate found for {self.currency} to {base_currency} "
                 f"on {self.transaction_date}. Using 1:1 rate."
             )
             rate = Decimal('1.0')
         
-        # Convert all amounts
-        BookingTransaction.objects.filter(pk=self.pk).update(
-            base_amount_base=self.base_amount * rate,
-            taxes_base=self.taxes * rate,
-            fees_base=self.fees * rate,
-            total_amount_base=self.total_amount * rate,
-            exchange_rate=rate
-        )
+        # Rounded as stored, so totals adjusted from these values match the row
+        rate = Decimal(str(rate))
+        cent = Decimal('0.01')
+        self.base_amount_base = (Decimal(str(self.base_amount)) * rate).quantize(cent)
+        self.taxes_base = (Decimal(str(self.taxes)) * rate).quantize(cent)
+        self.fees_base = (Decimal(str(self.fees)) * rate).quantize(cent)
+        self.total_amount_base = (Decimal(str(self.total_amount)) * rate).quantize(cent)
+        self.exchange_rate = rate.quantize(Decimal('0.000001'))
     
     @property
     def is_refund(self):
@@ -1429,8 +1708,9 @@ class BookingAuditLog(models.Model):
         help_text="Type of action performed"
     )
     
+    # Set when the entry is recorded, not when the batched writer inserts it
     timestamp = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
         db_index=True,
         help_text="When this action occurred"
     )
@@ -1644,6 +1924,625 @@ class BookingAuditLog(models.Model):
             user=user
         )
 
+# =============================================================================
+# DAILY SPEND ROLLUP (FACT TABLE)
+# =============================================================================
+
+class DailySpendFact(models.Model):
+    """
+    Pre-aggregated daily spend per organization, cost centre and product.
+
+    One row per (organization, date, cost_center, department, product_type,
+    currency, status). Dashboards, budgets and trend endpoints read this table
+    so their cost scales with the number of days rather than the number of
+    bookings.
+
+    - date is the parent booking's travel_date (fee_date for service fees not
+      attached to a booking), matching the travel_date filters used elsewhere
+    - currency is the currency the spend is expressed in: air fares and fees
+      in their own currency, hotel and car hire in the organization's base
+      currency (same amounts Booking.calculate_total_amount() sums)
+    - status is the parent booking status, so budgets can restrict to
+      CONFIRMED while dashboards include everything
+
+    Maintained incrementally by signals (see signals.py) and rebuilt in bulk
+    with: python manage.py backfill_daily_spend
+    """
+
+    PRODUCT_TYPES = [
+        ('AIR', 'Air'),
+        ('HOTEL', 'Accommodation'),
+        ('CAR', 'Car Hire'),
+        ('FEE', 'Service Fee'),
+    ]
+
+    organization = models.ForeignKey(
+        'organizations.Organization',
+        on_delete=models.CASCADE,
+        related_name='daily_spend_facts'
+    )
+    date = models.DateField()
+
+    # Reporting dimensions (copied from the traveller at aggregation time)
+    cost_center = models.CharField(max_length=100, blank=True)
+    department = models.CharField(max_length=100, blank=True)
+    product_type = models.CharField(max_length=10, choices=PRODUCT_TYPES)
+    currency = models.CharField(max_length=3)
+    status = models.CharField(max_length=20, default='CONFIRMED')
+
+    # Measures
+    spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    item_count = models.IntegerField(
+        default=0,
+        help_text="Number of components (tickets, stays, rentals, fees)"
+    )
+    nights = models.IntegerField(default=0)
+    days = models.IntegerField(default=0)
+    emissions_kg = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    savings = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        help_text="Potential (lost) savings from air bookings"
+    )
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'daily_spend_facts'
+        unique_together = [[
+            'organization', 'date', 'cost_center', 'department',
+            'product_type', 'currency', 'status'
+        ]]
+        indexes = [
+            models.Index(fields=['organization', 'date']),
+            models.Index(fields=['organization', 'cost_center', 'date']),
+            models.Index(fields=['organization', 'product_type', 'date']),
+        ]
+        ordering = ['date']
+
+    def __str__(self):
+        return f"{self.organization_id} {self.date} {self.product_type} {self.currency} {self.spend}"
+
+    # =============================================================================
+    # AGGREGATION
+    # =============================================================================
+
+    @classmethod
+    def refresh(cls, organization_id, dates):
+        """
+        Recompute the fact rows for one organization on the given dates.
+
+        Used by the incremental signal handlers: only the (organization, day)
+        cells touched by a change are rebuilt.
+        """
+        dates = sorted({d for d in dates if d is not None})
+        if not dates:
+            return 0
+
+        created = 0
+        with transaction.atomic():
+            # Chunk to keep IN (...) lists small for big backfills
+            for i in range(0, len(dates), 500):
+                chunk = dates[i:i + 500]
+                cls.objects.filter(organization_id=organization_id, date__in=chunk).delete()
+                rows = cls.build_rows(organization_id=organization_id, dates=chunk)
+                cls.objects.bulk_create(rows, batch_size=1000)
+                created += len(rows)
+        return created
+
+    @classmethod
+    def rebuild(cls, organization_id=None, start_date=None, end_date=None):
+        """
+        Rebuild all fact rows for an organization (or every organization)
+        within an optional date range. Used by the backfill command.
+        """
+        existing = cls.objects.all()
+        if organization_id:
+            existing = existing.filter(organization_id=organization_id)
+        if start_date:
+            existing = existing.filter(date__gte=start_date)
+        if end_date:
+            existing = existing.filter(date__lte=end_date)
+
+        with transaction.atomic():
+            existing.delete()
+            rows = cls.build_rows(
+                organization_id=organization_id,
+                start_date=start_date,
+                end_date=end_date
+            )
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+    @classmethod
+    def build_rows(cls, organization_id=None, dates=None, start_date=None, end_date=None):
+        """
+        Aggregate booking components into unsaved DailySpendFact instances.
+
+        Runs one grouped query per component type (plus one for segment
+        emissions) and merges the results in memory.
+        """
+        def booking_filters(prefix):
+            lookups = {}
+            if organization_id:
+                lookups[f'{prefix}organization_id'] = organization_id
+            if dates is not None:
+                lookups[f'{prefix}travel_date__in'] = dates
+            if start_date:
+                lookups[f'{prefix}travel_date__gte'] = start_date
+            if end_date:
+                lookups[f'{prefix}travel_date__lte'] = end_date
+            return lookups
+
+        def dimensions(prefix, currency):
+            return {
+                'fact_org': F(f'{prefix}organization_id'),
+                'fact_date': F(f'{prefix}travel_date'),
+                'fact_cost_center': F(f'{prefix}traveller__cost_center'),
+                'fact_department': F(f'{prefix}traveller__department'),
+                'fact_currency': currency,
+                'fact_status': F(f'{prefix}status'),
+            }
+
+        facts = {}
+
+        def add(product_type, row, **measures):
+            key = (
+                row['fact_org'], row['fact_date'],
+                row['fact_cost_center'] or '', row['fact_department'] or '',
+                product_type, row['fact_currency'] or '', row['fact_status'] or '',
+            )
+            fact = facts.get(key)
+            if fact is None:
+                fact = facts[key] = cls(
+                    organization_id=key[0], date=key[1], cost_center=key[2],
+                    department=key[3], product_type=key[4], currency=key[5],
+                    status=key[6],
+                )
+            for field, value in measures.items():
+                setattr(fact, field, getattr(fact, field) + (value or 0))
+
+        # Air tickets
+        air_rows = (
+            AirBooking.objects
+            .filter(**booking_filters('booking__'))
+            .values(**dimensions('booking__', F('currency')))
+            .annotate(
+                spend=Sum('total_fare'),
+                items=Count('id'),
+                savings=Sum('potential_savings'),
+            )
+            .order_by()
+        )
+        for row in air_rows:
+            add('AIR', row, spend=row['spend'], item_count=row['items'], savings=row['savings'])
+
+        # Air emissions come from segments (total_carbon_kg is not always populated)
+        segment_rows = (
+            AirSegment.objects
+            .filter(**booking_filters('air_booking__booking__'))
+            .values(**dimensions('air_booking__booking__', F('air_booking__currency')))
+            .annotate(emissions=Sum('carbon_emissions_kg'))
+            .order_by()
+        )
+        for row in segment_rows:
+            add('AIR', row, emissions_kg=row['emissions'])
+
+        # Hotel stays (base currency amounts)
+        hotel_rows = (
+            AccommodationBooking.objects
+            .filter(**booking_filters('booking__'))
+            .values(**dimensions('booking__', F('booking__organization__base_currency')))
+            .annotate(
+                spend=Sum('total_amount_base'),
+                items=Count('id'),
+                nights=Sum('number_of_nights'),
+            )
+            .order_by()
+        )
+        for row in hotel_rows:
+            add('HOTEL', row, spend=row['spend'], item_count=row['items'], nights=row['nights'])
+
+        # Car hire (base currency amounts)
+        car_rows = (
+            CarHireBooking.objects
+            .filter(**booking_filters('booking__'))
+            .values(**dimensions('booking__', F('booking__organization__base_currency')))
+            .annotate(
+                spend=Sum('total_amount_base'),
+                items=Count('id'),
+                days=Sum('number_of_days'),
+            )
+            .order_by()
+        )
+        for row in car_rows:
+            add('CAR', row, spend=row['spend'], item_count=row['items'], days=row['days'])
+
+        # Service fees - may exist without a parent booking
+        fees = ServiceFee.objects.annotate(
+            fact_date=Coalesce('booking__travel_date', 'fee_date'),
+        )
+        if organization_id:
+            fees = fees.filter(organization_id=organization_id)
+        if dates is not None:
+            fees = fees.filter(fact_date__in=dates)
+        if start_date:
+            fees = fees.filter(fact_date__gte=start_date)
+        if end_date:
+            fees = fees.filter(fact_date__lte=end_date)
+        fee_rows = (
+            fees
+            .values(
+                'fact_date',
+                fact_org=F('organization_id'),
+                fact_cost_center=Coalesce(
+                    'traveller__cost_center', 'booking__traveller__cost_center', Value('')
+                ),
+                fact_department=Coalesce(
+                    'traveller__department', 'booking__traveller__department', Value('')
+                ),
+                fact_currency=F('currency'),
+                fact_status=Coalesce('booking__status', Value('CONFIRMED')),
+            )
+            .annotate(spend=Sum('fee_amount'), items=Count('id'))
+            .order_by()
+        )
+        for row in fee_rows:
+            add('FEE', row, spend=row['spend'], item_count=row['items'])
+
+        return list(facts.values())
+
+
+# =============================================================================
+# DUPLICATE BOOKING DETECTION
+# =============================================================================
+
+class DuplicateBookingCandidate(models.Model):
+    """
+    A pair of bookings that probably describe the same trip under different
+    agent_booking_reference values. Found by apps.bookings.duplicates; the
+    later booking is `booking`, the one it duplicates is `duplicate_of`.
+    """
+    STATUS_CHOICES = [
+        ('OPEN', 'Open'),
+        ('CONFIRMED', 'Confirmed Duplicate'),
+        ('DISMISSED', 'Not a Duplicate'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    organization = models.ForeignKey(
+        'organizations.Organization',
+        on_delete=models.CASCADE,
+        related_name='duplicate_booking_candidates'
+    )
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name='duplicate_candidates',
+        help_text="The later booking - the probable duplicate"
+    )
+    duplicate_of = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name='duplicated_by',
+        help_text="The earlier booking it appears to duplicate"
+    )
+
+    # Match
+    confidence = models.DecimalField(max_digits=4, decimal_places=3,
+                                     help_text="Likelihood (0-1) that the bookings are the same trip")
+    reasons = models.JSONField(default=list, blank=True, help_text="Which fields matched")
+
+    # Review
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='OPEN')
+
+    # Import tracking
+    import_batch = models.ForeignKey('imports.ImportBatch', on_delete=models.SET_NULL,
+                                     null=True, blank=True, related_name='duplicate_candidates',
+                                     help_text="Import whose rows this pair was found for")
+
+    # Metadata
+    detected_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'duplicate_booking_candidates'
+        ordering = ['-confidence', '-detected_at']
+        constraints = [
+            models.UniqueConstraint(fields=['booking', 'duplicate_of'], name='unique_duplicate_candidate'),
+        ]
+        indexes = [
+            models.Index(fields=['organization', 'status']),
+            models.Index(fields=['import_batch']),
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.booking.agent_booking_reference} duplicates "
+            f"{self.duplicate_of.agent_booking_reference} ({self.confidence})"
+        )
+
+
+# =============================================================================
+# TRIPS
+# =============================================================================
+
+class Trip(models.Model):
+    """
+    One journey of a traveller - the flight out, the stays and rentals, the
+    flight back - reconstructed from their bookings by apps.bookings.trips.
+
+    Derived data: rebuilt per traveller whenever their bookings change, so
+    never edit trips directly.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    organization = models.ForeignKey(
+        'organizations.Organization',
+        on_delete=models.CASCADE,
+        related_name='trips'
+    )
+    traveller = models.ForeignKey(Traveller, on_delete=models.CASCADE, related_name='trips')
+    bookings = models.ManyToManyField(Booking, related_name='trips', blank=True)
+
+    # Dates
+    start_date = models.DateField()
+    end_date = models.DateField()
+    duration_days = models.IntegerField(help_text="Calendar days from start to end, inclusive")
+
+    # Places
+    origin_city = models.CharField(max_length=100, blank=True,
+                                   help_text="Departure city of the first flight")
+    destination_city = models.CharField(max_length=100, blank=True,
+                                        help_text="City with the most nights (else the first flight's destination)")
+    destination_country = models.CharField(max_length=100, blank=True)
+
+    # Components
+    flight_count = models.IntegerField(default=0)
+    nights = models.IntegerField(default=0)
+    rental_days = models.IntegerField(default=0)
+
+    # Spend (air fares as booked, hotel and car hire in base currency) and carbon
+    air_spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    hotel_spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    car_spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_carbon_kg = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    # Metadata
+    built_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'trips'
+        ordering = ['-start_date']
+        indexes = [
+            models.Index(fields=['organization', 'start_date']),
+            models.Index(fields=['traveller', 'start_date']),
+            models.Index(fields=['organization', 'total_spend']),
+            models.Index(fields=['organization', 'duration_days']),
+            models.Index(fields=['organization', 'total_carbon_kg']),
+            models.Index(fields=['organization', 'destination_city']),
+        ]
+
+    def __str__(self):
+        return f"{self.traveller} {self.origin_city or '?'} -> {self.destination_city or '?'} ({self.start_date})"
+
+
+class TravellerLocation(models.Model):
+    """
+    Where a traveller is on one day: one row per (traveller, date, city),
+    materialized from the trip timeline by apps.bookings.locations.
+
+    first_seen / last_seen are local times at that city (the times stored on
+    the bookings), so "who is in Melbourne between 09:00 and 17:00 on the
+    4th" is an indexed range read on (city_key, date).
+
+    Derived data, rebuilt together with the traveller's trips.
+    """
+    organization = models.ForeignKey(
+        'organizations.Organization',
+        on_delete=models.CASCADE,
+        related_name='traveller_locations'
+    )
+    traveller = models.ForeignKey(Traveller, on_delete=models.CASCADE, related_name='locations')
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='traveller_locations',
+        help_text="Booking that puts the traveller there"
+    )
+    date = models.DateField()
+
+    city = models.CharField(max_length=100)
+    country = models.CharField(max_length=100, blank=True)
+    city_key = models.CharField(max_length=100, help_text="Upper-cased city for lookups")
+    country_key = models.CharField(max_length=100, blank=True, help_text="Upper-cased country for lookups")
+
+    first_seen = models.TimeField(help_text="Local time the traveller arrives (00:00 if already there)")
+    last_seen = models.TimeField(help_text="Local time the traveller leaves (23:59:59 if staying on)")
+
+    class Meta:
+        db_table = 'traveller_locations'
+        ordering = ['traveller', 'date', 'first_seen']
+        indexes = [
+            models.Index(fields=['city_key', 'date']),
+            models.Index(fields=['country_key', 'date']),
+            models.Index(fields=['traveller', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.traveller} in {self.city} on {self.date}"
+
+
+# =============================================================================
+# BOOKING CONFLICTS
+# =============================================================================
+
+class BookingConflict(models.Model):
+    """
+    Two items of a traveller's timeline that can't both be used: overlapping
+    hotel stays, car rentals or flights, or a car picked up while the
+    traveller is still in the air. Found by apps.bookings.conflicts; `booking`
+    holds the later-starting item, `conflicting_booking` the earlier one.
+    """
+    CONFLICT_TYPES = [
+        ('OVERLAPPING_STAYS', 'Overlapping Hotel Stays'),
+        ('OVERLAPPING_RENTALS', 'Overlapping Car Rentals'),
+        ('OVERLAPPING_FLIGHTS', 'Overlapping Flights'),
+        ('RENTAL_BEFORE_ARRIVAL', 'Car Hire Starts Before Flight Lands'),
+    ]
+
+    STATUS_CHOICES = [
+        ('OPEN', 'Open'),
+        ('CONFIRMED', 'Confirmed'),
+        ('DISMISSED', 'Dismissed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    organization = models.ForeignKey(
+        'organizations.Organization',
+        on_delete=models.CASCADE,
+        related_name='booking_conflicts'
+    )
+    traveller = models.ForeignKey(Traveller, on_delete=models.CASCADE, related_name='booking_conflicts')
+    conflict_type = models.CharField(max_length=30, choices=CONFLICT_TYPES)
+
+    # The two items (AirSegment, AccommodationBooking or CarHireBooking ids)
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name='conflicts',
+        help_text="Booking of the later-starting item"
+    )
+    component_id = models.UUIDField()
+    conflicting_booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name='conflicted_by',
+        help_text="Booking of the earlier item it overlaps"
+    )
+    conflicting_component_id = models.UUIDField()
+
+    # Overlap (local time at the place)
+    overlap_start_date = models.DateField()
+    overlap_hours = models.DecimalField(max_digits=8, decimal_places=2)
+    wasted_amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        help_text="Share of the later item's cost falling inside the overlap"
+    )
+    description = models.CharField(max_length=255, blank=True)
+
+    # Review
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='OPEN')
+
+    # Import tracking
+    import_batch = models.ForeignKey('imports.ImportBatch', on_delete=models.SET_NULL,
+                                     null=True, blank=True, related_name='booking_conflicts',
+                                     help_text="Import during which this conflict was first found")
+
+    # Metadata
+    detected_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'booking_conflicts'
+        ordering = ['-overlap_start_date', 'traveller']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['conflict_type', 'component_id', 'conflicting_component_id'],
+                name='unique_booking_conflict'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['organization', 'status']),
+            models.Index(fields=['organization', 'overlap_start_date']),
+            models.Index(fields=['traveller']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_conflict_type_display()}: {self.traveller} on {self.overlap_start_date}"
+
+
+# =============================================================================
+# TRANSACTION BALANCES (AS-OF VALUATION)
+# =============================================================================
+
+class TransactionBalance(models.Model):
+    """
+    Running balance of a booking component's transactions at the end of a
+    day it had transactions on, materialized by valuation.py.
+
+    A row holds from balance_date up to the day before valid_until (the
+    component's next transaction day), or onwards when valid_until is null,
+    so the value of every component as of a date is the one row per
+    component with balance_date <= date < valid_until.
+
+    Refreshed per component when its transactions change, and rebuilt in
+    bulk with: python manage.py build_transaction_balances
+    """
+
+    organization = models.ForeignKey(
+        'organizations.Organization',
+        on_delete=models.CASCADE,
+        related_name='transaction_balances'
+    )
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='transaction_balances'
+    )
+
+    # The component (AirBooking, AccommodationBooking, CarHireBooking or ServiceFee)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.UUIDField()
+    product_type = models.CharField(max_length=10, choices=DailySpendFact.PRODUCT_TYPES)
+
+    balance_date = models.DateField()
+    valid_until = models.DateField(
+        null=True,
+        blank=True,
+        help_text="Next day with transactions; the balance holds until the day before"
+    )
+
+    # Cumulative through the end of balance_date
+    running_total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        help_text="Net of the transactions so far, in their own currency"
+    )
+    running_total_base = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        help_text="Net of the transactions so far in organization base currency"
+    )
+    transaction_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'transaction_balances'
+        ordering = ['balance_date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['content_type', 'object_id', 'balance_date'],
+                name='unique_transaction_balance'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['organization', 'balance_date', 'valid_until']),
+            models.Index(fields=['booking', 'balance_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_type} {self.object_id} as of {self.balance_date}: {self.running_total_base}"
+
 # =============================================================================
 # USAGE EXAMPLES
 # =============================================================================
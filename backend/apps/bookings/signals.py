@@ -4,10 +4,13 @@ Django signals for automatic calculations and updates.
 Session 38-39: Transaction tracking + Audit logging
 """
 
-from django.db.models.signals import post_save, post_delete, pre_delete
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.db.models import Sum
 from decimal import Decimal
+from collections import defaultdict
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,8 +24,12 @@ from .models import (
     CarHireBooking,
     ServiceFee,
     BookingTransaction,
-    BookingAuditLog
+    DailySpendFact,
+    Traveller
 )
+from apps.reference_data import suppliers
+from apps.reference_data.models import CarRentalCompany, HotelChain
+from . import analytics, audit, conflicts, transactions, trips, valuation
 
 # =================================================================
 # SIGNAL 1 & 2: CARBON EMISSIONS RECALCULATION
@@ -161,13 +168,13 @@ def recalculate_booking_total(sender, instance, **kwargs):
         )
         
         # Create audit log for total recalculation
-        BookingAuditLog.objects.create(
-            booking=booking,
-            action='TOTAL_RECALCULATED',
-            changed_by=None,  # System action
-            description=f'Total recalculated: ${new_total}',
-            before_value={'total_amount': str(booking.total_amount)},
-            after_value={'total_amount': str(new_total)}
+        audit.record(
+            booking.pk,
+            'TOTAL_RECALCULATED',
+            f'Total recalculated: ${new_total}',
+            field_name='total_amount',
+            old_value={'total_amount': str(booking.total_amount)},
+            new_value={'total_amount': str(new_total)}
         )
         
         logger.info(
@@ -183,64 +190,47 @@ def recalculate_booking_total(sender, instance, **kwargs):
 # SIGNAL 9A & 9B: TRANSACTION TOTAL UPDATES
 # =================================================================
 
-# Storage for pre-delete transaction data
-_transaction_pre_delete_data = {}
-
-@receiver(pre_delete, sender=BookingTransaction)
-def capture_transaction_before_delete(sender, instance, **kwargs):
-    """
-    Helper signal: Capture transaction data before deletion so we can
-    update totals after deletion.
-    """
-    _transaction_pre_delete_data[instance.pk] = {
-        'content_type': instance.content_type,
-        'object_id': instance.object_id,
-        'amount': instance.amount,
-        'currency': instance.currency
-    }
-
+# Totals move by the difference between a transaction's stored and new
+# values (see transactions.py); BookingTransaction.save()/delete() lock and
+# read the stored row and wrap these in the same database transaction.
 
 @receiver(post_save, sender=BookingTransaction)
-def update_component_total_on_transaction_save(sender, instance, **kwargs):
+def update_component_total_on_transaction_save(sender, instance, created, **kwargs):
     """
-    Signal 9A: When a BookingTransaction is saved, update the total_amount
-    of its related component (Air/Accommodation/Car/ServiceFee).
+    Signal 9A: When a BookingTransaction is saved, apply the change to the
+    transaction totals of its component (Air/Accommodation/Car/ServiceFee),
+    or move them when the transaction moved to another component.
     """
+    # Fixtures carry the components' totals already
+    if kwargs.get('raw'):
+        return
+    
+    before = getattr(instance, '_stored_contribution', None)
+    after = instance.contribution()
+    transactions.apply_deltas(transactions.deltas([(before, after)]))
+    instance._stored_contribution = after
+    _mark_balances_dirty(before, after)
+    
     try:
-        # Get the related component
-        component = instance.content_object
+        component = instance.booking_component
         if not component:
             logger.warning(f"Transaction {instance.pk} has no related component")
             return
         
-        # Calculate new total from all transactions
-        total = component.transactions.aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
-        
-        # Update the component's total
-        component.__class__.objects.filter(pk=component.pk).update(
-            total_amount=total
-        )
-        
         # Create audit log
-        BookingAuditLog.objects.create(
-            booking=component.booking,
-            action='TRANSACTION_CREATED' if kwargs.get('created') else 'TRANSACTION_MODIFIED',
-            changed_by=instance.created_by if hasattr(instance, 'created_by') else None,
-            description=f'Transaction {instance.get_transaction_type_display()}: ${instance.amount}',
-            before_value={},
-            after_value={
+        audit.record(
+            component.booking_id,
+            'TRANSACTION_CREATED' if created else 'TRANSACTION_MODIFIED',
+            f'Transaction {instance.get_transaction_type_display()}: {instance.currency} {instance.total_amount}',
+            component=instance,
+            user=getattr(instance, 'created_by', None),
+            old_value={'total_amount': str(before[2])} if before and not created else None,
+            new_value={
                 'transaction_type': instance.transaction_type,
-                'amount': str(instance.amount),
+                'total_amount': str(instance.total_amount),
                 'currency': instance.currency
             }
         )
-        
-        logger.info(
-            f"Component {component.__class__.__name__} {component.pk} "
-            f"total updated to ${total} after transaction save"
-        )
     except Exception as e:
         logger.error(f"Error in update_component_total_on_transaction_save: {e}")
 
@@ -248,55 +238,317 @@ def update_component_total_on_transaction_save(sender, instance, **kwargs):
 @receiver(post_delete, sender=BookingTransaction)
 def update_component_total_on_transaction_delete(sender, instance, **kwargs):
     """
-    Signal 9B: When a BookingTransaction is deleted, update the total_amount
-    of its related component.
+    Signal 9B: When a BookingTransaction is deleted, take what it
+    contributed off its component's transaction totals.
     """
+    if hasattr(instance, '_stored_contribution'):
+        before = instance._stored_contribution
+    else:
+        before = instance.contribution()
+    transactions.apply_deltas(transactions.deltas([(before, None)]))
+    _mark_balances_dirty(before)
+    
     try:
-        # Get transaction data captured before deletion
-        data = _transaction_pre_delete_data.pop(instance.pk, None)
-        if not data:
-            logger.warning(f"No pre-delete data found for transaction {instance.pk}")
-            return
-        
-        # Get the component using the captured data
-        model_class = data['content_type'].model_class()
-        try:
-            component = model_class.objects.get(pk=data['object_id'])
-        except model_class.DoesNotExist:
-            logger.warning(f"Component {model_class.__name__} {data['object_id']} no longer exists")
-            return
-        
-        # Calculate new total from remaining transactions
-        total = component.transactions.aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
+        model_class = instance.content_type.model_class()
+        booking_id = model_class.objects.filter(pk=instance.object_id).values_list('booking_id', flat=True).first()
         
-        # Update the component's total
-        model_class.objects.filter(pk=component.pk).update(
-            total_amount=total
-        )
-        
-        # Create audit log
-        BookingAuditLog.objects.create(
-            booking=component.booking,
-            action='TRANSACTION_DELETED',
-            changed_by=None,  # User not available in post_delete
-            description=f'Transaction deleted: ${data["amount"]}',
-            before_value={
-                'amount': str(data['amount']),
-                'currency': data['currency']
-            },
-            after_value={}
-        )
-        
-        logger.info(
-            f"Component {model_class.__name__} {component.pk} "
-            f"total updated to ${total} after transaction deletion"
+        # Create audit log (user not available in post_delete)
+        audit.record(
+            booking_id,
+            'TRANSACTION_DELETED',
+            f'Transaction deleted: {instance.currency} {instance.total_amount}',
+            old_value={
+                'total_amount': str(instance.total_amount),
+                'currency': instance.currency
+            }
         )
     except Exception as e:
         logger.error(f"Error in update_component_total_on_transaction_delete: {e}")
 
 
+# =================================================================
+# SIGNAL 10: DAILY SPEND ROLLUP MAINTENANCE
+# =================================================================
+# Changes mark (organization, date) cells dirty; the cells are recomputed
+# once when the surrounding transaction commits, so a booking saved with
+# several components only rebuilds its day once.
+
+_rollup_state = threading.local()
+
+
+def _mark_spend_dirty(organization_id, date):
+    if not organization_id or not date:
+        return
+    pending = getattr(_rollup_state, 'pending', None)
+    if pending is None:
+        pending = _rollup_state.pending = set()
+    pending.add((organization_id, date))
+    # Safe to register repeatedly - the first callback drains the set
+    transaction.on_commit(_flush_daily_spend)
+
+
+def _flush_daily_spend():
+    pending = getattr(_rollup_state, 'pending', None)
+    if not pending:
+        return
+    _rollup_state.pending = set()
+
+    by_org = defaultdict(set)
+    for organization_id, date in pending:
+        by_org[organization_id].add(date)
+
+    for organization_id, dates in by_org.items():
+        try:
+            DailySpendFact.refresh(organization_id, dates)
+        except Exception as e:
+            logger.error(f"Error refreshing daily spend facts for {organization_id}: {e}")
+
+    analytics.invalidate_cache()
+
+
+def _mark_booking_dirty(booking_id):
+    if not booking_id:
+        return
+    row = Booking.objects.filter(pk=booking_id).values('organization_id', 'travel_date').first()
+    if row:
+        _mark_spend_dirty(row['organization_id'], row['travel_date'])
+
+
+@receiver(pre_save, sender=Booking)
+def capture_booking_rollup_key(sender, instance, **kwargs):
+    """
+    Remember the old (organization, travel_date) so a moved booking clears
+    its old day, and the old traveller so their trips are rebuilt too.
+    """
+    if instance._state.adding:
+        return
+    previous = Booking.objects.filter(
+        pk=instance.pk
+    ).values_list('organization_id', 'travel_date', 'traveller_id').first()
+    if previous:
+        instance._previous_rollup_key = previous[:2]
+        instance._previous_traveller_id = previous[2]
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def update_daily_spend_on_booking_change(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_rollup_key', None)
+    if previous:
+        _mark_spend_dirty(*previous)
+        instance._previous_rollup_key = None
+    _mark_spend_dirty(instance.organization_id, instance.travel_date)
+
+
+@receiver(post_save, sender=AirBooking)
+@receiver(post_save, sender=AccommodationBooking)
+@receiver(post_save, sender=CarHireBooking)
+@receiver(post_delete, sender=AirBooking)
+@receiver(post_delete, sender=AccommodationBooking)
+@receiver(post_delete, sender=CarHireBooking)
+def update_daily_spend_on_component_change(sender, instance, **kwargs):
+    _mark_booking_dirty(instance.booking_id)
+
+
+@receiver(post_save, sender=AirSegment)
+@receiver(post_delete, sender=AirSegment)
+def update_daily_spend_on_segment_change(sender, instance, **kwargs):
+    booking_id = AirBooking.objects.filter(
+        pk=instance.air_booking_id
+    ).values_list('booking_id', flat=True).first()
+    _mark_booking_dirty(booking_id)
+
+
+@receiver(post_save, sender=ServiceFee)
+@receiver(post_delete, sender=ServiceFee)
+def update_daily_spend_on_fee_change(sender, instance, **kwargs):
+    if instance.booking_id:
+        _mark_booking_dirty(instance.booking_id)
+    else:
+        _mark_spend_dirty(instance.organization_id, instance.fee_date)
+
+
+@receiver(pre_save, sender=Traveller)
+def capture_traveller_rollup_dimensions(sender, instance, **kwargs):
+    if instance._state.adding:
+        return
+    instance._previous_rollup_dimensions = Traveller.objects.filter(
+        pk=instance.pk
+    ).values_list('cost_center', 'department').first()
+
+
+@receiver(post_save, sender=Traveller)
+def update_daily_spend_on_traveller_change(sender, instance, **kwargs):
+    """Cost centre / department moves re-bucket every day the traveller travelled."""
+    previous = getattr(instance, '_previous_rollup_dimensions', None)
+    instance._previous_rollup_dimensions = None
+    if not previous or previous == (instance.cost_center, instance.department):
+        return
+
+    keys = set(
+        Booking.objects.filter(traveller_id=instance.pk)
+        .values_list('organization_id', 'travel_date')
+    )
+    keys.update(
+        ServiceFee.objects.filter(traveller_id=instance.pk, booking__isnull=True)
+        .values_list('organization_id', 'fee_date')
+    )
+    for organization_id, date in keys:
+        _mark_spend_dirty(organization_id, date)
+
+
+# =================================================================
+# SIGNAL 11: TRIP MAINTENANCE
+# =================================================================
+# Changes mark the traveller dirty; their trips are rebuilt and their
+# conflicts re-detected once when the surrounding transaction commits. Bulk imports bypass these signals and
+# rebuild the travellers they touched in BookingImporter.finalize().
+
+_trip_state = threading.local()
+
+
+def _mark_trips_dirty(traveller_id):
+    if not traveller_id:
+        return
+    pending = getattr(_trip_state, 'pending', None)
+    if pending is None:
+        pending = _trip_state.pending = set()
+    pending.add(traveller_id)
+    transaction.on_commit(_flush_trips)
+
+
+def _flush_trips():
+    pending = getattr(_trip_state, 'pending', None)
+    if not pending:
+        return
+    _trip_state.pending = set()
+
+    try:
+        trips.rebuild_travellers(pending)
+    except Exception as e:
+        logger.error(f"Error rebuilding trips for {len(pending)} travellers: {e}")
+
+    try:
+        conflicts.detect_conflicts(traveller_ids=pending)
+    except Exception as e:
+        logger.error(f"Error detecting conflicts for {len(pending)} travellers: {e}")
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def update_trips_on_booking_change(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_traveller_id', None)
+    if previous:
+        _mark_trips_dirty(previous)
+        instance._previous_traveller_id = None
+    _mark_trips_dirty(instance.traveller_id)
+
+
+@receiver(post_save, sender=AirBooking)
+@receiver(post_save, sender=AccommodationBooking)
+@receiver(post_save, sender=CarHireBooking)
+@receiver(post_delete, sender=AirBooking)
+@receiver(post_delete, sender=AccommodationBooking)
+@receiver(post_delete, sender=CarHireBooking)
+def update_trips_on_component_change(sender, instance, **kwargs):
+    _mark_trips_dirty(
+        Booking.objects.filter(pk=instance.booking_id).values_list('traveller_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=AirSegment)
+@receiver(post_delete, sender=AirSegment)
+def update_trips_on_segment_change(sender, instance, **kwargs):
+    _mark_trips_dirty(
+        AirBooking.objects.filter(pk=instance.air_booking_id)
+        .values_list('booking__traveller_id', flat=True).first()
+    )
+
+# =================================================================
+# SIGNAL 12: TRANSACTION BALANCE MAINTENANCE
+# =================================================================
+# Transaction changes mark their components dirty; the components' as-of
+# balances are recomputed once when the surrounding transaction commits.
+# transactions.ingest() refreshes the components it touched itself.
+
+_balance_state = threading.local()
+
+
+def _mark_balances_dirty(*contributions):
+    pending = getattr(_balance_state, 'pending', None)
+    if pending is None:
+        pending = _balance_state.pending = set()
+    for contribution in contributions:
+        if contribution is not None:
+            pending.add(contribution[:2])
+    if pending:
+        transaction.on_commit(_flush_balances)
+
+
+def _flush_balances():
+    pending = getattr(_balance_state, 'pending', None)
+    if not pending:
+        return
+    _balance_state.pending = set()
+
+    try:
+        valuation.refresh(pending)
+    except Exception as e:
+        logger.error(f"Error refreshing transaction balances for {len(pending)} components: {e}")
+
+    analytics.invalidate_cache()
+
+# =================================================================
+# SIGNAL 13: IMPORT CONTENT HASH INVALIDATION
+# =================================================================
+# The importer skips re-sent records whose content hash equals the stored
+# one, and writes with bulk operations that send no signals - so a save()
+# or delete() is an edit made outside the importer (API, admin, shell).
+# Clearing the hashes of the row and its booking makes the next import of
+# that booking compare and rewrite it instead of skipping it.
+
+def _clear_content_hashes(booking_id, model=None, pk=None):
+    if model is not None and pk is not None:
+        model.objects.filter(pk=pk).exclude(content_hash='').update(content_hash='')
+    if booking_id:
+        Booking.objects.filter(pk=booking_id).exclude(content_hash='').update(content_hash='')
+
+
+@receiver(post_save, sender=Booking)
+def clear_booking_content_hash(sender, instance, raw=False, **kwargs):
+    if raw or not instance.content_hash:
+        return
+    instance.content_hash = ''
+    _clear_content_hashes(instance.pk)
+
+
+@receiver(post_save, sender=AirBooking)
+@receiver(post_save, sender=AccommodationBooking)
+@receiver(post_save, sender=CarHireBooking)
+@receiver(post_save, sender=ServiceFee)
+@receiver(post_delete, sender=AirBooking)
+@receiver(post_delete, sender=AccommodationBooking)
+@receiver(post_delete, sender=CarHireBooking)
+@receiver(post_delete, sender=ServiceFee)
+def clear_component_content_hash(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if 'created' in kwargs and instance.content_hash:
+        instance.content_hash = ''
+        _clear_content_hashes(instance.booking_id, sender, instance.pk)
+    else:
+        _clear_content_hashes(instance.booking_id)
+
+
+@receiver(post_save, sender=AirSegment)
+@receiver(post_delete, sender=AirSegment)
+def clear_segment_content_hash(sender, instance, raw=False, **kwargs):
+    # Segments are part of their air booking's hash
+    if raw:
+        return
+    booking_id = AirBooking.objects.filter(pk=instance.air_booking_id).values_list('booking_id', flat=True).first()
+    _clear_content_hashes(booking_id, AirBooking, instance.air_booking_id)
+
 # =================================================================
 # DISABLED SIGNALS (Future Implementation)
 # =================================================================
@@ -304,4 +556,23 @@ def update_component_total_on_transaction_delete(sender, instance, **kwargs):
 # Signal 4: Status Cascade - Not applicable (sub-bookings don't have status)
 # Signal 6: Budget Tracking - Blocked (Budget.spent field doesn't exist yet)
 # Signal 7: Compliance Checking - Disabled (ComplianceAlert model missing)
-# Signal 8: Currency Rate Changes - Optional feature, not yet implemented
\ No newline at end of file
+# Signal 8: Currency Rate Changes - Optional feature, not yet implemented
+
+# =================================================================
+# SIGNAL 14: SUPPLIER MATCHER INVALIDATION
+# =================================================================
+# Component saves match free-text supplier names with a matcher compiled
+# once per process (reference_data.suppliers.matcher). Any change to the
+# canonical suppliers or their alternative names makes every process
+# recompile it, and drops cached analytics that show supplier names,
+# preferred status or tier.
+
+@receiver(post_save, sender=HotelChain)
+@receiver(post_delete, sender=HotelChain)
+@receiver(post_save, sender=CarRentalCompany)
+@receiver(post_delete, sender=CarRentalCompany)
+def invalidate_supplier_matchers(sender, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(suppliers.invalidate_matchers)
+    transaction.on_commit(analytics.invalidate_cache)
@@ -1,3 +1,317 @@
-from django.test import TestCase
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+import tempfile
 
-# Create your tests here.
+from apps.organizations.models import Organization
+from . import audit, conflicts, duplicates, identity, timeline, transactions, trips, valuation
+from .models import AccommodationBooking, Booking, BookingAuditLog, BookingTransaction, Traveller
+
+
+def create_stay(code='CUS', reference='REF1', nightly_rate='200.00'):
+    """A customer organization with one booking holding one hotel stay."""
+    organization = Organization.objects.create(
+        name=f'Customer {code}', org_type='CUSTOMER', code=code, contact_email=f'{code.lower()}@example.com'
+    )
+    traveller = Traveller.objects.create(
+        organization=organization, first_name='Jo', last_name='Bloggs', employee_id='E1'
+    )
+    booking = Booking.objects.create(
+        organization=organization, traveller=traveller, agent_booking_reference=reference,
+        booking_date=date(2025, 2, 1), travel_date=date(2025, 3, 1),
+    )
+    return AccommodationBooking.objects.create(
+        booking=booking, hotel_name='Hilton Melbourne', city='Melbourne', country='Australia',
+        check_in_date=date(2025, 3, 1), check_out_date=date(2025, 3, 3), number_of_nights=2,
+        nightly_rate=Decimal(nightly_rate),
+    )
+
+
+class TransactionTotalTests(TestCase):
+    def setUp(self):
+        self.stay = create_stay()
+
+    def totals(self):
+        stay = AccommodationBooking.objects.get(pk=self.stay.pk)
+        return stay.transaction_total, stay.transaction_total_base
+
+    def add(self, amount, transaction_type='ORIGINAL'):
+        return BookingTransaction.objects.create(
+            booking_component=self.stay, transaction_type=transaction_type,
+            transaction_date=date(2025, 2, 1), total_amount=Decimal(amount),
+        )
+
+    def test_deltas_net_changes_per_component(self):
+        before = (1, 'a', Decimal('100.00'), Decimal('150.00'))
+        after = (1, 'a', Decimal('80.00'), Decimal('120.00'))
+        moved = (1, 'b', Decimal('80.00'), Decimal('120.00'))
+        self.assertEqual(transactions.deltas([(before, after)]), {(1, 'a'): (Decimal('-20.00'), Decimal('-30.00'))})
+        self.assertEqual(transactions.deltas([(before, before)]), {})
+        self.assertEqual(transactions.deltas([(before, None), (None, moved)]), {
+            (1, 'a'): (Decimal('-100.00'), Decimal('-150.00')),
+            (1, 'b'): (Decimal('80.00'), Decimal('120.00')),
+        })
+
+    def test_save_and_delete_adjust_totals(self):
+        original = self.add('400.00')
+        refund = self.add('-100.00', 'REFUND')
+        self.assertEqual(self.totals(), (Decimal('300.00'), Decimal('300.00')))
+
+        refund.status = 'CANCELLED'
+        refund.save()
+        self.assertEqual(self.totals(), (Decimal('400.00'), Decimal('400.00')))
+
+        original.delete()
+        self.assertEqual(self.totals(), (Decimal('0.00'), Decimal('0.00')))
+
+    def test_stale_copies_apply_delta_from_stored_row(self):
+        created = self.add('100.00')
+        first = BookingTransaction.objects.get(pk=created.pk)
+        second = BookingTransaction.objects.get(pk=created.pk)
+
+        first.total_amount = Decimal('150.00')
+        first.save()
+        second.total_amount = Decimal('120.00')
+        second.save()
+
+        self.assertEqual(self.totals(), (Decimal('120.00'), Decimal('120.00')))
+
+    def test_ingest_matches_rebuild(self):
+        transactions.ingest([
+            {'component_type': 'HOTEL', 'component_id': self.stay.pk, 'transaction_type': 'ORIGINAL',
+             'transaction_date': date(2025, 2, 1), 'total_amount': Decimal('400.00')},
+            {'component_type': 'HOTEL', 'component_id': self.stay.pk, 'transaction_type': 'EXCHANGE',
+             'transaction_date': date(2025, 2, 5), 'total_amount': Decimal('50.00')},
+        ])
+        ingested = self.totals()
+        AccommodationBooking.objects.update(transaction_total=0, transaction_total_base=0)
+        transactions.rebuild_totals()
+        self.assertEqual(self.totals(), ingested)
+        self.assertEqual(ingested, (Decimal('450.00'), Decimal('450.00')))
+
+
+@override_settings(AUDIT_ASYNC=False)
+class AuditBufferTests(TestCase):
+    """record() buffering; also guards the Django-version dependency documented on audit._Bucket."""
+
+    def setUp(self):
+        self.booking_id = create_stay().booking_id
+
+    def notes(self):
+        return set(
+            BookingAuditLog.objects.filter(action='BOOKING_MODIFIED', booking_id=self.booking_id)
+            .values_list('notes', flat=True)
+        )
+
+    def test_rolled_back_savepoint_discards_its_entries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            audit.record(self.booking_id, 'BOOKING_MODIFIED', 'Changed', notes='before')
+            try:
+                with transaction.atomic():
+                    audit.record(self.booking_id, 'BOOKING_MODIFIED', 'Changed', notes='rolled back')
+                    raise ValueError
+            except ValueError:
+                pass
+            audit.record(self.booking_id, 'BOOKING_MODIFIED', 'Changed', notes='after')
+            self.assertEqual(self.notes(), set())
+        self.assertEqual(self.notes(), {'before', 'after'})
+
+    def test_failed_write_is_raised(self):
+        with mock.patch.object(BookingAuditLog.objects, 'bulk_create', side_effect=RuntimeError), \
+                mock.patch.object(audit.time, 'sleep'):
+            with self.assertRaises(RuntimeError):
+                audit.write([BookingAuditLog(booking_id=self.booking_id, action='BOOKING_MODIFIED')])
+
+    def test_spooled_entries_are_replayed_once(self):
+        entry = BookingAuditLog(
+            booking_id=self.booking_id, action='BOOKING_MODIFIED', description='Changed',
+            notes='spooled', old_value={'status': 'CONFIRMED'},
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            directory = Path(directory)
+            audit.spool([entry], directory)
+            audit.spool([entry], directory)
+
+            self.assertEqual(audit.replay_spool(directory), 2)
+            self.assertEqual(list(directory.iterdir()), [])
+        replayed = BookingAuditLog.objects.get(notes='spooled')
+        self.assertEqual((replayed.pk, replayed.old_value), (entry.pk, {'status': 'CONFIRMED'}))
+
+    def test_entry_without_booking_is_logged(self):
+        with self.assertLogs(audit.logger, 'WARNING'):
+            audit.record(None, 'TRANSACTION_DELETED', 'Transaction deleted')
+
+
+@override_settings(AUDIT_ASYNC=False)
+class AuditTransactionRollbackTests(TransactionTestCase):
+    def test_transaction_after_a_rollback_is_recorded(self):
+        booking_id = create_stay().booking_id
+        try:
+            with transaction.atomic():
+                audit.record(booking_id, 'BOOKING_MODIFIED', 'Changed', notes='rolled back')
+                raise ValueError
+        except ValueError:
+            pass
+        with transaction.atomic():
+            audit.record(booking_id, 'BOOKING_MODIFIED', 'Changed', notes='committed')
+
+        self.assertEqual(
+            list(BookingAuditLog.objects.filter(action='BOOKING_MODIFIED').values_list('notes', flat=True)),
+            ['committed'],
+        )
+
+
+class IdentityTests(SimpleTestCase):
+    def test_first_names_agree(self):
+        for a, b in [('jon', 'jonathan'), ('j', 'jonathan'), ('anne', 'anne')]:
+            self.assertTrue(identity.first_names_agree(a, b), (a, b))
+        for a, b in [('daniel', 'danielle'), ('paul', 'paula'), ('', 'anne'), ('jon', 'mark')]:
+            self.assertFalse(identity.first_names_agree(a, b), (a, b))
+
+    def test_resolve(self):
+        jonathan = Traveller(first_name='Jonathan', last_name='Smith', employee_id='E1')
+        danielle = Traveller(first_name='Danielle', last_name='Jones', email='dj@example.com')
+        daniel = Traveller(first_name='Daniel', last_name='Jones')
+        index = identity.TravellerIndex([jonathan, danielle, daniel])
+
+        self.assertEqual(index.resolve({'employee_id': ' e1 ', 'last_name': 'Other'}), (jonathan, 1.0))
+        self.assertEqual(index.resolve({'email': 'DJ@example.com', 'last_name': 'Jones'}), (danielle, 1.0))
+        self.assertIs(index.resolve({'first_name': 'Jon', 'last_name': 'Smith'})[0], jonathan)
+        self.assertIs(index.resolve({'first_name': 'Daniel', 'last_name': 'Jones'})[0], daniel)
+        self.assertIs(index.resolve({'first_name': 'Danielle', 'last_name': 'Jones'})[0], danielle)
+        self.assertIsNone(index.resolve({'first_name': 'Mark', 'last_name': 'Smith'})[0])
+
+    def test_resolve_leaves_ambiguous_matches(self):
+        index = identity.TravellerIndex([
+            Traveller(first_name='John', last_name='Smith'), Traveller(first_name='John', last_name='Smith'),
+        ])
+        traveller, score = index.resolve({'first_name': 'John', 'last_name': 'Smith'})
+        self.assertEqual((traveller, score), (None, 1.0))
+
+
+class FindPairsTests(SimpleTestCase):
+    def record(self, id, reference, amount, route='SYD-MEL', traveller='T1', supplier_reference=''):
+        return duplicates.BookingRecord(
+            id, 'O1', traveller, date(2025, 3, 1), date(2025, 3, 3), date(2025, 2, 1),
+            reference, supplier_reference, Decimal(amount), route, '', '',
+        )
+
+    def test_pairs_same_trip_under_another_reference(self):
+        first = self.record(1, 'REF1', '500.00', supplier_reference='ABC123')
+        records = [
+            first,
+            self.record(2, 'REF2', '500.00', supplier_reference='abc123'),
+            self.record(3, 'REF3', '490.00'),
+            self.record(4, 'REF4', '500.00', route='SYD-BNE'),
+            self.record(5, 'REF5', '800.00'),
+            self.record(6, 'REF1', '500.00'),
+            self.record(7, 'REF7', '500.00', traveller='T2'),
+        ]
+
+        pairs = [(later.id, earlier.id, confidence) for later, earlier, confidence, _ in duplicates.find_pairs(records)]
+
+        # 6 shares 1's reference (a re-send, not a duplicate) but still pairs with 2 and 3
+        self.assertEqual(pairs, [(2, 1, 1.0), (3, 1, 0.89), (3, 2, 0.89), (6, 3, 0.89), (6, 2, 0.95)])
+
+    def test_only_pairs_with_new_bookings(self):
+        records = [self.record(1, 'REF1', '500.00'), self.record(2, 'REF2', '500.00'), self.record(3, 'REF3', '500.00')]
+        pairs = [(later.id, earlier.id) for later, earlier, _, _ in duplicates.find_pairs(records, new_ids={3})]
+        self.assertEqual(pairs, [(3, 1), (3, 2)])
+
+
+def interval(kind, start, end, city='Melbourne', origin_city='', booking='B1', air_booking=None):
+    return timeline.Interval(
+        kind, 'O1', 'T1', booking, f'{booking}-{kind}-{start:%d%H}', start, end,
+        origin_city=origin_city, city=city, air_booking_id=air_booking,
+    )
+
+
+class ConflictSweepTests(SimpleTestCase):
+    def test_overlaps_of_the_same_kind(self):
+        first = interval(timeline.STAY, datetime(2025, 3, 1, 14), datetime(2025, 3, 4, 11), booking='B1')
+        second = interval(timeline.STAY, datetime(2025, 3, 3, 14), datetime(2025, 3, 5, 11), booking='B2')
+        after = interval(timeline.STAY, datetime(2025, 3, 5, 14), datetime(2025, 3, 6, 11), booking='B3')
+
+        found = [(conflict_type, later.booking_id, earlier.booking_id)
+                 for conflict_type, later, earlier in conflicts.sweep([first, second, after])]
+
+        self.assertEqual(found, [('OVERLAPPING_STAYS', 'B2', 'B1')])
+
+    def test_flights_of_one_ticket_do_not_conflict(self):
+        out = interval(timeline.FLIGHT, datetime(2025, 3, 1, 8), datetime(2025, 3, 1, 12), air_booking='A1')
+        connection = interval(timeline.FLIGHT, datetime(2025, 3, 1, 11), datetime(2025, 3, 1, 14), air_booking='A1')
+        other = interval(timeline.FLIGHT, datetime(2025, 3, 1, 13), datetime(2025, 3, 1, 15),
+                         booking='B2', air_booking='A2')
+
+        found = [(conflict_type, later.booking_id) for conflict_type, later, _ in conflicts.sweep([out, connection, other])]
+
+        self.assertEqual(found, [('OVERLAPPING_FLIGHTS', 'B2')])
+
+    def test_rental_before_arrival(self):
+        flight = interval(timeline.FLIGHT, datetime(2025, 3, 1, 8), datetime(2025, 3, 1, 10), city='Melbourne',
+                          origin_city='Sydney', air_booking='A1')
+        early = interval(timeline.RENTAL, datetime(2025, 3, 1, 9), datetime(2025, 3, 2, 9), origin_city='MELBOURNE',
+                         booking='B2')
+        elsewhere = interval(timeline.RENTAL, datetime(2025, 3, 1, 9), datetime(2025, 3, 1, 9, 30),
+                             origin_city='Sydney', booking='B3')
+
+        found = [(conflict_type, later.booking_id) for conflict_type, later, _ in conflicts.sweep([flight, early, elsewhere])]
+
+        self.assertEqual(found, [('RENTAL_BEFORE_ARRIVAL', 'B2'), ('OVERLAPPING_RENTALS', 'B3')])
+
+
+class TripSweepTests(SimpleTestCase):
+    def test_cuts_trips_at_long_gaps_and_after_the_flight_home(self):
+        out = interval(timeline.FLIGHT, datetime(2025, 3, 1, 8), datetime(2025, 3, 1, 10), origin_city='Sydney')
+        stay = interval(timeline.STAY, datetime(2025, 3, 1, 14), datetime(2025, 3, 3, 11))
+        home = interval(timeline.FLIGHT, datetime(2025, 3, 3, 16), datetime(2025, 3, 3, 18), city='Sydney',
+                        origin_city='Melbourne')
+        # Within MAX_GAP of landing, but well after the return
+        next_out = interval(timeline.FLIGHT, datetime(2025, 3, 4, 9), datetime(2025, 3, 4, 11), city='Brisbane',
+                            origin_city='Sydney', booking='B2')
+        much_later = interval(timeline.STAY, datetime(2025, 3, 10, 14), datetime(2025, 3, 11, 11), booking='B3')
+
+        drafts = trips.sweep([out, stay, home, next_out, much_later])
+
+        self.assertEqual([draft.intervals for draft in drafts], [[out, stay, home], [next_out], [much_later]])
+        self.assertEqual((drafts[0].origin_city, drafts[0].returned_at), ('Sydney', datetime(2025, 3, 3, 18)))
+
+
+class ValuationTests(TestCase):
+    def setUp(self):
+        self.stay = create_stay()
+        self.content_type = ContentType.objects.get_for_model(AccommodationBooking)
+        for day, transaction_type, amount in [
+            (date(2025, 2, 1), 'ORIGINAL', '400.00'),
+            (date(2025, 2, 5), 'EXCHANGE', '50.00'),
+            (date(2025, 2, 5), 'EXCHANGE', '25.00'),
+            (date(2025, 3, 10), 'REFUND', '-100.00'),
+        ]:
+            BookingTransaction.objects.create(
+                booking_component=self.stay, transaction_type=transaction_type,
+                transaction_date=day, total_amount=Decimal(amount),
+            )
+
+    def value(self, day, stay=None):
+        return AccommodationBooking.objects.filter(pk=(stay or self.stay).pk).annotate(
+            value=valuation.value_as_of(AccommodationBooking, day, F('total_amount_base'), 'booking__booking_date')
+        ).values_list('value', flat=True).get()
+
+    def test_refresh_then_value_as_of(self):
+        self.assertEqual(valuation.refresh([(self.content_type.id, self.stay.pk)]), 3)
+
+        self.assertEqual(self.value(date(2025, 1, 31)), Decimal('0.00'))
+        self.assertEqual(self.value(date(2025, 2, 1)), Decimal('400.00'))
+        self.assertEqual(self.value(date(2025, 2, 5)), Decimal('475.00'))
+        self.assertEqual(self.value(date(2025, 3, 9)), Decimal('475.00'))
+        self.assertEqual(self.value(date(2025, 3, 10)), Decimal('375.00'))
+
+    def test_components_without_transactions_use_the_recorded_amount(self):
+        other = create_stay('OTH', 'REF2', nightly_rate='150.00')
+        self.assertEqual(self.value(date(2025, 1, 31), other), Decimal('0.00'))
+        self.assertEqual(self.value(date(2025, 2, 1), other), Decimal('300.00'))
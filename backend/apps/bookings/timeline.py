@@ -0,0 +1,172 @@
+# apps/bookings/timeline.py
+"""
+Per-traveller timeline of booked travel.
+
+Flights (one interval per AirSegment), hotel stays and car rentals are read
+as time intervals and merged into a single stream ordered by
+(traveller, start). Each component table is read with one query already
+sorted that way, and the three sorted streams are merged lazily, so a
+consumer sweeping one traveller at a time (trip building, conflict
+detection, location timelines) holds only that traveller's intervals in
+memory.
+
+Times are the local times stored on the bookings. Hotel stays carry no
+times, so check-in and check-out are taken as CHECK_IN_TIME and
+CHECK_OUT_TIME.
+"""
+
+from datetime import datetime, time
+from decimal import Decimal
+from heapq import merge
+from itertools import groupby
+
+from apps.reference_data.models import Airport
+from .models import AccommodationBooking, AirSegment, CarHireBooking
+
+FLIGHT = 'FLIGHT'
+STAY = 'STAY'
+RENTAL = 'RENTAL'
+
+CHECK_IN_TIME = time(14, 0)
+CHECK_OUT_TIME = time(11, 0)
+
+ZERO = Decimal('0.00')
+
+
+class Interval:
+    """One flight segment, hotel stay or car rental on a traveller's timeline."""
+
+    __slots__ = [
+        'kind', 'organization_id', 'traveller_id', 'booking_id', 'component_id',
+        'start', 'end', 'origin_city', 'origin_country', 'city', 'country',
+        'spend', 'carbon_kg', 'nights', 'days', 'air_booking_id',
+    ]
+
+    def __init__(self, kind, organization_id, traveller_id, booking_id, component_id, start, end,
+                 origin_city='', origin_country='', city='', country='', spend=ZERO, carbon_kg=ZERO,
+                 nights=0, days=0, air_booking_id=None):
+        self.kind = kind
+        self.organization_id = organization_id
+        self.traveller_id = traveller_id
+        self.booking_id = booking_id
+        self.component_id = component_id
+        self.start = start
+        # A zero-length or inverted interval still occupies its start
+        self.end = max(end, start)
+        self.origin_city = origin_city or ''
+        self.origin_country = origin_country or ''
+        # Where the traveller is during / at the end of the interval
+        self.city = city or ''
+        self.country = country or ''
+        self.spend = spend or ZERO
+        self.carbon_kg = carbon_kg or ZERO
+        self.nights = nights or 0
+        self.days = days or 0
+        self.air_booking_id = air_booking_id
+
+    def __repr__(self):
+        return f"<Interval {self.kind} {self.start:%Y-%m-%d %H:%M}..{self.end:%Y-%m-%d %H:%M} {self.city}>"
+
+
+def _airport_locations():
+    return {
+        code: (city, country)
+        for code, city, country in Airport.objects.values_list('iata_code', 'city', 'country')
+    }
+
+
+def _flights(bookings, airports):
+    rows = (
+        AirSegment.objects
+        .filter(air_booking__booking__in=bookings.order_by().values('pk'))
+        .order_by('air_booking__booking__traveller_id', 'departure_date', 'departure_time', 'segment_number')
+        .values_list(
+            'air_booking__booking__organization_id', 'air_booking__booking__traveller_id',
+            'air_booking__booking_id', 'air_booking_id', 'pk', 'departure_date', 'departure_time',
+            'arrival_date', 'arrival_time', 'origin_airport_iata_code',
+            'destination_airport_iata_code', 'carbon_emissions_kg', 'air_booking__total_fare',
+        )
+    )
+    current_traveller, priced = None, set()
+    for (organization_id, traveller_id, booking_id, air_booking_id, pk, departure_date, departure_time,
+         arrival_date, arrival_time, origin, destination, carbon, fare) in rows.iterator(chunk_size=5000):
+        if traveller_id != current_traveller:
+            current_traveller, priced = traveller_id, set()
+        # The fare is carried by the earliest segment of each air booking only
+        spend = ZERO if air_booking_id in priced else fare
+        priced.add(air_booking_id)
+
+        origin_city, origin_country = airports.get(origin, (origin, ''))
+        city, country = airports.get(destination, (destination, ''))
+        yield Interval(
+            FLIGHT, organization_id, traveller_id, booking_id, pk,
+            datetime.combine(departure_date, departure_time),
+            datetime.combine(arrival_date or departure_date, arrival_time or departure_time),
+            origin_city=origin_city, origin_country=origin_country, city=city, country=country,
+            spend=spend, carbon_kg=carbon, air_booking_id=air_booking_id,
+        )
+
+
+def _stays(bookings):
+    rows = (
+        AccommodationBooking.objects
+        .filter(booking__in=bookings.order_by().values('pk'))
+        .order_by('booking__traveller_id', 'check_in_date', 'check_out_date')
+        .values_list(
+            'booking__organization_id', 'booking__traveller_id', 'booking_id', 'pk',
+            'check_in_date', 'check_out_date', 'city', 'country', 'total_amount_base',
+            'number_of_nights',
+        )
+    )
+    for (organization_id, traveller_id, booking_id, pk, check_in, check_out, city, country,
+         spend, nights) in rows.iterator(chunk_size=5000):
+        yield Interval(
+            STAY, organization_id, traveller_id, booking_id, pk,
+            datetime.combine(check_in, CHECK_IN_TIME),
+            datetime.combine(check_out or check_in, CHECK_OUT_TIME),
+            city=city, country=country, spend=spend, nights=nights,
+        )
+
+
+def _rentals(bookings):
+    rows = (
+        CarHireBooking.objects
+        .filter(booking__in=bookings.order_by().values('pk'))
+        .order_by('booking__traveller_id', 'pickup_date', 'pickup_time')
+        .values_list(
+            'booking__organization_id', 'booking__traveller_id', 'booking_id', 'pk',
+            'pickup_date', 'pickup_time', 'dropoff_date', 'dropoff_time', 'pickup_city',
+            'dropoff_city', 'country', 'total_amount_base', 'number_of_days',
+        )
+    )
+    for (organization_id, traveller_id, booking_id, pk, pickup_date, pickup_time, dropoff_date,
+         dropoff_time, pickup_city, dropoff_city, country, spend, days) in rows.iterator(chunk_size=5000):
+        yield Interval(
+            RENTAL, organization_id, traveller_id, booking_id, pk,
+            datetime.combine(pickup_date, pickup_time),
+            datetime.combine(dropoff_date or pickup_date, dropoff_time or pickup_time),
+            origin_city=pickup_city, origin_country=country, city=dropoff_city or pickup_city,
+            country=country, spend=spend, days=days,
+        )
+
+
+def intervals(bookings):
+    """
+    Every flight segment, stay and rental of the bookings, ordered by
+    (traveller, start, end).
+
+    Args:
+        bookings: Booking queryset (e.g. one organization, or the bookings
+            of a set of travellers)
+    """
+    airports = _airport_locations()
+    return merge(
+        _flights(bookings, airports), _stays(bookings), _rentals(bookings),
+        key=lambda interval: (interval.traveller_id, interval.start, interval.end),
+    )
+
+
+def by_traveller(bookings):
+    """Yield (traveller_id, [intervals sorted by start]) one traveller at a time."""
+    for traveller_id, group in groupby(intervals(bookings), key=lambda interval: interval.traveller_id):
+        yield traveller_id, list(group)
@@ -0,0 +1,241 @@
+# apps/bookings/transactions.py
+"""
+Component transaction totals.
+
+Air bookings, stays, car hires and service fees carry transaction_total and
+transaction_total_base: the net of their BookingTransactions (cancelled ones
+left out), in the transactions' currency and in the organization's base
+currency. Re-aggregating every transaction of a component whenever one
+changes costs a scan per save and races with concurrent writers, so totals
+are adjusted by deltas instead - the new value of a transaction minus its
+old one - in a single
+
+    UPDATE ... SET transaction_total = transaction_total + delta, ...
+
+which the database applies atomically against the current row.
+
+ingest() is the bulk path: thousands of transactions are converted with
+one preloaded rate table, inserted with bulk_create and applied with one
+UPDATE per component they touch, and their as-of balances (valuation.py)
+are refreshed in the same transaction. rebuild_totals() recomputes the
+totals from scratch.
+"""
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from collections import defaultdict
+from decimal import Decimal
+import logging
+
+from .models import (
+    AirBooking, AccommodationBooking, CarHireBooking, ServiceFee, BookingTransaction
+)
+from . import analytics, audit, valuation
+
+logger = logging.getLogger(__name__)
+
+# Component types accepted by ingest()
+COMPONENT_TYPES = {
+    'AIR': AirBooking,
+    'HOTEL': AccommodationBooking,
+    'CAR': CarHireBooking,
+    'FEE': ServiceFee,
+}
+
+# What convert_to_base_currency() reads from each component
+RELATED = {
+    AirBooking: ['booking__organization'],
+    AccommodationBooking: ['booking__organization'],
+    CarHireBooking: ['booking__organization'],
+    ServiceFee: ['organization', 'booking'],
+}
+
+# Fields a transaction row passed to ingest() may set
+FIELDS = [
+    'transaction_type', 'transaction_date', 'transaction_reference', 'status', 'currency',
+    'base_amount', 'taxes', 'fees', 'total_amount', 'reason', 'notes',
+]
+
+BATCH_SIZE = 1000
+
+ZERO = Decimal('0.00')
+
+
+def _models_by_content_type():
+    return {
+        content_type.id: model
+        for model, content_type in ContentType.objects.get_for_models(*COMPONENT_TYPES.values()).items()
+    }
+
+
+def deltas(changes):
+    """
+    Net change per component.
+
+    Args:
+        changes: (before, after) pairs of BookingTransaction.contribution()
+            values, None for a transaction that didn't count before / doesn't
+            any more
+
+    Returns:
+        {(content_type_id, object_id): (total delta, base total delta)},
+        without components whose changes cancel out
+    """
+    net = defaultdict(lambda: [ZERO, ZERO])
+    for before, after in changes:
+        for contribution, sign in ((before, -1), (after, 1)):
+            if contribution is None:
+                continue
+            content_type_id, object_id, total, total_base = contribution
+            amounts = net[(content_type_id, object_id)]
+            amounts[0] += sign * total
+            amounts[1] += sign * total_base
+    return {key: tuple(amounts) for key, amounts in net.items() if any(amounts)}
+
+
+def apply_deltas(changes):
+    """
+    Add deltas() output to the components' totals, one UPDATE per component.
+
+    Components are updated in a fixed order so concurrent callers lock rows
+    in the same order.
+
+    Returns:
+        Number of components updated
+    """
+    if not changes:
+        return 0
+    models = _models_by_content_type()
+    ordered = sorted(changes.items(), key=lambda item: (item[0][0], str(item[0][1])))
+    for (content_type_id, object_id), (total, total_base) in ordered:
+        models[content_type_id].objects.filter(pk=object_id).update(
+            transaction_total=F('transaction_total') + total,
+            transaction_total_base=F('transaction_total_base') + total_base,
+        )
+    return len(changes)
+
+
+def _components(rows, organizations=None):
+    """Load the components rows refer to, keyed by (component_type, str(id))."""
+    ids = defaultdict(set)
+    for row in rows:
+        ids[row['component_type']].add(str(row['component_id']))
+
+    components = {}
+    for component_type, component_ids in ids.items():
+        model = COMPONENT_TYPES[component_type]
+        queryset = model.objects.select_related(*RELATED[model]).filter(pk__in=component_ids)
+        if organizations is not None:
+            if model is ServiceFee:
+                queryset = queryset.filter(organization__in=organizations)
+            else:
+                queryset = queryset.filter(booking__organization__in=organizations)
+        for component in queryset:
+            components[(component_type, str(component.pk))] = component
+    return components
+
+
+def ingest(rows, user=None, organizations=None):
+    """
+    Insert transactions in bulk and update their components' totals.
+
+    Args:
+        rows: Dicts with component_type (one of COMPONENT_TYPES),
+            component_id and BookingTransaction FIELDS
+        user: Optional user recorded as created_by
+        organizations: Optional queryset of organizations the components
+            must belong to
+
+    Returns:
+        The created BookingTransactions
+
+    Raises:
+        ValueError: If a row's component doesn't exist (or is outside
+            organizations); nothing is inserted
+    """
+    # Import here to avoid circular imports
+    from apps.reference_data.rates import ExchangeRateTable
+
+    rows = list(rows)
+    if not rows:
+        return []
+    components = _components(rows, organizations)
+    missing = sorted({
+        f"{row['component_type']} {row['component_id']}" for row in rows
+        if (row['component_type'], str(row['component_id'])) not in components
+    })
+    if missing:
+        raise ValueError(f"Unknown booking components: {', '.join(missing[:10])}")
+
+    currencies = {row.get('currency') or 'AUD' for row in rows}
+    for component in components.values():
+        organization = getattr(component, 'organization', None) or component.booking.organization
+        currencies.add(organization.base_currency)
+    rates = ExchangeRateTable.load(currencies=currencies, until=max(row['transaction_date'] for row in rows))
+
+    created = []
+    for row in rows:
+        booking_transaction = BookingTransaction(
+            booking_component=components[(row['component_type'], str(row['component_id']))],
+            created_by=user,
+            **{field: row[field] for field in FIELDS if row.get(field) is not None},
+        )
+        if booking_transaction.total_amount is None or booking_transaction.total_amount == 0:
+            booking_transaction.total_amount = (
+                booking_transaction.base_amount + booking_transaction.taxes + booking_transaction.fees
+            )
+        booking_transaction.convert_to_base_currency(rates)
+        created.append(booking_transaction)
+
+    with transaction.atomic():
+        BookingTransaction.objects.bulk_create(created, batch_size=BATCH_SIZE)
+        updated = apply_deltas(deltas((None, t.contribution()) for t in created))
+        valuation.refresh((t.content_type_id, t.object_id) for t in created)
+        for booking_transaction in created:
+            audit.record(
+                booking_transaction.booking_component.booking_id,
+                'TRANSACTION_CREATED',
+                f'Transaction {booking_transaction.get_transaction_type_display()}: '
+                f'{booking_transaction.currency} {booking_transaction.total_amount}',
+                component=booking_transaction,
+                user=user,
+                new_value={
+                    'transaction_type': booking_transaction.transaction_type,
+                    'total_amount': str(booking_transaction.total_amount),
+                    'currency': booking_transaction.currency,
+                },
+            )
+
+    analytics.invalidate_cache()
+    logger.info(f"Ingested {len(created)} transactions into {updated} components")
+    return created
+
+
+def rebuild_totals():
+    """
+    Recompute every component's totals from its transactions, one UPDATE
+    per component type.
+
+    Returns:
+        {component model name: rows updated}
+    """
+    updated = {}
+    with transaction.atomic():
+        for model in COMPONENT_TYPES.values():
+            counted = (
+                BookingTransaction.objects
+                .filter(content_type=ContentType.objects.get_for_model(model), object_id=OuterRef('pk'))
+                .exclude(status__in=BookingTransaction.UNCOUNTED_STATUSES)
+                .order_by()
+                .values('object_id')
+            )
+            zero = Value(ZERO, output_field=DecimalField(max_digits=12, decimal_places=2))
+            updated[model.__name__] = model.objects.update(
+                transaction_total=Coalesce(Subquery(counted.annotate(total=Sum('total_amount')).values('total')), zero),
+                transaction_total_base=Coalesce(
+                    Subquery(counted.annotate(total=Sum('total_amount_base')).values('total')), zero
+                ),
+            )
+    return updated
@@ -0,0 +1,237 @@
+# apps/bookings/trips.py
+"""
+Trip reconstruction.
+
+Bookings are per PNR, but a trip is the flight out, the stays and rentals
+and the flight back, often spread over several bookings. For each
+traveller the timeline (see timeline.py) is swept once in start order and
+cut into trips where:
+
+- nothing starts within MAX_GAP of everything before it ending, or
+- the traveller has flown back to the trip's origin city and the next
+  item starts more than RETURN_GAP after landing
+
+Trips are derived data. They are rebuilt for the travellers whose bookings
+changed (imports and the signals in signals.py) and can be rebuilt in bulk
+with the build_trips command. The same sweep writes the travellers'
+location timeline (see locations.py).
+"""
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+import logging
+
+from . import locations, timeline
+from .models import Booking, TravellerLocation, Trip
+
+logger = logging.getLogger(__name__)
+
+# Longest idle time between two items of the same trip
+MAX_GAP = timedelta(hours=48)
+
+# After the flight home, items starting within this of landing still belong to the trip
+RETURN_GAP = timedelta(hours=4)
+
+# Cancelled and refunded bookings are not travel
+EXCLUDED_STATUSES = ['CANCELLED', 'REFUNDED']
+
+# Travellers written per transaction in bulk rebuilds
+BATCH_SIZE = 500
+
+
+class TripDraft:
+    """Intervals swept into one trip so far."""
+
+    def __init__(self, interval):
+        self.intervals = [interval]
+        self.start = interval.start
+        self.end = interval.end
+        self.origin_city = interval.origin_city if interval.kind == timeline.FLIGHT else ''
+        self.returned_at = None
+
+    def accepts(self, interval):
+        if interval.start - self.end > MAX_GAP:
+            return False
+        if self.returned_at is not None and interval.start - self.returned_at > RETURN_GAP:
+            return False
+        return True
+
+    def add(self, interval):
+        self.intervals.append(interval)
+        self.end = max(self.end, interval.end)
+
+    def note_return(self, interval):
+        if (interval.kind == timeline.FLIGHT and self.origin_city
+                and interval.city == self.origin_city and interval is not self.intervals[0]):
+            self.returned_at = interval.end
+
+
+def sweep(intervals):
+    """
+    Cut one traveller's intervals (sorted by start) into TripDrafts.
+
+    Linear in the number of intervals.
+    """
+    drafts = []
+    current = None
+    for interval in intervals:
+        if current is not None and current.accepts(interval):
+            current.add(interval)
+        else:
+            current = TripDraft(interval)
+            drafts.append(current)
+        current.note_return(interval)
+    return drafts
+
+
+def to_trip(draft):
+    """Trip instance (unsaved) and the set of booking ids for a draft."""
+    first = draft.intervals[0]
+    spend = Counter()
+    nights = Counter()
+    countries = {}
+    flights = 0
+    rental_days = 0
+    carbon = Decimal('0.00')
+    first_destination = None
+
+    for interval in draft.intervals:
+        spend[interval.kind] += interval.spend
+        if interval.kind == timeline.FLIGHT:
+            flights += 1
+            carbon += interval.carbon_kg
+            if first_destination is None:
+                first_destination = interval
+        elif interval.kind == timeline.STAY:
+            nights[interval.city] += interval.nights
+            countries.setdefault(interval.city, interval.country)
+        else:
+            rental_days += interval.days
+
+    if nights:
+        destination_city = nights.most_common(1)[0][0]
+        destination_country = countries[destination_city]
+    else:
+        destination = first_destination or first
+        destination_city, destination_country = destination.city, destination.country
+
+    air = spend[timeline.FLIGHT]
+    hotel = spend[timeline.STAY]
+    car = spend[timeline.RENTAL]
+    trip = Trip(
+        organization_id=first.organization_id,
+        traveller_id=first.traveller_id,
+        start_date=draft.start.date(),
+        end_date=draft.end.date(),
+        duration_days=(draft.end.date() - draft.start.date()).days + 1,
+        origin_city=draft.origin_city,
+        destination_city=destination_city,
+        destination_country=destination_country,
+        flight_count=flights,
+        nights=sum(nights.values()),
+        rental_days=rental_days,
+        air_spend=air,
+        hotel_spend=hotel,
+        car_spend=car,
+        total_spend=air + hotel + car,
+        total_carbon_kg=carbon,
+    )
+    return trip, {interval.booking_id for interval in draft.intervals}
+
+
+def _write(trips, traveller_locations=()):
+    """Insert trips, their booking links and the travellers' locations."""
+    TravellerLocation.objects.bulk_create(traveller_locations, batch_size=5000)
+    if not trips:
+        return 0
+    Trip.objects.bulk_create([trip for trip, _ in trips], batch_size=1000)
+    Link = Trip.bookings.through
+    Link.objects.bulk_create(
+        [Link(trip_id=trip.pk, booking_id=booking_id) for trip, booking_ids in trips for booking_id in booking_ids],
+        batch_size=5000,
+    )
+    return len(trips)
+
+
+def _build(bookings):
+    """
+    Yield (traveller_id, [(trip, booking_ids), ...], [location, ...]) for the
+    bookings' travellers.
+    """
+    for traveller_id, intervals in timeline.by_traveller(bookings.exclude(status__in=EXCLUDED_STATUSES)):
+        drafts = sweep(intervals)
+        yield (
+            traveller_id,
+            [to_trip(draft) for draft in drafts],
+            [location for draft in drafts for location in locations.to_locations(draft)],
+        )
+
+
+def rebuild_travellers(traveller_ids):
+    """
+    Rebuild the trips and locations of the given travellers in one
+    transaction.
+
+    Returns:
+        Number of trips written
+    """
+    traveller_ids = list(set(traveller_ids))
+    if not traveller_ids:
+        return 0
+
+    written = 0
+    with transaction.atomic():
+        Trip.objects.filter(traveller_id__in=traveller_ids).delete()
+        TravellerLocation.objects.filter(traveller_id__in=traveller_ids).delete()
+        for _, trips, traveller_locations in _build(Booking.objects.filter(traveller_id__in=traveller_ids)):
+            written += _write(trips, traveller_locations)
+    return written
+
+
+def rebuild_all(organization_id=None):
+    """
+    Rebuild every trip and location (of one organization, or all), a batch of travellers
+    per transaction so history of any size streams through.
+
+    Returns:
+        Number of trips written
+    """
+    started = timezone.now()
+    bookings = Booking.objects.all()
+    trips = Trip.objects.all()
+    located = TravellerLocation.objects.all()
+    if organization_id is not None:
+        bookings = bookings.filter(organization_id=organization_id)
+        trips = trips.filter(organization_id=organization_id)
+        located = located.filter(organization_id=organization_id)
+
+    written = 0
+    pending_travellers, pending, pending_locations = [], [], []
+
+    def flush():
+        nonlocal written
+        with transaction.atomic():
+            Trip.objects.filter(traveller_id__in=pending_travellers, built_at__lt=started).delete()
+            TravellerLocation.objects.filter(traveller_id__in=pending_travellers).delete()
+            written += _write(pending, pending_locations)
+        pending_travellers.clear()
+        pending.clear()
+        pending_locations.clear()
+
+    for traveller_id, traveller_trips, traveller_locations in _build(bookings):
+        pending_travellers.append(traveller_id)
+        pending.extend(traveller_trips)
+        pending_locations.extend(traveller_locations)
+        if len(pending_travellers) >= BATCH_SIZE:
+            flush()
+    flush()
+
+    # Travellers left without any travel
+    trips.filter(built_at__lt=started).delete()
+    located.filter(~Exists(Trip.objects.filter(traveller_id=OuterRef('traveller_id')))).delete()
+    logger.info(f"Rebuilt {written} trips" + (f" for organization {organization_id}" if organization_id else ""))
+    return written
@@ -0,0 +1,238 @@
+# apps/bookings/valuation.py
+"""
+As-of valuation of booking components.
+
+BookingTransactions record what happened to a component and when
+(original sale, exchanges, refunds, ...), so its value on a past date is
+the net of its transactions up to that date. Replaying the ledger for
+every report doesn't scale; instead each component's running balance is
+materialized as TransactionBalance rows - one per day with transactions -
+computed with window functions over the ledger:
+
+    SUM(total_amount) OVER (PARTITION BY component ORDER BY date ROWS UNBOUNDED PRECEDING)
+    LEAD(transaction_date) OVER (PARTITION BY component ORDER BY date)
+
+The second gives each row the date it stops applying (valid_until), so the
+value of a component as of a date is a single indexed row lookup:
+balance_date <= date < valid_until.
+
+Rows are refreshed per component when its transactions change (see
+signals.py and transactions.ingest()); build() rebuilds everything.
+
+Components without any (counted) transaction have no ledger to replay;
+value_as_of() falls back to their recorded amount from the day they were
+booked.
+"""
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import (
+    Case, Count, DecimalField, Exists, F, OuterRef, Q, RowRange, Subquery, Sum, Value, When, Window
+)
+from django.db.models.functions import Coalesce, Lead
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+import logging
+
+from .models import (
+    AirBooking, AccommodationBooking, CarHireBooking, ServiceFee, BookingTransaction,
+    TransactionBalance
+)
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_MODELS = {
+    'AIR': AirBooking,
+    'HOTEL': AccommodationBooking,
+    'CAR': CarHireBooking,
+    'FEE': ServiceFee,
+}
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+BATCH_SIZE = 5000
+
+
+def parse_as_of(value):
+    """
+    Parse an ?as_of=YYYY-MM-DD query parameter.
+
+    Raises:
+        ValueError: If the value isn't a date
+    """
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError('as_of must be a date (YYYY-MM-DD)')
+
+
+def _matching(components):
+    """Q matching rows of the (content_type_id, object_id) components, None if there are none."""
+    by_type = defaultdict(set)
+    for content_type_id, object_id in components:
+        by_type[content_type_id].add(object_id)
+    if not by_type:
+        return None
+    match = Q()
+    for content_type_id, object_ids in by_type.items():
+        match |= Q(content_type_id=content_type_id, object_id__in=object_ids)
+    return match
+
+
+def _ledger(components=None):
+    """
+    Window-function query over counted transactions: per transaction, the
+    component's running totals and the date of the component's next
+    transaction.
+
+    Args:
+        components: Optional iterable of (content_type_id, object_id)
+    """
+    ledger = BookingTransaction.objects.exclude(status__in=BookingTransaction.UNCOUNTED_STATUSES)
+    if components is not None:
+        match = _matching(components)
+        if match is None:
+            return ledger.none()
+        ledger = ledger.filter(match)
+
+    window = dict(
+        partition_by=[F('content_type'), F('object_id')],
+        order_by=[F('transaction_date').asc(), F('created_at').asc(), F('id').asc()],
+    )
+    cumulative = dict(window, frame=RowRange(start=None, end=0))
+    return (
+        ledger
+        .annotate(
+            running_total=Window(Sum('total_amount'), **cumulative),
+            running_total_base=Window(Sum(Coalesce('total_amount_base', Value(Decimal('0.00')))), **cumulative),
+            running_count=Window(Count('id'), **cumulative),
+            next_date=Window(Lead('transaction_date'), **window),
+        )
+        .order_by()
+        .values_list(
+            'content_type_id', 'object_id', 'transaction_date', 'running_total',
+            'running_total_base', 'running_count', 'next_date',
+        )
+    )
+
+
+def _owners(object_ids_by_type):
+    """{(content_type_id, object_id): (product_type, organization_id, booking_id)}"""
+    content_types = ContentType.objects.get_for_models(*PRODUCT_MODELS.values())
+    owners = {}
+    for product_type, model in PRODUCT_MODELS.items():
+        content_type_id = content_types[model].id
+        object_ids = object_ids_by_type.get(content_type_id)
+        if not object_ids:
+            continue
+        organization = 'organization_id' if model is ServiceFee else 'booking__organization_id'
+        for pk, organization_id, booking_id in (
+            model.objects.filter(pk__in=object_ids).values_list('pk', organization, 'booking_id')
+        ):
+            owners[(content_type_id, pk)] = (product_type, organization_id, booking_id)
+    return owners
+
+
+def _balances(rows):
+    """TransactionBalance rows from _ledger() rows: the last transaction of each day."""
+    rows = list(rows)
+    object_ids_by_type = defaultdict(set)
+    for row in rows:
+        object_ids_by_type[row[0]].add(row[1])
+    owners = _owners(object_ids_by_type)
+
+    for content_type_id, object_id, day, total, total_base, count, next_date in rows:
+        if next_date == day:
+            # Not the day's last transaction
+            continue
+        owner = owners.get((content_type_id, object_id))
+        if owner is None:
+            # Component deleted
+            continue
+        product_type, organization_id, booking_id = owner
+        yield TransactionBalance(
+            organization_id=organization_id,
+            booking_id=booking_id,
+            content_type_id=content_type_id,
+            object_id=object_id,
+            product_type=product_type,
+            balance_date=day,
+            valid_until=next_date,
+            running_total=total,
+            running_total_base=total_base,
+            transaction_count=count,
+        )
+
+
+def refresh(components):
+    """
+    Recompute the balances of some components.
+
+    Args:
+        components: Iterable of (content_type_id, object_id)
+
+    Returns:
+        Number of balance rows written
+    """
+    components = set(components)
+    match = _matching(components)
+    if match is None:
+        return 0
+
+    with transaction.atomic():
+        TransactionBalance.objects.filter(match).delete()
+        created = TransactionBalance.objects.bulk_create(
+            _balances(_ledger(components)), batch_size=BATCH_SIZE
+        )
+    return len(created)
+
+
+def build():
+    """
+    Rebuild all balances from the ledger.
+
+    Returns:
+        Number of balance rows written
+    """
+    written = 0
+    with transaction.atomic():
+        TransactionBalance.objects.all().delete()
+        pending = []
+        for row in _ledger().iterator(chunk_size=BATCH_SIZE):
+            pending.append(row)
+            if len(pending) >= BATCH_SIZE:
+                written += len(TransactionBalance.objects.bulk_create(_balances(pending), batch_size=BATCH_SIZE))
+                pending = []
+        written += len(TransactionBalance.objects.bulk_create(_balances(pending), batch_size=BATCH_SIZE))
+    logger.info(f"Transaction balances rebuilt: {written} rows")
+    return written
+
+
+def value_as_of(model, as_of, recorded, recorded_on):
+    """
+    Expression valuing each row of a component queryset as of a date.
+
+    Args:
+        model: Component model (one of PRODUCT_MODELS)
+        as_of: The date
+        recorded: Expression for the component's recorded amount, used when
+            it has no transactions
+        recorded_on: Field with the date that amount applies from
+    """
+    balances = TransactionBalance.objects.filter(
+        content_type=ContentType.objects.get_for_model(model),
+        object_id=OuterRef('pk'),
+    )
+    balance = (
+        balances
+        .filter(Q(valid_until__gt=as_of) | Q(valid_until__isnull=True), balance_date__lte=as_of)
+        .values('running_total_base')[:1]
+    )
+    zero = Value(Decimal('0.00'), output_field=MONEY)
+    return Case(
+        When(Exists(balances), then=Coalesce(Subquery(balance), zero)),
+        When(**{f'{recorded_on}__lte': as_of}, then=recorded),
+        default=zero,
+        output_field=MONEY,
+    )
@@ -123,43 +123,41 @@ class Budget(models.Model):
     def __str__(self):
         return f"{self.organization.name} - {self.cost_center} ({self.fiscal_year.year_label})"
     
-    def get_total_spent(self):
-        """Calculate total spent against this budget"""
-        from django.db.models import Sum
-        from apps.bookings.models import Booking
+    def _spend_facts(self):
+        """Confirmed daily spend facts for this cost center within the fiscal year"""
+        from apps.bookings.models import DailySpendFact
         
-        bookings = Booking.objects.filter(
+        return DailySpendFact.objects.filter(
             organization=self.organization,
-            traveller__cost_center=self.cost_center,
-            travel_date__gte=self.fiscal_year.start_date,
-            travel_date__lte=self.fiscal_year.end_date,
+            cost_center=self.cost_center,
+            date__gte=self.fiscal_year.start_date,
+            date__lte=self.fiscal_year.end_date,
             status='CONFIRMED'
-        ).aggregate(total=Sum('total_amount'))
+        )
+    
+    def get_total_spent(self):
+        """Calculate total spent against this budget"""
+        from django.db.models import Sum
         
-        return bookings['total'] or Decimal('0.00')
+        total = self._spend_facts().aggregate(total=Sum('spend'))['total']
+        return total or Decimal('0.00')
     
     def get_spent_by_category(self):
         """Calculate spent amount by booking category"""
         from django.db.models import Sum
-        from apps.bookings.models import Booking
         
-        base_query = Booking.objects.filter(
-            organization=self.organization,
-            traveller__cost_center=self.cost_center,
-            travel_date__gte=self.fiscal_year.start_date,
-            travel_date__lte=self.fiscal_year.end_date,
-            status='CONFIRMED'
+        by_product = dict(
+            self._spend_facts()
+            .values('product_type')
+            .annotate(total=Sum('spend'))
+            .values_list('product_type', 'total')
         )
         
         return {
-            'air': base_query.filter(booking_type='AIR').aggregate(
-                total=Sum('total_amount'))['total'] or Decimal('0.00'),
-            'accommodation': base_query.filter(booking_type='HOTEL').aggregate(
-                total=Sum('total_amount'))['total'] or Decimal('0.00'),
-            'car_hire': base_query.filter(booking_type='CAR').aggregate(
-                total=Sum('total_amount'))['total'] or Decimal('0.00'),
-            'other': base_query.filter(booking_type='OTHER').aggregate(
-                total=Sum('total_amount'))['total'] or Decimal('0.00'),
+            'air': by_product.get('AIR') or Decimal('0.00'),
+            'accommodation': by_product.get('HOTEL') or Decimal('0.00'),
+            'car_hire': by_product.get('CAR') or Decimal('0.00'),
+            'other': by_product.get('FEE') or Decimal('0.00'),
         }
     
     def get_budget_status(self):
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Commission
+from .models import Commission, CommissionStatement, CommissionStatementLine
 
 
 @admin.register(Commission)
@@ -47,4 +47,37 @@ class CommissionAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.select_related('organization', 'booking', 'import_batch')
\ No newline at end of file
+        return qs.select_related('organization', 'booking', 'import_batch')
+
+
+@admin.register(CommissionStatement)
+class CommissionStatementAdmin(admin.ModelAdmin):
+    list_display = ['organization', 'supplier_name', 'commission_period', 'status', 'lines_total',
+                    'lines_matched', 'lines_variance', 'lines_unmatched', 'commissions_missing',
+                    'statement_total', 'expected_total', 'reconciled_at']
+    list_filter = ['status', 'organization', 'commission_period']
+    search_fields = ['supplier_name', 'file_name', 'organization__name']
+    list_select_related = ['organization']
+
+    # Statements are loaded and reconciled by apps.commissions.reconciliation
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CommissionStatementLine)
+class CommissionStatementLineAdmin(admin.ModelAdmin):
+    list_display = ['statement', 'line_number', 'supplier_reference', 'supplier_name', 'amount',
+                    'expected_amount', 'variance', 'status']
+    list_filter = ['status', 'statement__organization', 'statement__commission_period']
+    search_fields = ['supplier_reference', 'booking_reference', 'commission__booking__agent_booking_reference']
+    list_select_related = ['statement']
+    raw_id_fields = ['statement', 'commission']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,91 @@
+import os
+import re
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from apps.commissions.models import CommissionStatement
+from apps.commissions.reconciliation import StatementError, file_hash, load_statement, reconcile
+from apps.organizations.models import Organization
+
+
+class Command(BaseCommand):
+    help = "Reconcile a supplier's commission statement (CSV) against the period's commissions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', nargs='?', help='Path to the statement CSV')
+        parser.add_argument('--organization', help='Code of the agent organization the statement was issued to')
+        parser.add_argument('--period', help="Commission period, e.g. '2025-10'")
+        parser.add_argument('--supplier', default='',
+                            help='Supplier the statement covers (default: all suppliers of the period)')
+        parser.add_argument('--currency', default='AUD', help='Currency of lines without one')
+        parser.add_argument('--statement', help='Re-run the reconciliation of this CommissionStatement id')
+        parser.add_argument('--force', action='store_true', help='Load the file even if it was loaded before')
+
+    def handle(self, *args, **options):
+        if options['statement']:
+            try:
+                statement = CommissionStatement.objects.get(pk=options['statement'])
+            except (CommissionStatement.DoesNotExist, ValidationError):
+                raise CommandError(f"Commission statement '{options['statement']}' not found")
+            self.stdout.write(f'Re-running reconciliation of statement {statement.pk}...')
+            statement = reconcile(statement)
+            self.report(statement)
+            return
+
+        path = options['file']
+        if not path:
+            raise CommandError('Give a statement file, or --statement to re-run one')
+        if not os.path.exists(path):
+            raise CommandError(f"File '{path}' not found")
+        if not options['organization'] or not options['period']:
+            raise CommandError('--organization and --period are required with a statement file')
+        if not re.fullmatch(r'\d{4}-\d{2}', options['period']):
+            raise CommandError(f"Period '{options['period']}' must be YYYY-MM")
+
+        organization = Organization.objects.filter(code=options['organization']).first()
+        if organization is None:
+            raise CommandError(f"Organization '{options['organization']}' not found")
+
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                content = f.read()
+        except UnicodeDecodeError as e:
+            raise CommandError(f"File '{path}' is not UTF-8 text: {e}")
+
+        earlier = CommissionStatement.objects.filter(
+            organization=organization, file_hash=file_hash(content)
+        ).exclude(status='FAILED').first()
+        if earlier is not None and not options['force']:
+            raise CommandError(
+                f"This file was already loaded as statement {earlier.pk}; "
+                f"use --statement {earlier.pk} to re-run it or --force to load it again"
+            )
+
+        self.stdout.write(f"Reconciling {path} for {organization.code} {options['period']}...")
+        try:
+            statement = load_statement(
+                content,
+                organization,
+                options['period'],
+                supplier_name=options['supplier'],
+                currency=options['currency'].upper(),
+                file_name=os.path.basename(path),
+            )
+        except StatementError as e:
+            raise CommandError(str(e))
+        self.report(statement)
+
+    def report(self, statement):
+        self.stdout.write(
+            f'  {statement.lines_total} lines: {statement.lines_matched} matched, '
+            f'{statement.lines_variance} with a variance ({statement.variance_total}), '
+            f'{statement.lines_unmatched} unmatched ({statement.unmatched_total})'
+        )
+        self.stdout.write(
+            f'  {statement.commissions_missing} recorded commissions not on the statement '
+            f'({statement.missing_total})'
+        )
+        self.stdout.write(
+            f'  statement total {statement.statement_total}, recorded {statement.expected_total}'
+        )
+        self.stdout.write(self.style.SUCCESS(f'Statement {statement.pk} reconciled'))
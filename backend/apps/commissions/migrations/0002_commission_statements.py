@@ -0,0 +1,251 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:40
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("organizations", "0003_organization_home_country_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("commissions", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CommissionStatement",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "supplier_name",
+                    models.CharField(
+                        blank=True,
+                        help_text="Supplier the statement covers; blank for multi-supplier statements",
+                        max_length=200,
+                    ),
+                ),
+                (
+                    "commission_period",
+                    models.CharField(
+                        help_text="Period covered, e.g. '2025-10'", max_length=20
+                    ),
+                ),
+                ("currency", models.CharField(default="AUD", max_length=3)),
+                ("file_name", models.CharField(blank=True, max_length=255)),
+                (
+                    "file_hash",
+                    models.CharField(
+                        blank=True,
+                        help_text="SHA-256 of the statement file",
+                        max_length=64,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("RECONCILED", "Reconciled"),
+                            ("FAILED", "Failed"),
+                        ],
+                        default="PENDING",
+                        max_length=20,
+                    ),
+                ),
+                ("lines_total", models.IntegerField(default=0)),
+                ("lines_matched", models.IntegerField(default=0)),
+                ("lines_variance", models.IntegerField(default=0)),
+                ("lines_unmatched", models.IntegerField(default=0)),
+                (
+                    "commissions_missing",
+                    models.IntegerField(
+                        default=0,
+                        help_text="Commissions of the period that aren't on the statement",
+                    ),
+                ),
+                (
+                    "statement_total",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                (
+                    "expected_total",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0.00"),
+                        help_text="Commissions recorded for the period (and supplier)",
+                        max_digits=14,
+                    ),
+                ),
+                (
+                    "variance_total",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0.00"),
+                        help_text="Statement minus recorded amount over matched lines",
+                        max_digits=14,
+                    ),
+                ),
+                (
+                    "unmatched_total",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                (
+                    "missing_total",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                ("error_message", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("reconciled_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "imported_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="commission_statements",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "organization",
+                    models.ForeignKey(
+                        help_text="Travel agent organization the statement was issued to",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="commission_statements",
+                        to="organizations.organization",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "commission_statements",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.CreateModel(
+            name="CommissionStatementLine",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "line_number",
+                    models.IntegerField(
+                        blank=True, help_text="Line in the statement file", null=True
+                    ),
+                ),
+                ("supplier_reference", models.CharField(blank=True, max_length=100)),
+                ("supplier_name", models.CharField(blank=True, max_length=200)),
+                ("booking_reference", models.CharField(blank=True, max_length=100)),
+                (
+                    "amount",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        help_text="Commission amount on the statement",
+                        max_digits=10,
+                        null=True,
+                    ),
+                ),
+                ("currency", models.CharField(blank=True, max_length=3)),
+                ("description", models.CharField(blank=True, max_length=255)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("MATCHED", "Matched"),
+                            ("VARIANCE", "Amount Variance"),
+                            ("UNMATCHED", "Not in Commissions"),
+                            ("MISSING", "Not on Statement"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "expected_amount",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        help_text="Commission amount recorded",
+                        max_digits=10,
+                        null=True,
+                    ),
+                ),
+                (
+                    "variance",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0.00"),
+                        help_text="Statement amount minus recorded amount",
+                        max_digits=10,
+                    ),
+                ),
+                (
+                    "commission",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="statement_lines",
+                        to="commissions.commission",
+                    ),
+                ),
+                (
+                    "statement",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lines",
+                        to="commissions.commissionstatement",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "commission_statement_lines",
+                "ordering": ["statement", "line_number"],
+                "indexes": [
+                    models.Index(
+                        fields=["statement", "status"],
+                        name="commission__stateme_78a3a3_idx",
+                    ),
+                    models.Index(
+                        fields=["commission"], name="commission__commiss_22b46c_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="commissionstatement",
+            index=models.Index(
+                fields=["organization", "commission_period"],
+                name="commission__organiz_a7936e_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="commissionstatement",
+            index=models.Index(
+                fields=["file_hash"], name="commission__file_ha_2b9818_idx"
+            ),
+        ),
+    ]
@@ -130,4 +130,153 @@ class Commission(models.Model):
         """Calculate commission rate as percentage (for analysis)"""
         if self.booking_amount and self.booking_amount > 0:
             return (self.commission_amount / self.booking_amount * 100).quantize(Decimal('0.01'))
-        return None
\ No newline at end of file
+        return None
+
+class CommissionStatement(models.Model):
+    """
+    A supplier's commission statement for a period, reconciled against the
+    Commission records (see apps.commissions.reconciliation).
+    """
+
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RECONCILED', 'Reconciled'),
+        ('FAILED', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='commission_statements',
+        help_text="Travel agent organization the statement was issued to"
+    )
+    supplier_name = models.CharField(
+        max_length=200,
+        blank=True,
+        help_text="Supplier the statement covers; blank for multi-supplier statements"
+    )
+    commission_period = models.CharField(max_length=20, help_text="Period covered, e.g. '2025-10'")
+    currency = models.CharField(max_length=3, default='AUD')
+
+    # Source file
+    file_name = models.CharField(max_length=255, blank=True)
+    file_hash = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the statement file")
+
+    # Result
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    lines_total = models.IntegerField(default=0)
+    lines_matched = models.IntegerField(default=0)
+    lines_variance = models.IntegerField(default=0)
+    lines_unmatched = models.IntegerField(default=0)
+    commissions_missing = models.IntegerField(
+        default=0,
+        help_text="Commissions of the period that aren't on the statement"
+    )
+    statement_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    expected_total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Commissions recorded for the period (and supplier)"
+    )
+    variance_total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Statement minus recorded amount over matched lines"
+    )
+    unmatched_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    missing_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    error_message = models.TextField(blank=True)
+
+    # Metadata
+    imported_by = models.ForeignKey(
+        'users.User',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='commission_statements'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'commission_statements'
+        indexes = [
+            models.Index(fields=['organization', 'commission_period']),
+            models.Index(fields=['file_hash']),
+        ]
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.supplier_name or 'Statement'} {self.commission_period} ({self.get_status_display()})"
+
+
+class CommissionStatementLine(models.Model):
+    """
+    One line of a commission statement and its reconciliation result, or a
+    Commission of the period that no statement line accounts for (MISSING,
+    without line_number).
+    """
+
+    STATUS_CHOICES = [
+        ('MATCHED', 'Matched'),
+        ('VARIANCE', 'Amount Variance'),
+        ('UNMATCHED', 'Not in Commissions'),
+        ('MISSING', 'Not on Statement'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    statement = models.ForeignKey(CommissionStatement, on_delete=models.CASCADE, related_name='lines')
+    line_number = models.IntegerField(null=True, blank=True, help_text="Line in the statement file")
+
+    # As stated by the supplier
+    supplier_reference = models.CharField(max_length=100, blank=True)
+    supplier_name = models.CharField(max_length=200, blank=True)
+    booking_reference = models.CharField(max_length=100, blank=True)
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text="Commission amount on the statement"
+    )
+    currency = models.CharField(max_length=3, blank=True)
+    description = models.CharField(max_length=255, blank=True)
+
+    # Reconciliation
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    commission = models.ForeignKey(
+        Commission,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='statement_lines'
+    )
+    expected_amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text="Commission amount recorded"
+    )
+    variance = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Statement amount minus recorded amount"
+    )
+
+    class Meta:
+        db_table = 'commission_statement_lines'
+        indexes = [
+            models.Index(fields=['statement', 'status']),
+            models.Index(fields=['commission']),
+        ]
+        ordering = ['statement', 'line_number']
+
+    def __str__(self):
+        return f"{self.supplier_reference or '-'} {self.amount} ({self.get_status_display()})"
@@ -0,0 +1,413 @@
+# apps/commissions/reconciliation.py
+"""
+Commission statement reconciliation.
+
+Suppliers send agents a monthly statement of the commission they are
+paying - tens of thousands of lines for a large agency. Looking each line
+up in the database would cost a query per line, so the period's
+commissions are loaded once and the statement is hash-joined against them
+in memory:
+
+1. Build: every commission of the period goes into a hash table keyed on
+   (supplier_reference, amount band). References are compared uppercased
+   without spaces, and amount bands are logarithmic, about
+   AMOUNT_BAND_RATIO wide.
+2. Probe: each statement line looks in its own and the two neighbouring
+   bands and claims the closest unclaimed commission - first only
+   commissions within MATCH_TOLERANCE of the line (MATCHED), then any in
+   those bands (VARIANCE). Lines still unpaired are then joined on
+   supplier_reference alone, also as VARIANCE.
+3. Lines left over are UNMATCHED (paid but not recorded) and commissions
+   of the statement's supplier left over are MISSING (recorded but not
+   paid).
+
+Statement and GDS supplier names rarely agree verbatim ("Qantas" /
+"QANTAS AIRWAYS LTD"), so names only break ties between candidates of one
+reference. They are compared as SupplierKeys: the canonical HotelChain or
+CarRentalCompany a name matches (see reference_data.suppliers), else its
+tokens; two keys agree when one is a run of the other's tokens.
+
+The amount band keeps several commissions under one reference (e.g. the
+tickets of one PNR) paired with the right lines. Lines without a supplier
+reference are never matched.
+
+Results are stored as CommissionStatementLine rows with bulk_create, and
+the statement keeps the counts and totals. reconcile() re-runs the join
+for a stored statement, e.g. after more commissions have been imported.
+
+Statement files are CSV with a header row:
+
+    supplier_reference,supplier_name,amount,currency,booking_reference,description
+
+Only supplier_reference and amount are required; lines without a
+supplier_name take the statement's supplier.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+import csv
+import hashlib
+import io
+import logging
+import math
+
+from apps.reference_data.models import CarRentalCompany, HotelChain
+from apps.reference_data.suppliers import matcher, tokenize
+from .models import Commission, CommissionStatement, CommissionStatementLine
+
+logger = logging.getLogger(__name__)
+
+# Relative width of an amount band (neighbouring bands are probed too)
+AMOUNT_BAND_RATIO = 0.02
+
+# Largest difference between statement and recorded amount that still counts as MATCHED
+MATCH_TOLERANCE = Decimal('0.01')
+
+REQUIRED_COLUMNS = ['supplier_reference', 'amount']
+
+# Largest amount a CommissionStatementLine holds (max_digits=10)
+MAX_AMOUNT = Decimal('99999999.99')
+
+BATCH_SIZE = 5000
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+
+class StatementError(ValueError):
+    """A statement file that can't be read."""
+
+
+def normalize_reference(reference):
+    """'abc 123 ' -> 'ABC123'"""
+    return ''.join((reference or '').split()).upper()
+
+
+def normalize_supplier(name):
+    """'QANTAS-Airways' -> 'qantas airways'"""
+    return ' '.join(tokenize(name))
+
+
+def same_supplier(a, b):
+    """Whether two supplier keys can name one supplier ('qantas' / 'qantas airways'); a blank key agrees with any."""
+    if not a or not b or a == b:
+        return True
+    shorter, longer = sorted((a, b), key=len)
+    return f' {shorter} ' in f' {longer} '
+
+
+class SupplierKeys:
+    """
+    Canonical supplier keys for one reconciliation: the name of the hotel
+    chain or rental company a name matches, else the name's tokens.
+    """
+
+    def __init__(self):
+        self.matchers = [matcher(HotelChain), matcher(CarRentalCompany)]
+
+    def __call__(self, name):
+        for supplier_matcher in self.matchers:
+            supplier = supplier_matcher.match(name)
+            if supplier is not None:
+                return normalize_supplier(supplier.name)
+        return normalize_supplier(name)
+
+
+def amount_band(amount):
+    """Logarithmic band number of an amount; negative amounts (clawbacks) get negative bands."""
+    cents = abs(amount) / CENT
+    if cents < 1:
+        return 0
+    band = int(math.log(float(cents)) / math.log(1 + AMOUNT_BAND_RATIO)) + 1
+    return band if amount > 0 else -band
+
+
+def file_hash(content):
+    """SHA-256 of a statement file's text."""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class CommissionRecord:
+    """The fields of a Commission the join keys (and breaks ties) on."""
+
+    __slots__ = ['id', 'reference', 'supplier', 'amount', 'band']
+
+    def __init__(self, id, supplier_reference, supplier_name, amount, supplier_key=normalize_supplier):
+        self.id = id
+        self.reference = normalize_reference(supplier_reference)
+        self.supplier = supplier_key(supplier_name)
+        self.amount = amount
+        self.band = amount_band(amount)
+
+
+class StatementLine:
+    """A statement line, its join keys and, once matched, its commission and status."""
+
+    FIELDS = [
+        'line_number', 'supplier_reference', 'supplier_name', 'booking_reference', 'amount',
+        'currency', 'description',
+    ]
+
+    __slots__ = FIELDS + ['reference', 'supplier', 'band', 'commission', 'status']
+
+    def __init__(self, line_number, supplier_reference, supplier_name, booking_reference, amount,
+                 currency, description):
+        self.line_number = line_number
+        self.supplier_reference = supplier_reference
+        self.supplier_name = supplier_name
+        self.booking_reference = booking_reference
+        self.amount = amount
+        self.currency = currency
+        self.description = description
+        self.reference = normalize_reference(supplier_reference)
+        self.supplier = normalize_supplier(supplier_name)
+        self.band = amount_band(amount)
+        self.commission = None
+        self.status = 'UNMATCHED'
+
+
+# =============================================================================
+# READING
+# =============================================================================
+
+def read_statement(stream):
+    """
+    Yield StatementLines from a CSV statement.
+
+    Raises:
+        StatementError: On missing columns or an invalid amount
+    """
+    reader = csv.DictReader(stream)
+    columns = {(name or '').strip().lower() for name in reader.fieldnames or []}
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise StatementError(f"Statement is missing columns: {', '.join(missing)}")
+
+    for line_number, row in enumerate(reader, start=2):
+        row = {
+            name.strip().lower(): value.strip() if isinstance(value, str) else ''
+            for name, value in row.items() if name
+        }
+        if not any(row.values()):
+            continue
+        raw_amount = row['amount'].replace(',', '').replace('$', '')
+        try:
+            amount = Decimal(raw_amount).quantize(CENT)
+        except InvalidOperation:
+            raise StatementError(f"line {line_number}: invalid amount '{row['amount']}'")
+        if not amount.is_finite():
+            raise StatementError(f"line {line_number}: invalid amount '{row['amount']}'")
+        if abs(amount) > MAX_AMOUNT:
+            raise StatementError(f"line {line_number}: amount {amount} is too large")
+        yield StatementLine(
+            line_number,
+            row['supplier_reference'][:100],
+            row.get('supplier_name', '')[:200],
+            row.get('booking_reference', '')[:100],
+            amount,
+            row.get('currency', '')[:3].upper(),
+            row.get('description', '')[:255],
+        )
+
+
+# =============================================================================
+# MATCHING
+# =============================================================================
+
+def match(lines, commissions, tolerance=MATCH_TOLERANCE):
+    """
+    Hash-join statement lines with commissions, setting each line's
+    commission and status.
+
+    Args:
+        lines: StatementLines, in statement order
+        commissions: CommissionRecords
+
+    Returns:
+        The commissions no line claimed
+    """
+    commissions = list(commissions)
+    banded = defaultdict(list)
+    by_reference = defaultdict(list)
+    for commission in commissions:
+        if not commission.reference:
+            continue
+        banded[(commission.reference, commission.band)].append(commission)
+        by_reference[commission.reference].append(commission)
+
+    claimed = set()
+
+    def closest(line, buckets, limit):
+        # The same supplier first, then the smallest difference
+        best, best_rank = None, None
+        for bucket in buckets:
+            for commission in bucket:
+                if commission.id in claimed:
+                    continue
+                difference = abs(line.amount - commission.amount)
+                if limit is not None and difference > limit:
+                    continue
+                rank = (not same_supplier(line.supplier, commission.supplier), difference)
+                if best is None or rank < best_rank:
+                    best, best_rank = commission, rank
+        return best
+
+    def neighbouring_bands(line):
+        return [banded.get((line.reference, band), ()) for band in (line.band - 1, line.band, line.band + 1)]
+
+    def same_reference(line):
+        return [by_reference.get(line.reference, ())]
+
+    pending = [line for line in lines if line.reference]
+    for buckets, limit in ((neighbouring_bands, tolerance), (neighbouring_bands, None), (same_reference, None)):
+        unpaired = []
+        for line in pending:
+            commission = closest(line, buckets(line), limit)
+            if commission is None:
+                unpaired.append(line)
+                continue
+            claimed.add(commission.id)
+            line.commission = commission
+            line.status = 'MATCHED' if abs(line.amount - commission.amount) <= tolerance else 'VARIANCE'
+        pending = unpaired
+
+    return [commission for commission in commissions if commission.id not in claimed]
+
+
+def _commissions(statement, supplier_key):
+    """
+    CommissionRecords of the statement's period, of every supplier: a line
+    may claim one recorded under another spelling of its supplier.
+    """
+    rows = (
+        Commission.objects
+        .filter(organization=statement.organization, commission_period=statement.commission_period)
+        .order_by('earned_date', 'id')
+        .values_list('pk', 'supplier_reference', 'supplier_name', 'commission_amount')
+    )
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        yield CommissionRecord(*row, supplier_key=supplier_key)
+
+
+def _stored_lines(statement):
+    """StatementLines of an earlier run of the statement."""
+    rows = (
+        statement.lines.exclude(status='MISSING')
+        .order_by('line_number')
+        .values_list(*StatementLine.FIELDS)
+    )
+    return [StatementLine(*row) for row in rows.iterator(chunk_size=BATCH_SIZE)]
+
+
+# =============================================================================
+# RECONCILIATION
+# =============================================================================
+
+def reconcile(statement, lines=None):
+    """
+    Match a statement against its period's commissions and store the
+    result, replacing any earlier one.
+
+    Args:
+        statement: CommissionStatement
+        lines: StatementLines read from its file (default: the lines stored
+            by the last run)
+
+    Returns:
+        The statement, with counts and totals updated
+    """
+    lines = _stored_lines(statement) if lines is None else list(lines)
+    supplier_key = SupplierKeys()
+    statement_supplier = supplier_key(statement.supplier_name)
+    for line in lines:
+        line.supplier = supplier_key(line.supplier_name) or statement_supplier
+        line.currency = line.currency or statement.currency
+        line.commission = None
+        line.status = 'UNMATCHED'
+
+    unclaimed = match(lines, _commissions(statement, supplier_key))
+    # Other suppliers' commissions only concern this statement if one of its lines claimed them
+    missing = [commission for commission in unclaimed if same_supplier(statement_supplier, commission.supplier)]
+
+    rows = []
+    for line in lines:
+        commission = line.commission
+        rows.append(CommissionStatementLine(
+            statement=statement,
+            line_number=line.line_number,
+            supplier_reference=line.supplier_reference,
+            supplier_name=line.supplier_name,
+            booking_reference=line.booking_reference,
+            amount=line.amount,
+            currency=line.currency,
+            description=line.description,
+            status=line.status,
+            commission_id=commission.id if commission else None,
+            expected_amount=commission.amount if commission else None,
+            variance=line.amount - commission.amount if commission else line.amount,
+        ))
+    for commission in missing:
+        rows.append(CommissionStatementLine(
+            statement=statement,
+            status='MISSING',
+            commission_id=commission.id,
+            expected_amount=commission.amount,
+            variance=-commission.amount,
+        ))
+
+    paired = [line for line in lines if line.commission]
+    statement.lines_total = len(lines)
+    statement.lines_matched = sum(1 for line in paired if line.status == 'MATCHED')
+    statement.lines_variance = len(paired) - statement.lines_matched
+    statement.lines_unmatched = len(lines) - len(paired)
+    statement.commissions_missing = len(missing)
+    statement.statement_total = sum((line.amount for line in lines), ZERO)
+    statement.variance_total = sum((line.amount - line.commission.amount for line in paired), ZERO)
+    statement.unmatched_total = sum((line.amount for line in lines if not line.commission), ZERO)
+    statement.missing_total = sum((commission.amount for commission in missing), ZERO)
+    statement.expected_total = sum((line.commission.amount for line in paired), statement.missing_total)
+    statement.status = 'RECONCILED'
+    statement.error_message = ''
+    statement.reconciled_at = timezone.now()
+
+    with transaction.atomic():
+        statement.lines.all().delete()
+        CommissionStatementLine.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        statement.save()
+
+    logger.info(
+        f"Reconciled commission statement {statement.pk}: {statement.lines_matched} matched, "
+        f"{statement.lines_variance} variance, {statement.lines_unmatched} unmatched, "
+        f"{statement.commissions_missing} commissions missing"
+    )
+    return statement
+
+
+def load_statement(content, organization, commission_period, supplier_name='', currency='AUD',
+                   file_name='', user=None):
+    """
+    Create a CommissionStatement from a CSV file's text and reconcile it.
+
+    Raises:
+        StatementError: If the file can't be read; the statement is kept
+            as FAILED with the error
+    """
+    statement = CommissionStatement.objects.create(
+        organization=organization,
+        supplier_name=supplier_name,
+        commission_period=commission_period,
+        currency=currency,
+        file_name=file_name,
+        file_hash=file_hash(content),
+        imported_by=user,
+    )
+    try:
+        lines = list(read_statement(io.StringIO(content)))
+    except StatementError as e:
+        statement.status = 'FAILED'
+        statement.error_message = str(e)
+        statement.save(update_fields=['status', 'error_message'])
+        raise
+    return reconcile(statement, lines)
@@ -1,3 +1,68 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
+from decimal import Decimal
+import io
 
-# Create your tests here.
+from .reconciliation import CommissionRecord, StatementError, StatementLine, match, read_statement
+
+
+def statement(*rows):
+    return io.StringIO('\n'.join(['supplier_reference,supplier_name,amount', *rows]))
+
+
+def line(line_number, reference, amount, supplier=''):
+    return StatementLine(line_number, reference, supplier, '', Decimal(amount), 'AUD', '')
+
+
+def commission(id, reference, amount, supplier=''):
+    return CommissionRecord(id, reference, supplier, Decimal(amount))
+
+
+class ReadStatementTests(SimpleTestCase):
+    def test_reads_amounts(self):
+        lines = list(read_statement(statement('HX1,Hilton,"$1,250.505"', 'HX2,Hilton,-40')))
+        self.assertEqual([(line.line_number, line.reference, line.amount) for line in lines], [
+            (2, 'HX1', Decimal('1250.50')), (3, 'HX2', Decimal('-40.00')),
+        ])
+
+    def test_rejects_non_finite_amounts(self):
+        for amount in ['NaN', 'nan', 'Infinity', '-inf', 'sNaN']:
+            with self.subTest(amount=amount), self.assertRaisesMessage(StatementError, 'line 2: invalid amount'):
+                list(read_statement(statement(f'HX1,Hilton,{amount}')))
+
+    def test_rejects_missing_columns_and_large_amounts(self):
+        with self.assertRaisesMessage(StatementError, 'missing columns: amount'):
+            list(read_statement(io.StringIO('supplier_reference\nHX1')))
+        with self.assertRaisesMessage(StatementError, 'too large'):
+            list(read_statement(statement('HX1,Hilton,100000000')))
+
+
+class MatchTests(SimpleTestCase):
+    def test_matches_on_reference_and_amount(self):
+        lines = [line(2, 'HX1', '100.00'), line(3, 'hx 2', '105.00'), line(4, 'HX3', '10.00')]
+        commissions = [commission(1, 'HX1', '100.00'), commission(2, 'HX2', '100.00'), commission(3, 'HX4', '20.00')]
+
+        unclaimed = match(lines, commissions)
+
+        self.assertEqual([(l.status, l.commission and l.commission.id) for l in lines], [
+            ('MATCHED', 1), ('VARIANCE', 2), ('UNMATCHED', None),
+        ])
+        self.assertEqual([c.id for c in unclaimed], [3])
+
+    def test_prefers_the_same_supplier_then_the_closest_amount(self):
+        commissions = [
+            commission(1, 'HX5', '50.00', 'hilton'),
+            commission(2, 'HX5', '50.00', 'marriott'),
+            commission(3, 'HX5', '80.00', 'marriott'),
+        ]
+        lines = [line(2, 'HX5', '50.00', 'Marriott'), line(3, 'HX5', '75.00', 'Marriott')]
+
+        unclaimed = match(lines, commissions)
+
+        self.assertEqual([(l.commission.id, l.status) for l in lines], [(2, 'MATCHED'), (3, 'VARIANCE')])
+        self.assertEqual([c.id for c in unclaimed], [1])
+
+    def test_a_commission_is_claimed_once(self):
+        lines = [line(2, 'HX1', '100.00'), line(3, 'HX1', '100.00')]
+        unclaimed = match(lines, [commission(1, 'HX1', '100.00')])
+        self.assertEqual([l.status for l in lines], ['MATCHED', 'UNMATCHED'])
+        self.assertEqual(unclaimed, [])
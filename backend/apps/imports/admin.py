@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import ImportBatch
+from django.urls import reverse
+from django.utils.html import format_html
+from .models import ImportBatch, ImportBatchError
 
 
 @admin.register(ImportBatch)
@@ -23,14 +25,40 @@ class ImportBatchAdmin(admin.ModelAdmin):
             'fields': ('started_at', 'completed_at')
         }),
         ('Errors', {
-            'fields': ('error_log',),
+            'fields': ('error_summary', 'errors_link', 'error_log'),
             'classes': ('collapse',),
-            'description': 'JSON log of errors encountered during import'
+            'description': 'Error counts by class and a sample of the first errors; '
+                           'follow the link to browse all of them'
         }),
     )
     
-    readonly_fields = ['created_at']
+    readonly_fields = ['created_at', 'error_summary', 'errors_link', 'error_log']
+    
+    def errors_link(self, obj):
+        count = sum((obj.error_summary or {}).values())
+        if not count:
+            return '-'
+        url = reverse('admin:imports_importbatcherror_changelist') + f'?batch__id__exact={obj.pk}'
+        return format_html('<a href="{}">{} errors</a>', url, count)
+    errors_link.short_description = 'All errors'
     
     def has_add_permission(self, request):
         # Import batches are typically created programmatically, not manually
-        return False
\ No newline at end of file
+        return False
+
+
+@admin.register(ImportBatchError)
+class ImportBatchErrorAdmin(admin.ModelAdmin):
+    list_display = ['batch', 'line', 'reference', 'error_class', 'message']
+    list_filter = ['error_class']
+    search_fields = ['reference', 'message']
+    list_select_related = ['batch__organization']
+    raw_id_fields = ['batch']
+    # Batches can hold hundreds of thousands of errors: skip the unfiltered COUNT(*)
+    show_full_result_count = False
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,1015 @@
+# apps/imports/importer.py
+"""
+Streaming bulk importer for GDS / mid-office booking extracts.
+
+Nightly extracts run to hundreds of thousands of rows, so the importer never
+saves models one at a time. Input is read as a stream and processed in
+chunks. Travellers, organizations, airports, exchange rates and hotel /
+car rental suppliers are resolved from in-memory maps. Rows are written
+with bulk_create/bulk_update, which bypass model save() and signals.
+Totals, carbon and potential savings are then recalculated set-based once
+at the end.
+
+Input formats
+-------------
+CSV: one row per record with a ``record_type`` column (BOOKING, AIR,
+SEGMENT, HOTEL, CAR, FEE) plus ``organization_code`` and
+``agent_booking_reference``. Rows for one booking must be contiguous, and
+SEGMENT rows belong to the AIR row above them. Traveller columns on the
+BOOKING row are prefixed ``traveller_`` (traveller_employee_id,
+traveller_email, traveller_first_name, ...).
+
+NDJSON: one booking per line::
+
+    {"organization_code": "ACME", "agent_booking_reference": "GPT001",
+     "booking_date": "2025-03-01", "travel_date": "2025-03-10",
+     "traveller": {"employee_id": "E1", "first_name": "Jo", "last_name": "Bloggs"},
+     "air": [{"trip_type": "RETURN", "travel_class": "ECONOMY", ...,
+              "segments": [{...}, ...]}],
+     "hotels": [{...}], "cars": [{...}], "service_fees": [{...}]}
+
+Column and key names are the model field names. Blank values fall back to
+the model defaults. A re-sent booking (same organization and
+agent_booking_reference) replaces the previous version, and components
+are matched on natural keys so their ids are kept.
+
+Change detection
+----------------
+Each booking and component stores a SHA-256 ``content_hash`` of its
+parsed input values. A re-sent booking whose hash matches is counted as
+unchanged without being built or written, and within an amended booking
+only components whose hash changed are rewritten. Re-delivering an
+overlapping window therefore costs one hash lookup per booking.
+"""
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from collections import Counter, defaultdict
+from datetime import date, time
+from decimal import Decimal
+from itertools import islice
+import csv
+import hashlib
+import json
+import logging
+
+from apps.bookings.models import (
+    Booking, Traveller, AirBooking, AirSegment, AccommodationBooking, CarHireBooking,
+    ServiceFee, DailySpendFact
+)
+from apps.bookings.conflicts import detect_conflicts
+from apps.bookings.duplicates import detect_duplicates
+from apps.bookings.identity import TravellerIndex
+from apps.bookings.trips import rebuild_travellers
+from apps.organizations.models import Organization
+from apps.reference_data.models import Airport, CarRentalCompany, HotelChain
+from apps.reference_data.rates import ExchangeRateTable
+from apps.reference_data.suppliers import SupplierMatcher
+from .models import ImportBatch, ImportBatchError
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_CHUNK_SIZE = 1000
+# Every error is an ImportBatchError row; the first few are also copied to ImportBatch.error_log
+ERROR_SAMPLE_SIZE = 100
+
+BOOKING_FIELDS = [
+    'supplier_reference', 'booking_date', 'travel_date', 'return_date', 'status',
+    'currency', 'base_fare', 'taxes', 'fees', 'policy_compliant', 'advance_booking_days',
+    'travel_arranger_text', 'travel_consultant_text',
+]
+TRAVELLER_FIELDS = ['first_name', 'last_name', 'email', 'employee_id', 'department', 'cost_center']
+AIR_FIELDS = [
+    'trip_type', 'travel_class', 'ticket_number', 'primary_airline_iata_code',
+    'primary_airline_name', 'origin_airport_iata_code', 'destination_airport_iata_code',
+    'base_fare', 'taxes', 'fees', 'gst_amount', 'currency', 'lowest_fare_available',
+    'lowest_fare_currency',
+]
+SEGMENT_FIELDS = [
+    'segment_number', 'airline_iata_code', 'airline_name', 'flight_number',
+    'origin_airport_iata_code', 'destination_airport_iata_code', 'departure_date',
+    'departure_time', 'arrival_date', 'arrival_time', 'booking_class', 'fare_basis',
+    'distance_km', 'carbon_emissions_kg',
+]
+HOTEL_FIELDS = [
+    'hotel_name', 'hotel_chain', 'city', 'country', 'address', 'check_in_date',
+    'check_out_date', 'number_of_nights', 'room_type', 'nightly_rate', 'currency',
+    'gst_amount',
+]
+CAR_FIELDS = [
+    'rental_company', 'vehicle_type', 'vehicle_category', 'vehicle_make_model',
+    'pickup_location', 'pickup_city', 'pickup_date', 'pickup_time', 'dropoff_location',
+    'dropoff_city', 'dropoff_date', 'dropoff_time', 'country', 'number_of_days',
+    'daily_rate', 'currency', 'gst_amount',
+]
+FEE_FIELDS = ['fee_type', 'fee_date', 'fee_amount', 'currency', 'booking_channel', 'description']
+
+# Foreign keys are assigned by the importer, never validated from input
+RELATION_FIELDS = [
+    'id', 'booking', 'air_booking', 'organization', 'traveller', 'import_batch',
+    'travel_arranger', 'travel_consultant', 'user', 'hotel_chain_ref', 'rental_company_ref',
+]
+
+# Recalculated set-based in finalize(), or maintained from the component's
+# BookingTransactions (see bookings.transactions), so never compared or written per row
+LEDGER_FIELDS = {'transaction_total', 'transaction_total_base'}
+DERIVED_FIELDS = {
+    Booking: {'total_amount'},
+    AirBooking: {'total_carbon_kg', 'potential_savings'} | LEDGER_FIELDS,
+    AccommodationBooking: LEDGER_FIELDS,
+    CarHireBooking: LEDGER_FIELDS,
+    ServiceFee: LEDGER_FIELDS,
+}
+
+# Component collections in an import document: key -> (model, fields)
+COMPONENTS = {
+    'air': (AirBooking, AIR_FIELDS),
+    'hotels': (AccommodationBooking, HOTEL_FIELDS),
+    'cars': (CarHireBooking, CAR_FIELDS),
+    'service_fees': (ServiceFee, FEE_FIELDS),
+}
+
+
+class RecordError(ValueError):
+    """A record in the import file could not be turned into a booking."""
+
+    def __init__(self, message, error_class='VALIDATION'):
+        super().__init__(message)
+        self.error_class = error_class
+
+
+# =============================================================================
+# READING
+# =============================================================================
+
+def detect_format(file_name):
+    """Guess the input format from the file extension."""
+    name = (file_name or '').lower()
+    if name.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    return 'csv'
+
+
+def _new_document(organization_code, reference, line):
+    return {
+        'organization_code': organization_code,
+        'agent_booking_reference': reference,
+        '_line': line,
+        'air': [], 'hotels': [], 'cars': [], 'service_fees': [],
+    }
+
+
+def _read_csv(stream):
+    document = None
+    key = None
+    collections = {'AIR': 'air', 'HOTEL': 'hotels', 'CAR': 'cars', 'FEE': 'service_fees'}
+
+    for line, row in enumerate(csv.DictReader(stream), start=2):
+        row = {
+            name.strip(): value.strip() if isinstance(value, str) else value
+            for name, value in row.items() if name
+        }
+        record_type = (row.pop('record_type', '') or '').upper()
+        row_key = (row.get('organization_code', ''), row.get('agent_booking_reference', ''))
+
+        if document is None or row_key != key:
+            if document is not None:
+                yield document
+            key = row_key
+            document = _new_document(*row_key, line)
+
+        if record_type == 'BOOKING':
+            document['traveller'] = {
+                name[len('traveller_'):]: value
+                for name, value in row.items() if name.startswith('traveller_')
+            }
+            document.update({
+                name: value for name, value in row.items() if not name.startswith('traveller_')
+            })
+        elif record_type == 'SEGMENT':
+            if document['air']:
+                document['air'][-1]['segments'].append(row)
+            else:
+                document.setdefault('_errors', []).append(f'line {line}: SEGMENT row before any AIR row')
+        elif record_type in collections:
+            if record_type == 'AIR':
+                row['segments'] = []
+            document[collections[record_type]].append(row)
+        else:
+            document.setdefault('_errors', []).append(f"line {line}: unknown record_type '{record_type}'")
+
+    if document is not None:
+        yield document
+
+
+def _read_ndjson(stream):
+    for line, text in enumerate(stream, start=1):
+        text = text.strip()
+        if not text:
+            continue
+        try:
+            document = json.loads(text)
+        except json.JSONDecodeError as e:
+            yield {'_line': line, '_errors': [f'invalid JSON: {e}']}
+            continue
+        if not isinstance(document, dict):
+            yield {'_line': line, '_errors': ['expected a JSON object per line']}
+            continue
+        # Partition files written by the parallel importer keep the source line
+        document.setdefault('_line', line)
+        yield document
+
+
+def read_documents(stream, file_format='csv'):
+    """Yield one booking document (dict) at a time from a text stream."""
+    if file_format == 'ndjson':
+        return _read_ndjson(stream)
+    return _read_csv(stream)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# =============================================================================
+# FIELD COERCION
+# =============================================================================
+
+def _coerce(model, fields, data, label):
+    """Convert raw input values to python values using the model fields."""
+    values = {}
+    for name in fields:
+        raw = data.get(name)
+        if raw is None or raw == '':
+            continue
+        try:
+            values[name] = model._meta.get_field(name).to_python(raw)
+        except ValidationError as e:
+            raise RecordError(f"{label}.{name}: {'; '.join(e.messages)}", 'INVALID_VALUE')
+    return values
+
+
+def _validate(instance, label):
+    """Run field validation without any database queries."""
+    try:
+        instance.clean_fields(exclude=RELATION_FIELDS)
+    except ValidationError as e:
+        messages = [f'{label}.{field}: {"; ".join(errors)}' for field, errors in e.message_dict.items()]
+        raise RecordError(', '.join(messages))
+
+
+def _normalize(value):
+    """JSON-safe canonical form, so equal values always hash equally."""
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, Decimal):
+        return format(value.normalize(), 'f')
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    return value
+
+
+def content_hash(values):
+    """SHA-256 of parsed import values (field order and number formatting don't matter)."""
+    payload = json.dumps(_normalize(values), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# =============================================================================
+# IMPORTER
+# =============================================================================
+
+class BookingImporter:
+    """
+    Import bookings from a CSV or NDJSON extract into an ImportBatch.
+
+    Usage:
+        batch = ImportBatch.objects.create(organization=agent, import_date=date.today(),
+                                           import_type='DAILY', file_name='extract.csv')
+        with open('extract.csv', newline='') as f:
+            BookingImporter(batch).run(f, 'csv')
+    """
+
+    def __init__(self, batch, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.batch = batch
+        self.chunk_size = chunk_size
+        self.organizations = {}
+        self.rates = None
+        self.airports = None
+        self.hotel_chains = None
+        self.rental_companies = None
+        self.traveller_indexes = {}
+        self.organization_ids = set()
+        self.dirty_days = defaultdict(set)
+        self.totals = Counter()
+        self.errors = []
+
+    # -------------------------------------------------------------------------
+    # Entry point
+    # -------------------------------------------------------------------------
+
+    def run(self, stream, file_format='csv'):
+        """Import every document in the stream and finish the batch."""
+        self.start()
+        try:
+            self.load_reference_data()
+            self.import_documents(read_documents(stream, file_format))
+            self.finalize()
+        except Exception as e:
+            self.abort(e)
+            raise
+
+        self.complete()
+        return self.batch
+
+    def import_documents(self, documents):
+        """Process documents chunk by chunk (no final recalculation)."""
+        for chunk in _chunks(documents, self.chunk_size):
+            self.process_chunk(chunk)
+
+    def start(self):
+        """Mark the batch as processing."""
+        batch = self.batch
+        if not batch.started_at:
+            batch.started_at = timezone.now()
+        batch.status = 'PROCESSING'
+        batch.save(update_fields=['status', 'started_at'])
+
+    def abort(self, error):
+        """Record a fatal error and mark the batch failed."""
+        batch = self.batch
+        logger.error(f"Import batch {batch.pk} failed: {error}")
+        self.log_error(None, None, f'import aborted: {error}', 'ABORTED')
+        self._save_progress(Counter())
+        ImportBatch.objects.filter(pk=batch.pk).update(status='FAILED', completed_at=timezone.now())
+        batch.refresh_from_db()
+
+    def complete(self):
+        """Set the final batch status from its counters."""
+        batch = self.batch
+        batch.refresh_from_db()
+        succeeded = batch.records_created + batch.records_updated + batch.records_unchanged
+        if not batch.records_failed:
+            batch.status = 'COMPLETED'
+        elif succeeded:
+            batch.status = 'PARTIAL'
+        else:
+            batch.status = 'FAILED'
+        batch.completed_at = timezone.now()
+        batch.save(update_fields=['status', 'completed_at'])
+
+        logger.info(
+            f"Import batch {batch.pk} {batch.status}: {batch.records_created} created, "
+            f"{batch.records_updated} updated, {batch.records_unchanged} unchanged, "
+            f"{batch.records_failed} failed"
+        )
+
+    # -------------------------------------------------------------------------
+    # Reference data
+    # -------------------------------------------------------------------------
+
+    def load_reference_data(self):
+        """Load organizations, exchange rates, airports and suppliers into memory once."""
+        agent = self.batch.organization
+        self.organizations = {agent.code: agent}
+        for customer in Organization.objects.filter(travel_agent=agent):
+            self.organizations[customer.code] = customer
+
+        self.rates = ExchangeRateTable.load()
+        self.airports = {
+            airport.iata_code: airport
+            for airport in Airport.objects.only('iata_code', 'latitude', 'longitude')
+        }
+        self.hotel_chains = SupplierMatcher.load(HotelChain)
+        self.rental_companies = SupplierMatcher.load(CarRentalCompany)
+
+    def traveller_index(self, organization_id):
+        """The organization's TravellerIndex, loaded on first use."""
+        index = self.traveller_indexes.get(organization_id)
+        if index is None:
+            index = self.traveller_indexes[organization_id] = TravellerIndex.load(organization_id)
+        return index
+
+    def resolve_traveller(self, organization, values, new_travellers):
+        """
+        Match a traveller by employee id, email, then fuzzy name within the
+        phonetic block; create one (bulk-created with the chunk) if nothing
+        matches.
+        """
+        index = self.traveller_index(organization.id)
+        traveller, _ = index.resolve(values)
+        if traveller is not None:
+            return traveller
+
+        traveller = Traveller(organization=organization, **values)
+        _validate(traveller, 'traveller')
+        if not (traveller.employee_id or traveller.email):
+            raise RecordError('traveller: employee_id or email is required', 'TRAVELLER')
+        index.add(traveller)
+        new_travellers.append(traveller)
+        return traveller
+
+    def create_travellers(self, documents):
+        """
+        Yield documents unchanged, creating the travellers they name that
+        don't exist yet as they pass.
+
+        The parallel importer runs its input through this before spooling
+        partitions, so workers only ever resolve existing travellers and
+        one organization's months can't create the same person twice.
+        Documents that can't be parsed are left for the workers to report.
+        """
+        new_travellers = []
+
+        def flush():
+            try:
+                with transaction.atomic():
+                    Traveller.objects.bulk_create(new_travellers, batch_size=self.chunk_size)
+            except IntegrityError as e:
+                # Created concurrently by another import: workers reload and resolve it
+                logger.warning(f"Import batch {self.batch.pk}: traveller pre-creation failed: {e}")
+                for traveller in new_travellers:
+                    self.traveller_indexes.pop(traveller.organization_id, None)
+            new_travellers.clear()
+
+        for document in documents:
+            yield document
+            code = document.get('organization_code') or self.batch.organization.code
+            organization = self.organizations.get(code)
+            if organization is None or document.get('_errors') or not document.get('agent_booking_reference'):
+                continue
+            try:
+                values = _coerce(Traveller, TRAVELLER_FIELDS, document.get('traveller') or {}, 'traveller')
+                self.resolve_traveller(organization, values, new_travellers)
+            except RecordError:
+                continue
+            if len(new_travellers) >= self.chunk_size:
+                flush()
+        if new_travellers:
+            flush()
+
+    # -------------------------------------------------------------------------
+    # Building model instances
+    # -------------------------------------------------------------------------
+
+    def parse(self, document):
+        """
+        Coerce a raw document into typed values and hash it.
+
+        Nothing is looked up or validated beyond field types, so unchanged
+        documents can be recognised and skipped cheaply.
+
+        Returns:
+            dict with organization, reference, line, content_hash and the
+            parsed booking, traveller and component values
+
+        Raises:
+            RecordError: The document is malformed
+        """
+        if document.get('_errors'):
+            raise RecordError('; '.join(document['_errors']), 'PARSE')
+        if not document.get('agent_booking_reference'):
+            raise RecordError('agent_booking_reference is required', 'MISSING_REFERENCE')
+
+        code = document.get('organization_code') or self.batch.organization.code
+        organization = self.organizations.get(code)
+        if organization is None:
+            raise RecordError(
+                f"organization '{code}' is not {self.batch.organization.code} or one of its customers",
+                'UNKNOWN_ORGANIZATION'
+            )
+
+        parsed = {
+            'booking': _coerce(Booking, BOOKING_FIELDS, document, 'booking'),
+            'traveller': _coerce(Traveller, TRAVELLER_FIELDS, document.get('traveller') or {}, 'traveller'),
+        }
+        for kind, (model, fields) in COMPONENTS.items():
+            parsed[kind] = []
+            for index, data in enumerate(document.get(kind) or []):
+                label = f'{kind}[{index}]'
+                values = _coerce(model, fields, data, label)
+                if kind == 'air':
+                    values['segments'] = [
+                        _coerce(AirSegment, SEGMENT_FIELDS, segment, f'{label}.segments[{position}]')
+                        for position, segment in enumerate(data.get('segments') or [])
+                    ]
+                parsed[kind].append(values)
+
+        return {
+            **parsed,
+            'organization': organization,
+            'reference': str(document['agent_booking_reference']).strip(),
+            'line': document.get('_line'),
+            'content_hash': content_hash({'organization': code, **parsed}),
+        }
+
+    def build_booking(self, parsed, traveller):
+        booking = Booking(
+            organization=parsed['organization'],
+            traveller=traveller,
+            agent_booking_reference=parsed['reference'],
+            import_batch=self.batch,
+            content_hash=parsed['content_hash'],
+            **parsed['booking']
+        )
+        _validate(booking, 'booking')
+        return booking
+
+    def build_air(self, booking, values, index):
+        label = f'air[{index}]'
+        values = dict(values)
+        segments_values = values.pop('segments')
+        air_hash = content_hash({**values, 'segments': segments_values})
+
+        # Route summary defaults to first origin / destination (see route_destination)
+        if segments_values:
+            values.setdefault('origin_airport_iata_code', segments_values[0].get('origin_airport_iata_code'))
+            values.setdefault('destination_airport_iata_code', self.route_destination(segments_values))
+
+        air = AirBooking(booking=booking, content_hash=air_hash, **values)
+        air.total_fare = (
+            (air.base_fare or Decimal('0')) + (air.taxes or Decimal('0')) +
+            (air.gst_amount or Decimal('0')) + (air.fees or Decimal('0'))
+        )
+        _validate(air, label)
+
+        segments = []
+        for position, segment_values in enumerate(segments_values, start=1):
+            segment_label = f'{label}.segments[{position - 1}]'
+            segment = AirSegment(air_booking=air, **segment_values)
+            if segment.segment_number is None:
+                segment.segment_number = position
+            _validate(segment, segment_label)
+            if not segment.distance_km:
+                segment.distance_km = segment.calculate_distance(self.airports)
+            if segment.distance_km and not segment.carbon_emissions_kg:
+                carbon = segment.calculate_carbon_emissions(self.airports) or 0
+                segment.carbon_emissions_kg = Decimal(str(carbon)).quantize(Decimal('0.01'))
+            segments.append(segment)
+
+        return air, segments
+
+    def route_destination(self, segments_values):
+        """
+        Destination of a ticket's route summary: the last arrival, unless the
+        ticket ends where it started (a return), in which case the turnaround
+        point - the arrival furthest from the origin, or the first arrival
+        when airport coordinates are missing.
+        """
+        origin = segments_values[0].get('origin_airport_iata_code')
+        arrivals = [segment.get('destination_airport_iata_code') for segment in segments_values]
+        if arrivals[-1] != origin:
+            return arrivals[-1]
+
+        turnaround, furthest = None, None
+        for arrival in arrivals[:-1]:
+            distance = AirSegment(
+                origin_airport_iata_code=origin, destination_airport_iata_code=arrival
+            ).calculate_distance(self.airports)
+            if distance is not None and (furthest is None or distance > furthest):
+                turnaround, furthest = arrival, distance
+        if turnaround is None:
+            turnaround = arrivals[0]
+        # Only when every arrival is the origin itself
+        return turnaround if turnaround != origin else arrivals[-1]
+
+    def build_hotel(self, booking, values, index):
+        label = f'hotels[{index}]'
+        hotel = AccommodationBooking(booking=booking, content_hash=content_hash(values), **values)
+        hotel.hotel_chain_ref = self.hotel_chains.match(hotel.hotel_chain)
+        if hotel.number_of_nights is None and hotel.check_in_date and hotel.check_out_date:
+            hotel.number_of_nights = (hotel.check_out_date - hotel.check_in_date).days
+        _validate(hotel, label)
+        hotel.convert_to_base_currency(self.rates)
+        return hotel
+
+    def build_car(self, booking, values, index):
+        label = f'cars[{index}]'
+        car = CarHireBooking(booking=booking, content_hash=content_hash(values), **values)
+        car.rental_company_ref = self.rental_companies.match(car.rental_company)
+        if car.number_of_days is None and car.pickup_date and car.dropoff_date:
+            car.number_of_days = max((car.dropoff_date - car.pickup_date).days, 1)
+        _validate(car, label)
+        car.convert_to_base_currency(self.rates)
+        return car
+
+    def build_fee(self, booking, values, index):
+        label = f'service_fees[{index}]'
+        fee = ServiceFee(
+            booking=booking,
+            organization=booking.organization,
+            traveller=booking.traveller,
+            import_batch=self.batch,
+            content_hash=content_hash(values),
+            **values
+        )
+        _validate(fee, label)
+        return fee
+
+    def build(self, parsed, new_travellers):
+        """
+        Turn one parsed document into unsaved model instances.
+
+        Returns:
+            dict with booking, air (list of (air, segments)), hotels, cars, service_fees
+
+        Raises:
+            RecordError: The document is invalid
+        """
+        traveller = self.resolve_traveller(parsed['organization'], parsed['traveller'], new_travellers)
+        booking = self.build_booking(parsed, traveller)
+
+        return {
+            'booking': booking,
+            'air': [self.build_air(booking, values, i) for i, values in enumerate(parsed['air'])],
+            'hotels': [self.build_hotel(booking, values, i) for i, values in enumerate(parsed['hotels'])],
+            'cars': [self.build_car(booking, values, i) for i, values in enumerate(parsed['cars'])],
+            'service_fees': [self.build_fee(booking, values, i) for i, values in enumerate(parsed['service_fees'])],
+        }
+
+    # -------------------------------------------------------------------------
+    # Matching against existing rows
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def component_key(kind, instance):
+        """Natural key used to match a re-sent component to the stored one."""
+        if kind == 'air':
+            return (instance.ticket_number or '', instance.origin_airport_iata_code,
+                    instance.destination_airport_iata_code)
+        if kind == 'hotels':
+            return (instance.hotel_name, instance.check_in_date)
+        if kind == 'cars':
+            return (instance.rental_company, instance.pickup_date)
+        if kind == 'segments':
+            return (instance.segment_number,)
+        return (instance.fee_type, instance.fee_date)
+
+    @classmethod
+    def keyed(cls, kind, instances):
+        """Key instances, numbering duplicates so every key is unique."""
+        seen = Counter()
+        result = {}
+        for instance in instances:
+            key = cls.component_key(kind, instance)
+            seen[key] += 1
+            result[key + (seen[key],)] = instance
+        return result
+
+    def stored_hashes(self, parsed_documents):
+        """Content hashes of the stored bookings a chunk refers to, keyed (organization_id, reference)."""
+        references = defaultdict(set)
+        for parsed in parsed_documents:
+            references[parsed['organization'].id].add(parsed['reference'])
+
+        hashes = {}
+        for organization_id, refs in references.items():
+            stored = Booking.objects.filter(
+                organization_id=organization_id, agent_booking_reference__in=refs
+            ).values_list('agent_booking_reference', 'content_hash')
+            for reference, stored_hash in stored:
+                hashes.setdefault((organization_id, reference), stored_hash)
+        return hashes
+
+    def load_existing(self, built):
+        """Fetch stored bookings and their components for a chunk."""
+        references = defaultdict(set)
+        for item in built:
+            booking = item['booking']
+            references[booking.organization_id].add(booking.agent_booking_reference)
+
+        existing = {}
+        for organization_id, refs in references.items():
+            for booking in Booking.objects.filter(organization_id=organization_id, agent_booking_reference__in=refs):
+                existing.setdefault((organization_id, booking.agent_booking_reference), booking)
+
+        components = defaultdict(lambda: defaultdict(list))
+        booking_ids = [booking.pk for booking in existing.values()]
+        if booking_ids:
+            for kind, (model, _) in COMPONENTS.items():
+                for instance in model.objects.filter(booking_id__in=booking_ids):
+                    components[instance.booking_id][kind].append(instance)
+            for segment in AirSegment.objects.filter(air_booking__booking_id__in=booking_ids):
+                components[segment.air_booking_id]['segments'].append(segment)
+
+        return existing, components
+
+    # -------------------------------------------------------------------------
+    # Chunk processing
+    # -------------------------------------------------------------------------
+
+    def process_chunk(self, documents):
+        """
+        Parse, match and write one chunk of documents in a transaction.
+
+        Documents whose content hash equals the stored booking's are counted
+        as unchanged and go no further. A reference repeated within the
+        chunk is imported once (last version wins) and every copy is counted
+        with that version's outcome.
+        """
+        counts = Counter(processed=len(documents))
+        latest = {}
+        copies = Counter()
+
+        for document in documents:
+            try:
+                parsed = self.parse(document)
+            except RecordError as e:
+                counts['failed'] += 1
+                self.log_error(document.get('_line'), document.get('agent_booking_reference'), str(e), e.error_class)
+                continue
+            key = (parsed['organization'].id, parsed['reference'])
+            latest.pop(key, None)
+            latest[key] = parsed
+            copies[key] += 1
+
+        stored = self.stored_hashes(latest.values())
+        candidates = {key: parsed for key, parsed in latest.items() if stored.get(key) != parsed['content_hash']}
+        counts['unchanged'] += sum(copies[key] for key in latest.keys() - candidates.keys())
+
+        retried = False
+        while True:
+            new_travellers = []
+            built = []
+            for key, parsed in list(candidates.items()):
+                try:
+                    built.append(self.build(parsed, new_travellers))
+                except RecordError as e:
+                    del candidates[key]
+                    counts['failed'] += copies[key]
+                    self.log_error(parsed['line'], parsed['reference'], str(e), e.error_class)
+
+            try:
+                with transaction.atomic():
+                    if new_travellers:
+                        Traveller.objects.bulk_create(new_travellers, batch_size=self.chunk_size)
+                    outcomes = self.write(built)
+            except Exception as e:
+                # Travellers created in the failed transaction must be looked up again
+                for traveller in new_travellers:
+                    self.traveller_index(traveller.organization_id).remove(traveller)
+                if isinstance(e, IntegrityError) and new_travellers and not retried:
+                    # Another import created the same traveller (employee ids and, for
+                    # travellers without one, emails are unique): reload and retry once
+                    retried = True
+                    for traveller in new_travellers:
+                        self.traveller_indexes.pop(traveller.organization_id, None)
+                    continue
+                logger.error(f"Import batch {self.batch.pk}: chunk failed: {e}")
+                for key, parsed in candidates.items():
+                    counts['failed'] += copies[key]
+                    self.log_error(parsed['line'], parsed['reference'], f'chunk failed: {e}', 'CHUNK_FAILED')
+                break
+
+            for key, outcome in outcomes.items():
+                counts[outcome] += copies[key]
+            break
+
+        counts['chunks'] = 1
+        self._save_progress(counts)
+
+    @staticmethod
+    def update_fields(model):
+        """Fields rewritten on a changed stored row."""
+        skip = {'created_at'} | DERIVED_FIELDS.get(model, set())
+        return [
+            field.name for field in model._meta.concrete_fields
+            if not field.primary_key and field.name not in skip
+        ]
+
+    @staticmethod
+    def is_unchanged(instance, stored):
+        """Same content hash and still attached to the same booking/traveller."""
+        # Segments carry no hash of their own; they change with their air booking
+        stored_hash = getattr(stored, 'content_hash', '')
+        if not stored_hash or instance.content_hash != stored_hash:
+            return False
+        return all(
+            getattr(instance, field.attname) == getattr(stored, field.attname)
+            for field in type(instance)._meta.concrete_fields
+            if field.is_relation and field.name != 'import_batch'
+        )
+
+    def write(self, built):
+        """
+        Write built documents, updating stored bookings in place.
+
+        Components are matched to the stored ones on natural keys; only
+        components whose content hash changed are written, and those
+        missing from the document are deleted. Segments are part of their
+        air booking's hash.
+
+        Returns:
+            dict of (organization_id, reference) -> 'created' / 'updated'
+        """
+        outcomes = {}
+        existing, stored_components = self.load_existing(built)
+        now = timezone.now()
+
+        creates = defaultdict(list)
+        updates = defaultdict(list)
+        deletes = defaultdict(list)
+
+        def match(kind, new, old):
+            """Queue creates/updates/deletes for one component list; return the matched pairs."""
+            matched = []
+            for key, instance in new.items():
+                stored = old.get(key)
+                if stored is None:
+                    creates[kind].append(instance)
+                    continue
+                instance.pk = instance.id = stored.pk
+                matched.append((instance, stored))
+                if self.is_unchanged(instance, stored):
+                    continue
+                if hasattr(stored, 'created_at'):
+                    instance.created_at = stored.created_at
+                if hasattr(instance, 'updated_at'):
+                    instance.updated_at = now
+                updates[kind].append(instance)
+            deletes[kind].extend(old[key].pk for key in old.keys() - new.keys())
+            return matched
+
+        for item in built:
+            booking = item['booking']
+            key = (booking.organization_id, booking.agent_booking_reference)
+            self.organization_ids.add(booking.organization_id)
+            self.dirty_days[booking.organization_id].add(booking.travel_date)
+
+            stored = existing.get(key)
+            if stored is None:
+                creates['booking'].append(booking)
+                for kind in COMPONENTS:
+                    for entry in item[kind]:
+                        instance, segments = entry if kind == 'air' else (entry, [])
+                        creates[kind].append(instance)
+                        creates['segments'].extend(segments)
+                outcomes[key] = 'created'
+                continue
+
+            # Keep identity of the stored booking and its components
+            self.dirty_days[stored.organization_id].add(stored.travel_date)
+            booking.pk = booking.id = stored.pk
+            booking.created_at = stored.created_at
+            booking.updated_at = now
+            booking.travel_arranger_id = stored.travel_arranger_id
+            booking.travel_consultant_id = stored.travel_consultant_id
+            updates['booking'].append(booking)
+            outcomes[key] = 'updated'
+            for kind in COMPONENTS:
+                for entry in item[kind]:
+                    (entry[0] if kind == 'air' else entry).booking = booking
+
+            stored_by_kind = stored_components[stored.pk]
+            unchanged_air = set()
+            for kind in COMPONENTS:
+                entries = item[kind] if kind != 'air' else [air for air, _ in item['air']]
+                matched = match(kind, self.keyed(kind, entries), self.keyed(kind, stored_by_kind[kind]))
+                if kind == 'air':
+                    unchanged_air = {id(air) for air, stored_air in matched if self.is_unchanged(air, stored_air)}
+
+            for air, segments in item['air']:
+                for segment in segments:
+                    segment.air_booking = air
+                if id(air) not in unchanged_air:
+                    match(
+                        'segments',
+                        self.keyed('segments', segments),
+                        self.keyed('segments', stored_components[air.pk]['segments'])
+                    )
+
+        models = {kind: model for kind, (model, _) in COMPONENTS.items()}
+        models.update(booking=Booking, segments=AirSegment)
+
+        # Parents first so foreign keys exist; deletes last
+        for kind in ('booking', 'air', 'segments', 'hotels', 'cars', 'service_fees'):
+            model = models[kind]
+            if creates[kind]:
+                model.objects.bulk_create(creates[kind], batch_size=self.chunk_size)
+            if updates[kind]:
+                model.objects.bulk_update(updates[kind], self.update_fields(model), batch_size=self.chunk_size)
+        for kind in ('segments', 'air', 'hotels', 'cars', 'service_fees'):
+            if deletes[kind]:
+                models[kind].objects.filter(pk__in=deletes[kind]).delete()
+
+        return outcomes
+
+    # -------------------------------------------------------------------------
+    # Progress, errors and final recalculation
+    # -------------------------------------------------------------------------
+
+    def log_error(self, line, reference, message, error_class='VALIDATION'):
+        """Buffer an error; buffered errors are written with the chunk's progress."""
+        self.totals['errors'] += 1
+        self.errors.append(ImportBatchError(
+            batch_id=self.batch.pk,
+            line=line,
+            reference=str(reference or '')[:100],
+            error_class=error_class,
+            message=message,
+        ))
+
+    def _save_progress(self, counts):
+        """Add a chunk's counts and errors to the batch (F() increments, safe for parallel workers)."""
+        self.totals.update(counts)
+        updates = {
+            'records_processed': F('records_processed') + counts['processed'],
+            'records_created': F('records_created') + counts['created'],
+            'records_updated': F('records_updated') + counts['updated'],
+            'records_unchanged': F('records_unchanged') + counts['unchanged'],
+            'records_failed': F('records_failed') + counts['failed'],
+            'chunks_processed': F('chunks_processed') + counts['chunks'],
+        }
+        ImportBatch.objects.filter(pk=self.batch.pk).update(**updates)
+
+        if self.errors:
+            errors, self.errors = self.errors, []
+            with transaction.atomic():
+                ImportBatchError.objects.bulk_create(errors, batch_size=self.chunk_size)
+
+                batch = (
+                    ImportBatch.objects.select_for_update()
+                    .only('error_log', 'error_summary')
+                    .get(pk=self.batch.pk)
+                )
+                summary = Counter(batch.error_summary or {})
+                summary.update(error.error_class for error in errors)
+                sample = batch.error_log or []
+                sample += [
+                    {'line': error.line, 'reference': error.reference, 'error': error.message}
+                    for error in errors[:max(ERROR_SAMPLE_SIZE - len(sample), 0)]
+                ]
+                ImportBatch.objects.filter(pk=self.batch.pk).update(error_log=sample, error_summary=dict(summary))
+            self.batch.error_log = sample
+            self.batch.error_summary = dict(summary)
+
+    def finalize(self):
+        """
+        Set-based recalculation for everything this importer touched:
+        air carbon totals, booking totals, potential savings and the daily
+        spend rollup; then the trips of the travellers touched. If
+        IMPORT_DETECT_DUPLICATES is on, the batch's bookings are also checked
+        for duplicates of existing ones, and if IMPORT_DETECT_CONFLICTS is
+        on, the touched travellers' timelines for overlapping items.
+        """
+        if not self.organization_ids:
+            return
+
+        from apps.bookings.analytics import invalidate_cache
+
+        bookings = Booking.objects.filter(
+            import_batch=self.batch, organization_id__in=self.organization_ids
+        )
+        air = AirBooking.objects.filter(booking__in=bookings.values('pk'))
+        money = DecimalField(max_digits=12, decimal_places=2)
+        zero = Value(Decimal('0.00'), output_field=money)
+
+        def component_sum(model, field, link='booking'):
+            return Coalesce(
+                Subquery(
+                    model.objects.filter(**{link: OuterRef('pk')})
+                    .order_by()
+                    .values(link)
+                    .annotate(total=Sum(field))
+                    .values('total'),
+                    output_field=money
+                ),
+                zero
+            )
+
+        air.update(total_carbon_kg=component_sum(AirSegment, 'carbon_emissions_kg', link='air_booking'))
+        bookings.update(
+            total_amount=(
+                component_sum(AirBooking, 'total_fare') +
+                component_sum(AccommodationBooking, 'total_amount_base') +
+                component_sum(CarHireBooking, 'total_amount_base') +
+                component_sum(ServiceFee, 'fee_amount')
+            )
+        )
+        AirBooking.recalculate_potential_savings(air, batch_size=self.chunk_size)
+
+        for organization_id, dates in self.dirty_days.items():
+            DailySpendFact.refresh(organization_id, dates)
+        invalidate_cache()
+
+        traveller_ids = list(bookings.values_list('traveller_id', flat=True).distinct())
+        rebuild_travellers(traveller_ids)
+
+        if settings.IMPORT_DETECT_DUPLICATES:
+            detect_duplicates(batch=self.batch)
+        if settings.IMPORT_DETECT_CONFLICTS:
+            detect_conflicts(traveller_ids=traveller_ids, batch=self.batch)
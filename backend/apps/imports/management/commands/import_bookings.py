@@ -0,0 +1,65 @@
+import os
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from apps.imports.importer import DEFAULT_CHUNK_SIZE, detect_format
+from apps.imports.parallel import ParallelImporter
+from apps.imports.models import ImportBatch
+from apps.organizations.models import Organization
+
+
+class Command(BaseCommand):
+    help = 'Import bookings from a CSV or NDJSON extract into a new import batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='Path to the extract file')
+        parser.add_argument('--organization', required=True,
+                            help='Organization code the batch belongs to (agent or customer)')
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help='Input format (default: from the file extension)')
+        parser.add_argument('--import-type', default='MANUAL', help='DAILY, MONTHLY or MANUAL')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Bookings per chunk / transaction')
+        parser.add_argument('--workers', type=int, default=settings.IMPORT_WORKERS,
+                            help='Worker processes (1 = import in-process)')
+        parser.add_argument('--partition-size', type=int, default=settings.IMPORT_PARTITION_SIZE,
+                            help='Bookings per worker partition')
+
+    def handle(self, *args, **options):
+        path = options['file']
+        if not os.path.exists(path):
+            raise CommandError(f"File '{path}' not found")
+
+        organization = Organization.objects.filter(code=options['organization']).first()
+        if organization is None:
+            raise CommandError(f"Organization '{options['organization']}' not found")
+
+        file_format = options['format'] or detect_format(path)
+        batch = ImportBatch.objects.create(
+            organization=organization,
+            import_date=date.today(),
+            import_type=options['import_type'],
+            file_name=os.path.basename(path),
+        )
+
+        self.stdout.write(
+            f"Importing {path} ({file_format}) as batch {batch.pk} with {options['workers']} worker(s)..."
+        )
+
+        importer = ParallelImporter(
+            batch,
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            partition_size=options['partition_size'],
+        )
+        with open(path, newline='', encoding='utf-8-sig') as stream:
+            importer.run(stream, file_format)
+
+        self.stdout.write(
+            f'  processed {batch.records_processed}: {batch.records_created} created, '
+            f'{batch.records_updated} updated, {batch.records_unchanged} unchanged, '
+            f'{batch.records_failed} failed'
+        )
+        style = self.style.SUCCESS if batch.status == 'COMPLETED' else self.style.WARNING
+        self.stdout.write(style(f'Import {batch.status.lower()}'))
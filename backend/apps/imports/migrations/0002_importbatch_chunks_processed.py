@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("imports", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importbatch",
+            name="chunks_processed",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("imports", "0002_importbatch_chunks_processed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importbatch",
+            name="error_summary",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.CreateModel(
+            name="ImportBatchError",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("line", models.IntegerField(blank=True, null=True)),
+                ("reference", models.CharField(blank=True, max_length=100)),
+                (
+                    "error_class",
+                    models.CharField(
+                        choices=[
+                            ("PARSE", "Unreadable Record"),
+                            ("MISSING_REFERENCE", "Missing Booking Reference"),
+                            ("UNKNOWN_ORGANIZATION", "Unknown Organization"),
+                            ("INVALID_VALUE", "Invalid Value"),
+                            ("VALIDATION", "Validation Failed"),
+                            ("TRAVELLER", "Traveller Not Identifiable"),
+                            ("CHUNK_FAILED", "Chunk Write Failed"),
+                            ("PARTITION_FAILED", "Partition Failed"),
+                            ("ABORTED", "Import Aborted"),
+                        ],
+                        max_length=30,
+                    ),
+                ),
+                ("message", models.TextField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "batch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="errors",
+                        to="imports.importbatch",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "import_batch_errors",
+                "ordering": ["line"],
+                "indexes": [
+                    models.Index(
+                        fields=["batch", "error_class"],
+                        name="import_batc_batch_i_8aa355_idx",
+                    ),
+                    models.Index(
+                        fields=["batch", "line"], name="import_batc_batch_i_baac8b_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -34,9 +34,12 @@ class ImportBatch(models.Model):
     records_updated = models.IntegerField(default=0)
     records_unchanged = models.IntegerField(default=0)
     records_failed = models.IntegerField(default=0)
+    chunks_processed = models.IntegerField(default=0)
     
-    # Error tracking
+    # Error tracking: full rows are in ImportBatchError, the batch keeps a
+    # capped sample and counts per error class
     error_log = models.JSONField(default=list, blank=True)
+    error_summary = models.JSONField(default=dict, blank=True)
     
     # Processing time
     started_at = models.DateTimeField(null=True, blank=True)
@@ -54,4 +57,48 @@ class ImportBatch(models.Model):
         ordering = ['-import_date', '-created_at']
     
     def __str__(self):
-        return f"{self.organization.code} - {self.import_date} ({self.status})"
\ No newline at end of file
+        return f"{self.organization.code} - {self.import_date} ({self.status})"
+
+
+class ImportBatchError(models.Model):
+    """One rejected record (or failed chunk/partition) of an import batch"""
+    ERROR_CLASS_CHOICES = [
+        ('PARSE', 'Unreadable Record'),
+        ('MISSING_REFERENCE', 'Missing Booking Reference'),
+        ('UNKNOWN_ORGANIZATION', 'Unknown Organization'),
+        ('INVALID_VALUE', 'Invalid Value'),
+        ('VALIDATION', 'Validation Failed'),
+        ('TRAVELLER', 'Traveller Not Identifiable'),
+        ('CHUNK_FAILED', 'Chunk Write Failed'),
+        ('PARTITION_FAILED', 'Partition Failed'),
+        ('ABORTED', 'Import Aborted'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    batch = models.ForeignKey(
+        ImportBatch,
+        on_delete=models.CASCADE,
+        related_name='errors'
+    )
+    
+    # Where in the file
+    line = models.IntegerField(null=True, blank=True)
+    reference = models.CharField(max_length=100, blank=True)
+    
+    # What went wrong
+    error_class = models.CharField(max_length=30, choices=ERROR_CLASS_CHOICES)
+    message = models.TextField()
+    
+    # Metadata
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'import_batch_errors'
+        indexes = [
+            models.Index(fields=['batch', 'error_class']),
+            models.Index(fields=['batch', 'line']),
+        ]
+        ordering = ['line']
+    
+    def __str__(self):
+        return f"{self.batch_id} line {self.line}: {self.error_class}"
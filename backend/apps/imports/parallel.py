@@ -0,0 +1,223 @@
+# apps/imports/parallel.py
+"""
+Parallel import runner.
+
+The input file is split into partitions by organization and, for tenants
+larger than the partition size, by ranges of travel month. Each partition
+is spooled to a temporary NDJSON file and imported by a worker process
+with its own database connection. Workers write in per-chunk transactions,
+and their counts and errors are added to the shared ImportBatch. A
+partition that fails leaves the others' committed chunks in place. The
+final set-based recalculation runs once in the parent after all workers
+finish.
+
+Every copy of an agent_booking_reference goes to the partition that saw
+it first, so two workers never write the same booking. Travellers are
+created by the parent while it partitions the input (see
+BookingImporter.create_travellers), so an organization split across
+partitions resolves each person to one traveller.
+
+Workers are forked: they inherit the parent's configured Django and its
+imported models, which a spawned interpreter would import before setup.
+"""
+
+from django.conf import settings
+from django.db import connections
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import Counter, defaultdict
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+
+import django
+
+from .importer import BookingImporter, DEFAULT_CHUNK_SIZE, read_documents
+from .models import ImportBatch
+
+logger = logging.getLogger(__name__)
+
+
+class Partition:
+    """A slice of the input for one worker: one organization, a run of travel months."""
+
+    def __init__(self, organization_code):
+        self.organization_code = organization_code
+        self.months = []
+        self.paths = []
+        self.size = 0
+
+    @property
+    def label(self):
+        code = self.organization_code or '(no organization)'
+        months = [month for month in self.months if month]
+        if not months:
+            return code
+        return f"{code} {months[0]}..{months[-1]}"
+
+
+def partition_documents(documents, directory, partition_size):
+    """
+    Spool documents into per-(organization, travel month) files and group
+    them into partitions of at most partition_size documents (a single
+    month is never split).
+
+    Returns:
+        list of Partition, largest first so long partitions start early
+    """
+    spools = {}
+    counts = Counter()
+    routes = {}
+
+    try:
+        for document in documents:
+            code = str(document.get('organization_code') or '').strip()
+            month = str(document.get('travel_date') or '')[:7]
+            reference = (code, str(document.get('agent_booking_reference') or '').strip())
+
+            # Re-sent copies follow the first one so the last version still wins
+            key = routes.setdefault(reference, (code, month)) if reference[1] else (code, month)
+            if key not in spools:
+                spools[key] = open(os.path.join(directory, f'part-{len(spools)}.ndjson'), 'w')
+            spools[key].write(json.dumps(document, default=str) + '\n')
+            counts[key] += 1
+    finally:
+        for spool in spools.values():
+            spool.close()
+
+    by_organization = defaultdict(list)
+    for code, month in sorted(spools):
+        by_organization[code].append(month)
+
+    partitions = []
+    for code, months in by_organization.items():
+        current = Partition(code)
+        for month in months:
+            if current.size and current.size + counts[(code, month)] > partition_size:
+                partitions.append(current)
+                current = Partition(code)
+            current.months.append(month)
+            current.paths.append(spools[(code, month)].name)
+            current.size += counts[(code, month)]
+        partitions.append(current)
+
+    return sorted(partitions, key=lambda partition: -partition.size)
+
+
+def _init_worker():
+    """Runs once in each (forked) worker process: fresh Django setup, no inherited connections."""
+    django.setup()
+    connections.close_all()
+
+
+def import_partition(batch_id, paths, chunk_size):
+    """
+    Worker entry point: import one partition's spool files into the batch.
+
+    Never raises, so one partition's failure is reported rather than
+    propagated. Already committed chunks stay committed.
+
+    Returns:
+        dict with processed count, error (or None), organization_ids and
+        dirty_days for the parent's final recalculation
+    """
+    batch = ImportBatch.objects.select_related('organization').get(pk=batch_id)
+    importer = BookingImporter(batch, chunk_size=chunk_size)
+    error = None
+    try:
+        importer.load_reference_data()
+        for path in paths:
+            with open(path) as stream:
+                importer.import_documents(read_documents(stream, 'ndjson'))
+    except Exception as e:
+        logger.exception(f"Import batch {batch_id}: partition worker failed")
+        error = str(e) or e.__class__.__name__
+    finally:
+        connections.close_all()
+
+    return {
+        'processed': importer.totals['processed'],
+        'error': error,
+        'organization_ids': importer.organization_ids,
+        'dirty_days': dict(importer.dirty_days),
+    }
+
+
+class ParallelImporter:
+    """
+    Import a large extract with a pool of worker processes.
+
+    Usage:
+        batch = ImportBatch.objects.create(organization=agent, import_date=date.today(),
+                                           import_type='DAILY', file_name='extract.csv')
+        with open('extract.csv', newline='') as f:
+            ParallelImporter(batch, workers=4).run(f, 'csv')
+    """
+
+    def __init__(self, batch, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, partition_size=None):
+        self.batch = batch
+        self.workers = workers or settings.IMPORT_WORKERS
+        self.chunk_size = chunk_size
+        self.partition_size = partition_size or settings.IMPORT_PARTITION_SIZE
+
+    def run(self, stream, file_format='csv'):
+        """Partition the stream, import partitions in parallel and finish the batch."""
+        importer = BookingImporter(self.batch, chunk_size=self.chunk_size)
+        if self.workers <= 1:
+            return importer.run(stream, file_format)
+
+        importer.start()
+        try:
+            importer.load_reference_data()
+            with tempfile.TemporaryDirectory(prefix='import-') as directory:
+                partitions = partition_documents(
+                    importer.create_travellers(read_documents(stream, file_format)),
+                    directory, self.partition_size
+                )
+                logger.info(
+                    f"Import batch {self.batch.pk}: {len(partitions)} partitions, {self.workers} workers"
+                )
+                self.run_partitions(importer, partitions)
+            importer.finalize()
+        except Exception as e:
+            importer.abort(e)
+            raise
+
+        importer.complete()
+        return self.batch
+
+    def run_partitions(self, importer, partitions):
+        """Run partitions on the pool and merge each worker's results into the importer."""
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+
+        # Fork explicitly: spawn/forkserver (the default on some platforms) would
+        # import this module's models before the worker has set Django up
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                 initializer=_init_worker) as pool:
+            futures = {
+                pool.submit(import_partition, self.batch.pk, partition.paths, self.chunk_size): partition
+                for partition in partitions
+            }
+            for future in as_completed(futures):
+                partition = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker process itself died
+                    result = {'processed': 0, 'error': str(e) or e.__class__.__name__,
+                              'organization_ids': set(), 'dirty_days': {}}
+
+                importer.organization_ids |= result['organization_ids']
+                for organization_id, dates in result['dirty_days'].items():
+                    importer.dirty_days[organization_id] |= dates
+
+                if result['error']:
+                    unprocessed = partition.size - result['processed']
+                    logger.error(f"Import batch {self.batch.pk}: partition {partition.label} failed: {result['error']}")
+                    importer.log_error(
+                        None, None, f"partition {partition.label} failed: {result['error']}", 'PARTITION_FAILED'
+                    )
+                    importer._save_progress(Counter(processed=unprocessed, failed=unprocessed))
@@ -1,3 +1,63 @@
 from django.test import TestCase
+from datetime import date
+from decimal import Decimal
+import io
+import json
 
-# Create your tests here.
+from apps.bookings import transactions
+from apps.bookings.models import AccommodationBooking, BookingTransaction
+from apps.organizations.models import Organization
+from .importer import BookingImporter
+from .models import ImportBatch
+
+
+def hotel_document(nightly_rate='200.00'):
+    return {
+        'organization_code': 'CUS', 'agent_booking_reference': 'H1',
+        'booking_date': '2025-02-01', 'travel_date': '2025-03-01',
+        'traveller': {'employee_id': 'E1', 'first_name': 'Jo', 'last_name': 'Bloggs'},
+        'hotels': [{
+            'hotel_name': 'Hilton Melbourne', 'city': 'Melbourne', 'country': 'Australia',
+            'check_in_date': '2025-03-01', 'check_out_date': '2025-03-03', 'nightly_rate': nightly_rate,
+        }],
+    }
+
+
+class ReimportTests(TestCase):
+    def setUp(self):
+        self.agent = Organization.objects.create(
+            name='Agent', org_type='AGENT', code='AGT', contact_email='agent@example.com'
+        )
+        Organization.objects.create(
+            name='Customer', org_type='CUSTOMER', code='CUS', contact_email='customer@example.com',
+            travel_agent=self.agent
+        )
+
+    def run_import(self, *documents):
+        batch = ImportBatch.objects.create(organization=self.agent, import_date=date.today(), import_type='DAILY')
+        ndjson = '\n'.join(json.dumps(document) for document in documents)
+        BookingImporter(batch).run(io.StringIO(ndjson), 'ndjson')
+        batch.refresh_from_db()
+        return batch
+
+    def test_unchanged_reimport_is_skipped(self):
+        self.run_import(hotel_document())
+        batch = self.run_import(hotel_document())
+        self.assertEqual((batch.records_created, batch.records_updated, batch.records_unchanged), (0, 0, 1))
+
+    def test_reimport_keeps_transaction_totals(self):
+        self.run_import(hotel_document())
+        hotel = AccommodationBooking.objects.get()
+        transactions.ingest([{
+            'component_type': 'HOTEL', 'component_id': hotel.pk, 'transaction_type': 'EXCHANGE',
+            'transaction_date': date(2025, 2, 10), 'total_amount': Decimal('50.00'),
+        }])
+
+        batch = self.run_import(hotel_document(nightly_rate='210.00'))
+
+        hotel = AccommodationBooking.objects.get()
+        self.assertEqual(batch.records_updated, 1)
+        self.assertEqual(hotel.nightly_rate, Decimal('210.00'))
+        self.assertEqual(hotel.transaction_total, Decimal('50.00'))
+        self.assertEqual(hotel.transaction_total_base, Decimal('50.00'))
+        self.assertEqual(BookingTransaction.objects.count(), 1)
@@ -0,0 +1,97 @@
+# apps/reference_data/rates.py
+"""
+In-memory exchange rate table for batch conversions.
+
+CurrencyExchangeRate.get_rate() costs up to four queries per call, which is
+fine for a single save but not for recalculating thousands of rows. Load
+the table once and look rates up with a binary search instead.
+"""
+
+from bisect import bisect_right
+from collections import defaultdict
+from decimal import Decimal
+import logging
+
+from .models import CurrencyExchangeRate
+
+logger = logging.getLogger(__name__)
+
+
+class ExchangeRateTable:
+    """
+    Preloaded exchange rates with the same lookup rules as
+    CurrencyExchangeRate.get_rate():
+
+    1. Same currency returns 1.0
+    2. Most recent direct rate (from → to) on or before the date
+    3. Most recent reverse rate (to → from) on or before the date, inverted
+    4. Otherwise None
+
+    Example:
+        >>> rates = ExchangeRateTable.load(currencies=['USD', 'AUD'])
+        >>> rates.get_rate('USD', 'AUD', date(2024, 1, 15))
+        Decimal('1.52')
+    """
+
+    def __init__(self, rows=()):
+        series = defaultdict(list)
+        for from_currency, to_currency, rate_date, exchange_rate in rows:
+            series[(from_currency, to_currency)].append((rate_date, Decimal(str(exchange_rate))))
+
+        self._dates = {}
+        self._rates = {}
+        for pair, points in series.items():
+            points.sort()
+            self._dates[pair] = [rate_date for rate_date, _ in points]
+            self._rates[pair] = [rate for _, rate in points]
+
+    @classmethod
+    def load(cls, currencies=None, until=None):
+        """
+        Load rates from the database in one query.
+
+        Args:
+            currencies: Optional iterable of currency codes to restrict both
+                sides of the pair to
+            until: Optional latest rate_date needed
+        """
+        rates = CurrencyExchangeRate.objects.order_by()
+        if currencies is not None:
+            currencies = list(set(currencies))
+            rates = rates.filter(from_currency__in=currencies, to_currency__in=currencies)
+        if until is not None:
+            rates = rates.filter(rate_date__lte=until)
+
+        return cls(rates.values_list('from_currency', 'to_currency', 'rate_date', 'exchange_rate'))
+
+    def _latest(self, pair, date):
+        dates = self._dates.get(pair)
+        if not dates:
+            return None
+        index = bisect_right(dates, date)
+        if index == 0:
+            return None
+        return self._rates[pair][index - 1]
+
+    def get_rate(self, from_currency, to_currency, date):
+        """Exchange rate for the date, or None if not found."""
+        if from_currency == to_currency:
+            return Decimal('1.0')
+
+        rate = self._latest((from_currency, to_currency), date)
+        if rate is not None:
+            return rate
+
+        reverse = self._latest((to_currency, from_currency), date)
+        if reverse:
+            return Decimal('1.0') / reverse
+
+        logger.debug(f"No exchange rate found for {from_currency} → {to_currency} on or before {date}")
+        return None
+
+    def convert_amount(self, amount, from_currency, to_currency, date):
+        """Convert an amount, or None if no rate is available."""
+        rate = self.get_rate(from_currency, to_currency, date)
+        if rate is None:
+            return None
+        return Decimal(str(amount)) * rate
@@ -0,0 +1,140 @@
+# apps/reference_data/suppliers.py
+"""
+Supplier name normalization.
+
+Bookings carry free-text supplier names ("HILTON GARDEN INN SYD",
+"Hertz Australia Pty Ltd", "ZE"), while HotelChain and CarRentalCompany
+hold the canonical supplier with its comma-separated alternative_names.
+A SupplierMatcher compiles every name and alternative name into a token
+trie, so matching a string costs one walk per token position instead of
+one comparison per alias, and each distinct string is matched only once.
+
+Matching rules:
+
+1. Strings are compared as lowercase alphanumeric tokens, so punctuation,
+   case and spacing don't matter ("Best-Western" == "BEST WESTERN")
+2. The alias covering the most tokens anywhere in the string wins
+   ("Hilton Garden Inn Sydney" -> Hilton, unless "Hilton Garden Inn" is
+   itself an alias of another supplier)
+3. Ties go to the earliest match in the string
+4. Strings with no alias in them don't match
+
+Single saves use matcher(), which keeps one compiled SupplierMatcher per
+model in each process and recompiles it after invalidate_matchers() -
+called whenever a HotelChain or CarRentalCompany changes.
+"""
+
+from django.core.cache import cache
+import re
+import unicodedata
+import uuid
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+# Trie node key marking the end of an alias
+_END = None
+
+# Changes whenever supplier reference data does; lives in the shared cache
+# (settings.CACHES) so an edit in one process reaches every other one
+MATCHER_VERSION_KEY = 'suppliers:version'
+
+# model label -> (version, SupplierMatcher) compiled in this process
+_matchers = {}
+
+
+def tokenize(name):
+    """Lowercase ASCII alphanumeric tokens ('Hôtel Ibis-Budget' -> ['hotel', 'ibis', 'budget'])."""
+    text = unicodedata.normalize('NFKD', name or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return _TOKEN.findall(text.replace('&', ' and '))
+
+
+def aliases(supplier):
+    """The supplier's name followed by its alternative names."""
+    names = [supplier.name]
+    names.extend(name.strip() for name in (supplier.alternative_names or '').split(','))
+    return [name for name in names if name]
+
+
+class SupplierMatcher:
+    """
+    Token trie over the names and alternative names of one supplier model.
+
+    Usage:
+        chains = SupplierMatcher.load(HotelChain)
+        chains.match('HILTON GARDEN INN SYDNEY')   # -> <HotelChain: Hilton>
+        chains.match('Unknown Lodge')              # -> None
+    """
+
+    def __init__(self, suppliers=()):
+        self.root = {}
+        self.suppliers = []
+        self._cache = {}
+        for supplier in suppliers:
+            self.add(supplier)
+
+    @classmethod
+    def load(cls, model, active_only=False):
+        """Compile every supplier of the model (one query)."""
+        suppliers = model.objects.order_by('name')
+        if active_only:
+            suppliers = suppliers.filter(is_active=True)
+        return cls(suppliers)
+
+    def __len__(self):
+        return len(self.suppliers)
+
+    def add(self, supplier):
+        """Add the supplier's aliases. An alias already claimed keeps its first supplier."""
+        self.suppliers.append(supplier)
+        self._cache.clear()
+        for alias in aliases(supplier):
+            tokens = tokenize(alias)
+            if not tokens:
+                continue
+            node = self.root
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node.setdefault(_END, supplier)
+
+    def match(self, name):
+        """The canonical supplier for a free-text name, or None."""
+        if not name:
+            return None
+        try:
+            return self._cache[name]
+        except KeyError:
+            pass
+
+        tokens = tokenize(name)
+        best, best_length = None, 0
+        for start in range(len(tokens)):
+            node = self.root
+            for position in range(start, len(tokens)):
+                node = node.get(tokens[position])
+                if node is None:
+                    break
+                length = position - start + 1
+                if _END in node and length > best_length:
+                    best, best_length = node[_END], length
+
+        self._cache[name] = best
+        return best
+
+    def match_many(self, names):
+        """{name: supplier or None} for each distinct name."""
+        return {name: self.match(name) for name in set(names)}
+
+
+def matcher(model):
+    """The model's SupplierMatcher, compiled once per process and reference data version."""
+    version = cache.get_or_set(MATCHER_VERSION_KEY, lambda: uuid.uuid4().hex, None)
+    entry = _matchers.get(model._meta.label)
+    if entry is None or entry[0] != version:
+        entry = _matchers[model._meta.label] = (version, SupplierMatcher.load(model))
+    return entry[1]
+
+
+def invalidate_matchers():
+    """Make every process recompile its matchers on next use."""
+    cache.set(MATCHER_VERSION_KEY, uuid.uuid4().hex, None)
@@ -1,3 +1,32 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from .models import HotelChain
+from .suppliers import SupplierMatcher
+
+
+class SupplierMatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.hilton = HotelChain(name='Hilton', alternative_names='Hilton Hotels, Conrad')
+        self.garden_inn = HotelChain(name='Hilton Garden Inn')
+        self.ibis = HotelChain(name='Ibis Budget')
+        self.matcher = SupplierMatcher([self.hilton, self.garden_inn, self.ibis])
+
+    def test_matches_name_or_alternative_name_anywhere_in_the_string(self):
+        self.assertIs(self.matcher.match('HILTON SYDNEY'), self.hilton)
+        self.assertIs(self.matcher.match('The Conrad, Melbourne'), self.hilton)
+        self.assertIs(self.matcher.match('Hôtel Ibis-Budget Paris'), self.ibis)
+
+    def test_longest_alias_wins(self):
+        self.assertIs(self.matcher.match('HILTON GARDEN INN SYDNEY'), self.garden_inn)
+
+    def test_unknown_and_blank_names(self):
+        self.assertIsNone(self.matcher.match('Unknown Lodge'))
+        self.assertIsNone(self.matcher.match('Garden Inn'))
+        self.assertIsNone(self.matcher.match(''))
+        self.assertEqual(self.matcher.match_many(['Conrad', 'Nowhere']), {'Conrad': self.hilton, 'Nowhere': None})
+
+    def test_first_supplier_keeps_a_shared_alias(self):
+        other = HotelChain(name='Other', alternative_names='Conrad')
+        self.matcher.add(other)
+        self.assertIs(self.matcher.match('Conrad'), self.hilton)
+        self.assertIs(self.matcher.match('Other'), other)
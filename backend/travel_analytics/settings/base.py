@@ -131,6 +131,53 @@ SPECTACULAR_SETTINGS = {
     'VERSION': '1.0.0',
 }
 
+# Cache
+# Analytics results and their invalidation version (a counter bumped when
+# booking data changes). The local-memory default is per process, which is
+# fine for a single dev server; deployments with several web workers or
+# out-of-process imports set a shared backend so a bump reaches all of
+# them, e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache with
+# CACHE_LOCATION=redis://host:6379/1, or
+# CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache with
+# CACHE_LOCATION=django_cache after running `manage.py createcachetable`
+# as a deploy step.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Analytics
+# Grouped analytics responses are cached per user and filter set (seconds)
+ANALYTICS_CACHE_TIMEOUT = int(os.getenv('ANALYTICS_CACHE_TIMEOUT', 300))
+
+# Imports
+# Worker processes for large booking imports (1 = import in-process)
+IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', 1))
+# Bookings per worker partition; larger tenants are split by travel month
+IMPORT_PARTITION_SIZE = int(os.getenv('IMPORT_PARTITION_SIZE', 50000))
+# Look for duplicate bookings among each import's rows when it finishes
+IMPORT_DETECT_DUPLICATES = os.getenv('IMPORT_DETECT_DUPLICATES', 'True') == 'True'
+# Look for overlapping stays, rentals and flights of the travellers each import touched
+IMPORT_DETECT_CONFLICTS = os.getenv('IMPORT_DETECT_CONFLICTS', 'True') == 'True'
+
+# Audit log
+# Write committed BookingAuditLog entries from a background thread
+AUDIT_ASYNC = os.getenv('AUDIT_ASYNC', 'False') == 'True'
+# Entries the background writer may hold before committing threads wait for it
+AUDIT_QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', 10000))
+# Entries per INSERT
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', 500))
+# Months kept in the database; older months are moved to compressed archive files
+AUDIT_RETENTION_MONTHS = int(os.getenv('AUDIT_RETENTION_MONTHS', 24))
+# Where archived audit log months (and their index.json) are written
+AUDIT_ARCHIVE_DIR = os.getenv('AUDIT_ARCHIVE_DIR', str(BASE_DIR / 'archive' / 'audit_logs'))
+# Where the background writer spools entries it could not insert; archive_audit_logs replays them
+AUDIT_SPOOL_DIR = os.getenv('AUDIT_SPOOL_DIR', str(BASE_DIR / 'archive' / 'audit_spool'))
+# Monthly partitions created ahead of time (PostgreSQL)
+AUDIT_PARTITION_MONTHS_AHEAD = int(os.getenv('AUDIT_PARTITION_MONTHS_AHEAD', 3))
+
 # CORS Settings for Frontend
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
@@ -41,34 +41,19 @@ export default {
 
   // Airline spend analysis
   async getAirlineSpend(params = {}) {
-    const response = await api.get('/bookings/', {
-      params: {
-        booking_type: 'AIR',
-        ...params
-      }
-    })
+    const response = await api.get('/bookings/airlines/', { params })
     return response.data
   },
 
   // Accommodation spend analysis
   async getAccommodationSpend(params = {}) {
-    const response = await api.get('/bookings/', {
-      params: {
-        booking_type: 'HOTEL',
-        ...params
-      }
-    })
+    const response = await api.get('/bookings/accommodation/', { params })
     return response.data
   },
 
   // Car hire spend analysis
   async getCarHireSpend(params = {}) {
-    const response = await api.get('/bookings/', {
-      params: {
-        booking_type: 'CAR',
-        ...params
-      }
-    })
+    const response = await api.get('/bookings/car_hire/', { params })
     return response.data
   },
 
@@ -39,12 +39,6 @@ export async function getComplianceSummary(params = {}) {
         summary.non_compliant_bookings++
       }
 
-      // Online booking compliance (mock - need to add field)
-      // Assuming 89% are booked online based on your screenshot
-      if (Math.random() > 0.11) {
-        summary.online_booking_count++
-      }
-
       // Advance booking compliance
       if (booking.advance_booking_days && booking.advance_booking_days >= 7) {
         summary.advance_booking_compliant++
@@ -59,7 +53,6 @@ export async function getComplianceSummary(params = {}) {
     // Calculate rates
     if (summary.total_bookings > 0) {
       summary.compliance_rate = (summary.compliant_bookings / summary.total_bookings) * 100
-      summary.online_booking_rate = (summary.online_booking_count / summary.total_bookings) * 100
       
       const airBookings = bookings.filter(b => b.booking_type === 'AIR').length
       if (airBookings > 0) {
@@ -68,8 +61,18 @@ export async function getComplianceSummary(params = {}) {
       }
     }
 
+    // Online adoption from booking service fees
+    const feeResponse = await api.get('/service-fees/summary/', { params })
+    summary.online_booking_count = feeResponse.data.totals.online_bookings
+    summary.online_booking_rate = feeResponse.data.totals.online_adoption_rate || 0
+
+    // Exchange, reissue and date change costs from booking transactions
+    const transactionResponse = await api.get('/bookings/transactions/', {
+      params: { ...params, group_by: 'product' },
+    })
+    summary.cost_of_change = transactionResponse.data.totals.cost_of_change || 0
+
     // Mock financial data (will be calculated from violations)
-    summary.cost_of_change = 3015445.64
     summary.out_of_policy_spend = 1245380.22
     summary.potential_savings = 892450.00
 
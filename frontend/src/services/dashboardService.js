@@ -14,14 +14,26 @@ export default {
     return response.data
   },
 
+  /**
+   * Run a server-side group-by over bookings
+   * @param {Object} params - Booking filters plus dimensions, measures, products, rollup, limit
+   * @returns {Promise} { dimensions, measures, rows, totals, truncated }
+   */
+  async getAnalytics(params = {}) {
+    const response = await api.get('/bookings/analytics/', { params })
+    return response.data
+  },
+
   /**
    * Get spend breakdown by category
    */
   async getSpendBreakdown(params = {}) {
-    const response = await api.get('/bookings/', { params })
-    const bookings = response.data.results || response.data
+    const data = await this.getAnalytics({
+      ...params,
+      dimensions: 'product',
+      measures: 'spend,count',
+    })
 
-    // Calculate totals by category
     const breakdown = {
       total: 0,
       air: 0,
@@ -29,26 +41,14 @@ export default {
       car: 0,
       service_fees: 0,
       other: 0,
-      bookings_count: bookings.length,
+      bookings_count: 0,
     }
+    const keys = { AIR: 'air', HOTEL: 'accommodation', CAR: 'car', FEE: 'service_fees' }
 
-    bookings.forEach((booking) => {
-      const amount = parseFloat(booking.total_amount) || 0
-      breakdown.total += amount
-
-      switch (booking.booking_type) {
-        case 'AIR':
-          breakdown.air += amount
-          break
-        case 'HOTEL':
-          breakdown.accommodation += amount
-          break
-        case 'CAR':
-          breakdown.car += amount
-          break
-        default:
-          breakdown.other += amount
-      }
+    data.rows.forEach((row) => {
+      breakdown[keys[row.product] || 'other'] += row.spend
+      breakdown.total += row.spend
+      breakdown.bookings_count += row.count
     })
 
     return breakdown
@@ -58,41 +58,63 @@ export default {
    * Get transaction summary
    */
   async getTransactionSummary(params = {}) {
-    const response = await api.get('/bookings/', { params })
-    const bookings = response.data.results || response.data
+    // Component measures from the analytics endpoint; the booking count from
+    // the list summary, since a booking has several components
+    const [data, list] = await Promise.all([
+      this.getAnalytics({
+        ...params,
+        dimensions: 'product',
+        measures: 'nights,days,spend',
+      }),
+      api.get('/bookings/', { params }),
+    ])
 
     const summary = {
-      total_bookings: bookings.length,
+      total_bookings: list.data.summary ? list.data.summary.booking_count : list.data.count || 0,
       hotel_nights: 0,
       car_hire_days: 0,
       service_fees: 0,
     }
 
-    // Calculate hotel nights and car hire days
-    bookings.forEach((booking) => {
-      if (booking.booking_type === 'HOTEL' && booking.accommodation_details) {
-        summary.hotel_nights += booking.accommodation_details.number_of_nights || 0
-      }
-      if (booking.booking_type === 'CAR' && booking.car_hire_details) {
-        summary.car_hire_days += booking.car_hire_details.number_of_days || 0
+    data.rows.forEach((row) => {
+      summary.hotel_nights += row.nights
+      summary.car_hire_days += row.days
+      if (row.product === 'FEE') {
+        summary.service_fees += row.spend
       }
     })
 
     return summary
   },
 
+  /**
+   * Get change, refund and void analytics from booking transactions
+   * @param {Object} params - Booking filters plus group_by (supplier,product,month),
+   *   start_date / end_date (transaction dates) and products
+   * @returns {Promise} { dimensions, totals, rows }
+   */
+  async getTransactionAnalytics(params = {}) {
+    const response = await api.get('/bookings/transactions/', { params })
+    return response.data
+  },
+
   /**
    * Get compliance metrics
    */
   async getComplianceMetrics(params = {}) {
-    // TODO: This will use the compliance violations API once available
-    // For now, return mock data structure
+    // TODO: Remaining fields will use the compliance violations API once available
+    const [response, transactions] = await Promise.all([
+      api.get('/service-fees/summary/', { params }),
+      this.getTransactionAnalytics({ ...params, group_by: 'product' }),
+    ])
+    const fees = response.data.totals
+
     return {
       total_bookings: 0,
       compliant_bookings: 0,
       compliance_rate: 0,
-      online_booking_rate: 0,
-      cost_of_change: 0,
+      online_booking_rate: fees.online_adoption_rate || 0,
+      cost_of_change: transactions.totals.cost_of_change || 0,
       lowest_fare_compliance: 0,
     }
   },